@@ -0,0 +1,122 @@
+"""
+跨專案公平排程的每專案尾延遲
+
+模擬一個有大量 MR 的大型專案排在清單最前面，比較依清單順序逐一 clone（FIFO）
+與管線公平排程下，各專案 MR 從開始到 clone 完成的延遲。clone 以固定時間的 sleep 模擬。
+
+用法:
+    python -m benchmarks.bench_fair_scheduling
+    python -m benchmarks.bench_fair_scheduling --big 80 --small 5 --projects 10 --workers 2 --clone-ms 5
+"""
+
+import argparse
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from src.gitlab_.models import MRInfo
+from src.pipeline.engine import ScanClonePipeline
+from src.scanner.mr_scanner import ScanResult
+from src.state.history import percentile
+
+
+def _make_projects(big: int, small: int, projects: int) -> Dict[str, List[MRInfo]]:
+    counts = {"group/monorepo": big}
+    counts.update({f"group/project{i}": small for i in range(projects)})
+    return {
+        project: [
+            MRInfo(
+                id=iid, project_id=0, project_name=project, iid=iid, title="", description="", state="opened",
+                author="", created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+                draft=False, work_in_progress=False,
+            )
+            for iid in range(count)
+        ]
+        for project, count in counts.items()
+    }
+
+
+def run_fifo(mrs: Dict[str, List[MRInfo]], workers: int, clone_seconds: float) -> Dict[str, List[float]]:
+    """依專案清單順序處理所有 MR"""
+    items: queue.Queue = queue.Queue()
+    for project, project_mrs in mrs.items():
+        for mr in project_mrs:
+            items.put((project, mr))
+
+    latencies: Dict[str, List[float]] = {project: [] for project in mrs}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            try:
+                project, _ = items.get_nowait()
+            except queue.Empty:
+                return
+            time.sleep(clone_seconds)
+            with lock:
+                latencies[project].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_fair(mrs: Dict[str, List[MRInfo]], workers: int, clone_seconds: float, queue_size: int) -> Dict[str, List[float]]:
+    """以管線公平排程處理所有 MR"""
+    latencies: Dict[str, List[float]] = {project: [] for project in mrs}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def process(project, mr):
+        time.sleep(clone_seconds)
+        with lock:
+            latencies[project].append(time.perf_counter() - started)
+
+    pipeline = ScanClonePipeline(
+        lambda project: ScanResult(project=project, merge_requests=mrs[project]),
+        process,
+        lambda result, seconds: None,
+        workers=workers,
+        queue_size=queue_size,
+    )
+    pipeline.run(list(mrs))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--big", type=int, default=80, help="大型專案的 MR 數")
+    parser.add_argument("--small", type=int, default=5, help="其他專案各自的 MR 數")
+    parser.add_argument("--projects", type=int, default=10, help="其他專案數")
+    parser.add_argument("--workers", type=int, default=2, help="clone worker 數")
+    parser.add_argument("--clone-ms", type=float, default=5.0, help="模擬每個 clone 的毫秒數")
+    parser.add_argument("--queue-size", type=int, default=16, help="管線佇列容量")
+    args = parser.parse_args()
+
+    mrs = _make_projects(args.big, args.small, args.projects)
+    clone_seconds = args.clone_ms / 1000
+    results = {
+        "fifo": run_fifo(mrs, args.workers, clone_seconds),
+        "fair": run_fair(mrs, args.workers, clone_seconds, args.queue_size),
+    }
+
+    print(f"{'mode':<5} {'project':<18} {'MRs':>4} {'p50(ms)':>9} {'p95(ms)':>9} {'max(ms)':>9}")
+    for mode, latencies in results.items():
+        for project, values in latencies.items():
+            print(
+                f"{mode:<5} {project:<18} {len(values):>4} "
+                f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+                f"{max(values) * 1000:>9.1f}",
+                flush=True,
+            )
+        small_p95 = [percentile(values, 95) for project, values in latencies.items() if project != "group/monorepo"]
+        print(f"{mode:<5} {'小專案 p95 最大值':<18} {'':>4} {max(small_p95) * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+列出 clone 的耗時
+
+在暫存目錄建立指定數量的 clone 目錄（三層專案路徑），比較：
+
+- index: 讀取 SQLite 中的 clone 索引（list-clones 的預設路徑）
+- scandir: 以 os.scandir 掃描重建時的目錄走訪
+
+用法:
+    python -m benchmarks.bench_list_clones
+    python -m benchmarks.bench_list_clones --sizes 1000,10000 --projects 200
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.clone.manager import CloneManager
+from src.clone.workspaces import Workspace, WorkspaceStore, scan_workspaces
+from src.state.manager import StateManager
+
+
+def _make(root: Path, size: int, projects: int) -> StateManager:
+    state_manager = StateManager(storage_type="sqlite", db_path=str(root / "db.sqlite"), state_dir=str(root))
+    for n in range(size):
+        project = f"group/sub{n % 10}/project{n % projects}"
+        (root / "reviews" / project / str(n) / ".git").mkdir(parents=True)
+        workspace = Workspace(project=project, iid=n, size=1024)
+        state_manager.put_document("workspaces", workspace.key, workspace.__dict__)
+    return state_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="逗號分隔的 clone 數")
+    parser.add_argument("--projects", type=int, default=100, help="專案數")
+    args = parser.parse_args()
+
+    print(f"{'clones':>8} {'index(ms)':>10} {'scandir(ms)':>12}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            state_manager = _make(root, size, args.projects)
+            manager = CloneManager(
+                SimpleNamespace(reviews_path=str(root / "reviews")), state_manager,
+                workspaces=WorkspaceStore(state_manager),
+            )
+
+            started = time.perf_counter()
+            listed = manager.list_clones()
+            indexed = time.perf_counter()
+            scanned = scan_workspaces(root / "reviews")
+            finished = time.perf_counter()
+            assert sum(len(iids) for iids in listed.values()) == len(scanned) == size
+
+            print(f"{size:>8} {(indexed - started) * 1000:>10.1f} {(finished - indexed) * 1000:>12.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+掃描差異比對的耗時
+
+以不同數量的已追蹤 MR 建立索引並逐專案比對，確認耗時隨 MR 數線性成長。
+每個專案約有 1% 的 MR 有新的 commit、1% 只更新資料、1% 已關閉，並新增 1% 的 MR。
+
+用法:
+    python -m benchmarks.bench_scan_diff
+    python -m benchmarks.bench_scan_diff --sizes 10000,100000 --projects 200
+"""
+
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+from src.gitlab_.models import MRInfo
+from src.scanner.diff import diff_project, index_states
+from src.state.models import MRState
+
+
+def _make(size: int, projects: int) -> Tuple[List[MRState], Dict[str, List[MRInfo]]]:
+    states = []
+    scanned: Dict[str, List[MRInfo]] = {f"group/project{p}": [] for p in range(projects)}
+    for n in range(size):
+        project = f"group/project{n % projects}"
+        iid = n // projects
+        states.append(MRState(
+            mr_id=n, project_slug=project, iid=iid, state="opened",
+            head_commit_sha=f"sha{n}", mr_updated_at="2024-01-01T00:00:00Z",
+        ))
+        bucket = n % 100
+        if bucket == 0:
+            continue  # 已關閉
+        sha = f"new{n}" if bucket == 1 else f"sha{n}"
+        updated_at = "2024-02-01T00:00:00Z" if bucket in (1, 2) else "2024-01-01T00:00:00Z"
+        scanned[project].append(MRInfo(
+            id=n, project_id=0, project_name=project, iid=iid, title="", description="", state="opened",
+            author="", created_at="", updated_at=updated_at, source_branch="f", target_branch="main", web_url="",
+            draft=False, work_in_progress=False, sha=sha,
+        ))
+    for n in range(size // 100):
+        project = f"group/project{n % projects}"
+        scanned[project].append(MRInfo(
+            id=size + n, project_id=0, project_name=project, iid=size + n, title="", description="", state="opened",
+            author="", created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+            draft=False, work_in_progress=False, sha=f"sha{size + n}",
+        ))
+    return states, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="逗號分隔的已追蹤 MR 數")
+    parser.add_argument("--projects", type=int, default=100, help="專案數")
+    args = parser.parse_args()
+
+    print(f"{'MRs':>8} {'index(ms)':>10} {'diff(ms)':>10} {'events':>8} {'us/MR':>7}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        states, scanned = _make(size, args.projects)
+
+        started = time.perf_counter()
+        index = index_states(states)
+        indexed = time.perf_counter()
+        events = sum(len(diff_project(project, mrs, index.get(project, {}))) for project, mrs in scanned.items())
+        finished = time.perf_counter()
+
+        print(
+            f"{size:>8} {(indexed - started) * 1000:>10.1f} {(finished - indexed) * 1000:>10.1f} "
+            f"{events:>8} {(finished - started) / size * 1e6:>7.2f}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
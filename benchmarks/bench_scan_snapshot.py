@@ -0,0 +1,68 @@
+"""
+掃描快照的讀寫耗時
+
+建立指定數量 MR 的快照（平均分散到各專案），量測寫入、讀取與離線篩選
+（scan --dry-run --offline 的本機工作）的耗時與檔案大小。
+
+用法:
+    python -m benchmarks.bench_scan_snapshot
+    python -m benchmarks.bench_scan_snapshot --sizes 1000,10000 --projects 200
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+from src.gitlab_.models import MRInfo
+from src.scanner.mr_scanner import MRScanner, ScanResult
+from src.scanner.snapshot import SNAPSHOT_FILE, ScanSnapshot
+
+
+def _results(size: int, projects: int):
+    by_project = {}
+    for n in range(size):
+        project = f"group/project{n % projects}"
+        by_project.setdefault(project, []).append(MRInfo(
+            id=n, project_id=n % projects, project_name=project, iid=n, title=f"Feature {n}",
+            description="x" * 200, state="opened", author="dev", created_at="2024-01-01T00:00:00Z",
+            updated_at="2024-01-02T00:00:00Z", source_branch=f"feature-{n}", target_branch="main",
+            web_url=f"https://gitlab.example.com/{project}/-/merge_requests/{n}", draft=n % 5 == 0,
+            work_in_progress=False, sha=f"{n:040x}", labels=["backend"] if n % 2 else [],
+        ))
+    return [ScanResult(project=project, merge_requests=[], listed=mrs) for project, mrs in by_project.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="逗號分隔的 MR 數")
+    parser.add_argument("--projects", type=int, default=100, help="專案數")
+    args = parser.parse_args()
+
+    scanner = MRScanner(None, Mock(), filter_rules=["label = backend"])
+    print(f"{'mrs':>8} {'save(ms)':>9} {'load(ms)':>9} {'filter(ms)':>11} {'size(KB)':>9}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / SNAPSHOT_FILE
+            snapshot = ScanSnapshot(path)
+            snapshot.update(_results(size, args.projects))
+
+            started = time.perf_counter()
+            snapshot.save()
+            saved = time.perf_counter()
+            loaded = ScanSnapshot.load(path)
+            read = time.perf_counter()
+            mrs, _ = scanner.filter_offline(loaded.merge_requests())
+            finished = time.perf_counter()
+            assert len(loaded.merge_requests()) == size and mrs
+
+            print(
+                f"{size:>8} {(saved - started) * 1000:>9.1f} {(read - saved) * 1000:>9.1f} "
+                f"{(finished - read) * 1000:>11.1f} {path.stat().st_size / 1024:>9.0f}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+狀態儲存後端效能比較
+
+比較 sqlite、json、kv 後端在不同 MR 狀態數量下的批次寫入、點查詢與全量讀取耗時。
+
+用法:
+    python -m benchmarks.bench_state_backends
+    python -m benchmarks.bench_state_backends --sizes 10000,100000 --backends sqlite,kv --reads 2000
+
+JSON 後端每次點查詢都會讀取整份檔案，大量資料時請調低 --reads 或排除 json。
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from src.state.history import percentile
+from src.state.manager import StateManager
+from src.state.models import MRState
+
+
+BATCH_SIZE = 10_000
+
+
+def _make_states(count: int) -> List[MRState]:
+    return [
+        MRState(
+            mr_id=i,
+            project_slug=f"group{i % 50}/project{i % 500}",
+            iid=i,
+            state="opened",
+            head_commit_sha=f"{i:040x}",
+            saved_at="2026-01-01T00:00:00",
+        )
+        for i in range(count)
+    ]
+
+
+def run(backend: str, size: int, reads: int) -> dict:
+    """
+    對單一後端與資料量執行基準測試
+
+    Returns:
+        各階段耗時（秒）
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = StateManager(
+            storage_type=backend,
+            db_path=str(Path(tmp) / "bench.sqlite"),
+            state_dir=tmp,
+        )
+        states = _make_states(size)
+
+        # JSON 每批都會重寫整份檔案，一次寫入才不會變成 O(n^2)
+        batch = size if backend == "json" else BATCH_SIZE
+        started = time.perf_counter()
+        for offset in range(0, size, batch):
+            manager.save_mr_states(states[offset:offset + batch])
+        load_seconds = time.perf_counter() - started
+
+        samples = random.Random(42).sample(states, min(reads, size))
+        latencies = []
+        for state in samples:
+            started = time.perf_counter()
+            manager.get_mr_state(state.mr_id, state.project_slug)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        manager.get_all_mr_states()
+        scan_seconds = time.perf_counter() - started
+
+        manager.close()
+
+    return {
+        "load": load_seconds,
+        "read_p50": percentile(latencies, 50),
+        "read_p95": percentile(latencies, 95),
+        "get_all": scan_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="逗號分隔的 MR 狀態數量")
+    parser.add_argument("--backends", default="sqlite,json,kv", help="逗號分隔的後端名稱")
+    parser.add_argument("--reads", type=int, default=1000, help="點查詢取樣次數")
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'size':>9} {'load(s)':>9} {'read p50(ms)':>13} {'read p95(ms)':>13} {'get_all(s)':>11}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for backend in args.backends.split(","):
+            result = run(backend, size, args.reads)
+            print(
+                f"{backend:<8} {size:>9} {result['load']:>9.2f} "
+                f"{result['read_p50'] * 1000:>13.3f} {result['read_p95'] * 1000:>13.3f} "
+                f"{result['get_all']:>11.2f}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,32 +7,46 @@ import json
 import logging
 import shutil
 import subprocess
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from ..config import Config
 from ..gitlab_.models import MRInfo
+from ..observability.metrics import clone_bytes, clone_seconds
+from ..observability.tracing import tracer
 from ..state.manager import StateManager
+from ..state.models import MRState
 from ..utils.exceptions import CloneError, GitError
+from .prune import tree_size
+from .trace2 import git_trace2
+from .workspaces import WorkspaceStore, measure, scan_workspaces
 
 
 logger = logging.getLogger(__name__)
 
 
+# git clone -b <target_branch> --single-branch，再 fetch refs/merge-requests/<iid>/head 並 checkout
+CLONE_STRATEGY = "single-branch"
+
+
 class CloneManager:
     """MR Clone 管理器"""
     
-    def __init__(self, config: Config, state_manager: StateManager):
+    def __init__(self, config: Config, state_manager: StateManager, workspaces: Optional[WorkspaceStore] = None):
         """
         初始化 Clone 管理器
         
         Args:
             config: 應用設定
             state_manager: 狀態管理器
+            workspaces: clone 紀錄（大小與最後存取時間），None 表示不記錄
         """
         self.config = config
         self.state_manager = state_manager
+        self.workspaces = workspaces
+        self._index_checked = False
     
     def create_clone(self, mr_info: MRInfo) -> Path:
         """
@@ -56,15 +70,15 @@ class CloneManager:
             
             # 若目錄已存在，先刪除
             if clone_path.exists():
-                logger.info(f"目錄已存在，刪除後重新 clone: {clone_path}")
+                logger.info("目錄已存在，刪除後重新 clone: %s", clone_path)
                 shutil.rmtree(clone_path)
             
             # 建立父目錄
             clone_path.parent.mkdir(parents=True, exist_ok=True)
             
-            logger.info(f"建立 clone: {clone_path}")
-            logger.debug(f"MR: {mr_info.project_name}#{mr_info.iid}")
-            logger.debug(f"分支: refs/merge-requests/{mr_info.iid}/head")
+            logger.info("建立 clone: %s", clone_path)
+            logger.debug("MR: %s#%s", mr_info.project_name, mr_info.iid)
+            logger.debug("分支: refs/merge-requests/%s/head", mr_info.iid)
             
             # 建構 git clone 命令
             repo_url = self._get_repo_url(mr_info)
@@ -77,8 +91,11 @@ class CloneManager:
                 str(clone_path)
             ]
             
-            logger.info(f"執行: {' '.join(clone_cmd)}")
+            logger.info("執行: %s", ' '.join(clone_cmd))
+            timings = {}
+            started = time.perf_counter()
             self._run_git_command(clone_cmd)
+            timings["clone"] = time.perf_counter() - started
             
             # 確保目錄存在（git clone 會建立，但以防萬一）
             clone_path.mkdir(parents=True, exist_ok=True)
@@ -91,8 +108,10 @@ class CloneManager:
                 f'refs/merge-requests/{mr_info.iid}/head'
             ]
             
-            logger.info(f"執行: {' '.join(fetch_cmd)}")
+            logger.info("執行: %s", ' '.join(fetch_cmd))
+            started = time.perf_counter()
             self._run_git_command(fetch_cmd, cwd=clone_path)
+            timings["fetch"] = time.perf_counter() - started
             
             # 切到 MR 的 branch
             checkout_cmd = [
@@ -101,30 +120,43 @@ class CloneManager:
                 'FETCH_HEAD'
             ]
             
-            logger.info(f"執行: {' '.join(checkout_cmd)}")
+            logger.info("執行: %s", ' '.join(checkout_cmd))
+            started = time.perf_counter()
             self._run_git_command(checkout_cmd, cwd=clone_path)
+            timings["checkout"] = time.perf_counter() - started
+            
+            clone_seconds.observe(sum(timings.values()), strategy=CLONE_STRATEGY)
             
             # 保存元資料
-            self._save_mr_metadata(mr_info, clone_path)
+            if self._exports_metadata():
+                self._save_mr_metadata(mr_info, clone_path)
             
             # 更新狀態
-            from src.state.models import MRState
             mr_state = MRState.from_mr_info(mr_info)
             self.state_manager.save_mr_state(mr_state)
             
-            logger.info(f"Clone 建立成功: {clone_path}")
+            # 只在建立時量測一次大小，配額檢查直接加總紀錄
+            if self.workspaces is not None:
+                size = tree_size(clone_path)
+                clone_bytes.inc(size, strategy=CLONE_STRATEGY)
+                self.workspaces.record(
+                    mr_info.project_name, mr_info.iid, mr_info.id, size,
+                    mr_info=mr_info, strategy=CLONE_STRATEGY, timings=timings,
+                )
+            
+            logger.info("Clone 建立成功: %s", clone_path)
             return clone_path
         
         except GitError as e:
             # 清理可能的殘留目錄
             if clone_path and clone_path.exists():
                 shutil.rmtree(clone_path, ignore_errors=True)
-            logger.error(f"建立 clone 失敗: {e}")
+            logger.error("建立 clone 失敗: %s", e)
             raise CloneError(f"建立 clone 失敗: {e}")
         except Exception as e:
             if clone_path and clone_path.exists():
                 shutil.rmtree(clone_path, ignore_errors=True)
-            logger.error(f"建立 clone 失敗: {e}")
+            logger.error("建立 clone 失敗: %s", e)
             raise CloneError(f"建立 clone 失敗: {e}")
     
     def delete_clone(self, mr_info: MRInfo) -> bool:
@@ -137,64 +169,137 @@ class CloneManager:
         Returns:
             是否刪除成功
         """
+        return self._delete(mr_info.project_name, mr_info.iid, mr_info.id)
+    
+    def delete_closed_clone(self, mr_state: MRState) -> bool:
+        """
+        移除已不在掃描結果中的 MR 的 clone 與狀態
+        
+        clone 目錄已不存在時仍會清除狀態，避免每次掃描重複產生 closed 事件。
+        
+        Args:
+            mr_state: 保存的 MR 狀態
+            
+        Returns:
+            是否刪除了 clone 目錄
+        """
+        deleted = self._delete(mr_state.project_slug, mr_state.iid, mr_state.mr_id)
+        if not deleted:
+            self.state_manager.delete_mr_state(mr_state.mr_id, mr_state.project_slug)
+            if self.workspaces is not None:
+                self.workspaces.forget(mr_state.project_slug, mr_state.iid)
+        return deleted
+    
+    def update_metadata(self, mr_info: MRInfo) -> bool:
+        """
+        只更新既有 clone 的元資料與狀態（head commit 未改變時不必重新 clone）
+        
+        Args:
+            mr_info: MR 資訊
+            
+        Returns:
+            是否已更新；clone 不存在時回傳 False
+        """
+        clone_path = self._get_clone_path(mr_info)
+        if not clone_path.exists():
+            return False
+        if self._exports_metadata():
+            self._save_mr_metadata(mr_info, clone_path)
+        if self.workspaces is not None:
+            self.workspaces.update_manifest(mr_info)
+        self.state_manager.save_mr_state(MRState.from_mr_info(mr_info))
+        logger.info("更新 clone 元資料: %s", clone_path)
+        return True
+    
+    def _delete(self, project: str, iid: int, mr_id: int) -> bool:
+        """刪除 clone 目錄與對應的狀態"""
         try:
-            clone_path = self._get_clone_path(mr_info)
+            clone_path = self.clone_path(project, iid)
             
             if not clone_path.exists():
-                logger.warning(f"Clone 不存在: {clone_path}")
+                logger.warning("Clone 不存在: %s", clone_path)
                 return False
             
-            logger.info(f"刪除 clone: {clone_path}")
+            logger.info("刪除 clone: %s", clone_path)
             shutil.rmtree(clone_path)
             
             # 更新狀態
-            self.state_manager.delete_mr_state(mr_info.id, mr_info.project_name)
+            self.state_manager.delete_mr_state(mr_id, project)
+            if self.workspaces is not None:
+                self.workspaces.forget(project, iid)
             
-            logger.info(f"Clone 刪除成功: {clone_path}")
+            logger.info("Clone 刪除成功: %s", clone_path)
             return True
         
         except Exception as e:
-            logger.error(f"刪除 clone 失敗: {e}")
+            logger.error("刪除 clone 失敗: %s", e)
             return False
     
     def list_clones(self) -> Dict[str, List[int]]:
         """
         列出所有已建立的 clone
         
+        有 clone 紀錄時直接讀取索引，不走訪目錄；索引為空時（例如升級後第一次執行）
+        先以目錄掃描重建一次。沒有 clone 紀錄時掃描 reviews 目錄。
+        
         Returns:
             專案 -> MR IID 列表的字典
         """
-        result = {}
-        reviews_path = Path(self.config.reviews_path).expanduser()
+        if self.workspaces is None:
+            return self._group(scan_workspaces(self._reviews_path()))
         
-        if not reviews_path.exists():
-            return result
+        clones = self.workspaces.index()
+        if not clones and not self._index_checked:
+            self.rebuild_index()
+            clones = self.workspaces.index()
+        self._index_checked = True
+        return self._group(clones)
+    
+    def rebuild_index(self, measure_all: bool = False) -> Tuple[int, int]:
+        """
+        以 reviews 目錄的實際內容校正 clone 索引
         
-        # 遍歷 reviews 目錄
-        for project_dir in reviews_path.iterdir():
-            if not project_dir.is_dir():
-                continue
+        補上磁碟上有但沒有紀錄的 clone（量測大小），清除目錄已不存在的紀錄。
+        
+        Args:
+            measure_all: 一併重新量測已有紀錄的 clone 的大小
             
-            # 處理 group/project 結構
-            for sub_dir in project_dir.iterdir():
-                if sub_dir.is_dir():
-                    # 檢查是否為 MR IID 目錄（數字）
-                    if sub_dir.name.isdigit():
-                        # 單層專案結構: reviews/project/123
-                        project_name = project_dir.name
-                        if project_name not in result:
-                            result[project_name] = []
-                        result[project_name].append(int(sub_dir.name))
-                    else:
-                        # 雙層結構: reviews/group/project/123
-                        for mr_dir in sub_dir.iterdir():
-                            if mr_dir.is_dir() and mr_dir.name.isdigit():
-                                project_name = f"{project_dir.name}/{sub_dir.name}"
-                                if project_name not in result:
-                                    result[project_name] = []
-                                result[project_name].append(int(mr_dir.name))
+        Returns:
+            (新增的紀錄數, 清除的紀錄數)
+        """
+        on_disk = set(scan_workspaces(self._reviews_path()))
+        known = set(self.workspaces.index())
         
-        return result
+        removed = 0
+        for key in known - on_disk:
+            self.workspaces.forget(*key)
+            removed += 1
+        
+        added = 0
+        for project, iid in sorted(on_disk):
+            if (project, iid) in known and not measure_all:
+                continue
+            size, accessed = measure(self.clone_path(project, iid))
+            self.workspaces.record(project, iid, 0, size, accessed_at=accessed)
+            added += (project, iid) not in known
+        
+        self._index_checked = True
+        if added or removed:
+            logger.info("重建 clone 索引：新增 %s 筆、清除 %s 筆", added, removed)
+        return added, removed
+    
+    def clone_path(self, project: str, iid: int) -> Path:
+        """
+        指定 MR 的 clone 路徑（不檢查是否存在）
+        
+        Args:
+            project: 專案路徑
+            iid: MR IID
+            
+        Returns:
+            clone 路徑
+        """
+        return self._reviews_path() / project / str(iid)
     
     def get_clone_path(self, project: str, iid: int) -> Optional[Path]:
         """
@@ -207,12 +312,24 @@ class CloneManager:
         Returns:
             clone 路徑，若不存在則返回 None
         """
-        clone_path = Path(self.config.reviews_path).expanduser() / project / str(iid)
+        clone_path = self.clone_path(project, iid)
         return clone_path if clone_path.exists() else None
     
     def _get_clone_path(self, mr_info: MRInfo) -> Path:
         """取得 clone 路徑"""
-        return Path(self.config.reviews_path).expanduser() / mr_info.project_name / str(mr_info.iid)
+        return self.clone_path(mr_info.project_name, mr_info.iid)
+    
+    def _reviews_path(self) -> Path:
+        return Path(self.config.reviews_path).expanduser()
+    
+    @staticmethod
+    def _group(clones: Iterable[Tuple[str, int]]) -> Dict[str, List[int]]:
+        result: Dict[str, List[int]] = {}
+        for project, iid in clones:
+            result.setdefault(project, []).append(iid)
+        for iids in result.values():
+            iids.sort()
+        return result
     
     def _get_repo_url(self, mr_info: MRInfo) -> str:
         """
@@ -236,6 +353,10 @@ class CloneManager:
         
         return f"git@{host}:{mr_info.project_name}.git"
     
+    def _exports_metadata(self) -> bool:
+        """是否在 clone 目錄寫入 .mr_info.json（供編輯器等工具讀取）"""
+        return getattr(self.config, 'mr_info_export', True)
+    
     def _save_mr_metadata(self, mr_info: MRInfo, clone_path: Path):
         """保存 MR 元資料"""
         metadata = {
@@ -248,6 +369,7 @@ class CloneManager:
             'web_url': mr_info.web_url,
             'created_at': mr_info.created_at,
             'updated_at': mr_info.updated_at,
+            'head_sha': mr_info.sha,
             'cloned_at': datetime.utcnow().isoformat(),
         }
         
@@ -259,19 +381,23 @@ class CloneManager:
     def _run_git_command(cmd, cwd=None):
         """執行 git 命令"""
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=False,
-                cwd=cwd
-            )
+            # 不記錄完整參數（repo URL 可能含有憑證）
+            with tracer.span(f"git.{cmd[1]}", cwd=str(cwd) if cwd else None) as span, git_trace2.command() as env:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                    cwd=cwd,
+                    env=env
+                )
+                span.set(returncode=result.returncode)
             
             if result.returncode != 0:
                 raise GitError(f"Git 命令失敗: {result.stderr}")
             
             if result.stdout:
-                logger.debug(f"Git 輸出: {result.stdout}")
+                logger.debug("Git 輸出: %s", result.stdout)
                 
             return result
         
@@ -0,0 +1,137 @@
+"""
+清理已關閉或已合併 MR 的 clone
+
+刪除分兩步：先將 clone 目錄 rename 到 reviews 根目錄下的 .trash（同一檔案系統上為原子操作，
+工作目錄立即消失），再由多個背景執行緒平行計算大小並刪除。
+前次中斷而留在 .trash 的目錄會在下一次清理時一併刪除。
+"""
+
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+TRASH_DIR = ".trash"
+
+
+@dataclass
+class PruneReport:
+    """清理結果"""
+    removed: int = 0
+    failed: int = 0
+    bytes_reclaimed: int = 0
+
+
+def find_stale_clones(clones: Dict[str, List[int]], open_iids: Dict[str, Set[int]]) -> List[Tuple[str, int]]:
+    """
+    找出 MR 已不再開啟的 clone
+
+    Args:
+        clones: 專案 -> 本地 clone 的 iid
+        open_iids: 專案 -> 開啟中的 iid；未列出的專案（例如無法取得 MR 列表）不清理
+
+    Returns:
+        (專案, iid) 列表
+    """
+    return [
+        (project, iid)
+        for project, iids in clones.items() if project in open_iids
+        for iid in sorted(iids) if iid not in open_iids[project]
+    ]
+
+
+def tree_size(path: Path) -> int:
+    """目錄內所有檔案的大小總和（不跟隨符號連結）"""
+    total = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total
+
+
+class ClonePruner:
+    """以背景執行緒平行刪除 clone 目錄"""
+
+    def __init__(self, reviews_path: str, workers: int = 4):
+        """
+        初始化清理器
+
+        Args:
+            reviews_path: MR clone 根目錄
+            workers: 平行刪除的執行緒數
+        """
+        self.reviews_path = Path(reviews_path).expanduser()
+        self.trash_path = self.reviews_path / TRASH_DIR
+        self.workers = max(1, workers)
+
+    def clone_path(self, project: str, iid: int) -> Path:
+        """clone 目錄路徑"""
+        return self.reviews_path / project / str(iid)
+
+    def prune(self, clones: Iterable[Tuple[str, int]]) -> PruneReport:
+        """
+        刪除指定的 clone
+
+        Args:
+            clones: (專案, iid) 列表
+
+        Returns:
+            清理結果
+        """
+        report = PruneReport()
+        self.trash_path.mkdir(parents=True, exist_ok=True)
+
+        # 前次中斷留下的目錄
+        doomed = [path for path in self.trash_path.iterdir()]
+        for project, iid in clones:
+            source = self.clone_path(project, iid)
+            target = self.trash_path / f"{project.replace('/', '_')}-{iid}-{uuid.uuid4().hex[:8]}"
+            try:
+                source.rename(target)
+            except OSError as e:
+                logger.error("無法移除 clone %s: %s", source, e)
+                report.failed += 1
+                continue
+            logger.info("移除 clone: %s", source)
+            report.removed += 1
+            doomed.append(target)
+
+        if doomed:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prune") as pool:
+                for size in pool.map(self._remove, doomed):
+                    report.bytes_reclaimed += size
+        return report
+
+    @staticmethod
+    def _remove(path: Path) -> int:
+        """刪除目錄並回傳釋放的位元組數"""
+        try:
+            if path.is_dir() and not path.is_symlink():
+                size = tree_size(path)
+                shutil.rmtree(path)
+            else:
+                size = path.lstat().st_size
+                path.unlink()
+        except OSError as e:
+            logger.warning("刪除 %s 失敗，下次清理時重試: %s", path, e)
+            return 0
+        return size
@@ -0,0 +1,154 @@
+"""
+reviews_path 的磁碟配額
+
+用量由 clone 紀錄（見 workspaces.py）加總而得，不走訪目錄樹。超過配額時，
+依最後存取時間由舊到新淘汰非活動中的 clone，直到用量回到配額以內：
+
+- 釘選的 clone 不淘汰
+- 最近 min_idle 秒內建立、重新 clone 或被存取的 clone 視為活動中，不淘汰
+
+淘汰只移除 clone 目錄與紀錄，保留 MR 狀態：MR 沒有新的 commit 前不會被重新 clone，
+有新的 commit（head_moved）或資料更新時才重新建立。
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List
+
+from .prune import ClonePruner
+from .workspaces import Workspace, WorkspaceStore, observed_access
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QuotaReport:
+    """配額檢查結果"""
+    quota: int
+    usage: int
+    evicted: List[Workspace] = field(default_factory=list)
+    failed: int = 0
+    bytes_reclaimed: int = 0
+
+
+def plan_eviction(workspaces: Iterable[Workspace], quota: int, now: float, min_idle: float = 0.0) -> List[Workspace]:
+    """
+    選出要淘汰的 clone
+
+    Args:
+        workspaces: 所有 clone 紀錄
+        quota: 配額位元組數
+        now: 目前時間
+        min_idle: 未存取超過此秒數的 clone 才可淘汰
+
+    Returns:
+        依最後存取時間由舊到新排列的淘汰清單；可淘汰的都移除後仍超過配額時回傳全部可淘汰的
+    """
+    workspaces = list(workspaces)
+    usage = sum(workspace.size for workspace in workspaces)
+    candidates = sorted(
+        (
+            workspace for workspace in workspaces
+            if not workspace.pinned and now - workspace.last_access >= min_idle
+        ),
+        key=lambda workspace: workspace.last_access,
+    )
+    evict = []
+    for workspace in candidates:
+        if usage <= quota:
+            break
+        evict.append(workspace)
+        usage -= workspace.size
+    return evict
+
+
+class QuotaManager:
+    """依配額以 LRU 淘汰 clone"""
+
+    def __init__(
+        self,
+        workspaces: WorkspaceStore,
+        pruner: ClonePruner,
+        quota: int,
+        min_idle: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化配額管理
+
+        Args:
+            workspaces: clone 紀錄
+            pruner: 刪除 clone 目錄的清理器
+            quota: reviews_path 的配額位元組數
+            min_idle: 未存取超過此秒數的 clone 才可淘汰
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.workspaces = workspaces
+        self.pruner = pruner
+        self.quota = quota
+        self.min_idle = min_idle
+        self._clock = clock
+
+    def usage(self) -> int:
+        """目前記錄的總用量（位元組）"""
+        return sum(workspace.size for workspace in self.workspaces.all())
+
+    def enforce(self, dry_run: bool = False) -> QuotaReport:
+        """
+        用量超過配額時淘汰最久未存取的 clone
+
+        只在超過配額時才 stat 各 clone 目錄，以目錄的 atime 更新最後存取時間；
+        目錄已不存在的紀錄直接清除。
+
+        Args:
+            dry_run: 只列出將淘汰的 clone
+
+        Returns:
+            配額檢查結果
+        """
+        workspaces = self.workspaces.all()
+        report = QuotaReport(quota=self.quota, usage=sum(workspace.size for workspace in workspaces))
+        if report.usage <= self.quota:
+            return report
+
+        present = []
+        for workspace in workspaces:
+            accessed = observed_access(self.pruner.clone_path(workspace.project, workspace.iid))
+            if not accessed:
+                if not dry_run:
+                    self.workspaces.forget(workspace.project, workspace.iid)
+                report.usage -= workspace.size
+                continue
+            if accessed > workspace.last_access:
+                workspace.last_access = accessed
+                if not dry_run:
+                    self.workspaces.touch(workspace.project, workspace.iid, accessed)
+            present.append(workspace)
+
+        report.evicted = plan_eviction(present, self.quota, self._clock(), self.min_idle)
+        if dry_run:
+            return report
+
+        if report.evicted:
+            pruned = self.pruner.prune((workspace.project, workspace.iid) for workspace in report.evicted)
+            report.failed = pruned.failed
+            report.bytes_reclaimed = pruned.bytes_reclaimed
+            # 無法移除的 clone 保留紀錄
+            report.evicted = [
+                workspace for workspace in report.evicted
+                if not self.pruner.clone_path(workspace.project, workspace.iid).exists()
+            ]
+            for workspace in report.evicted:
+                self.workspaces.forget(workspace.project, workspace.iid)
+                report.usage -= workspace.size
+            logger.info(
+                "超過配額 %s 位元組，淘汰 %s 個 clone: %s",
+                report.quota, len(report.evicted), ", ".join(workspace.key for workspace in report.evicted),
+            )
+        if report.usage > report.quota:
+            logger.warning(
+                "clone 用量 %s 位元組仍超過配額 %s（其餘為釘選或活動中的 clone）", report.usage, report.quota,
+            )
+        return report
@@ -0,0 +1,176 @@
+"""
+git trace2 效能事件擷取
+
+啟用時每個 git 命令以 GIT_TRACE2_EVENT 寫入獨立的暫存檔，命令結束後解析各階段耗時並刪除檔案：
+
+- negotiation: fetch-pack 與遠端協商要傳輸的物件（negotiation_v0_v1 / negotiation_v2 區段）
+- pack: index-pack / unpack-objects 子行程；pack 由傳輸串流直接讀入並建立索引，傳輸與建索引重疊，
+  因此合併為一個階段
+- checkout: unpack_trees 區段（clone 結束時與 git checkout 的工作目錄更新）
+- total: 頂層 git 行程的總耗時
+
+子行程（git-remote-https、fetch-pack、index-pack 等）繼承環境變數並附加到同一個檔案，
+以 sid 與 child_id 對應 child_start / child_exit 事件。
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+PHASES = ("negotiation", "pack", "checkout", "total")
+
+# 讀取 pack 的子命令
+PACK_COMMANDS = ("index-pack", "unpack-objects")
+
+
+def _region_phase(category: Optional[str], label: Optional[str]) -> Optional[str]:
+    if category == "fetch-pack" and label and label.startswith("negotiation"):
+        return "negotiation"
+    if category == "unpack_trees" and label == "unpack_trees":
+        return "checkout"
+    return None
+
+
+def parse_events(lines: Iterable[str]) -> Dict[str, float]:
+    """
+    由 trace2 事件（每行一個 JSON）計算各階段秒數
+
+    Args:
+        lines: GIT_TRACE2_EVENT 的輸出行，無法解析的行會略過
+
+    Returns:
+        階段 -> 秒數，只包含有出現的階段
+    """
+    phases: Dict[str, float] = {}
+    children: Dict[tuple, str] = {}
+
+    def add(phase: str, seconds) -> None:
+        if isinstance(seconds, (int, float)):
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(event, dict):
+            continue
+        kind = event.get("event")
+        sid = event.get("sid", "")
+        if kind == "region_leave":
+            phase = _region_phase(event.get("category"), event.get("label"))
+            if phase is not None:
+                add(phase, event.get("t_rel"))
+        elif kind == "child_start":
+            argv = event.get("argv") or []
+            if len(argv) > 1 and argv[1] in PACK_COMMANDS:
+                children[(sid, event.get("child_id"))] = "pack"
+        elif kind == "child_exit":
+            phase = children.pop((sid, event.get("child_id")), None)
+            if phase is not None:
+                add(phase, event.get("t_rel"))
+        elif kind == "exit" and "/" not in sid:
+            # 子行程的 sid 為 "<父 sid>/<子 sid>"
+            add("total", event.get("t_abs"))
+    return phases
+
+
+def read_events(path: Path) -> Dict[str, float]:
+    """讀取並解析 trace2 事件檔"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return parse_events(f)
+
+
+def merge_phases(target: Dict[str, float], phases: Dict[str, float]) -> None:
+    """將 phases 的秒數累加到 target"""
+    for phase, seconds in phases.items():
+        target[phase] = target.get(phase, 0.0) + seconds
+
+
+def format_phases(phases: Dict[str, float]) -> str:
+    """以「階段 毫秒」的形式顯示各階段秒數"""
+    return "、".join(f"{phase} {phases[phase] * 1000:.0f}ms" for phase in PHASES if phase in phases)
+
+
+class GitTrace2:
+    """
+    以 trace2 擷取 git 命令的階段耗時
+
+        with git_trace2.collect() as phases:
+            clone_manager.create_clone(mr)
+        # phases: 這段期間本執行緒所有 git 命令的階段秒數
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+
+    def enable(self):
+        """開始擷取"""
+        self.enabled = True
+
+    def disable(self):
+        """停止擷取"""
+        self.enabled = False
+
+    @contextmanager
+    def collect(self) -> Iterator[Dict[str, float]]:
+        """收集本執行緒在區塊內執行的 git 命令的階段秒數（未啟用時維持空字典）"""
+        phases: Dict[str, float] = {}
+        stack = self._stack()
+        stack.append(phases)
+        try:
+            yield phases
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def command(self) -> Iterator[Optional[Dict[str, str]]]:
+        """
+        包住單一 git 命令
+
+        啟用時提供帶有 GIT_TRACE2_EVENT 的環境變數，命令結束後（無論成功與否）解析事件、
+        累加到目前的收集區塊並刪除暫存檔；未啟用時提供 None（沿用目前環境）。
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        fd, path = tempfile.mkstemp(prefix="git-trace2-", suffix=".json")
+        os.close(fd)
+        try:
+            yield {**os.environ, "GIT_TRACE2_EVENT": path}
+        finally:
+            try:
+                phases = read_events(Path(path))
+            except OSError as e:
+                logger.warning("讀取 git trace2 事件失敗: %s", e)
+                phases = {}
+            finally:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            if phases:
+                logger.debug("git trace2: %s", format_phases(phases))
+                for target in self._stack():
+                    merge_phases(target, phases)
+
+    def _stack(self) -> List[Dict[str, float]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+# 全域擷取器
+git_trace2 = GitTrace2()
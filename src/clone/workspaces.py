@@ -0,0 +1,331 @@
+"""
+review 工作目錄（MR clone）的紀錄
+
+每個 clone 在狀態儲存的 "workspaces" 文件命名空間有一筆紀錄，鍵為 "專案#iid"：
+大小在建立或重新 clone 時量測一次，之後直接加總紀錄即可得知 reviews_path 的用量，
+不必每次走訪整個目錄樹。最後存取時間與釘選狀態供配額淘汰使用。
+
+這些紀錄同時是 clone 的索引：列出 clone 只需讀取一次命名空間。
+索引與磁碟不一致時（手動刪除或複製目錄），以 scan_workspaces 的 os.scandir 掃描重建。
+
+紀錄也是 clone 的清單（manifest）：MR 的標題、分支、head commit、clone 策略與各步驟耗時，
+一次查詢即可取得所有 clone 的摘要，不必逐一開啟各 clone 的 .mr_info.json。
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.gitlab_.models import MRInfo
+from src.utils.exceptions import StateError
+from .prune import tree_size
+
+
+logger = logging.getLogger(__name__)
+
+
+NAMESPACE = "workspaces"
+
+
+@dataclass
+class Workspace:
+    """單一 clone 的紀錄"""
+    project: str
+    iid: int
+    mr_id: int = 0
+    size: int = 0
+    created_at: float = 0.0
+    last_access: float = 0.0
+    pinned: bool = False
+    # clone 清單
+    title: str = ""
+    source_branch: str = ""
+    target_branch: str = ""
+    web_url: str = ""
+    head_sha: str = ""
+    mr_created_at: str = ""
+    mr_updated_at: str = ""
+    strategy: str = ""
+    cloned_at: float = 0.0
+    timings: Dict[str, float] = field(default_factory=dict)  # 步驟 -> 秒數
+
+    @property
+    def key(self) -> str:
+        return workspace_key(self.project, self.iid)
+
+    @classmethod
+    def from_document(cls, value: dict) -> "Workspace":
+        """由文件內容建立紀錄，忽略不認得的欄位（較新版本寫入的紀錄）"""
+        return cls(**{name: value[name] for name in _FIELDS if name in value})
+
+    def describe(self, mr_info: MRInfo):
+        """以 MR 資訊更新清單欄位"""
+        self.mr_id = mr_info.id or self.mr_id
+        self.title = mr_info.title
+        self.source_branch = mr_info.source_branch
+        self.target_branch = mr_info.target_branch
+        self.web_url = mr_info.web_url
+        self.head_sha = mr_info.sha or self.head_sha
+        self.mr_created_at = mr_info.created_at
+        self.mr_updated_at = mr_info.updated_at
+
+
+_FIELDS = {item.name for item in fields(Workspace)}
+
+
+def workspace_key(project: str, iid: int) -> str:
+    """紀錄的鍵"""
+    return f"{project}#{iid}"
+
+
+def observed_access(path: Path) -> float:
+    """
+    clone 目錄本身的存取時間
+
+    列出目錄內容（ls、git status 等）會更新目錄的 atime；只 stat 一次，不走訪目錄樹。
+    以 relatime 掛載時 atime 最多一天更新一次，對 LRU 淘汰已足夠。
+
+    Returns:
+        atime；目錄不存在時回傳 0
+    """
+    try:
+        return os.stat(path).st_atime
+    except OSError:
+        return 0.0
+
+
+def scan_workspaces(root: Path) -> List[Tuple[str, int]]:
+    """
+    以 os.scandir 找出 reviews 目錄下所有的 clone，不限專案路徑的層數
+
+    數字命名且含有 .git 的目錄即為 clone，不再往下走訪。沒有 .git 的數字目錄
+    （例如 group/2024/project 中的 2024）若底下還有 clone 則視為路徑的一段，否則視為 clone。
+    以 "." 開頭的目錄（如 .trash）不列入。
+
+    Args:
+        root: reviews 根目錄
+
+    Returns:
+        (專案, iid) 列表；根目錄不存在時回傳空列表
+    """
+    found: List[Tuple[str, int]] = []
+    _scan_dir(str(root), [], found)
+    return found
+
+
+def _scan_dir(path: str, segments: List[str], found: List[Tuple[str, int]]):
+    try:
+        with os.scandir(path) as it:
+            entries = [entry for entry in it if not entry.name.startswith(".")]
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+        except OSError:
+            continue
+        if segments and entry.name.isdigit():
+            project = "/".join(segments)
+            if os.path.lexists(os.path.join(entry.path, ".git")):
+                found.append((project, int(entry.name)))
+                continue
+            before = len(found)
+            _scan_dir(entry.path, segments + [entry.name], found)
+            if len(found) == before:
+                found.append((project, int(entry.name)))
+            continue
+        _scan_dir(entry.path, segments + [entry.name], found)
+
+
+def measure(path: Path) -> Tuple[int, float]:
+    """
+    量測既有 clone 的大小與存取時間
+
+    走訪目錄樹會更新目錄的 atime，量測後還原，避免被當成剛使用過。
+
+    Returns:
+        (位元組數, 存取時間)
+    """
+    stat = os.stat(path)
+    size = tree_size(path)
+    try:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    except OSError:
+        pass
+    return size, stat.st_atime
+
+
+class WorkspaceStore:
+    """以狀態儲存持久化的 clone 紀錄"""
+
+    def __init__(self, state_manager, clock: Callable[[], float] = time.time):
+        """
+        初始化紀錄儲存
+
+        Args:
+            state_manager: 提供 get/put/delete_document 的狀態管理器
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.state_manager = state_manager
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        project: str,
+        iid: int,
+        mr_id: int,
+        size: int,
+        accessed_at: Optional[float] = None,
+        mr_info: Optional[MRInfo] = None,
+        strategy: str = "",
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Workspace:
+        """
+        記錄新建立或重新 clone 的工作目錄
+
+        重新 clone 時沿用原本的建立時間與釘選狀態。
+
+        Args:
+            project: 專案路徑
+            iid: MR IID
+            mr_id: MR ID
+            size: clone 的位元組數
+            accessed_at: 最後存取時間，None 表示現在
+            mr_info: 剛 clone 的 MR；None 表示只更新大小（例如掃描目錄重建索引）
+            strategy: clone 策略
+            timings: 各 git 步驟的耗時秒數
+
+        Returns:
+            更新後的紀錄
+        """
+        now = self._clock()
+        with self._lock:
+            workspace = self._load(project, iid) or Workspace(project=project, iid=iid, created_at=now)
+            workspace.mr_id = mr_id or workspace.mr_id
+            workspace.size = size
+            workspace.last_access = max(workspace.last_access, accessed_at if accessed_at is not None else now)
+            if mr_info is not None:
+                workspace.describe(mr_info)
+                workspace.strategy = strategy
+                workspace.timings = dict(timings or {})
+                workspace.cloned_at = now
+            self._save(workspace)
+        return workspace
+
+    def update_manifest(self, mr_info: MRInfo) -> bool:
+        """
+        只更新清單中的 MR 資訊（head commit 未改變，不重新 clone）
+
+        Args:
+            mr_info: MR 資訊
+
+        Returns:
+            是否有對應的紀錄
+        """
+        with self._lock:
+            workspace = self._load(mr_info.project_name, mr_info.iid)
+            if workspace is None:
+                return False
+            workspace.describe(mr_info)
+            self._save(workspace)
+            return True
+
+    def get(self, project: str, iid: int) -> Optional[Workspace]:
+        """取得紀錄，沒有紀錄時回傳 None"""
+        return self._load(project, iid)
+
+    def all(self) -> List[Workspace]:
+        """
+        列出所有紀錄
+
+        Returns:
+            紀錄列表；讀取失敗時回傳空列表
+        """
+        try:
+            documents = self.state_manager.get_documents(NAMESPACE)
+        except StateError as e:
+            logger.warning("讀取 clone 紀錄失敗: %s", e)
+            return []
+        return [Workspace.from_document(value) for value in documents.values()]
+
+    def index(self) -> List[Tuple[str, int]]:
+        """
+        列出所有紀錄的 (專案, iid)，只讀取鍵而不解析紀錄內容
+
+        Returns:
+            (專案, iid) 列表；讀取失敗時回傳空列表
+        """
+        try:
+            keys = self.state_manager.get_document_keys(NAMESPACE)
+        except StateError as e:
+            logger.warning("讀取 clone 索引失敗: %s", e)
+            return []
+        clones = []
+        for key in keys:
+            project, _, iid = key.rpartition("#")
+            clones.append((project, int(iid)))
+        return clones
+
+    def touch(self, project: str, iid: int, accessed_at: Optional[float] = None):
+        """
+        更新最後存取時間（只會往後移）
+
+        Args:
+            project: 專案路徑
+            iid: MR IID
+            accessed_at: 存取時間，None 表示現在
+        """
+        accessed_at = accessed_at if accessed_at is not None else self._clock()
+        with self._lock:
+            workspace = self._load(project, iid)
+            if workspace is None or accessed_at <= workspace.last_access:
+                return
+            workspace.last_access = accessed_at
+            self._save(workspace)
+
+    def pin(self, project: str, iid: int, pinned: bool = True) -> bool:
+        """
+        設定釘選狀態；釘選的 clone 不會因配額被淘汰
+
+        Args:
+            project: 專案路徑
+            iid: MR IID
+            pinned: 是否釘選
+
+        Returns:
+            是否有對應的紀錄
+        """
+        with self._lock:
+            workspace = self._load(project, iid)
+            if workspace is None:
+                return False
+            workspace.pinned = pinned
+            self._save(workspace)
+            return True
+
+    def forget(self, project: str, iid: int):
+        """刪除紀錄（clone 已移除）"""
+        try:
+            self.state_manager.delete_document(NAMESPACE, workspace_key(project, iid))
+        except StateError as e:
+            logger.warning("清除 %s#%s 的 clone 紀錄失敗: %s", project, iid, e)
+
+    def _load(self, project: str, iid: int) -> Optional[Workspace]:
+        try:
+            value = self.state_manager.get_document(NAMESPACE, workspace_key(project, iid))
+        except StateError as e:
+            logger.warning("讀取 %s#%s 的 clone 紀錄失敗: %s", project, iid, e)
+            return None
+        return Workspace.from_document(value) if value is not None else None
+
+    def _save(self, workspace: Workspace):
+        try:
+            self.state_manager.put_document(NAMESPACE, workspace.key, asdict(workspace))
+        except StateError as e:
+            logger.warning("保存 %s 的 clone 紀錄失敗: %s", workspace.key, e)
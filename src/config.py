@@ -3,10 +3,13 @@
 """
 
 import os
-from dataclasses import dataclass
+import socket
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
+from src.observability.tracing import TRACE_FORMATS
+from src.scanner.filters import MRFilter
 from src.utils.exceptions import ConfigError
 
 
@@ -23,9 +26,56 @@ class Config:
     reviews_path: str = "~/GIT_POOL/reviews"
     state_dir: str = "./state"
     db_path: str = "./state/mr_state.sqlite"
+    storage_type: str = "sqlite"
     gitlab_ssl_verify: bool = True
     log_level: str = "INFO"
     api_retry_count: int = 3
+    state_cache_enabled: bool = False
+    state_cache_flush_interval: float = 5.0
+    state_cache_max_dirty: int = 100
+    state_cache_flush_policy: str = "batch"
+    job_max_attempts: int = 3
+    job_backoff_seconds: float = 30.0
+    job_lease_timeout: float = 1800.0
+    job_retention: float = 604800.0
+    shard_mode: str = "none"
+    shard_node_id: str = ""
+    shard_nodes: List[str] = field(default_factory=list)
+    shard_lease_ttl: float = 900.0
+    scan_lock: str = "global"
+    scan_lock_wait: float = 0.0
+    scan_lock_stale: float = 3600.0
+    mr_filters: List[str] = field(default_factory=list)
+    poll_min_interval: float = 30.0
+    poll_max_interval: float = 1800.0
+    webhook_enabled: bool = False
+    webhook_host: str = "127.0.0.1"
+    webhook_port: int = 8080
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    pipeline_workers: int = 2
+    pipeline_scanners: int = 1
+    pipeline_queue_size: int = 16
+    project_weights: Dict[str, float] = field(default_factory=dict)
+    fair_recent_window: float = 3600.0
+    fair_recent_boost: float = 1.0
+    scan_budget: float = 0.0
+    project_cache_ttl: float = 86400.0
+    breaker_threshold: int = 3
+    breaker_base_delay: float = 300.0
+    breaker_max_delay: float = 86400.0
+    auto_clean_merged: bool = False
+    prune_interval: float = 86400.0
+    prune_workers: int = 4
+    reviews_quota: int = 0
+    quota_min_idle: float = 3600.0
+    mr_info_export: bool = True
+    trace_file: str = ""
+    trace_format: str = "jsonl"
+    metrics_textfile: str = ""
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    git_trace2: bool = False
     
     @classmethod
     def from_env(cls) -> "Config":
@@ -43,9 +93,56 @@ class Config:
         - REVIEWS_PATH: MR clone 根目錄 (預設: ~/GIT_POOL/reviews)
         - STATE_DIR: 狀態儲存目錄 (預設: ./state)
         - DB_PATH: SQLite 資料庫路徑
+        - STORAGE_TYPE: 狀態儲存後端 sqlite/json/kv (預設: sqlite)
         - GITLAB_SSL_VERIFY: SSL 驗證 (預設: true)
         - LOG_LEVEL: 日誌級別 (預設: INFO)
         - API_RETRY_COUNT: API 重試次數 (預設: 3)
+        - STATE_CACHE_ENABLED: 啟用狀態 write-behind 快取 (預設: false)
+        - STATE_CACHE_FLUSH_INTERVAL: 快取定時寫回間隔秒數 (預設: 5)
+        - STATE_CACHE_MAX_DIRTY: dirty 筆數達此值即寫回 (預設: 100)
+        - STATE_CACHE_FLUSH_POLICY: 寫回策略 batch/project/always (預設: batch)
+        - JOB_MAX_ATTEMPTS: clone 工作最大嘗試次數 (預設: 3)
+        - JOB_BACKOFF_SECONDS: clone 工作失敗重試的基礎退避秒數 (預設: 30)
+        - JOB_LEASE_TIMEOUT: running 工作逾時視為中斷的秒數 (預設: 1800)
+        - JOB_RETENTION: 已結束 (done / failed) 工作的保留秒數，0 表示永久保留 (預設: 604800)
+        - SHARD_MODE: 多節點分片模式 none/lease/hash (預設: none)
+        - SHARD_NODE_ID: 本節點識別 (預設: 主機名稱)
+        - SHARD_NODES: hash 模式參與分配的節點，逗號分隔 (預設: 所有存活節點)
+        - SHARD_LEASE_TTL: 節點心跳與專案租約有效秒數 (預設: 900)
+        - SCAN_LOCK: 掃描鎖粒度 none/global/project (預設: global)
+        - SCAN_LOCK_WAIT: 等待掃描鎖的最長秒數 (預設: 0，不等待)
+        - SCAN_LOCK_STALE: 掃描鎖超過此秒數未更新視為過期 (預設: 3600)
+        - MR_FILTERS_FILE 或 MR_FILTERS: MR 篩選規則
+          - MR_FILTERS_FILE: 檔案路徑（每行一條規則）
+          - MR_FILTERS: 以分號分隔的規則
+        - POLL_MIN_INTERVAL: serve 模式活躍專案的輪詢間隔秒數 (預設: 30)
+        - POLL_MAX_INTERVAL: serve 模式閒置專案的最長輪詢間隔秒數 (預設: 1800)
+        - WEBHOOK_ENABLED: serve 模式啟用 webhook 接收端 (預設: false)
+        - WEBHOOK_HOST / WEBHOOK_PORT: webhook 監聽位址 (預設: 127.0.0.1:8080)
+        - WEBHOOK_PATH: webhook URL 路徑 (預設: /webhook)
+        - WEBHOOK_SECRET: GitLab webhook Secret token（啟用 webhook 時必要）
+        - PIPELINE_WORKERS: 同時執行 clone 的 worker 數 (預設: 2)
+        - PIPELINE_SCANNERS: 同時掃描的專案數 (預設: 1)
+        - PIPELINE_QUEUE_SIZE: 等待 clone 的 MR 佇列上限 (預設: 16)
+        - PROJECT_WEIGHTS: 公平排程的專案權重，如 "group/big=0.5,group/hot=2" (預設: 皆為 1)
+        - FAIR_RECENT_WINDOW: 視為近期更新的 MR 秒數 (預設: 3600)
+        - FAIR_RECENT_BOOST: 近期更新 MR 的優先倍數，1 表示不加權 (預設: 1)
+        - SCAN_BUDGET: 每次 scan / serve 輪詢的時間預算秒數，0 表示不限制 (預設: 0)
+        - PROJECT_CACHE_TTL: 專案路徑 → ID 解析結果的有效秒數，0 表示停用快取 (預設: 86400)
+        - BREAKER_THRESHOLD: 專案連續掃描失敗幾次後暫停掃描，0 表示停用斷路器 (預設: 3)
+        - BREAKER_BASE_DELAY: 斷路器第一次開啟的冷卻秒數，之後每次加倍 (預設: 300)
+        - BREAKER_MAX_DELAY: 斷路器冷卻秒數上限 (預設: 86400)
+        - AUTO_CLEAN_MERGED: 掃描時移除 GitLab 確認已關閉或合併的 MR 的 clone (預設: false)
+        - PRUNE_INTERVAL: serve 模式清理已關閉 MR clone 的間隔秒數，0 表示停用 (預設: 86400)
+        - PRUNE_WORKERS: 平行刪除 clone 的執行緒數 (預設: 4)
+        - REVIEWS_QUOTA: reviews_path 的配額，如 "50G"、"500M" 或位元組數，0 表示不限制 (預設: 0)
+        - QUOTA_MIN_IDLE: 超過配額時，未存取超過此秒數的 clone 才可淘汰 (預設: 3600)
+        - MR_INFO_EXPORT: 在每個 clone 目錄寫入 .mr_info.json 供編輯器等工具讀取 (預設: true)
+        - TRACE_FILE: 各階段（API、git、狀態讀寫）的追蹤輸出檔，空白表示停用追蹤 (預設: 空白)
+        - TRACE_FORMAT: 追蹤輸出格式 jsonl/chrome (預設: jsonl)
+        - METRICS_TEXTFILE: 每次 scan / serve 輪詢後寫入 Prometheus 指標的檔案（textfile collector），空白表示停用 (預設: 空白)
+        - METRICS_HOST / METRICS_PORT: serve 模式的 /metrics 端點，埠為 0 表示停用 (預設: 127.0.0.1:0)
+        - GIT_TRACE2: 以 git trace2 擷取每個 git 命令的協商、pack、checkout 耗時並記入掃描統計 (預設: false)
         """
         # 取得必要環境變數
         gitlab_url = os.getenv("GITLAB_URL")
@@ -75,6 +172,7 @@ class Config:
         reviews_path = os.getenv("REVIEWS_PATH", "~/GIT_POOL/reviews")
         state_dir = os.getenv("STATE_DIR", "./state")
         db_path = os.getenv("DB_PATH", "./state/mr_state.sqlite")
+        storage_type = os.getenv("STORAGE_TYPE", "sqlite").lower()
         
         # 解析布林值
         ssl_verify_str = os.getenv("GITLAB_SSL_VERIFY", "true").lower()
@@ -83,6 +181,122 @@ class Config:
         log_level = os.getenv("LOG_LEVEL", "INFO")
         api_retry_count = int(os.getenv("API_RETRY_COUNT", "3"))
         
+        # 狀態快取設定
+        state_cache_enabled = os.getenv("STATE_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+        state_cache_flush_interval = float(os.getenv("STATE_CACHE_FLUSH_INTERVAL", "5"))
+        state_cache_max_dirty = int(os.getenv("STATE_CACHE_MAX_DIRTY", "100"))
+        state_cache_flush_policy = os.getenv("STATE_CACHE_FLUSH_POLICY", "batch").lower()
+        if state_cache_flush_policy not in ("batch", "project", "always"):
+            raise ConfigError(f"無效的 STATE_CACHE_FLUSH_POLICY: {state_cache_flush_policy}")
+        
+        # clone 工作佇列設定
+        job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        job_backoff_seconds = float(os.getenv("JOB_BACKOFF_SECONDS", "30"))
+        job_lease_timeout = float(os.getenv("JOB_LEASE_TIMEOUT", "1800"))
+        job_retention = float(os.getenv("JOB_RETENTION", "604800"))
+        if job_retention < 0:
+            raise ConfigError(f"JOB_RETENTION 不可為負數: {job_retention}")
+        
+        # 多節點分片設定
+        shard_mode = os.getenv("SHARD_MODE", "none").lower()
+        if shard_mode not in ("none", "lease", "hash"):
+            raise ConfigError(f"無效的 SHARD_MODE: {shard_mode}")
+        shard_node_id = os.getenv("SHARD_NODE_ID") or socket.gethostname()
+        shard_nodes = [n.strip() for n in os.getenv("SHARD_NODES", "").split(",") if n.strip()]
+        shard_lease_ttl = float(os.getenv("SHARD_LEASE_TTL", "900"))
+        
+        # 跨行程掃描鎖設定
+        scan_lock = os.getenv("SCAN_LOCK", "global").lower()
+        if scan_lock not in ("none", "global", "project"):
+            raise ConfigError(f"無效的 SCAN_LOCK: {scan_lock}")
+        scan_lock_wait = float(os.getenv("SCAN_LOCK_WAIT", "0"))
+        scan_lock_stale = float(os.getenv("SCAN_LOCK_STALE", "3600"))
+        
+        # MR 篩選規則（在此編譯一次以便及早發現格式錯誤）
+        filters_file = os.getenv("MR_FILTERS_FILE")
+        if filters_file:
+            mr_filters = cls._load_filter_rules_from_file(filters_file)
+        else:
+            mr_filters = [rule.strip() for rule in os.getenv("MR_FILTERS", "").split(";") if rule.strip()]
+        MRFilter.parse(mr_filters)
+        
+        # 常駐服務輪詢設定
+        poll_min_interval = float(os.getenv("POLL_MIN_INTERVAL", "30"))
+        poll_max_interval = float(os.getenv("POLL_MAX_INTERVAL", "1800"))
+        
+        # webhook 接收端設定
+        webhook_enabled = os.getenv("WEBHOOK_ENABLED", "false").lower() in ("true", "1", "yes")
+        webhook_host = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+        webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+        webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+        webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        if webhook_enabled and not webhook_secret:
+            raise ConfigError("啟用 webhook 時必須設定 WEBHOOK_SECRET")
+        
+        # scan → clone 管線設定
+        pipeline_workers = int(os.getenv("PIPELINE_WORKERS", "2"))
+        pipeline_scanners = int(os.getenv("PIPELINE_SCANNERS", "1"))
+        pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+        if min(pipeline_workers, pipeline_scanners, pipeline_queue_size) < 1:
+            raise ConfigError("PIPELINE_WORKERS、PIPELINE_SCANNERS 與 PIPELINE_QUEUE_SIZE 必須至少為 1")
+        project_weights = cls._parse_project_weights(os.getenv("PROJECT_WEIGHTS", ""))
+        fair_recent_window = float(os.getenv("FAIR_RECENT_WINDOW", "3600"))
+        fair_recent_boost = float(os.getenv("FAIR_RECENT_BOOST", "1"))
+        if fair_recent_boost <= 0:
+            raise ConfigError(f"FAIR_RECENT_BOOST 必須大於 0: {fair_recent_boost}")
+        
+        scan_budget = float(os.getenv("SCAN_BUDGET", "0"))
+        if scan_budget < 0:
+            raise ConfigError(f"SCAN_BUDGET 不可為負數: {scan_budget}")
+        
+        project_cache_ttl = float(os.getenv("PROJECT_CACHE_TTL", "86400"))
+        if project_cache_ttl < 0:
+            raise ConfigError(f"PROJECT_CACHE_TTL 不可為負數: {project_cache_ttl}")
+        
+        # 專案掃描斷路器
+        breaker_threshold = int(os.getenv("BREAKER_THRESHOLD", "3"))
+        breaker_base_delay = float(os.getenv("BREAKER_BASE_DELAY", "300"))
+        breaker_max_delay = float(os.getenv("BREAKER_MAX_DELAY", "86400"))
+        if breaker_threshold < 0:
+            raise ConfigError(f"BREAKER_THRESHOLD 不可為負數: {breaker_threshold}")
+        if breaker_base_delay <= 0 or breaker_max_delay < breaker_base_delay:
+            raise ConfigError("BREAKER_BASE_DELAY 必須大於 0 且不大於 BREAKER_MAX_DELAY")
+        
+        auto_clean_merged = os.getenv("AUTO_CLEAN_MERGED", "false").lower() in ("true", "1", "yes")
+        prune_interval = float(os.getenv("PRUNE_INTERVAL", "86400"))
+        prune_workers = int(os.getenv("PRUNE_WORKERS", "4"))
+        if prune_interval < 0:
+            raise ConfigError(f"PRUNE_INTERVAL 不可為負數: {prune_interval}")
+        if prune_workers < 1:
+            raise ConfigError(f"PRUNE_WORKERS 必須至少為 1: {prune_workers}")
+        
+        # clone 磁碟配額
+        reviews_quota = cls._parse_size(os.getenv("REVIEWS_QUOTA", "0"))
+        quota_min_idle = float(os.getenv("QUOTA_MIN_IDLE", "3600"))
+        if quota_min_idle < 0:
+            raise ConfigError(f"QUOTA_MIN_IDLE 不可為負數: {quota_min_idle}")
+        
+        mr_info_export = os.getenv("MR_INFO_EXPORT", "true").lower() in ("true", "1", "yes")
+        
+        # 階段追蹤
+        trace_file = os.getenv("TRACE_FILE", "").strip()
+        if trace_file:
+            trace_file = str(Path(trace_file).expanduser())
+        trace_format = os.getenv("TRACE_FORMAT", "jsonl").strip().lower()
+        if trace_format not in TRACE_FORMATS:
+            raise ConfigError(f"TRACE_FORMAT 必須是 {'/'.join(TRACE_FORMATS)}: {trace_format}")
+        
+        # Prometheus 指標
+        metrics_textfile = os.getenv("METRICS_TEXTFILE", "").strip()
+        if metrics_textfile:
+            metrics_textfile = str(Path(metrics_textfile).expanduser())
+        metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        if not 0 <= metrics_port <= 65535:
+            raise ConfigError(f"METRICS_PORT 必須介於 0 與 65535: {metrics_port}")
+        
+        git_trace2 = os.getenv("GIT_TRACE2", "false").lower() in ("true", "1", "yes")
+        
         # 建立設定物件
         config = cls(
             gitlab_url=gitlab_url,
@@ -91,9 +305,56 @@ class Config:
             reviews_path=reviews_path,
             state_dir=state_dir,
             db_path=db_path,
+            storage_type=storage_type,
             gitlab_ssl_verify=gitlab_ssl_verify,
             log_level=log_level,
             api_retry_count=api_retry_count,
+            state_cache_enabled=state_cache_enabled,
+            state_cache_flush_interval=state_cache_flush_interval,
+            state_cache_max_dirty=state_cache_max_dirty,
+            state_cache_flush_policy=state_cache_flush_policy,
+            job_max_attempts=job_max_attempts,
+            job_backoff_seconds=job_backoff_seconds,
+            job_lease_timeout=job_lease_timeout,
+            job_retention=job_retention,
+            shard_mode=shard_mode,
+            shard_node_id=shard_node_id,
+            shard_nodes=shard_nodes,
+            shard_lease_ttl=shard_lease_ttl,
+            scan_lock=scan_lock,
+            scan_lock_wait=scan_lock_wait,
+            scan_lock_stale=scan_lock_stale,
+            mr_filters=mr_filters,
+            poll_min_interval=poll_min_interval,
+            poll_max_interval=poll_max_interval,
+            webhook_enabled=webhook_enabled,
+            webhook_host=webhook_host,
+            webhook_port=webhook_port,
+            webhook_path=webhook_path,
+            webhook_secret=webhook_secret,
+            pipeline_workers=pipeline_workers,
+            pipeline_scanners=pipeline_scanners,
+            pipeline_queue_size=pipeline_queue_size,
+            project_weights=project_weights,
+            fair_recent_window=fair_recent_window,
+            fair_recent_boost=fair_recent_boost,
+            scan_budget=scan_budget,
+            project_cache_ttl=project_cache_ttl,
+            breaker_threshold=breaker_threshold,
+            breaker_base_delay=breaker_base_delay,
+            breaker_max_delay=breaker_max_delay,
+            auto_clean_merged=auto_clean_merged,
+            prune_interval=prune_interval,
+            prune_workers=prune_workers,
+            reviews_quota=reviews_quota,
+            quota_min_idle=quota_min_idle,
+            mr_info_export=mr_info_export,
+            trace_file=trace_file,
+            trace_format=trace_format,
+            metrics_textfile=metrics_textfile,
+            metrics_host=metrics_host,
+            metrics_port=metrics_port,
+            git_trace2=git_trace2,
         )
         
         # 建立所需目錄
@@ -142,6 +403,87 @@ class Config:
         except IOError as e:
             raise ConfigError(f"讀取專案清單檔案失敗: {file_path} - {e}")
     
+    @staticmethod
+    def _load_filter_rules_from_file(file_path: str) -> List[str]:
+        """
+        從檔案讀取 MR 篩選規則
+        
+        檔案格式：每行一條規則，忽略空行和以 # 開頭的註釋行
+        
+        Args:
+            file_path: 規則檔案路徑
+            
+        Returns:
+            規則列表
+            
+        Raises:
+            ConfigError: 檔案不存在或讀取失敗
+        """
+        try:
+            with open(Path(file_path).expanduser(), 'r', encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+        except FileNotFoundError:
+            raise ConfigError(f"MR 篩選規則檔案不存在: {file_path}")
+        except IOError as e:
+            raise ConfigError(f"讀取 MR 篩選規則檔案失敗: {file_path} - {e}")
+    
+    @staticmethod
+    def _parse_project_weights(value: str) -> Dict[str, float]:
+        """
+        解析專案權重設定
+        
+        Args:
+            value: 逗號分隔的 "專案=權重"
+            
+        Returns:
+            專案 -> 權重
+            
+        Raises:
+            ConfigError: 格式錯誤或權重不是正數
+        """
+        weights = {}
+        for entry in value.split(","):
+            if not entry.strip():
+                continue
+            project, sep, weight = entry.rpartition("=")
+            try:
+                parsed = float(weight)
+            except ValueError:
+                parsed = 0.0
+            if not sep or not project.strip() or parsed <= 0:
+                raise ConfigError(f"無效的專案權重: {entry.strip()}（格式為 group/project=權重，權重須大於 0）")
+            weights[project.strip()] = parsed
+        return weights
+    
+    @staticmethod
+    def _parse_size(value: str) -> int:
+        """
+        解析容量設定
+        
+        Args:
+            value: 位元組數，或加上 K/M/G/T 單位（1024 進位，可加 B 或 iB），如 "50G"
+            
+        Returns:
+            位元組數
+            
+        Raises:
+            ConfigError: 格式錯誤或為負數
+        """
+        units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+        text = value.strip().upper()
+        for suffix in ("IB", "B"):
+            if text.endswith(suffix):
+                text = text[:-len(suffix)]
+                break
+        unit = text[-1:] if text[-1:] in units else ""
+        try:
+            size = float(text[:len(text) - len(unit)])
+        except ValueError:
+            raise ConfigError(f"無效的容量: {value}（格式如 50G、500M 或位元組數）")
+        if size < 0:
+            raise ConfigError(f"容量不可為負數: {value}")
+        return int(size * units[unit])
+    
     def _create_directories(self):
         """建立所需的目錄"""
         # 展開 ~ 符號
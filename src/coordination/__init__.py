@@ -0,0 +1,3 @@
+"""
+多節點協調模組
+"""
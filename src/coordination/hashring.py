@@ -0,0 +1,50 @@
+"""
+一致性雜湊環
+
+將專案路徑對應到節點；節點增減時只有相鄰區段的專案會改變歸屬，
+其餘專案留在原節點，本機已建立的 clone 可以繼續沿用。
+"""
+
+import bisect
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """以虛擬節點平衡分布的一致性雜湊環"""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64):
+        """
+        初始化雜湊環
+
+        Args:
+            nodes: 節點識別列表
+            replicas: 每個節點的虛擬節點數
+        """
+        self.nodes = sorted(set(nodes))
+        self.replicas = replicas
+        self._ring: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._keys = [point for point, _ in self._ring]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        取得鍵的所屬節點
+
+        Args:
+            key: 專案路徑
+
+        Returns:
+            節點識別，環為空時回傳 None
+        """
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
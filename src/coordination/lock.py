@@ -0,0 +1,168 @@
+"""
+跨行程掃描鎖
+
+排程執行的 scan 若超過排程間隔，兩個行程會同時寫入相同的
+reviews/<project>/<iid> 目錄與 SQLite 檔案。鎖記錄在 scan_locks 表，
+可以鎖住整次掃描（"scan"），也可以逐專案上鎖（"project:<path>"），
+讓重疊的執行改為處理沒有其他行程負責的專案。
+
+持有者已結束（同一主機上 PID 不存在）或超過 stale_after 秒未更新的鎖視為過期，
+可直接接手。
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from src.jobs.queue import default_worker_id, worker_is_dead
+from src.logger import logger
+from src.utils.exceptions import StateError
+from src.utils.sqlite import ImmediateTransaction
+
+
+GLOBAL_LOCK = "scan"
+
+
+def project_lock_name(project: str) -> str:
+    """專案鎖名稱"""
+    return f"project:{project}"
+
+
+class ScanLock:
+    """以 SQLite 表實作、支援過期接手的命名鎖"""
+
+    def __init__(
+        self,
+        db_path: str,
+        owner: Optional[str] = None,
+        stale_after: float = 3600.0,
+        poll_interval: float = 1.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        初始化掃描鎖
+
+        Args:
+            db_path: SQLite 資料庫路徑
+            owner: 持有者識別，預設為 "主機名稱:PID"
+            stale_after: 鎖超過此秒數未更新視為過期
+            poll_interval: 等待鎖時的輪詢間隔秒數
+            clock: 取得目前時間的函數（測試用）
+            sleep: 等待函數（測試用）
+        """
+        self.db_path = db_path
+        self.owner = owner or default_worker_id()
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+        try:
+            self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_locks (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+        except Exception as e:
+            logger.error("初始化掃描鎖失敗: %s", e)
+            raise StateError(f"初始化掃描鎖失敗: {e}")
+
+    def try_acquire(self, name: str) -> bool:
+        """
+        嘗試取得鎖一次（可重入）
+
+        Args:
+            name: 鎖名稱
+
+        Returns:
+            是否取得
+        """
+        now = self._clock()
+        with self._lock, ImmediateTransaction(self._conn):
+            row = self._conn.execute(
+                "SELECT owner, heartbeat_at FROM scan_locks WHERE name = ?",
+                (name,),
+            ).fetchone()
+            if row is not None and row[0] != self.owner:
+                holder, heartbeat_at = row
+                if heartbeat_at > now - self.stale_after and not worker_is_dead(holder):
+                    return False
+                logger.warning("接手過期的掃描鎖 %s（原持有者 %s）", name, holder)
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scan_locks (name, owner, acquired_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (name, self.owner, now, now),
+            )
+        return True
+
+    def acquire(self, name: str, wait: float = 0.0) -> Optional[float]:
+        """
+        取得鎖，必要時等待
+
+        Args:
+            name: 鎖名稱
+            wait: 最長等待秒數，0 表示只嘗試一次
+
+        Returns:
+            取得鎖所等待的秒數；逾時未取得則回傳 None
+        """
+        started = self._clock()
+        while True:
+            if self.try_acquire(name):
+                return self._clock() - started
+            if self._clock() - started >= wait:
+                return None
+            self._sleep(self.poll_interval)
+
+    def holder(self, name: str) -> Optional[str]:
+        """
+        目前的鎖持有者
+
+        Args:
+            name: 鎖名稱
+
+        Returns:
+            持有者識別或 None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM scan_locks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self):
+        """更新本行程持有的所有鎖，避免長時間掃描被視為過期"""
+        with self._lock, ImmediateTransaction(self._conn):
+            self._conn.execute(
+                "UPDATE scan_locks SET heartbeat_at = ? WHERE owner = ?",
+                (self._clock(), self.owner),
+            )
+
+    def release(self, name: str):
+        """
+        釋放鎖（僅限本行程持有的鎖）
+
+        Args:
+            name: 鎖名稱
+        """
+        with self._lock, ImmediateTransaction(self._conn):
+            self._conn.execute("DELETE FROM scan_locks WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def release_all(self):
+        """釋放本行程持有的所有鎖"""
+        with self._lock, ImmediateTransaction(self._conn):
+            self._conn.execute("DELETE FROM scan_locks WHERE owner = ?", (self.owner,))
+
+    def close(self):
+        """釋放本行程持有的所有鎖並關閉資料庫連線"""
+        try:
+            self.release_all()
+        except Exception as e:
+            logger.warning("釋放掃描鎖失敗: %s", e)
+        with self._lock:
+            self._conn.close()
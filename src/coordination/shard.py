@@ -0,0 +1,243 @@
+"""
+多節點專案分片
+
+多台 review 主機共用同一份專案清單與同一個 SQLite 資料庫（需放在共享檔案系統上），
+每個 scan worker 只處理分配給自己的專案，因此不會有兩台主機 clone 同一個 MR。
+
+節點以 shard_nodes 表登記心跳；超過 lease_ttl 未更新的節點視為已離線。
+支援兩種分配模式：
+
+- lease：以 project_leases 表租用專案，租約含到期時間並由心跳續約。
+  每個節點最多持有 ceil(專案數 / 存活節點數) 個專案，超出的租約會釋出給其他節點；
+  節點離線後其租約到期，專案由其他節點接手。
+- hash：以一致性雜湊將專案路徑對應到存活節點，節點增減時只有少數專案改變歸屬。
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from src.coordination.hashring import HashRing
+from src.logger import logger
+from src.utils.exceptions import StateError
+from src.utils.sqlite import ImmediateTransaction
+
+
+SHARD_MODES = ("none", "lease", "hash")
+
+
+class ShardCoordinator:
+    """以 SQLite 心跳與租約協調多節點的專案分配"""
+
+    def __init__(
+        self,
+        db_path: str,
+        node_id: str,
+        mode: str = "lease",
+        lease_ttl: float = 900.0,
+        nodes: Optional[Sequence[str]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化分片協調器
+
+        Args:
+            db_path: 共用的 SQLite 資料庫路徑
+            node_id: 本節點識別（各主機需唯一）
+            mode: 分配模式 lease 或 hash
+            lease_ttl: 節點心跳與專案租約的有效秒數
+            nodes: hash 模式下參與分配的節點清單，None 表示所有存活節點
+            clock: 取得目前時間的函數（測試用）
+        """
+        if mode not in ("lease", "hash"):
+            raise StateError(f"無效的分片模式: {mode}")
+
+        self.db_path = db_path
+        self.node_id = node_id
+        self.mode = mode
+        self.lease_ttl = lease_ttl
+        self.nodes = list(nodes) if nodes else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        try:
+            self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shard_nodes (
+                    node_id TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS project_leases (
+                    project TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        except Exception as e:
+            logger.error("初始化分片協調失敗: %s", e)
+            raise StateError(f"初始化分片協調失敗: {e}")
+
+    def heartbeat(self):
+        """更新本節點心跳，lease 模式下同時續約本節點持有的租約"""
+        now = self._clock()
+        with self._lock, ImmediateTransaction(self._conn):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shard_nodes (node_id, heartbeat_at) VALUES (?, ?)",
+                (self.node_id, now),
+            )
+            if self.mode == "lease":
+                self._conn.execute(
+                    "UPDATE project_leases SET expires_at = ? WHERE owner = ? AND expires_at > ?",
+                    (now + self.lease_ttl, self.node_id, now),
+                )
+
+    def live_nodes(self) -> List[str]:
+        """
+        取得目前存活的節點（本節點一律視為存活）
+
+        Returns:
+            依名稱排序的節點識別列表
+        """
+        now = self._clock()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id FROM shard_nodes WHERE heartbeat_at > ?",
+                (now - self.lease_ttl,),
+            ).fetchall()
+        live = {row[0] for row in rows} | {self.node_id}
+        if self.nodes is not None:
+            live &= set(self.nodes) | {self.node_id}
+        return sorted(live)
+
+    def assign(self, projects: Sequence[str]) -> List[str]:
+        """
+        取得本節點這次應處理的專案
+
+        Args:
+            projects: 完整專案清單
+
+        Returns:
+            分配給本節點的專案（保留原順序）
+        """
+        self.heartbeat()
+        live = self.live_nodes()
+
+        if self.mode == "hash":
+            ring = HashRing(live)
+            assigned = [project for project in projects if ring.owner(project) == self.node_id]
+        else:
+            assigned = self._acquire_leases(projects, math.ceil(len(projects) / len(live)))
+
+        logger.info(
+            "節點 %s 分配到 %s/%s 個專案（存活節點 %s 個）", self.node_id, len(assigned), len(projects), len(live),
+        )
+        return assigned
+
+    def _acquire_leases(self, projects: Sequence[str], share: int) -> List[str]:
+        """在單一交易內釋出超額租約並租用尚無人持有的專案"""
+        now = self._clock()
+        expires_at = now + self.lease_ttl
+        wanted = set(projects)
+
+        with self._lock, ImmediateTransaction(self._conn):
+            rows = self._conn.execute(
+                "SELECT project, owner FROM project_leases WHERE expires_at > ?",
+                (now,),
+            ).fetchall()
+            taken = {project for project, owner in rows if owner != self.node_id}
+            mine = {project for project, owner in rows if owner == self.node_id}
+            held = [project for project in projects if project in mine]
+
+            # 新節點加入後，超出公平份額的租約釋出給其他節點
+            released = held[share:]
+            held = held[:share]
+            self._conn.executemany(
+                "DELETE FROM project_leases WHERE project = ? AND owner = ?",
+                [(project, self.node_id) for project in released],
+            )
+            # 清單中已移除的專案不再持有
+            self._conn.executemany(
+                "DELETE FROM project_leases WHERE project = ? AND owner = ?",
+                [(project, self.node_id) for project in mine - wanted],
+            )
+
+            for project in projects:
+                if len(held) >= share:
+                    break
+                if project in taken or project in held or project in released:
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO project_leases (project, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (project, self.node_id, now, expires_at),
+                )
+                held.append(project)
+
+        if released:
+            logger.info("釋出 %s 個超額專案租約: %s", len(released), ', '.join(released))
+        held_set = set(held)
+        return [project for project in projects if project in held_set]
+
+    def owns(self, project: str) -> bool:
+        """
+        確認本節點仍持有專案
+
+        clone 前再次確認，避免租約在掃描期間過期並被其他節點接手。
+
+        Args:
+            project: 專案路徑
+
+        Returns:
+            是否仍由本節點處理
+        """
+        if self.mode == "hash":
+            return HashRing(self.live_nodes()).owner(project) == self.node_id
+
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT owner FROM project_leases WHERE project = ? AND expires_at > ?",
+                (project, now),
+            ).fetchone()
+        return row is not None and row[0] == self.node_id
+
+    def start_heartbeat(self, interval: Optional[float] = None):
+        """
+        啟動背景心跳執行緒
+
+        Args:
+            interval: 心跳間隔秒數，預設為 lease_ttl 的三分之一
+        """
+        if self._thread is not None:
+            return
+        interval = interval if interval is not None else self.lease_ttl / 3
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat_loop, args=(interval,), name="shard-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _heartbeat_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.warning("更新節點心跳失敗: %s", e)
+
+    def stop_heartbeat(self):
+        """停止背景心跳執行緒"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """停止心跳並關閉資料庫連線（租約保留至到期，下次執行可繼續持有）"""
+        self.stop_heartbeat()
+        with self._lock:
+            self._conn.close()
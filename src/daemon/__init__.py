@@ -0,0 +1,3 @@
+"""
+常駐服務模組
+"""
@@ -0,0 +1,85 @@
+"""
+自適應輪詢排程
+
+每個專案各自維護輪詢間隔：掃描到新的或有更新的 MR 時回到最短間隔，
+沒有變化時間隔加倍，直到最長間隔。活躍的專案因此約每 30 秒輪詢一次，
+長期沒有動靜的專案則降到約 30 分鐘一次。
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List
+
+
+@dataclass
+class ProjectSchedule:
+    """單一專案的輪詢狀態"""
+    interval: float
+    next_run_at: float
+
+
+class AdaptiveScheduler:
+    """依 MR 活動調整各專案輪詢間隔的排程器"""
+
+    def __init__(
+        self,
+        projects: Iterable[str],
+        min_interval: float = 30.0,
+        max_interval: float = 1800.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化排程器（所有專案立即到期）
+
+        Args:
+            projects: 專案列表
+            min_interval: 活躍專案的輪詢間隔秒數
+            max_interval: 閒置專案的最長輪詢間隔秒數
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self._clock = clock
+        now = clock()
+        self.schedules: Dict[str, ProjectSchedule] = {
+            project: ProjectSchedule(interval=min_interval, next_run_at=now) for project in projects
+        }
+
+    def due(self) -> List[str]:
+        """
+        取得已到期的專案（依到期時間排序）
+
+        Returns:
+            專案列表
+        """
+        now = self._clock()
+        due = [project for project, schedule in self.schedules.items() if schedule.next_run_at <= now]
+        # 穩定排序：同時到期的專案維持設定中的順序
+        return sorted(due, key=lambda project: self.schedules[project].next_run_at)
+
+    def record(self, project: str, active: bool):
+        """
+        記錄一次輪詢結果並排定下一次
+
+        Args:
+            project: 專案路徑
+            active: 本次是否有新的或更新的 MR
+        """
+        schedule = self.schedules[project]
+        if active:
+            schedule.interval = self.min_interval
+        else:
+            schedule.interval = min(schedule.interval * 2, self.max_interval)
+        schedule.next_run_at = self._clock() + schedule.interval
+
+    def seconds_until_next(self) -> float:
+        """
+        距離下一個專案到期的秒數
+
+        Returns:
+            秒數（已有到期專案時為 0；沒有專案時為最長間隔）
+        """
+        if not self.schedules:
+            return self.max_interval
+        next_run_at = min(schedule.next_run_at for schedule in self.schedules.values())
+        return max(0.0, next_run_at - self._clock())
@@ -2,19 +2,42 @@
 GitLab API 客戶端模組
 """
 
-from typing import List, Any
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import gitlab
+import requests
 
 from src.gitlab_.models import MRInfo, Change, Commit
+from src.gitlab_.project_cache import ProjectCache, ProjectRef
+from src.gitlab_.usage import api_usage
 from src.logger import logger
+from src.observability.metrics import observe_api_response
+from src.observability.tracing import NOOP_SPAN, tracer
 from src.utils.exceptions import GitLabError
 
 
+@contextmanager
+def _api_span(name: str, **attrs):
+    """追蹤一次 API 操作，結束時記錄其中的請求數與接收的位元組數"""
+    if not tracer.enabled:
+        yield NOOP_SPAN
+        return
+    before = api_usage.snapshot()
+    with tracer.span(name, **attrs) as span:
+        try:
+            yield span
+        finally:
+            usage = api_usage.snapshot() - before
+            span.set(requests=usage.requests, bytes=usage.bytes)
+
+
 class GitLabClient:
     """GitLab API 客戶端"""
     
-    def __init__(self, url: str, token: str, ssl_verify: bool = True):
+    project_cache: Optional[ProjectCache] = None
+    
+    def __init__(self, url: str, token: str, ssl_verify: bool = True, project_cache: Optional[ProjectCache] = None):
         """
         初始化 GitLab 客戶端
         
@@ -22,13 +45,19 @@ class GitLabClient:
             url: GitLab 執行個體 URL
             token: GitLab 存取令牌
             ssl_verify: 是否驗證 SSL 憑證
+            project_cache: 專案路徑 → ID 解析快取，None 表示每次都解析
         """
+        self.project_cache = project_cache
         try:
-            self.gl = gitlab.Gitlab(url, private_token=token, ssl_verify=ssl_verify)
+            # 自備 Session 以掛上用量統計 hook
+            session = requests.Session()
+            session.hooks["response"].append(api_usage.record)
+            session.hooks["response"].append(observe_api_response)
+            self.gl = gitlab.Gitlab(url, private_token=token, ssl_verify=ssl_verify, session=session)
             self.gl.auth()
-            logger.info(f"成功連接到 GitLab: {url}")
+            logger.info("成功連接到 GitLab: %s", url)
         except Exception as e:
-            logger.error(f"連接 GitLab 失敗: {e}")
+            logger.error("連接 GitLab 失敗: %s", e)
             raise GitLabError(f"連接 GitLab 失敗: {e}")
     
     def get_project(self, project_id: str) -> Any:
@@ -45,18 +74,57 @@ class GitLabClient:
             GitLabError: 無法取得專案
         """
         try:
-            project = self.gl.projects.get(project_id)
+            with _api_span("gitlab.projects.get", project=project_id):
+                project = self.gl.projects.get(project_id)
             return project
         except Exception as e:
-            logger.error(f"取得專案失敗: {e}")
+            logger.error("取得專案失敗: %s", e)
             raise GitLabError(f"取得專案失敗: {e}")
     
-    def get_merge_requests(self, project_id: str) -> List[MRInfo]:
+    def _resolve_project(self, project_id: str) -> Tuple[Any, Any]:
+        """
+        取得可呼叫 MR API 的專案物件與其 metadata
+        
+        快取命中時以數字 ID 建立 lazy 專案物件，不發出 GET /projects/:id；
+        未命中時完整取得專案並寫入快取。
+        
+        Returns:
+            (專案物件, 具有 id 與 path_with_namespace 的 metadata)
+        """
+        if self.project_cache is not None:
+            ref = self.project_cache.get(str(project_id))
+            if ref is not None:
+                return self.gl.projects.get(ref.id, lazy=True), ref
+        
+        project = self.get_project(project_id)
+        if self.project_cache is not None:
+            self.project_cache.put(str(project_id), project.id, project.path_with_namespace)
+        return project, project
+    
+    def _with_project(self, project_id: str, action: Callable[[Any, Any], Any]) -> Any:
+        """
+        以解析後的專案執行 action(專案物件, metadata)
+        
+        使用快取的專案 ID 收到 404 時（專案已刪除或 ID 改變），使快取失效並重新解析一次。
+        """
+        project, ref = self._resolve_project(project_id)
+        try:
+            return action(project, ref)
+        except gitlab.exceptions.GitlabError as e:
+            if not isinstance(ref, ProjectRef) or getattr(e, "response_code", None) != 404:
+                raise
+            logger.info("專案 %s 的快取 ID %s 回應 404，重新解析", project_id, ref.id)
+            self.project_cache.invalidate(str(project_id))
+            project, ref = self._resolve_project(project_id)
+            return action(project, ref)
+    
+    def get_merge_requests(self, project_id: str, params: Optional[Dict[str, str]] = None) -> List[MRInfo]:
         """
         取得專案的 MR 列表
         
         Args:
             project_id: 專案 ID 或路徑
+            params: 額外的 mergerequests.list 查詢參數（伺服器端篩選）
             
         Returns:
             MRInfo 對象列表
@@ -64,20 +132,26 @@ class GitLabClient:
         Raises:
             GitLabError: 無法取得 MR 列表
         """
+        def list_mrs(project, ref):
+            mrs = project.mergerequests.list(all=True, state="opened", **(params or {}))
+            if isinstance(ref, ProjectRef) and any(not _belongs_to(mr, ref.path_with_namespace) for mr in mrs):
+                # 專案已搬移或改名：以新的路徑重新解析
+                logger.info("專案 %s 已不在 %s，重新解析", project_id, ref.path_with_namespace)
+                self.project_cache.invalidate(str(project_id))
+                _, ref = self._resolve_project(project_id)
+            return [self._convert_mr_to_info(mr, ref) for mr in mrs]
+        
         try:
-            project = self.get_project(project_id)
-            mrs = project.mergerequests.list(all=True, state="opened")
+            with _api_span("gitlab.mergerequests.list", project=project_id) as span:
+                results = self._with_project(project_id, list_mrs)
+                span.set(count=len(results))
             
-            results = []
-            for mr in mrs:
-                results.append(self._convert_mr_to_info(mr, project))
-            
-            logger.debug(f"取得專案 {project_id} 的 {len(results)} 個 MR")
+            logger.debug("取得專案 %s 的 %s 個 MR", project_id, len(results))
             return results
         except GitLabError:
             raise
         except Exception as e:
-            logger.error(f"取得 MR 列表失敗: {e}")
+            logger.error("取得 MR 列表失敗: %s", e)
             raise GitLabError(f"取得 MR 列表失敗: {e}")
     
     def get_mr_details(self, project_id: str, mr_iid: int) -> MRInfo:
@@ -95,13 +169,15 @@ class GitLabClient:
             GitLabError: 無法取得 MR 詳情
         """
         try:
-            project = self.get_project(project_id)
-            mr = project.mergerequests.get(mr_iid)
-            return self._convert_mr_to_info(mr, project)
+            with _api_span("gitlab.mergerequests.get", project=project_id, iid=mr_iid):
+                return self._with_project(
+                    project_id,
+                    lambda project, ref: self._convert_mr_to_info(project.mergerequests.get(mr_iid), ref),
+                )
         except GitLabError:
             raise
         except Exception as e:
-            logger.error(f"取得 MR 詳情失敗: {e}")
+            logger.error("取得 MR 詳情失敗: %s", e)
             raise GitLabError(f"取得 MR 詳情失敗: {e}")
     
     def get_mr_changes(self, project_id: str, mr_iid: int) -> List[Change]:
@@ -119,9 +195,8 @@ class GitLabClient:
             GitLabError: 無法取得 MR 變更
         """
         try:
-            project = self.get_project(project_id)
-            mr = project.mergerequests.get(mr_iid)
-            changes = mr.changes()
+            with _api_span("gitlab.mergerequests.changes", project=project_id, iid=mr_iid):
+                changes = self._with_project(project_id, lambda project, ref: project.mergerequests.get(mr_iid).changes())
             
             results = []
             for change in changes.get("changes", []):
@@ -137,7 +212,7 @@ class GitLabClient:
         except GitLabError:
             raise
         except Exception as e:
-            logger.error(f"取得 MR 變更失敗: {e}")
+            logger.error("取得 MR 變更失敗: %s", e)
             raise GitLabError(f"取得 MR 變更失敗: {e}")
     
     def get_mr_commits(self, project_id: str, mr_iid: int) -> List[Commit]:
@@ -155,9 +230,8 @@ class GitLabClient:
             GitLabError: 無法取得 MR 提交列表
         """
         try:
-            project = self.get_project(project_id)
-            mr = project.mergerequests.get(mr_iid)
-            commits = mr.commits()
+            with _api_span("gitlab.mergerequests.commits", project=project_id, iid=mr_iid):
+                commits = self._with_project(project_id, lambda project, ref: project.mergerequests.get(mr_iid).commits())
             
             results = []
             for commit in commits:
@@ -175,7 +249,7 @@ class GitLabClient:
         except GitLabError:
             raise
         except Exception as e:
-            logger.error(f"取得 MR 提交列表失敗: {e}")
+            logger.error("取得 MR 提交列表失敗: %s", e)
             raise GitLabError(f"取得 MR 提交列表失敗: {e}")
     
     @staticmethod
@@ -195,6 +269,11 @@ class GitLabClient:
         if draft is None:
             draft = work_in_progress
         
+        # 舊版 GitLab 可能沒有 labels / source_project_id
+        labels = getattr(mr, 'labels', None)
+        source_project_id = getattr(mr, 'source_project_id', None)
+        sha = getattr(mr, 'sha', None)
+        
         return MRInfo(
             id=mr.id,
             project_id=project.id,
@@ -211,4 +290,15 @@ class GitLabClient:
             web_url=mr.web_url,
             draft=draft,
             work_in_progress=work_in_progress,
+            labels=list(labels) if isinstance(labels, (list, tuple)) else [],
+            source_project_id=source_project_id if isinstance(source_project_id, int) else None,
+            sha=sha if isinstance(sha, str) else None,
         )
+
+
+def _belongs_to(mr, path_with_namespace: str) -> bool:
+    """MR 的網址是否位於指定的專案路徑下（無法判斷時視為是）"""
+    web_url = getattr(mr, "web_url", None)
+    if not isinstance(web_url, str) or "/-/merge_requests/" not in web_url:
+        return True
+    return web_url.split("/-/merge_requests/")[0].endswith(f"/{path_with_namespace}")
@@ -2,7 +2,7 @@
 GitLab API 資料模型
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, List
 
@@ -47,3 +47,6 @@ class MRInfo:
     web_url: str
     draft: bool
     work_in_progress: bool
+    labels: List[str] = field(default_factory=list)
+    source_project_id: Optional[int] = None
+    sha: Optional[str] = None  # head commit
@@ -0,0 +1,118 @@
+"""
+專案路徑 → ID 解析快取
+
+每次列出 MR 前都要以 GET /projects/:path 解析專案，專案數量多時這是一個
+完全重複的 API 往返。ProjectCache 將解析結果（數字 ID 與 path_with_namespace）
+存進狀態儲存的文件命名空間，超過 TTL 才重新解析；GitLabClient 命中快取時
+以數字 ID 建立 lazy 專案物件，直接呼叫 MR API。
+
+專案被刪除或搬移時，GitLabClient 會在收到 404 或發現 MR 的網址不再屬於
+快取的路徑時使該筆快取失效並重新解析。
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional
+
+from src.logger import logger
+from src.observability.metrics import cache_requests
+from src.utils.exceptions import StateError
+
+
+NAMESPACE = "projects"
+
+
+@dataclass
+class ProjectRef:
+    """已解析的專案 metadata"""
+    id: int
+    path_with_namespace: str
+    resolved_at: float
+
+
+class ProjectCache:
+    """以狀態儲存持久化的專案解析快取"""
+
+    def __init__(self, state_manager, ttl: float = 86400.0, clock: Callable[[], float] = time.time):
+        """
+        初始化快取
+
+        Args:
+            state_manager: 提供 get/put/delete_document 的狀態管理器
+            ttl: 解析結果的有效秒數
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.state_manager = state_manager
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory: Dict[str, ProjectRef] = {}
+
+    def get(self, project: str) -> Optional[ProjectRef]:
+        """
+        取得尚未過期的解析結果
+
+        Args:
+            project: 設定中的專案路徑或 ID
+
+        Returns:
+            ProjectRef；沒有快取或已過期時回傳 None
+        """
+        ref = self._lookup(project)
+        cache_requests.inc(cache="project", result="hit" if ref is not None else "miss")
+        return ref
+
+    def _lookup(self, project: str) -> Optional[ProjectRef]:
+        with self._lock:
+            ref = self._memory.get(project)
+        if ref is None:
+            try:
+                document = self.state_manager.get_document(NAMESPACE, project)
+            except StateError:
+                # 狀態儲存暫時無法讀取，視為未命中
+                return None
+            if document is None:
+                return None
+            ref = ProjectRef(**document)
+            with self._lock:
+                self._memory[project] = ref
+
+        if self._clock() - ref.resolved_at > self.ttl:
+            return None
+        return ref
+
+    def put(self, project: str, project_id: int, path_with_namespace: str) -> ProjectRef:
+        """
+        記錄解析結果
+
+        Args:
+            project: 設定中的專案路徑或 ID
+            project_id: 專案數字 ID
+            path_with_namespace: 專案目前的完整路徑
+
+        Returns:
+            寫入的 ProjectRef
+        """
+        ref = ProjectRef(id=project_id, path_with_namespace=path_with_namespace, resolved_at=self._clock())
+        with self._lock:
+            self._memory[project] = ref
+        try:
+            self.state_manager.put_document(NAMESPACE, project, asdict(ref))
+        except StateError as e:
+            logger.warning("無法保存專案 %s 的解析結果: %s", project, e)
+        return ref
+
+    def invalidate(self, project: str):
+        """
+        使一筆解析結果失效
+
+        Args:
+            project: 設定中的專案路徑或 ID
+        """
+        with self._lock:
+            self._memory.pop(project, None)
+        try:
+            self.state_manager.delete_document(NAMESPACE, project)
+        except StateError as e:
+            logger.warning("無法刪除專案 %s 的解析結果: %s", project, e)
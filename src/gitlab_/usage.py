@@ -0,0 +1,62 @@
+"""
+GitLab API 用量統計
+
+透過 requests Session 的 response hook 計算每個執行緒發出的 API 請求數
+與接收的位元組數，讓掃描流程可以用前後快照的差值得到單一專案的 API 成本。
+"""
+
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ApiUsage:
+    """API 用量快照"""
+    requests: int = 0
+    bytes: int = 0
+
+    def __sub__(self, other: "ApiUsage") -> "ApiUsage":
+        return ApiUsage(
+            requests=self.requests - other.requests,
+            bytes=self.bytes - other.bytes,
+        )
+
+
+class ApiUsageTracker:
+    """以執行緒為單位累計 API 用量"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def record(self, response, *args, **kwargs):
+        """
+        requests response hook：累計一次請求
+
+        Args:
+            response: requests.Response 物件
+        """
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit():
+            size = int(content_length)
+        else:
+            size = len(response.content or b"")
+
+        self._local.requests = getattr(self._local, "requests", 0) + 1
+        self._local.bytes = getattr(self._local, "bytes", 0) + size
+        return response
+
+    def snapshot(self) -> ApiUsage:
+        """
+        取得目前執行緒的累計用量
+
+        Returns:
+            ApiUsage 快照
+        """
+        return ApiUsage(
+            requests=getattr(self._local, "requests", 0),
+            bytes=getattr(self._local, "bytes", 0),
+        )
+
+
+# 全域用量統計實例
+api_usage = ApiUsageTracker()
@@ -0,0 +1,3 @@
+"""
+持久化工作佇列模組
+"""
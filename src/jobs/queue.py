@@ -0,0 +1,382 @@
+"""
+SQLite 持久化 clone 工作佇列
+
+掃描結果轉為 clone_jobs 表中的工作，狀態依序為
+pending → running → done；失敗時依指數退避重新排入 pending，
+超過最大嘗試次數則標記為 failed。
+
+工作以 (project, iid) 為鍵，並記錄 MR 的 updated_at：
+同一版本的 MR 完成後不會再次執行，因此行程中途崩潰後重新掃描，
+只會處理尚未完成的工作。已結束 (done / failed) 的工作保留 retention 秒後清除。
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional
+
+from src.gitlab_.models import MRInfo
+from src.logger import logger
+from src.utils.exceptions import StateError
+from src.utils.sqlite import ImmediateTransaction
+
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_COLUMNS = "id, project, iid, mr_updated_at, payload, state, attempts, max_attempts, next_run_at, last_error"
+
+
+def default_worker_id() -> str:
+    """以主機名稱與 PID 組成 worker 識別"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def worker_is_dead(worker_id: Optional[str]) -> bool:
+    """
+    判斷同一主機上的 worker 行程是否已不存在
+
+    其他主機的 worker 無法判斷，一律視為存活（交由逾時處理）。
+    """
+    host, _, pid = (worker_id or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+@dataclass
+class CloneJob:
+    """clone 工作"""
+    id: int
+    project: str
+    iid: int
+    mr_updated_at: str
+    mr_info: MRInfo
+    state: str
+    attempts: int
+    max_attempts: int
+    next_run_at: float
+    last_error: Optional[str] = None
+
+
+class JobQueue:
+    """以 SQLite 表實作的持久化工作佇列"""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_attempts: int = 3,
+        backoff_seconds: float = 30.0,
+        lease_timeout: float = 1800.0,
+        retention: float = 604800.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化工作佇列
+
+        Args:
+            db_path: SQLite 資料庫路徑（可與狀態資料庫共用）
+            max_attempts: 每個工作的最大嘗試次數
+            backoff_seconds: 失敗重試的基礎退避秒數（第 n 次失敗等待 base * 2^(n-1)）
+            lease_timeout: running 工作超過此秒數未完成視為 worker 已死亡
+            retention: done / failed 工作保留的秒數，0 表示永久保留
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_timeout = lease_timeout
+        self.retention = retention
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        try:
+            # isolation_level=None 以便自行控制 BEGIN IMMEDIATE 交易
+            self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS clone_jobs (
+                    id INTEGER PRIMARY KEY,
+                    project TEXT NOT NULL,
+                    iid INTEGER NOT NULL,
+                    mr_updated_at TEXT,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    last_error TEXT,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    updated_at REAL,
+                    UNIQUE (project, iid)
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_clone_jobs_state
+                ON clone_jobs (state, next_run_at)
+            """)
+        except Exception as e:
+            logger.error("初始化工作佇列失敗: %s", e)
+            raise StateError(f"初始化工作佇列失敗: {e}")
+
+    def _transaction(self):
+        """以 BEGIN IMMEDIATE 取得寫入鎖，確保跨行程的原子性"""
+        return ImmediateTransaction(self._conn)
+
+    @staticmethod
+    def _row_to_job(row) -> CloneJob:
+        return CloneJob(
+            id=row[0],
+            project=row[1],
+            iid=row[2],
+            mr_updated_at=row[3],
+            mr_info=MRInfo(**json.loads(row[4])),
+            state=row[5],
+            attempts=row[6],
+            max_attempts=row[7],
+            next_run_at=row[8],
+            last_error=row[9],
+        )
+
+    def enqueue(self, mr_info: MRInfo) -> bool:
+        """
+        將 MR 加入佇列
+
+        - 新 MR：建立 pending 工作
+        - MR 有更新（updated_at 改變）或前次已放棄 (failed)：重設為 pending
+        - 同一版本已完成 (done) 或正在執行 (running)：不動作
+
+        Args:
+            mr_info: MR 資訊
+
+        Returns:
+            是否有待執行的工作
+        """
+        now = self._clock()
+        payload = json.dumps(asdict(mr_info))
+        with self._lock, self._transaction():
+            row = self._conn.execute(
+                "SELECT state, mr_updated_at FROM clone_jobs WHERE project = ? AND iid = ?",
+                (mr_info.project_name, mr_info.iid),
+            ).fetchone()
+
+            if row is None:
+                self._conn.execute(
+                    """
+                    INSERT INTO clone_jobs
+                    (project, iid, mr_updated_at, payload, state, attempts, max_attempts, next_run_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+                    """,
+                    (mr_info.project_name, mr_info.iid, mr_info.updated_at, payload, PENDING, self.max_attempts, now, now),
+                )
+                return True
+
+            state, updated_at = row
+            if state == RUNNING:
+                return False
+            if state == DONE and updated_at == mr_info.updated_at:
+                return False
+
+            if state == PENDING and updated_at == mr_info.updated_at:
+                # 保留既有的嘗試次數與退避時間，只更新 MR 內容
+                self._conn.execute(
+                    "UPDATE clone_jobs SET payload = ?, updated_at = ? WHERE project = ? AND iid = ?",
+                    (payload, now, mr_info.project_name, mr_info.iid),
+                )
+                return True
+
+            self._conn.execute(
+                """
+                UPDATE clone_jobs
+                SET mr_updated_at = ?, payload = ?, state = ?, attempts = 0, max_attempts = ?,
+                    next_run_at = ?, last_error = NULL, claimed_by = NULL, claimed_at = NULL, updated_at = ?
+                WHERE project = ? AND iid = ?
+                """,
+                (mr_info.updated_at, payload, PENDING, self.max_attempts, now, now, mr_info.project_name, mr_info.iid),
+            )
+            return True
+
+    def claim(self, worker_id: str, project: Optional[str] = None, iid: Optional[int] = None) -> Optional[CloneJob]:
+        """
+        原子地取得一個可執行的工作並標記為 running
+
+        Args:
+            worker_id: worker 識別
+            project: 僅取得指定專案的工作
+            iid: 僅取得指定 MR 的工作（需同時指定 project）
+
+        Returns:
+            CloneJob 或 None（沒有可執行的工作）
+        """
+        now = self._clock()
+        query = f"SELECT {JOB_COLUMNS} FROM clone_jobs WHERE state = ? AND next_run_at <= ?"
+        params = [PENDING, now]
+        if project is not None:
+            query += " AND project = ?"
+            params.append(project)
+            if iid is not None:
+                query += " AND iid = ?"
+                params.append(iid)
+        query += " ORDER BY next_run_at, id LIMIT 1"
+
+        with self._lock, self._transaction():
+            row = self._conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                """
+                UPDATE clone_jobs
+                SET state = ?, attempts = attempts + 1, claimed_by = ?, claimed_at = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (RUNNING, worker_id, now, now, row[0]),
+            )
+
+        job = self._row_to_job(row)
+        job.state = RUNNING
+        job.attempts += 1
+        return job
+
+    def complete(self, job: CloneJob):
+        """
+        標記工作完成
+
+        Args:
+            job: 工作
+        """
+        now = self._clock()
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE clone_jobs SET state = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (DONE, now, job.id),
+            )
+        job.state = DONE
+
+    def fail(self, job: CloneJob, error: str) -> str:
+        """
+        標記工作失敗，未達最大嘗試次數時依指數退避重新排入
+
+        Args:
+            job: 工作
+            error: 錯誤訊息
+
+        Returns:
+            工作的新狀態 (pending 或 failed)
+        """
+        now = self._clock()
+        if job.attempts < job.max_attempts:
+            state = PENDING
+            next_run_at = now + self.backoff_seconds * (2 ** (job.attempts - 1))
+        else:
+            state = FAILED
+            next_run_at = now
+
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE clone_jobs SET state = ?, next_run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (state, next_run_at, error, now, job.id),
+            )
+
+        job.state = state
+        job.next_run_at = next_run_at
+        job.last_error = error
+        return state
+
+    def remove(self, project: str, iid: int) -> bool:
+        """
+        移除 MR 的工作（MR 已關閉、clone 已清除時）
+
+        移除後 MR 若重新出現，enqueue 會建立新的工作。
+
+        Args:
+            project: 專案路徑
+            iid: MR 的專案內編號
+
+        Returns:
+            是否有工作被移除
+        """
+        with self._lock, self._transaction():
+            cursor = self._conn.execute("DELETE FROM clone_jobs WHERE project = ? AND iid = ?", (project, iid))
+        return cursor.rowcount > 0
+
+    def recover_stale(self) -> int:
+        """
+        將中斷的 running 工作重新排入 pending
+
+        同一主機上 worker 行程已不存在的工作立即恢復；
+        其他工作則在超過 lease_timeout 後恢復。
+
+        Returns:
+            恢復的工作數
+        """
+        now = self._clock()
+        with self._lock, self._transaction():
+            rows = self._conn.execute(
+                "SELECT id, claimed_by, claimed_at FROM clone_jobs WHERE state = ?",
+                (RUNNING,),
+            ).fetchall()
+            stale = [
+                (PENDING, now, now, job_id) for job_id, claimed_by, claimed_at in rows
+                if claimed_at <= now - self.lease_timeout or worker_is_dead(claimed_by)
+            ]
+            self._conn.executemany(
+                "UPDATE clone_jobs SET state = ?, next_run_at = ?, claimed_by = NULL, updated_at = ? WHERE id = ?",
+                stale,
+            )
+            recovered = len(stale)
+
+        if recovered:
+            logger.info("恢復 %s 個中斷的 clone 工作", recovered)
+        return recovered
+
+    def purge_finished(self) -> int:
+        """
+        清除結束超過 retention 秒的 done / failed 工作
+
+        MR 是否需要重新 clone 由掃描差異比對判斷，清除完成紀錄不會造成重複 clone。
+
+        Returns:
+            清除的工作數
+        """
+        if not self.retention:
+            return 0
+        cutoff = self._clock() - self.retention
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                "DELETE FROM clone_jobs WHERE state IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, cutoff),
+            )
+            purged = cursor.rowcount
+
+        if purged:
+            logger.info("清除 %s 個已結束的 clone 工作", purged)
+        return purged
+
+    def counts(self) -> Dict[str, int]:
+        """
+        各狀態的工作數
+
+        Returns:
+            狀態 -> 數量
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM clone_jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self):
+        """關閉資料庫連線"""
+        with self._lock:
+            self._conn.close()
+
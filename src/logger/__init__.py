@@ -1,46 +1,65 @@
 """
 日誌系統模組
+
+日誌經由 QueueHandler 放入佇列，由背景的 QueueListener 執行緒寫到主控台與輪替檔案，
+呼叫端（包含平行 clone 的 worker 執行緒）不會因磁碟 I/O 而阻塞。
+匯入本模組不會建立任何檔案或目錄；呼叫 setup_logging() 後才開始輸出。
 """
 
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
+
+
+LOGGER_NAME = "gitlab_mr_reviewer"
+
+_listener: Optional[QueueListener] = None
 
 
 def setup_logging(log_level: str = "INFO", log_dir: str = "logs") -> logging.Logger:
     """
     設定應用日誌系統
-    
+
+    重複呼叫時會先停止前一次的背景寫入執行緒。
+
     Args:
         log_level: 日誌級別 (DEBUG, INFO, WARNING, ERROR)
         log_dir: 日誌目錄
-        
+
     Returns:
         配置後的 Logger 物件
     """
+    global _listener
+    level = getattr(logging, log_level.upper())
+
     # 建立日誌目錄
     log_path = Path(log_dir)
     log_path.mkdir(parents=True, exist_ok=True)
-    
+
     # 建立 logger
-    logger = logging.getLogger("gitlab_mr_reviewer")
-    logger.setLevel(getattr(logging, log_level.upper()))
-    
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    # 不再交給根 logger，避免其 handler 在呼叫端執行緒同步寫入
+    logger.propagate = False
+
     # 清除現有的 handlers
+    stop_logging()
     logger.handlers.clear()
-    
+
     # 建立格式化程式
     formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
-    
+
     # 控制檯輸出
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(getattr(logging, log_level.upper()))
+    console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
+
     # 檔案輸出（使用 RotatingFileHandler）
     log_file = log_path / "app.log"
     file_handler = RotatingFileHandler(
@@ -48,12 +67,31 @@ def setup_logging(log_level: str = "INFO", log_dir: str = "logs") -> logging.Log
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,
     )
-    file_handler.setLevel(getattr(logging, log_level.upper()))
+    file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+
+    # 呼叫端只放入無上限的佇列，實際寫入由背景執行緒處理
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
     return logger
 
 
-# 建立全域 logger 實例
-logger = setup_logging()
+def stop_logging():
+    """停止背景寫入執行緒，寫完佇列中剩餘的日誌並關閉檔案"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(stop_logging)
+
+
+# 全域 logger 實例；setup_logging() 之前沒有 handler，訊息交由 logging 的預設處理
+logger = logging.getLogger(LOGGER_NAME)
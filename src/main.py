@@ -3,17 +3,47 @@ GitLab MR Reviewer - 主 CLI 應用程式
 """
 
 import logging
+import queue
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Set
 
 import click
 
 from src.config import Config
+from src.coordination.lock import GLOBAL_LOCK, ScanLock, project_lock_name
+from src.coordination.shard import ShardCoordinator
+from src.daemon.scheduler import AdaptiveScheduler
 from src.gitlab_.client import GitLabClient
+from src.gitlab_.models import MRInfo
+from src.gitlab_.project_cache import ProjectCache
+from src.jobs.queue import JobQueue, default_worker_id
 from src.logger import setup_logging
-from src.scanner.mr_scanner import MRScanner
+from src.observability import metrics
+from src.observability.metrics import MetricsServer
+from src.observability.profiling import PROFILE_FORMATS, profiler
+from src.observability.tracing import summarize, tracer
+from src.pipeline.engine import ScanClonePipeline
+from src.pipeline.fair import FairPolicy
+from src.scanner.breaker import UNAUTHORIZED, ProjectBreaker
+from src.scanner.diff import CLOSED, FILTERED_OUT, METADATA_CHANGED, MREvent, diff_project, index_states
+from src.scanner.mr_scanner import MRScanner, ScanResult
+from src.scanner.snapshot import SNAPSHOT_FILE, ScanSnapshot
+from src.state.cache import CachedStateManager
+from src.state.history import summarize_scan_history
 from src.state.manager import StateManager
+from src.state.models import MRState, ScanRecord
+from src.webhook.server import MergeRequestEvent, WebhookServer
 from src.clone.manager import CloneManager
+from src.clone.prune import ClonePruner, PruneReport, find_stale_clones, tree_size
+from src.clone.quota import QuotaManager, QuotaReport
+from src.clone.trace2 import format_phases, git_trace2, merge_phases
+from src.clone.workspaces import Workspace, WorkspaceStore
+from src.utils.exceptions import GitLabError
 
 
 # 全域變數
@@ -22,12 +52,29 @@ gitlab_client: Optional[GitLabClient] = None
 mr_scanner: Optional[MRScanner] = None
 state_manager: Optional[StateManager] = None
 clone_manager: Optional[CloneManager] = None
+job_queue: Optional[JobQueue] = None
+shard_coordinator: Optional[ShardCoordinator] = None
+scan_lock: Optional[ScanLock] = None
+fair_policy: Optional[FairPolicy] = None
+project_breaker: Optional[ProjectBreaker] = None
+quota_manager: Optional[QuotaManager] = None
+snapshot_path: Optional[Path] = None
+metrics_path: Optional[Path] = None
 logger: Optional[logging.Logger] = None
 
+# 掃描鎖在同一行程內可重入，另以執行緒鎖（依鎖名稱）避免掃描與 webhook 同時持有同一個鎖、提前釋放對方的鎖
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
 
-def init_app():
-    """初始化應用程式"""
-    global config, gitlab_client, mr_scanner, state_manager, clone_manager, logger
+
+def init_app(offline: bool = False):
+    """
+    初始化應用程式
+    
+    Args:
+        offline: 不連線 GitLab（不建立 GitLabClient），只使用本機狀態與掃描快照
+    """
+    global config, gitlab_client, mr_scanner, state_manager, clone_manager, job_queue, shard_coordinator, scan_lock, fair_policy, project_breaker, quota_manager, snapshot_path, metrics_path, logger
     
     # 載入設定
     config = Config.from_env()
@@ -40,25 +87,714 @@ def init_app():
     
     logger.info("應用程式初始化開始")
     
+    if config.trace_file:
+        tracer.enable()
+        logger.info("階段追蹤已啟用，輸出至 %s (%s)", config.trace_file, config.trace_format)
+    
+    if config.git_trace2:
+        git_trace2.enable()
+        logger.info("已啟用 git trace2 階段耗時擷取")
+    
     # 初始化各個元件
-    gitlab_client = GitLabClient(
-        url=config.gitlab_url,
-        token=config.gitlab_token,
-        ssl_verify=config.gitlab_ssl_verify
+    state_manager = StateManager(
+        storage_type=config.storage_type,
+        db_path=config.db_path,
+        state_dir=config.state_dir,
     )
-    
-    state_manager = StateManager(db_path=config.db_path)
-    mr_scanner = MRScanner(gitlab_client, state_manager)
-    clone_manager = CloneManager(config=config, state_manager=state_manager)
+    if config.state_cache_enabled:
+        state_manager = CachedStateManager(
+            state_manager,
+            flush_interval=config.state_cache_flush_interval,
+            max_dirty=config.state_cache_max_dirty,
+            flush_policy=config.state_cache_flush_policy,
+        )
+    project_cache = None
+    if config.project_cache_ttl > 0:
+        project_cache = ProjectCache(state_manager, ttl=config.project_cache_ttl)
+    gitlab_client = None
+    if not offline:
+        gitlab_client = GitLabClient(
+            url=config.gitlab_url,
+            token=config.gitlab_token,
+            ssl_verify=config.gitlab_ssl_verify,
+            project_cache=project_cache,
+        )
+    mr_scanner = MRScanner(gitlab_client, state_manager, filter_rules=config.mr_filters)
+    workspaces = WorkspaceStore(state_manager)
+    clone_manager = CloneManager(config=config, state_manager=state_manager, workspaces=workspaces)
+    job_queue = JobQueue(
+        db_path=config.db_path,
+        max_attempts=config.job_max_attempts,
+        backoff_seconds=config.job_backoff_seconds,
+        lease_timeout=config.job_lease_timeout,
+        retention=config.job_retention,
+    )
+    shard_coordinator = None
+    if config.shard_mode != "none":
+        shard_coordinator = ShardCoordinator(
+            db_path=config.db_path,
+            node_id=config.shard_node_id,
+            mode=config.shard_mode,
+            lease_ttl=config.shard_lease_ttl,
+            nodes=config.shard_nodes,
+        )
+    scan_lock = None
+    if config.scan_lock != "none":
+        scan_lock = ScanLock(db_path=config.db_path, stale_after=config.scan_lock_stale)
+    fair_policy = FairPolicy(
+        weights=config.project_weights,
+        recent_window=config.fair_recent_window,
+        recent_boost=config.fair_recent_boost,
+    )
+    project_breaker = None
+    if config.breaker_threshold > 0:
+        project_breaker = ProjectBreaker(
+            state_manager,
+            threshold=config.breaker_threshold,
+            base_delay=config.breaker_base_delay,
+            max_delay=config.breaker_max_delay,
+        )
+    quota_manager = None
+    if config.reviews_quota > 0:
+        quota_manager = QuotaManager(
+            workspaces,
+            ClonePruner(config.reviews_path, workers=config.prune_workers),
+            quota=config.reviews_quota,
+            min_idle=config.quota_min_idle,
+        )
+    snapshot_path = Path(config.state_dir) / SNAPSHOT_FILE
+    metrics_path = Path(config.metrics_textfile) if config.metrics_textfile else None
+    metrics.registry.set_collector("queue", _collect_queue_metrics)
+    metrics.registry.set_collector("reviews", _collect_reviews_metrics)
     
     logger.info("應用程式初始化完成")
 
 
+@dataclass
+class CloneStats:
+    """單一專案 clone 階段的統計"""
+    created: int = 0
+    refreshed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    deferred: int = 0
+    error_class: Optional[str] = None
+    git_phases: Dict[str, float] = field(default_factory=dict)  # git trace2 階段 -> 累計秒數
+    
+    def merge(self, other: "CloneStats"):
+        """累加另一份統計"""
+        self.created += other.created
+        self.refreshed += other.refreshed
+        self.skipped += other.skipped
+        self.failed += other.failed
+        self.deferred += other.deferred
+        self.error_class = self.error_class or other.error_class
+        merge_phases(self.git_phases, other.git_phases)
+
+
+def _mr_still_open(mr: MRInfo, listed: Optional[Set[int]] = None) -> bool:
+    """
+    確認佇列中的 MR 仍為開啟狀態
+    
+    本次掃描列出的 MR 不再查詢；查詢失敗時視為開啟，交由 clone 本身處理錯誤。
+    
+    Args:
+        mr: 工作的 MR
+        listed: 本次掃描列出的 iid
+    """
+    if listed is not None and mr.iid in listed:
+        return True
+    try:
+        return gitlab_client.get_mr_details(mr.project_name, mr.iid).state == "opened"
+    except Exception as e:
+        logger.warning("無法確認 %s#%s 是否仍開啟: %s", mr.project_name, mr.iid, e)
+        return True
+
+
+def _process_jobs(
+    worker_id: str,
+    stats: CloneStats,
+    project: Optional[str] = None,
+    iid: Optional[int] = None,
+    is_open: Optional[Callable[[MRInfo], bool]] = None,
+):
+    """
+    持續從佇列取得 clone 工作並執行，直到沒有可執行的工作
+    
+    Args:
+        worker_id: worker 識別
+        stats: 累計的 clone 統計
+        project: 僅處理指定專案的工作，None 表示全部
+        iid: 僅處理指定 MR 的工作（需同時指定 project）
+        is_open: 執行前確認 MR 仍開啟的函數，不再開啟的工作直接移除；None 表示不確認
+    """
+    while True:
+        job = job_queue.claim(worker_id, project=project, iid=iid)
+        if job is None:
+            return
+        
+        mr = job.mr_info
+        if is_open is not None and not is_open(mr):
+            job_queue.remove(mr.project_name, mr.iid)
+            click.echo(f"- {mr.project_name}#{mr.iid}: MR 已不是開啟狀態，移除 clone 工作")
+            logger.info("MR %s#%s 已不是開啟狀態，移除 clone 工作", mr.project_name, mr.iid)
+            stats.skipped += 1
+            continue
+        
+        existed = clone_manager.get_clone_path(mr.project_name, mr.iid) is not None
+        try:
+            with tracer.span("clone.mr", project=mr.project_name, iid=mr.iid, refresh=existed), \
+                    git_trace2.collect() as phases:
+                try:
+                    clone_path = clone_manager.create_clone(mr)
+                finally:
+                    merge_phases(stats.git_phases, phases)
+            job_queue.complete(job)
+            click.echo(f"✓ {mr.project_name}#{mr.iid}: {clone_path}")
+            logger.info("建立 clone: %s", clone_path)
+            if existed:
+                stats.refreshed += 1
+            else:
+                stats.created += 1
+            metrics.clone_jobs.inc(result="refreshed" if existed else "created")
+        except Exception as e:
+            state = job_queue.fail(job, str(e))
+            click.echo(f"✗ {mr.project_name}#{mr.iid}: {e}")
+            logger.error("建立 clone 失敗 (第 %s 次, %s): %s", job.attempts, state, e)
+            stats.failed += 1
+            metrics.clone_jobs.inc(result="failed")
+            stats.error_class = stats.error_class or type(e).__name__
+
+
+def _acquire_scan_locks(projects: List[str]) -> Optional[Dict[str, float]]:
+    """
+    依 SCAN_LOCK 設定取得整次執行的掃描鎖
+    
+    global 模式最多等待 SCAN_LOCK_WAIT 秒取得整體鎖；project 模式不在此上鎖，
+    而是在掃描各專案之前才取得該專案的鎖（見 _acquire_project_lock），處理完即釋放。
+    
+    Args:
+        projects: 本次要處理的專案
+    
+    Returns:
+        專案 -> 等待秒數（project 模式為空）；整體鎖由其他行程持有時回傳 None
+    """
+    if config.scan_lock != "global":
+        return {}
+    waited = _acquire_lock(GLOBAL_LOCK)
+    if waited is None:
+        return None
+    return {project: waited for project in projects}
+
+
+def _acquire_lock(name: str) -> Optional[float]:
+    """
+    取得掃描鎖，最多等待 SCAN_LOCK_WAIT 秒
+    
+    先取得本行程內同名的執行緒鎖，再取得跨行程的掃描鎖。
+    
+    Args:
+        name: 鎖名稱
+    
+    Returns:
+        等待秒數；鎖由其他行程或本行程的其他執行緒持有時回傳 None
+    """
+    with _local_locks_guard:
+        local = _local_locks.setdefault(name, threading.Lock())
+    local_wait = 0.0
+    if not local.acquire(blocking=False):
+        started = time.monotonic()
+        if not local.acquire(timeout=config.scan_lock_wait):
+            return None
+        local_wait = time.monotonic() - started
+    
+    try:
+        waited = scan_lock.acquire(name, wait=config.scan_lock_wait)
+    except Exception:
+        local.release()
+        raise
+    if waited is None:
+        local.release()
+        return None
+    return local_wait + waited
+
+
+def _release_lock(name: str):
+    """釋放 _acquire_lock 取得的鎖"""
+    try:
+        scan_lock.release(name)
+    finally:
+        _local_locks[name].release()
+
+
+def _project_locking() -> bool:
+    """是否逐專案上鎖（SCAN_LOCK=project）"""
+    return scan_lock is not None and config.scan_lock == "project"
+
+
+def _acquire_project_lock(project: str) -> Optional[float]:
+    """
+    取得單一專案的掃描鎖，最多等待 SCAN_LOCK_WAIT 秒
+    
+    Args:
+        project: 專案路徑
+    
+    Returns:
+        等待秒數；鎖由其他行程或本行程的其他執行緒持有時回傳 None
+    """
+    name = project_lock_name(project)
+    waited = _acquire_lock(name)
+    if waited is None:
+        holder = scan_lock.holder(name)
+        if holder == scan_lock.owner:
+            click.echo(f"- {project}: 正由本行程的其他工作處理，略過")
+            logger.info("專案 %s 正由本行程的其他工作處理，略過", project)
+        else:
+            click.echo(f"- {project}: 正由其他行程（{holder}）處理，略過")
+            logger.info("專案 %s 的掃描鎖由 %s 持有，略過", project, holder)
+    return waited
+
+
+def _release_project_lock(project: str):
+    """釋放 _acquire_project_lock 取得的專案鎖"""
+    _release_lock(project_lock_name(project))
+
+
+def _prioritize_projects(projects: List[str]) -> List[str]:
+    """
+    依上次掃描時間排序專案，最久未掃描（含前次因時間預算延後）的專案優先
+    
+    Args:
+        projects: 專案列表
+    
+    Returns:
+        排序後的專案列表；讀取掃描紀錄失敗時維持原順序
+    """
+    try:
+        last_scanned = {}
+        for record in state_manager.get_scan_history():
+            last_scanned[record.project] = record.scan_time
+    except Exception as e:
+        logger.warning("讀取掃描紀錄失敗，維持專案順序: %s", e)
+        return list(projects)
+    return sorted(projects, key=lambda project: last_scanned.get(project, ""))
+
+
+def _load_known_states() -> Optional[Dict[str, Dict[int, MRState]]]:
+    """
+    載入所有 MR 狀態並依 (專案, iid) 建立索引
+    
+    Returns:
+        專案 -> iid -> MRState；讀取失敗時回傳 None（不做差異比對，所有 MR 交由 clone 佇列去重）
+    """
+    try:
+        return index_states(state_manager.get_all_mr_states())
+    except Exception as e:
+        logger.warning("讀取 MR 狀態失敗，略過差異比對: %s", e)
+        return None
+
+
+def _mr_state_lookup(project: str):
+    """
+    向 GitLab 查詢專案中 MR 目前狀態的函數
+    
+    查詢失敗時回傳 None，呼叫端不應據此移除任何 clone。
+    """
+    def lookup(iid: int) -> Optional[str]:
+        try:
+            return gitlab_client.get_mr_details(project, iid).state
+        except Exception as e:
+            logger.warning("無法取得 %s#%s 的狀態，保留 clone: %s", project, iid, e)
+            return None
+    return lookup
+
+
+def _apply_scan_diff(project: str, mrs: List[MRInfo], previous: Dict[int, MRState]) -> Dict[int, MREvent]:
+    """
+    比對專案的掃描結果與保存的狀態，處理不需要 clone 的事件
+    
+    - closed: 移除 clone 與其 clone 工作（僅在 AUTO_CLEAN_MERGED 啟用時查詢狀態，
+      GitLab 確認已關閉或合併才會產生）
+    - filtered_out: 只是不在篩選後的掃描結果中，保留 clone
+    - metadata_changed: 只更新 clone 元資料；clone 已不存在時改為重新 clone
+    
+    Args:
+        project: 專案路徑
+        mrs: 本次成功掃描取得的 MR
+        previous: 該專案 iid -> 保存的狀態
+    
+    Returns:
+        iid -> 需要 clone 的事件（opened / head_moved）
+    """
+    to_clone: Dict[int, MREvent] = {}
+    lookup = _mr_state_lookup(project) if config.auto_clean_merged else None
+    for event in diff_project(project, mrs, previous, lookup):
+        if event.kind == CLOSED:
+            if clone_manager.delete_closed_clone(event.previous):
+                click.echo(f"✓ {project}#{event.iid}: 已關閉或合併，移除 clone")
+            # 移除完成紀錄，MR 重新開啟時才會再次建立 clone
+            if job_queue is not None:
+                job_queue.remove(project, event.iid)
+            continue
+        if event.kind == FILTERED_OUT:
+            logger.debug("%s#%s 不在本次掃描結果中，保留 clone", project, event.iid)
+            continue
+        if event.kind == METADATA_CHANGED and clone_manager.update_metadata(event.mr):
+            continue
+        to_clone[event.iid] = event
+    logger.debug("專案 %s 有 %s 個 MR 需要 clone", project, len(to_clone))
+    return to_clone
+
+
+def _scan_and_clone(
+    projects: List[str],
+    worker_id: str,
+    lock_waits: Dict[str, float],
+    exclude_wip: bool,
+    exclude_draft: bool,
+    budget: float = 0.0,
+) -> Dict[str, bool]:
+    """
+    以管線掃描專案並建立 clone，逐專案寫入掃描統計
+    
+    掃描完一個專案就開始 clone 它的 MR，同時繼續掃描下一個專案。
+    設定時間預算時，超出預算的專案與 MR 延後到下一次執行：
+    延後的 MR 留在 clone 佇列 (pending)，延後的專案下次優先掃描。
+    
+    Args:
+        projects: 專案列表
+        worker_id: worker 識別
+        lock_waits: 專案 -> 取得掃描鎖所等待的秒數（project 模式於掃描各專案時填入）
+        exclude_wip: 排除 WIP MR
+        exclude_draft: 排除草稿 MR
+        budget: 時間預算秒數，0 表示不限制
+    
+    Returns:
+        專案 -> 是否有新的或更新的 MR（有延後工作的專案也視為有活動）
+    """
+    job_queue.purge_finished()
+    activity: Dict[str, bool] = {}
+    project_stats: Dict[str, CloneStats] = {}
+    stats_lock = threading.Lock()
+    # 專案 -> iid -> 需要 clone 的事件；未比對的專案由 clone 佇列依 updated_at 去重
+    known = _load_known_states()
+    to_clone: Dict[str, Dict[int, MREvent]] = {}
+    project_locking = _project_locking()
+    # token 失效 (401) 時其餘專案也不會成功，停止掃描
+    unauthorized = threading.Event()
+    
+    def scan_project(project: str) -> Optional[ScanResult]:
+        if not project_locking:
+            return scan_unlocked(project)
+        # 掃描前才取得專案鎖，專案處理完 (project_done) 即釋放
+        waited = _acquire_project_lock(project)
+        if waited is None:
+            return None
+        with stats_lock:
+            lock_waits[project] = waited
+        try:
+            result = scan_unlocked(project)
+        except Exception:
+            _release_project_lock(project)
+            raise
+        if result is None:
+            _release_project_lock(project)
+        return result
+    
+    def scan_unlocked(project: str) -> Optional[ScanResult]:
+        if unauthorized.is_set():
+            return None
+        # 持續失敗的專案在冷卻期間不掃描
+        blocked = project_breaker.blocking(project) if project_breaker is not None else None
+        if blocked is not None:
+            until = datetime.fromtimestamp(blocked.skip_until).isoformat(timespec="seconds")
+            click.echo(f"- {project}: 連續失敗 {blocked.failures} 次，暫停掃描至 {until}")
+            logger.info("斷路器開啟，略過專案 %s: %s", project, blocked.error)
+            return None
+        
+        result = mr_scanner.scan(projects=[project], exclude_wip=exclude_wip, exclude_draft=exclude_draft)[0]
+        if result.error_status == UNAUTHORIZED:
+            unauthorized.set()
+            click.echo(f"✗ {project}: GitLab 驗證失敗 (401)，停止掃描其餘專案")
+            logger.error("掃描 %s 時 GitLab 驗證失敗，停止掃描: %s", project, result.error)
+            return None
+        if project_breaker is not None:
+            project_breaker.record(result)
+        if scan_lock is not None:
+            scan_lock.refresh()
+        with stats_lock:
+            activity[project] = False
+            project_stats[project] = CloneStats()
+        
+        if result.error:
+            click.echo(f"✗ {project}: {result.error}")
+            logger.error("掃描 %s 時出錯: %s", project, result.error)
+            return result
+        
+        # 掃描期間租約可能已過期並被其他節點接手
+        if shard_coordinator is not None and not shard_coordinator.owns(project):
+            click.echo(f"- {project}: 已由其他節點負責，略過")
+            logger.warning("專案 %s 已不屬於本節點，略過 clone", project)
+            return None
+        
+        if known is not None:
+            events = _apply_scan_diff(project, result.merge_requests, known.get(project, {}))
+            with stats_lock:
+                to_clone[project] = events
+        return result
+    
+    def process_mr(project: str, mr: MRInfo):
+        stats = CloneStats()
+        # 未改變的 MR 不進入 clone 佇列；同一版本已完成的 MR 也不再重新 clone
+        events = to_clone.get(project)
+        queued = (events is None or mr.iid in events) and job_queue.enqueue(mr)
+        if queued:
+            # 只處理這個 MR 的工作，讓公平排程決定下一個處理的專案
+            _process_jobs(worker_id, stats, project=project, iid=mr.iid)
+        else:
+            stats.skipped += 1
+            metrics.mrs_skipped_unchanged.inc()
+        with stats_lock:
+            activity[project] = activity[project] or queued
+            project_stats[project].merge(stats)
+    
+    def project_done(result: ScanResult, clone_seconds: float):
+        try:
+            finish_project(result, clone_seconds)
+        finally:
+            if project_locking:
+                _release_project_lock(result.project)
+    
+    def finish_project(result: ScanResult, clone_seconds: float):
+        stats = project_stats[result.project]
+        if result.deferred_mrs:
+            # 記錄延後的 MR，下次掃描或 scan --resume 時處理
+            for mr in result.deferred_mrs:
+                job_queue.enqueue(mr)
+            stats.deferred = len(result.deferred_mrs)
+            with stats_lock:
+                activity[result.project] = True
+        if result.error:
+            clone_seconds = 0.0
+        elif not pipeline.over_budget():
+            # 處理本次掃描以外仍待執行的工作（例如退避重試）；不在本次列表中的 MR 先確認仍開啟
+            listed = {mr.iid for mr in result.listed}
+            listed.update(mr.iid for mr in result.merge_requests)
+            started = time.perf_counter()
+            _process_jobs(
+                worker_id, stats, project=result.project,
+                is_open=lambda mr: _mr_still_open(mr, listed),
+            )
+            clone_seconds += time.perf_counter() - started
+        _record_project_scan(result, stats, clone_seconds, lock_waits.get(result.project, 0.0))
+        # 專案邊界：依快取策略寫回狀態
+        state_manager.checkpoint()
+    
+    pipeline = ScanClonePipeline(
+        scan_project,
+        process_mr,
+        project_done,
+        workers=config.pipeline_workers,
+        scanners=config.pipeline_scanners,
+        queue_size=config.pipeline_queue_size,
+        policy=fair_policy,
+    )
+    if budget:
+        projects = _prioritize_projects(projects)
+    scan_results = pipeline.run(projects, budget=budget or None)
+    if unauthorized.is_set():
+        raise GitLabError("GitLab 驗證失敗 (401)，請確認 GITLAB_TOKEN 是否有效")
+    
+    total_mrs = sum(len(result.merge_requests) for result in scan_results)
+    logger.info("掃描完成，發現 %s 個 MR", total_mrs)
+    if pipeline.first_clone_latency is not None:
+        logger.info("第一個 MR 於開始後 %.2f 秒進入 clone", pipeline.first_clone_latency)
+    
+    deferred_projects = [result.project for result in scan_results if result.deferred]
+    deferred_mrs = [mr for result in scan_results for mr in result.deferred_mrs]
+    if deferred_projects or deferred_mrs:
+        click.echo(
+            f"- 超出時間預算 {budget:.0f} 秒：延後 {len(deferred_projects)} 個專案、"
+            f"{len(deferred_mrs)} 個 MR 到下一次執行"
+        )
+        for result in scan_results:
+            if result.deferred or result.deferred_mrs:
+                iids = ", ".join(f"#{mr.iid}" for mr in result.deferred_mrs)
+                logger.info("延後 %s %s: %s", result.project, iids, result.deferred_reason)
+        # 延後的專案盡快再輪詢
+        for project in deferred_projects:
+            activity[project] = True
+    
+    _save_snapshot(scan_results)
+    if quota_manager is not None:
+        _enforce_quota()
+    return activity
+
+
+def _save_snapshot(scan_results: List[ScanResult]):
+    """將本次掃描列出的 MR 併入掃描快照（失敗的專案保留上一次的內容）"""
+    if snapshot_path is None:
+        return
+    try:
+        snapshot = ScanSnapshot.load(snapshot_path)
+        if snapshot.update(scan_results):
+            snapshot.save()
+    except Exception as e:
+        # 快照只供離線查詢，寫入失敗不影響掃描流程
+        logger.warning("寫入掃描快照失敗: %s", e)
+
+
+def _load_snapshot() -> ScanSnapshot:
+    """讀取掃描快照；沒有設定路徑時回傳空的快照"""
+    return ScanSnapshot.load(snapshot_path) if snapshot_path is not None else ScanSnapshot(Path(SNAPSHOT_FILE))
+
+
+def _format_age(timestamp: float) -> str:
+    """顯示距今多久"""
+    seconds = max(time.time() - timestamp, 0)
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} 分鐘前"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} 小時前"
+    return f"{seconds / 86400:.1f} 天前"
+
+
+def _enforce_quota() -> Optional[QuotaReport]:
+    """
+    clone 用量超過配額時淘汰最久未存取的 clone
+    
+    Returns:
+        配額檢查結果；檢查失敗時回傳 None（不影響掃描流程）
+    """
+    try:
+        report = quota_manager.enforce()
+    except Exception as e:
+        logger.warning("配額檢查失敗: %s", e)
+        return None
+    if report.evicted:
+        click.echo(
+            f"- 超過配額 {_format_size(report.quota)}：淘汰 {len(report.evicted)} 個最久未使用的 clone，"
+            f"釋放 {_format_size(report.bytes_reclaimed)}"
+        )
+    if report.usage > report.quota:
+        click.echo(f"- clone 用量 {_format_size(report.usage)} 仍超過配額 {_format_size(report.quota)}")
+    return report
+
+
+def _export_trace():
+    """將收集的 span 寫入 TRACE_FILE，並記錄累計耗時最多的階段"""
+    if not tracer.enabled:
+        return
+    spans = tracer.spans()
+    try:
+        written = tracer.export(Path(config.trace_file), config.trace_format)
+    except Exception as e:
+        logger.warning("寫入追蹤檔失敗: %s", e)
+        return
+    logger.info("寫入 %s 個 span 到 %s", written, config.trace_file)
+    for name, count, total in summarize(spans)[:10]:
+        logger.info("  %s: %s 次，共 %.2f 秒", name, count, total)
+
+
+def _collect_queue_metrics():
+    """以 clone 佇列各狀態的工作數更新 gauge"""
+    if job_queue is None:
+        return
+    counts = job_queue.counts()
+    metrics.queue_jobs.clear()
+    for state, count in counts.items():
+        metrics.queue_jobs.set(count, state=state)
+
+
+def _collect_reviews_metrics():
+    """以 clone 紀錄更新磁碟用量 gauge"""
+    if clone_manager is None or clone_manager.workspaces is None:
+        return
+    workspaces = clone_manager.workspaces.all()
+    metrics.reviews_bytes.set(sum(workspace.size for workspace in workspaces))
+    metrics.reviews_clones.set(len(workspaces))
+    metrics.reviews_quota_bytes.set(getattr(config, "reviews_quota", 0))
+
+
+def _write_metrics():
+    """設定 METRICS_TEXTFILE 時寫入目前的指標"""
+    if metrics_path is None:
+        return
+    try:
+        metrics.registry.write_textfile(metrics_path)
+    except Exception as e:
+        logger.warning("寫入指標檔失敗: %s", e)
+
+
+def _format_size(size: int) -> str:
+    """以 MB / GB 顯示位元組數"""
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:.1f} GB"
+    return f"{size / 1024 ** 2:.1f} MB"
+
+
+def _record_project_scan(result: ScanResult, stats: CloneStats, clone_seconds: float, lock_wait: float = 0.0):
+    """將專案的掃描與 clone 統計寫入 scan_history"""
+    try:
+        state_manager.record_scan(ScanRecord(
+            project=result.project,
+            mr_count=len(result.merge_requests),
+            success=not result.error and not stats.failed,
+            duration_ms=(result.duration + clone_seconds) * 1000,
+            api_requests=result.api_requests,
+            bytes_transferred=result.bytes_transferred,
+            clones_created=stats.created,
+            clones_refreshed=stats.refreshed,
+            clones_skipped=stats.skipped,
+            clones_failed=stats.failed,
+            error_class=result.error_class or stats.error_class,
+            lock_wait_ms=lock_wait * 1000,
+            clones_deferred=stats.deferred,
+            git_negotiation_ms=stats.git_phases.get("negotiation", 0.0) * 1000,
+            git_pack_ms=stats.git_phases.get("pack", 0.0) * 1000,
+            git_checkout_ms=stats.git_phases.get("checkout", 0.0) * 1000,
+            git_total_ms=stats.git_phases.get("total", 0.0) * 1000,
+        ))
+    except Exception as e:
+        # 統計寫入失敗不影響掃描流程
+        logger.warning("寫入掃描紀錄失敗: %s: %s", result.project, e)
+
+
 @click.group()
 @click.version_option(version="1.0.0", prog_name="gitlab-mr-reviewer")
-def cli():
+@click.option(
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="以 cProfile 剖析整個命令並寫入此檔"
+)
+@click.option(
+    "--profile-format",
+    type=click.Choice(PROFILE_FORMATS),
+    default="pstats",
+    show_default=True,
+    help="剖析輸出格式：pstats 或 collapsed（flamegraph）"
+)
+@click.option(
+    "--trace-malloc",
+    is_flag=True,
+    default=False,
+    help="以 tracemalloc 記錄配置，結束時回報配置最多的位置與峰值 RSS"
+)
+@click.pass_context
+def cli(ctx: click.Context, profile_path: Optional[Path], profile_format: str, trace_malloc: bool):
     """GitLab MR Reviewer - 自動化 MR 審查工作流程"""
-    pass
+    if profile_path is None and not trace_malloc:
+        return
+    profiler.start(profile_path=profile_path, profile_format=profile_format, trace_malloc=trace_malloc)
+    ctx.call_on_close(_report_profile)
+
+
+def _report_profile():
+    """結束剖析並將結果輸出到 stderr"""
+    for line in profiler.stop():
+        click.echo(line, err=True)
 
 
 @cli.command()
@@ -77,27 +813,92 @@ def cli():
     is_flag=True,
     help="僅顯示操作而不實際執行"
 )
-def scan(exclude_wip: bool, exclude_draft: bool, dry_run: bool):
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="不重新掃描，僅繼續佇列中未完成的 clone 工作"
+)
+@click.option(
+    "--budget",
+    type=float,
+    default=None,
+    help="本次執行的時間預算（秒），超出的工作延後到下一次；預設使用 SCAN_BUDGET"
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    help="不連線 GitLab，以最近一次掃描的快照試執行（需搭配 --dry-run）"
+)
+def scan(exclude_wip: bool, exclude_draft: bool, dry_run: bool, resume: bool, budget: Optional[float], offline: bool):
     """掃描 GitLab 並建立 MR Clone"""
+    if offline and not dry_run:
+        raise click.UsageError("--offline 只能與 --dry-run 一起使用")
+    global_locked = False
     try:
+        if offline:
+            init_app(offline=True)
+            _dry_run_offline(exclude_wip, exclude_draft)
+            return
         init_app()
         
-        logger.info("開始掃描 MR")
-        logger.info(f"設定: exclude_wip={exclude_wip}, exclude_draft={exclude_draft}, dry_run={dry_run}")
+        worker_id = default_worker_id()
         
-        # 掃描 MR
-        scan_results = mr_scanner.scan(
-            projects=config.projects,
-            exclude_wip=exclude_wip,
-            exclude_draft=exclude_draft
-        )
+        # 多節點分片：只處理分配給本節點的專案
+        projects = config.projects
+        if shard_coordinator is not None:
+            projects = shard_coordinator.assign(projects)
+            shard_coordinator.start_heartbeat()
+            click.echo(f"節點 {config.shard_node_id} 負責 {len(projects)}/{len(config.projects)} 個專案")
         
-        # 統計結果
-        total_mrs = sum(len(result.merge_requests) for result in scan_results)
-        logger.info(f"掃描完成，發現 {total_mrs} 個 MR")
+        # 跨行程掃描鎖：避免重疊的排程執行同時寫入相同的 clone 目錄
+        lock_waits: Dict[str, float] = {}
+        if scan_lock is not None and not dry_run:
+            lock_waits = _acquire_scan_locks(projects)
+            if lock_waits is None:
+                holder = scan_lock.holder(GLOBAL_LOCK)
+                click.echo(f"- 另一個掃描正在執行（{holder}），略過本次執行")
+                logger.warning("掃描鎖由 %s 持有，略過本次執行", holder)
+                return
+            global_locked = config.scan_lock == "global"
+        
+        if resume:
+            job_queue.recover_stale()
+            job_queue.purge_finished()
+            stats = CloneStats()
+            project_locking = _project_locking()
+            if shard_coordinator is None and not project_locking:
+                _process_jobs(worker_id, stats, is_open=_mr_still_open)
+            else:
+                for project in projects:
+                    if project_locking and _acquire_project_lock(project) is None:
+                        continue
+                    try:
+                        _process_jobs(worker_id, stats, project=project, is_open=_mr_still_open)
+                    finally:
+                        if project_locking:
+                            _release_project_lock(project)
+            state_manager.flush()
+            click.echo(f"✓ 繼續未完成工作：建立 {stats.created}、更新 {stats.refreshed}、失敗 {stats.failed}")
+            logger.info("繼續未完成工作完成: %s", stats)
+            return
+        
+        logger.info("開始掃描 MR")
+        logger.info("設定: exclude_wip=%s, exclude_draft=%s, dry_run=%s", exclude_wip, exclude_draft, dry_run)
         
         if dry_run:
+            with profiler.phase("scan"):
+                scan_results = mr_scanner.scan(
+                    projects=projects,
+                    exclude_wip=exclude_wip,
+                    exclude_draft=exclude_draft
+                )
+            _save_snapshot(scan_results)
+            total_mrs = sum(len(result.merge_requests) for result in scan_results)
+            logger.info("掃描完成，發現 %s 個 MR", total_mrs)
             click.echo(f"✓ 試執行模式：將處理 {total_mrs} 個 MR")
+            server_rules, client_rules = mr_scanner.describe_filters(exclude_wip, exclude_draft)
+            click.echo(f"  篩選規則（伺服器端）: {'; '.join(server_rules) or '無'}")
+            click.echo(f"  篩選規則（用戶端）: {'; '.join(client_rules) or '無'}")
             for result in scan_results:
                 if result.error:
                     click.echo(f"  ✗ {result.project}: {result.error}")
@@ -106,63 +907,483 @@ def scan(exclude_wip: bool, exclude_draft: bool, dry_run: bool):
                         click.echo(f"  → {mr.project_name}#{mr.iid}: {mr.title}")
             return
         
-        # 建立 clone
-        for result in scan_results:
-            if result.error:
-                click.echo(f"✗ {result.project}: {result.error}")
-                logger.error(f"掃描 {result.project} 時出錯: {result.error}")
-                continue
-            
-            for mr in result.merge_requests:
-                try:
-                    clone_path = clone_manager.create_clone(mr)
-                    click.echo(f"✓ {mr.project_name}#{mr.iid}: {clone_path}")
-                    logger.info(f"建立 clone: {clone_path}")
-                except Exception as e:
-                    click.echo(f"✗ {mr.project_name}#{mr.iid}: {e}")
-                    logger.error(f"建立 clone 失敗: {e}")
+        # 建立 clone：先恢復前次中斷的工作，再以管線邊掃描邊建立 clone
+        job_queue.recover_stale()
+        with profiler.phase("scan_and_clone"):
+            _scan_and_clone(
+                projects, worker_id, lock_waits, exclude_wip, exclude_draft,
+                budget=budget if budget is not None else config.scan_budget,
+            )
         
+        with profiler.phase("flush"):
+            state_manager.flush()
         click.echo(f"✓ 掃描和 clone 建立完成")
         logger.info("掃描和 clone 建立完成")
         
     except Exception as e:
         click.echo(f"✗ 錯誤: {e}", err=True)
         if logger:
-            logger.error(f"掃描失敗: {e}")
+            logger.error("掃描失敗: %s", e)
+        exit(1)
+    finally:
+        _export_trace()
+        _write_metrics()
+        if shard_coordinator is not None:
+            shard_coordinator.close()
+        if global_locked:
+            _release_lock(GLOBAL_LOCK)
+        if scan_lock is not None:
+            scan_lock.close()
+
+
+def _dry_run_offline(exclude_wip: bool, exclude_draft: bool):
+    """以掃描快照試執行：套用篩選規則，不發出任何 API 請求"""
+    snapshot = _load_snapshot()
+    if not snapshot.projects:
+        click.echo("✗ 沒有掃描快照，請先執行一次 scan（或 scan --dry-run）", err=True)
+        exit(1)
+    
+    logger.info("離線試執行，快照: %s", snapshot_path)
+    server_rules, client_rules = mr_scanner.describe_filters(exclude_wip, exclude_draft)
+    results = []
+    skipped: List[str] = []
+    for project in config.projects:
+        entry = snapshot.projects.get(project)
+        if entry is None:
+            results.append((project, None, []))
+            continue
+        mrs, skipped = mr_scanner.filter_offline(entry.merge_requests, exclude_wip, exclude_draft)
+        results.append((project, entry.scanned_at, mrs))
+    
+    total_mrs = sum(len(mrs) for _, _, mrs in results)
+    click.echo(f"✓ 試執行模式（離線，快照 {_format_age(snapshot.oldest())}）：將處理 {total_mrs} 個 MR")
+    click.echo(f"  篩選規則（伺服器端）: {'; '.join(server_rules) or '無'}")
+    click.echo(f"  篩選規則（用戶端）: {'; '.join(client_rules) or '無'}")
+    if skipped:
+        click.echo(f"  離線無法評估，已略過: {'; '.join(skipped)}")
+    for project, scanned_at, mrs in results:
+        if scanned_at is None:
+            click.echo(f"  ? {project}: 快照中沒有此專案")
+            continue
+        for mr in mrs:
+            click.echo(f"  → {mr.project_name}#{mr.iid}: {mr.title}")
+    logger.info("離線試執行完成，%s 個 MR", total_mrs)
+
+
+def _serve_cycle(scheduler: AdaptiveScheduler, worker_id: str, exclude_wip: bool, exclude_draft: bool):
+    """
+    處理一輪已到期的專案並排定下一次輪詢
+    
+    Args:
+        scheduler: 自適應輪詢排程器
+        worker_id: worker 識別
+        exclude_wip: 排除 WIP MR
+        exclude_draft: 排除草稿 MR
+    """
+    due = scheduler.due()
+    if not due:
+        return
+    
+    projects = due
+    if shard_coordinator is not None:
+        assigned = set(shard_coordinator.assign(config.projects))
+        projects = [project for project in due if project in assigned]
+    
+    lock_waits: Dict[str, float] = {}
+    global_locked = False
+    if scan_lock is not None and projects:
+        waits = _acquire_scan_locks(projects)
+        if waits is None:
+            logger.info("掃描鎖由 %s 持有，略過本輪", scan_lock.holder(GLOBAL_LOCK))
+            projects = []
+        else:
+            lock_waits = waits
+            global_locked = config.scan_lock == "global"
+    
+    activity = {}
+    try:
+        if projects:
+            with profiler.phase("serve_cycle"):
+                activity = _scan_and_clone(
+                    projects, worker_id, lock_waits, exclude_wip, exclude_draft, budget=config.scan_budget,
+                )
+    finally:
+        # project 模式的專案鎖已逐一釋放；只釋放本輪取得的整體鎖，不影響 webhook 持有的鎖
+        if global_locked:
+            _release_lock(GLOBAL_LOCK)
+        _export_trace()
+        _write_metrics()
+        # 未處理（非本節點、被鎖住或失敗）的專案視為無活動，逐步拉長間隔
+        for project in due:
+            scheduler.record(project, activity.get(project, False))
+    
+    active = [project for project, is_active in activity.items() if is_active]
+    logger.info("輪詢 %s/%s 個到期專案，%s 個有新的或更新的 MR", len(projects), len(due), len(active))
+
+
+def _serve_loop(scheduler: AdaptiveScheduler, stop: threading.Event, worker_id: str, exclude_wip: bool, exclude_draft: bool):
+    """
+    常駐輪詢迴圈，直到 stop 被設定
+    
+    單輪失敗只記錄錯誤，不會中止服務。
+    """
+    while not stop.is_set():
+        try:
+            _serve_cycle(scheduler, worker_id, exclude_wip, exclude_draft)
+        except Exception as e:
+            click.echo(f"✗ 輪詢失敗: {e}", err=True)
+            logger.error("輪詢失敗: %s", e)
+        stop.wait(scheduler.seconds_until_next())
+
+
+def _reconcile(projects: List[str], dry_run: bool = False, include_orphans: bool = False) -> PruneReport:
+    """
+    比對開啟中的 MR、保存的狀態與本地 clone，移除已關閉或已合併 MR 的 clone
+    
+    先列出本地 clone 再向 GitLab 取得開啟中的 MR，比對期間新建立的 clone 不會被誤刪。
+    無法取得 MR 列表的專案不清理。
+    
+    Args:
+        projects: 要比對的專案
+        dry_run: 只列出將移除的 clone
+        include_orphans: 一併移除不在專案清單中的專案的 clone
+    
+    Returns:
+        清理結果
+    """
+    if clone_manager.workspaces is not None:
+        # 以實際目錄校正索引，手動複製或刪除的 clone 也納入比對
+        clone_manager.rebuild_index()
+    clones = clone_manager.list_clones()
+    open_iids: Dict[str, Set[int]] = {}
+    for project in projects:
+        try:
+            open_iids[project] = {mr.iid for mr in gitlab_client.get_merge_requests(project)}
+        except Exception as e:
+            click.echo(f"- {project}: 無法取得開啟中的 MR，略過: {e}")
+            logger.warning("無法取得 %s 的 MR 列表，略過清理: %s", project, e)
+    if include_orphans:
+        for project in clones:
+            if project not in config.projects:
+                open_iids[project] = set()
+    
+    stale = find_stale_clones(clones, open_iids)
+    pruner = ClonePruner(config.reviews_path, workers=config.prune_workers)
+    if dry_run:
+        report = PruneReport()
+        for project, iid in stale:
+            size = tree_size(pruner.clone_path(project, iid))
+            click.echo(f"  → {project}#{iid}: {size / 1024 / 1024:.1f} MB")
+            report.removed += 1
+            report.bytes_reclaimed += size
+        return report
+    
+    report = pruner.prune(stale)
+    if clone_manager.workspaces is not None:
+        for project, iid in stale:
+            if not pruner.clone_path(project, iid).exists():
+                clone_manager.workspaces.forget(project, iid)
+    
+    # 清除已關閉 MR 的狀態與 clone 工作（包含 clone 目錄早已不存在的）
+    known = _load_known_states() or {}
+    closed_states = [
+        state
+        for project, states in known.items() if project in open_iids
+        for iid, state in states.items() if iid not in open_iids[project]
+    ]
+    closed = [(state.mr_id, state.project_slug) for state in closed_states]
+    if closed:
+        state_manager.delete_mr_states(closed)
+    for project, iid in set(stale) | {(state.project_slug, state.iid) for state in closed_states}:
+        job_queue.remove(project, iid)
+    logger.info("清理 %s 個 clone、%s 筆狀態，釋放 %s 位元組", report.removed, len(closed), report.bytes_reclaimed)
+    return report
+
+
+def _prune_worker(stop: threading.Event, interval: float):
+    """serve 模式的定期清理，直到 stop 被設定"""
+    while not stop.wait(interval):
+        try:
+            projects = config.projects
+            if shard_coordinator is not None:
+                projects = shard_coordinator.assign(projects)
+            report = _reconcile(projects)
+            if report.removed:
+                click.echo(f"✓ 清理 {report.removed} 個 clone，釋放 {report.bytes_reclaimed / 1024 / 1024:.1f} MB")
+        except Exception as e:
+            click.echo(f"✗ 清理失敗: {e}", err=True)
+            logger.error("清理失敗: %s", e)
+
+
+def _handle_webhook_event(event: MergeRequestEvent, worker_id: str, exclude_wip: bool, exclude_draft: bool):
+    """
+    依 webhook 事件只重新取得並 clone 該 MR
+    
+    Args:
+        event: merge request webhook 事件
+        worker_id: worker 識別
+        exclude_wip: 排除 WIP MR
+        exclude_draft: 排除草稿 MR
+    """
+    if event.project not in config.projects:
+        logger.info("忽略未設定專案的 webhook: %s", event.project)
+        return
+    if shard_coordinator is not None and not shard_coordinator.owns(event.project):
+        logger.info("專案 %s 由其他節點負責，略過 webhook", event.project)
+        return
+    
+    mr = mr_scanner.refresh_mr(event.project, event.iid, exclude_wip=exclude_wip, exclude_draft=exclude_draft)
+    if mr is None or not job_queue.enqueue(mr):
+        return
+    # 與掃描使用相同粒度的鎖，避免和其他行程同時寫入相同的 clone 目錄
+    lock_name = None
+    if scan_lock is not None:
+        lock_name = project_lock_name(event.project) if _project_locking() else GLOBAL_LOCK
+        if _acquire_lock(lock_name) is None:
+            # 工作留在佇列中，由持有鎖的掃描或下一輪掃描處理
+            logger.info(
+                "掃描鎖 %s 由 %s 持有，webhook %s!%s 留待下一輪掃描",
+                lock_name, scan_lock.holder(lock_name), event.project, event.iid,
+            )
+            return
+    try:
+        _process_jobs(worker_id, CloneStats(), project=event.project, iid=event.iid)
+        state_manager.checkpoint()
+    finally:
+        if lock_name is not None:
+            _release_lock(lock_name)
+
+
+def _webhook_worker(events: "queue.Queue[MergeRequestEvent]", stop: threading.Event, worker_id: str, exclude_wip: bool, exclude_draft: bool):
+    """
+    依序處理 webhook 事件，直到 stop 被設定
+    
+    單一事件失敗只記錄錯誤；遺漏的更新仍會由輪詢補上。
+    """
+    while not stop.is_set():
+        try:
+            event = events.get(timeout=1)
+        except queue.Empty:
+            continue
+        try:
+            _handle_webhook_event(event, worker_id, exclude_wip, exclude_draft)
+        except Exception as e:
+            click.echo(f"✗ webhook {event.project}#{event.iid}: {e}", err=True)
+            logger.error("處理 webhook %s!%s 失敗: %s", event.project, event.iid, e)
+
+
+@cli.command()
+@click.option(
+    "--exclude-wip",
+    is_flag=True,
+    help="排除 WIP (Work In Progress) 的 MR"
+)
+@click.option(
+    "--exclude-draft",
+    is_flag=True,
+    help="排除草稿 (Draft) 的 MR"
+)
+def serve(exclude_wip: bool, exclude_draft: bool):
+    """常駐執行：依各專案的 MR 活動自適應輪詢並建立 MR Clone"""
+    stop = threading.Event()
+    previous_handlers = {}
+    webhook_server: Optional[WebhookServer] = None
+    webhook_thread: Optional[threading.Thread] = None
+    prune_thread: Optional[threading.Thread] = None
+    metrics_server: Optional[MetricsServer] = None
+    
+    def handle_signal(signum, frame):
+        click.echo("收到停止信號，完成目前的工作後結束")
+        if logger:
+            logger.info("收到信號 %s，完成目前的工作後結束", signum)
+        stop.set()
+    
+    try:
+        init_app()
+        
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous_handlers[signum] = signal.signal(signum, handle_signal)
+        
+        scheduler = AdaptiveScheduler(
+            config.projects,
+            min_interval=config.poll_min_interval,
+            max_interval=config.poll_max_interval,
+        )
+        if shard_coordinator is not None:
+            shard_coordinator.start_heartbeat()
+        
+        click.echo(
+            f"✓ 服務啟動：{len(config.projects)} 個專案，"
+            f"輪詢間隔 {config.poll_min_interval:.0f}-{config.poll_max_interval:.0f} 秒"
+        )
+        logger.info("常駐服務啟動")
+        
+        job_queue.recover_stale()
+        worker_id = default_worker_id()
+        
+        if config.webhook_enabled:
+            events: "queue.Queue[MergeRequestEvent]" = queue.Queue()
+            webhook_server = WebhookServer(
+                config.webhook_host,
+                config.webhook_port,
+                config.webhook_secret,
+                on_event=events.put,
+                path=config.webhook_path,
+            )
+            webhook_server.start()
+            webhook_thread = threading.Thread(
+                target=_webhook_worker,
+                args=(events, stop, worker_id, exclude_wip, exclude_draft),
+                name="webhook-worker",
+                daemon=True,
+            )
+            webhook_thread.start()
+            host, port = webhook_server.address
+            click.echo(f"✓ webhook 接收端: http://{host}:{port}{config.webhook_path}")
+        
+        if config.metrics_port:
+            metrics_server = MetricsServer(config.metrics_host, config.metrics_port, metrics.registry)
+            metrics_server.start()
+            host, port = metrics_server.address
+            click.echo(f"✓ 指標端點: http://{host}:{port}/metrics")
+        
+        if config.prune_interval > 0:
+            prune_thread = threading.Thread(
+                target=_prune_worker,
+                args=(stop, config.prune_interval),
+                name="prune-worker",
+                daemon=True,
+            )
+            prune_thread.start()
+        
+        _serve_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft)
+        
+        # 等待處理中的 webhook 事件完成後再寫回狀態
+        if webhook_server is not None:
+            webhook_server.stop()
+            webhook_thread.join()
+            webhook_server = webhook_thread = None
+        stop.set()
+        if prune_thread is not None:
+            prune_thread.join()
+            prune_thread = None
+        
+        state_manager.flush()
+        click.echo("✓ 服務已停止")
+        logger.info("常駐服務已停止")
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("常駐服務失敗: %s", e)
         exit(1)
+    finally:
+        stop.set()
+        if webhook_server is not None:
+            webhook_server.stop()
+        if webhook_thread is not None:
+            webhook_thread.join()
+        if prune_thread is not None:
+            prune_thread.join()
+        if metrics_server is not None:
+            metrics_server.stop()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        if shard_coordinator is not None:
+            shard_coordinator.close()
+        if scan_lock is not None:
+            scan_lock.close()
 
 
 @cli.command("list-clones")
-def list_clones():
+@click.option(
+    "--rebuild",
+    is_flag=True,
+    default=False,
+    help="先掃描 reviews 目錄校正 clone 索引"
+)
+@click.option(
+    "--long",
+    "long_format",
+    is_flag=True,
+    default=False,
+    help="顯示 MR 標題、分支、head commit、大小與 clone 耗時"
+)
+def list_clones(rebuild: bool, long_format: bool):
     """列出所有已建立的 MR Clone"""
     try:
-        init_app()
+        init_app(offline=True)
         
         logger.info("列出所有 clone")
         
+        if rebuild:
+            added, removed = clone_manager.rebuild_index()
+            click.echo(f"✓ 重建 clone 索引：新增 {added} 筆、清除 {removed} 筆")
+            state_manager.flush()
+        
         clones = clone_manager.list_clones()
         
         if not clones:
             click.echo("沒有 clone")
             return
         
-        for project, mr_iids in clones.items():
+        if long_format:
+            _echo_clone_manifest(clone_manager.workspaces.all(), _load_snapshot())
+            return
+        
+        for project, mr_iids in sorted(clones.items()):
             click.echo(f"\n{project}:")
             for mr_iid in sorted(mr_iids):
-                clone_path = clone_manager.get_clone_path(project, mr_iid)
-                if clone_path:
-                    click.echo(f"  #{mr_iid}: {clone_path}")
+                click.echo(f"  #{mr_iid}: {clone_manager.clone_path(project, mr_iid)}")
         
         click.echo(f"\n總計: {sum(len(iids) for iids in clones.values())} 個 clone")
-        logger.info(f"列出 {sum(len(iids) for iids in clones.values())} 個 clone")
+        logger.info("列出 %s 個 clone", sum(len(iids) for iids in clones.values()))
         
     except Exception as e:
         click.echo(f"✗ 錯誤: {e}", err=True)
         if logger:
-            logger.error(f"列出 clone 失敗: {e}")
+            logger.error("列出 clone 失敗: %s", e)
         exit(1)
 
 
+def _echo_clone_manifest(workspaces: List[Workspace], snapshot: Optional[ScanSnapshot] = None):
+    """
+    以表格列出 clone 清單（一次讀取所有紀錄）
+    
+    有掃描快照時，標示快照中已不存在（已合併或關閉）與有新 commit 的 MR。
+    """
+    listed: Dict[str, Dict[int, MRInfo]] = {}
+    if snapshot is not None:
+        for project, entry in snapshot.projects.items():
+            listed[project] = {mr.iid: mr for mr in entry.merge_requests}
+    by_project: Dict[str, List[Workspace]] = {}
+    for workspace in workspaces:
+        by_project.setdefault(workspace.project, []).append(workspace)
+    
+    for project in sorted(by_project):
+        click.echo(f"\n{project}:")
+        for workspace in sorted(by_project[project], key=lambda item: item.iid):
+            sha = workspace.head_sha[:8] or "-"
+            cloned_at = datetime.fromtimestamp(workspace.cloned_at).isoformat(timespec="seconds") if workspace.cloned_at else "-"
+            seconds = f"{sum(workspace.timings.values()):.1f}s" if workspace.timings else "-"
+            branch = f"{workspace.source_branch} → {workspace.target_branch}" if workspace.source_branch else "-"
+            note = ""
+            if project in listed:
+                mr = listed[project].get(workspace.iid)
+                if mr is None:
+                    note = "  [快照中已無此 MR]"
+                elif mr.sha and workspace.head_sha and mr.sha != workspace.head_sha:
+                    note = f"  [有新 commit {mr.sha[:8]}]"
+            click.echo(
+                f"  #{workspace.iid:<6} {sha:<8} {_format_size(workspace.size):>10} {cloned_at:<20} {seconds:>7}  "
+                f"{branch}  {workspace.title}{note}"
+            )
+    
+    click.echo(f"\n總計: {len(workspaces)} 個 clone，{_format_size(sum(workspace.size for workspace in workspaces))}")
+    if snapshot is not None and snapshot.projects:
+        click.echo(f"掃描快照: {_format_age(snapshot.oldest())}")
+
+
 @cli.command("clean-clone")
 @click.option(
     "--iid",
@@ -181,14 +1402,14 @@ def clean_clone(iid: int, project: str):
     try:
         init_app()
         
-        logger.info(f"刪除 clone: {project}#{iid}")
+        logger.info("刪除 clone: %s#%s", project, iid)
         
         # 查找對應的 clone
         clone_path = clone_manager.get_clone_path(project, iid)
         
         if not clone_path:
             click.echo(f"✗ Clone 不存在: {project}#{iid}")
-            logger.warning(f"Clone 不存在: {project}#{iid}")
+            logger.warning("Clone 不存在: %s#%s", project, iid)
             exit(1)
         
         # 建立臨時 MRInfo 以便刪除
@@ -213,16 +1434,278 @@ def clean_clone(iid: int, project: str):
         
         if clone_manager.delete_clone(mr_info):
             click.echo(f"✓ Clone 已刪除: {project}#{iid}")
-            logger.info(f"Clone 已刪除: {project}#{iid}")
+            logger.info("Clone 已刪除: %s#%s", project, iid)
         else:
             click.echo(f"✗ 刪除失敗: {project}#{iid}")
-            logger.error(f"刪除 clone 失敗: {project}#{iid}")
+            logger.error("刪除 clone 失敗: %s#%s", project, iid)
+            exit(1)
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("刪除 clone 失敗: %s", e)
+        exit(1)
+
+
+@cli.command()
+@click.option(
+    "--project",
+    type=str,
+    default=None,
+    help="僅顯示指定專案"
+)
+@click.option(
+    "--days",
+    type=int,
+    default=14,
+    show_default=True,
+    help="統計最近幾天的掃描紀錄"
+)
+@click.option(
+    "--window",
+    type=int,
+    default=50,
+    show_default=True,
+    help="每個專案納入計算的最近掃描次數"
+)
+def stats(project: Optional[str], days: int, window: int):
+    """顯示各專案的掃描耗時與 API 成本統計"""
+    try:
+        init_app(offline=True)
+        
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        records = state_manager.get_scan_history(project=project, since=since)
+        summaries = summarize_scan_history(records, window=window)
+        
+        if not summaries:
+            click.echo("沒有掃描紀錄")
+            return
+        
+        click.echo(
+            f"{'專案':<40} {'次數':>5} {'失敗':>5} {'p50(ms)':>10} {'p95(ms)':>10} "
+            f"{'p50請求':>8} {'p95請求':>8} {'平均KB':>9} {'p95鎖等待':>10} {'趨勢':>7}"
+        )
+        for summary in summaries:
+            trend = f"{summary.trend:+.0%}" if summary.trend is not None else "-"
+            click.echo(
+                f"{summary.project:<40} {summary.runs:>5} {summary.failures:>5} "
+                f"{summary.p50_ms:>10.0f} {summary.p95_ms:>10.0f} "
+                f"{summary.p50_requests:>8.0f} {summary.p95_requests:>8.0f} "
+                f"{summary.avg_bytes / 1024:>9.1f} {summary.p95_lock_wait_ms:>10.0f} {trend:>7}"
+            )
+            if summary.git_phases_ms:
+                click.echo(f"  git 每次 clone 平均: {format_phases({phase: ms / 1000 for phase, ms in summary.git_phases_ms.items()})}")
+            if summary.last_error_class:
+                click.echo(f"  最近錯誤: {summary.last_error_class}")
+        
+        logger.info("顯示 %s 個專案的掃描統計", len(summaries))
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("顯示掃描統計失敗: %s", e)
+        exit(1)
+
+
+@cli.command()
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="只列出將移除的 clone"
+)
+@click.option(
+    "--include-orphans",
+    is_flag=True,
+    default=False,
+    help="一併移除不在專案清單中的專案的 clone"
+)
+def prune(dry_run: bool, include_orphans: bool):
+    """移除已關閉或已合併 MR 的 clone 並回報釋放的空間"""
+    try:
+        init_app()
+        
+        projects = config.projects
+        if shard_coordinator is not None:
+            projects = shard_coordinator.assign(projects)
+        
+        with profiler.phase("reconcile"):
+            report = _reconcile(projects, dry_run=dry_run, include_orphans=include_orphans)
+        
+        size = f"{report.bytes_reclaimed / 1024 / 1024:.1f} MB"
+        if dry_run:
+            click.echo(f"✓ 試執行模式：將移除 {report.removed} 個 clone，釋放 {size}")
+        else:
+            click.echo(f"✓ 移除 {report.removed} 個 clone，釋放 {size}")
+            if report.failed:
+                click.echo(f"✗ {report.failed} 個 clone 無法移除，詳見日誌")
+        state_manager.flush()
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("清理 clone 失敗: %s", e)
+        exit(1)
+    finally:
+        if shard_coordinator is not None:
+            shard_coordinator.close()
+
+
+@cli.command()
+@click.option(
+    "--reset",
+    "reset_project",
+    type=str,
+    default=None,
+    help="關閉指定專案的斷路器，下次掃描立即重試"
+)
+def breakers(reset_project: Optional[str]):
+    """顯示因連續失敗而暫停掃描的專案"""
+    try:
+        init_app(offline=True)
+        
+        if project_breaker is None:
+            click.echo("斷路器未啟用（BREAKER_THRESHOLD=0）")
+            return
+        
+        if reset_project:
+            if project_breaker.reset(reset_project):
+                click.echo(f"✓ 已關閉 {reset_project} 的斷路器")
+                logger.info("手動關閉斷路器: %s", reset_project)
+            else:
+                click.echo(f"- {reset_project} 沒有斷路器紀錄")
+            return
+        
+        entries = project_breaker.tripped()
+        if not entries:
+            click.echo("沒有開啟中的斷路器")
+            return
+        
+        click.echo(f"{'專案':<40} {'狀態':<10} {'失敗':>5} {'HTTP':>5} {'暫停至':<20}")
+        for entry in entries:
+            until = datetime.fromtimestamp(entry.skip_until).isoformat(timespec="seconds")
+            status = entry.error_status or "-"
+            click.echo(f"{entry.project:<40} {entry.state:<10} {entry.failures:>5} {status:>5} {until:<20}")
+            if entry.error:
+                click.echo(f"  {entry.error_class or '錯誤'}: {entry.error}")
+        
+        logger.info("顯示 %s 個開啟中的斷路器", len(entries))
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("顯示斷路器失敗: %s", e)
+        exit(1)
+
+
+@cli.command()
+@click.option(
+    "--rescan",
+    is_flag=True,
+    default=False,
+    help="重新量測所有 clone 的大小（補上此功能啟用前建立的 clone）"
+)
+@click.option(
+    "--evict",
+    is_flag=True,
+    default=False,
+    help="立即淘汰超出配額的 clone"
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="只列出將淘汰的 clone"
+)
+def quota(rescan: bool, evict: bool, dry_run: bool):
+    """顯示 clone 的磁碟用量並依配額淘汰最久未使用的 clone"""
+    try:
+        init_app(offline=True)
+        
+        workspaces = clone_manager.workspaces
+        if rescan:
+            clone_manager.rebuild_index(measure_all=True)
+            click.echo(f"✓ 重新量測 {len(workspaces.all())} 個 clone")
+        
+        if evict or dry_run:
+            if quota_manager is None:
+                click.echo("未設定配額（REVIEWS_QUOTA=0）")
+                return
+            report = quota_manager.enforce(dry_run=dry_run)
+            for workspace in report.evicted:
+                click.echo(f"  → {workspace.key}: {_format_size(workspace.size)}")
+            if dry_run:
+                click.echo(f"✓ 試執行模式：將淘汰 {len(report.evicted)} 個 clone")
+            else:
+                click.echo(f"✓ 淘汰 {len(report.evicted)} 個 clone，釋放 {_format_size(report.bytes_reclaimed)}")
+                if report.failed:
+                    click.echo(f"✗ {report.failed} 個 clone 無法移除，詳見日誌")
+            state_manager.flush()
+            return
+        
+        entries = sorted(workspaces.all(), key=lambda workspace: workspace.last_access)
+        usage = sum(workspace.size for workspace in entries)
+        limit = _format_size(config.reviews_quota) if config.reviews_quota else "不限制"
+        click.echo(f"用量 {_format_size(usage)} / 配額 {limit}，{len(entries)} 個 clone")
+        if entries:
+            click.echo(f"{'MR':<50} {'大小':>10} {'最後存取':<20} {'釘選':<4}")
+        for workspace in entries:
+            accessed = datetime.fromtimestamp(workspace.last_access).isoformat(timespec="seconds")
+            pinned = "是" if workspace.pinned else ""
+            click.echo(f"{workspace.key:<50} {_format_size(workspace.size):>10} {accessed:<20} {pinned:<4}")
+        
+        state_manager.flush()
+        
+    except Exception as e:
+        click.echo(f"✗ 錯誤: {e}", err=True)
+        if logger:
+            logger.error("配額檢查失敗: %s", e)
+        exit(1)
+
+
+@cli.command()
+@click.option(
+    "--iid",
+    required=True,
+    type=int,
+    help="MR 編號"
+)
+@click.option(
+    "--project",
+    required=True,
+    type=str,
+    help="專案名稱"
+)
+@click.option(
+    "--unpin",
+    is_flag=True,
+    default=False,
+    help="取消釘選"
+)
+def pin(iid: int, project: str, unpin: bool):
+    """釘選 MR Clone，使其不因配額被淘汰"""
+    try:
+        init_app(offline=True)
+        
+        clone_path = clone_manager.get_clone_path(project, iid)
+        if clone_path is None:
+            click.echo(f"✗ Clone 不存在: {project}#{iid}")
             exit(1)
         
+        workspaces = clone_manager.workspaces
+        if workspaces.get(project, iid) is None:
+            # 索引中沒有的 clone（手動複製等）
+            clone_manager.rebuild_index()
+        workspaces.pin(project, iid, pinned=not unpin)
+        state_manager.flush()
+        
+        click.echo(f"✓ {'已取消釘選' if unpin else '已釘選'}: {project}#{iid}")
+        logger.info("%s clone: %s#%s", '取消釘選' if unpin else '釘選', project, iid)
+        
     except Exception as e:
         click.echo(f"✗ 錯誤: {e}", err=True)
         if logger:
-            logger.error(f"刪除 clone 失敗: {e}")
+            logger.error("釘選 clone 失敗: %s", e)
         exit(1)
 
 
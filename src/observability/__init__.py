@@ -0,0 +1,3 @@
+"""
+效能觀測模組
+"""
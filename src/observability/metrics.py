@@ -0,0 +1,366 @@
+"""
+Prometheus 指標
+
+以標準函式庫實作的最小指標註冊表（counter、gauge、histogram，支援標籤），
+輸出 Prometheus 文字格式（0.0.4），可：
+
+- 由 serve 模式的本機 HTTP 端點提供抓取（METRICS_PORT）
+- 在每次 scan 結束後寫入 node_exporter textfile collector 讀取的檔案（METRICS_TEXTFILE）
+
+佇列深度、磁碟用量等目前狀態的 gauge 不在事件發生時更新，而是由輸出前呼叫的
+collector 讀取（見 Registry.set_collector）。
+"""
+
+import bisect
+import math
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from src.logger import logger
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的標籤必須是 {self.labelnames}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """指標的樣本行"""
+
+
+class Counter(_Metric):
+    """只增不減的累計值"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """可增可減的目前值"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def clear(self):
+        """清除所有標籤組合（例如重新收集佇列各狀態的數量前）"""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    """依區間累計觀測值的分布"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 標籤 -> (各區間的觀測數, 總和, 總數)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0.0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return int(entry[1][1]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), list(totals))) for key, (counts, totals) in self._values.items())
+        lines = []
+        for key, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (math.inf,), counts):
+                cumulative += observed
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_format_value(count)}")
+        return lines
+
+
+class Registry:
+    """指標註冊表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指標已註冊: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def set_collector(self, name: str, collect: Optional[Callable[[], None]]):
+        """
+        設定輸出前呼叫的 collector（同名取代，None 表示移除）
+
+        Args:
+            name: collector 名稱
+            collect: 更新 gauge 的函數
+        """
+        with self._lock:
+            if collect is None:
+                self._collectors.pop(name, None)
+            else:
+                self._collectors[name] = collect
+
+    def render(self) -> str:
+        """
+        輸出 Prometheus 文字格式
+
+        collector 失敗時只記錄警告，其餘指標照常輸出。
+        """
+        with self._lock:
+            collectors = list(self._collectors.items())
+            metrics = list(self._metrics.values())
+        for name, collect in collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("收集指標 %s 失敗: %s", name, e)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path):
+        """
+        寫入 textfile collector 檔案
+
+        先寫入同目錄的暫存檔再 os.replace，node_exporter 不會讀到寫到一半的檔案。
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsServer:
+    """在背景執行緒提供 /metrics 的 HTTP 伺服器"""
+
+    def __init__(self, host: str, port: int, registry: Registry, path: str = "/metrics"):
+        """
+        Args:
+            host: 監聽位址
+            port: 監聽埠（0 表示由系統指定）
+            registry: 輸出的指標註冊表
+            path: 指標的 URL 路徑
+        """
+        self.registry = registry
+        self.path = path
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """實際監聽的 (host, port)"""
+        return self._httpd.server_address[:2]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != server.path:
+                    self.send_error(404)
+                    return
+                body = server.registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics %s " + format, self.address_string(), *args)
+
+        return Handler
+
+    def start(self):
+        """在背景執行緒開始接受請求"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        host, port = self.address
+        logger.info("指標端點啟動: http://%s:%s%s", host, port, self.path)
+
+    def stop(self):
+        """停止伺服器並釋放連接埠"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{40})$")
+
+
+def api_endpoint(path: str) -> str:
+    """
+    將 API 路徑正規化為低基數的端點標籤
+
+    專案路徑或 ID、MR iid 等識別碼以 ":id" 取代，如
+    "/api/v4/projects/group%2Fproj/merge_requests/5/changes" → "projects/:id/merge_requests/:id/changes"。
+    """
+    segments = [segment for segment in path.split("?", 1)[0].split("/") if segment]
+    if len(segments) >= 2 and segments[0] == "api":
+        segments = segments[2:]
+    normalized = []
+    for index, segment in enumerate(segments):
+        if _ID_SEGMENT.match(segment) or (index > 0 and segments[index - 1] in ("projects", "groups", "users")):
+            normalized.append(":id")
+        else:
+            normalized.append(segment)
+    return "/".join(normalized) or "/"
+
+
+def observe_api_response(response, *args, **kwargs):
+    """
+    requests response hook：依端點與狀態碼累計 API 請求
+
+    Args:
+        response: requests.Response 物件
+    """
+    request = response.request
+    endpoint = api_endpoint(urlsplit(request.url).path)
+    api_requests.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None and content_length.isdigit():
+        api_response_bytes.inc(int(content_length), endpoint=endpoint)
+    if response.elapsed is not None:
+        api_request_seconds.observe(response.elapsed.total_seconds(), endpoint=endpoint)
+    return response
+
+
+# 全域註冊表與指標
+registry = Registry()
+
+api_requests = registry.counter(
+    "gitlab_mr_reviewer_api_requests_total", "GitLab API 請求數", ("endpoint", "method", "status"),
+)
+api_response_bytes = registry.counter(
+    "gitlab_mr_reviewer_api_response_bytes_total", "GitLab API 回應的位元組數", ("endpoint",),
+)
+api_request_seconds = registry.histogram(
+    "gitlab_mr_reviewer_api_request_seconds", "GitLab API 請求耗時", ("endpoint",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+clone_seconds = registry.histogram(
+    "gitlab_mr_reviewer_clone_seconds", "建立一個 MR clone 的耗時（各 git 步驟合計）", ("strategy",),
+)
+clone_bytes = registry.counter(
+    "gitlab_mr_reviewer_clone_bytes_total", "新建立的 clone 佔用的位元組數", ("strategy",),
+)
+clone_jobs = registry.counter(
+    "gitlab_mr_reviewer_clone_jobs_total", "clone 工作結果（created/refreshed/failed）", ("result",),
+)
+mrs_skipped_unchanged = registry.counter(
+    "gitlab_mr_reviewer_mrs_skipped_unchanged_total", "未改變而不重新 clone 的 MR 數",
+)
+projects_scanned = registry.counter(
+    "gitlab_mr_reviewer_projects_scanned_total", "掃描的專案數", ("result",),
+)
+cache_requests = registry.counter(
+    "gitlab_mr_reviewer_cache_requests_total", "快取查詢（project: 專案 ID 解析，state: MR 狀態）", ("cache", "result"),
+)
+queue_jobs = registry.gauge(
+    "gitlab_mr_reviewer_queue_jobs", "clone 佇列中各狀態的工作數", ("state",),
+)
+reviews_bytes = registry.gauge(
+    "gitlab_mr_reviewer_reviews_bytes", "clone 紀錄的總用量（位元組）",
+)
+reviews_clones = registry.gauge(
+    "gitlab_mr_reviewer_reviews_clones", "clone 數",
+)
+reviews_quota_bytes = registry.gauge(
+    "gitlab_mr_reviewer_reviews_quota_bytes", "clone 用量配額（位元組），0 表示不限制",
+)
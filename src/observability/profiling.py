@@ -0,0 +1,258 @@
+"""
+CLI 效能剖析
+
+全域選項 --profile 以 cProfile 剖析整個命令，輸出為：
+
+- pstats: cProfile 原始資料，可用 python -m pstats、snakeviz 開啟
+- collapsed: collapsed stack 文字（"a;b;c 微秒"），可餵給 flamegraph.pl 或 speedscope；
+  cProfile 只記錄呼叫者與被呼叫者的關係，堆疊是依各呼叫邊的累計時間比例展開的近似值
+
+--trace-malloc 以 tracemalloc 記錄配置位置，結束時回報配置最多的位置、配置峰值與峰值 RSS。
+同時啟用階段追蹤（TRACE_FILE）時，另依子命令標記的階段（profiler.phase()）分別回報，
+並將各階段的記憶體數據寫入 phase.<名稱> span。
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.observability.tracing import tracer
+
+try:
+    import resource
+except ImportError:  # pragma: no cover  (Windows)
+    resource = None
+
+
+PROFILE_FORMATS = ("pstats", "collapsed")
+
+# tracemalloc 保留的堆疊深度（只依行號彙總，一層即可）
+TRACEMALLOC_FRAMES = 1
+
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def peak_rss() -> int:
+    """行程的峰值 RSS 位元組數，無法取得時為 0"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 回報，macOS 以位元組回報
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _frame_label(func: Tuple[str, int, str]) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        # 內建函數
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{lineno})"
+    return label.replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats, min_fraction: float = 1e-4, max_depth: int = 64) -> List[str]:
+    """
+    將 cProfile 統計展開為 collapsed stack
+
+    Args:
+        stats: cProfile 統計
+        min_fraction: 低於總時間此比例的路徑不再展開
+        max_depth: 最大堆疊深度
+
+    Returns:
+        "frame;frame;frame 微秒" 列表，依堆疊排序
+    """
+    entries = stats.stats
+    children: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    total = sum(entry[2] for entry in entries.values())
+    threshold = total * min_fraction
+    samples: Dict[str, float] = {}
+
+    def walk(func: tuple, seconds: float, stack: List[str], on_stack: set):
+        cumulative = entries[func][3]
+        if cumulative <= 0:
+            return
+        fraction = min(1.0, seconds / cumulative)
+        stack.append(_frame_label(func))
+        on_stack.add(func)
+        key = ";".join(stack)
+        samples[key] = samples.get(key, 0.0) + entries[func][2] * fraction
+        if len(stack) < max_depth:
+            for child, edge_seconds in children.get(func, ()):
+                child_seconds = edge_seconds * fraction
+                if child not in on_stack and child in entries and child_seconds >= threshold:
+                    walk(child, child_seconds, stack, on_stack)
+        on_stack.discard(func)
+        stack.pop()
+
+    for func, entry in entries.items():
+        if not entry[4]:
+            walk(func, entry[3], [], set())
+
+    return [f"{key} {round(seconds * 1e6)}" for key, seconds in sorted(samples.items()) if seconds * 1e6 >= 1]
+
+
+@dataclass
+class PhaseMemory:
+    """單一階段（同名階段合併）的記憶體統計"""
+    name: str
+    runs: int = 0
+    seconds: float = 0.0
+    peak_traced: int = 0
+    peak_rss: int = 0
+    # 配置位置 -> 階段內淨增加的位元組數（同名階段取最大值）
+    top: Dict[str, int] = field(default_factory=dict)
+
+
+class Profiler:
+    """整個 CLI 命令的 cProfile / tracemalloc 剖析"""
+
+    def __init__(self):
+        self.profile_path: Optional[Path] = None
+        self.profile_format = "pstats"
+        self.trace_malloc = False
+        self.top = 10
+        self._profile: Optional[cProfile.Profile] = None
+        self._phases: Dict[str, PhaseMemory] = {}
+        # 階段開始時會重設 tracemalloc 峰值，整體峰值另外保留
+        self._peak = 0
+
+    def start(self, profile_path: Optional[Path] = None, profile_format: str = "pstats",
+              trace_malloc: bool = False, top: int = 10):
+        """
+        開始剖析
+
+        Args:
+            profile_path: cProfile 輸出檔，None 表示不啟用 cProfile
+            profile_format: pstats 或 collapsed
+            trace_malloc: 以 tracemalloc 記錄配置
+            top: 回報的配置位置數
+        """
+        if profile_format not in PROFILE_FORMATS:
+            raise ValueError(f"未知的剖析輸出格式: {profile_format}")
+        self.profile_path = Path(profile_path) if profile_path else None
+        self.profile_format = profile_format
+        self.trace_malloc = trace_malloc
+        self.top = top
+        self._phases = {}
+        self._peak = 0
+        if trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.profile_path is not None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        標記子命令的一個階段
+
+        只在 --trace-malloc 與階段追蹤同時啟用時記錄，否則不做任何事。
+        """
+        if not (self.trace_malloc and tracer.enabled and tracemalloc.is_tracing()):
+            yield
+            return
+
+        before = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+        self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        with tracer.span(f"phase.{name}") as span:
+            try:
+                yield
+            finally:
+                seconds = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                self._peak = max(self._peak, peak)
+                rss = peak_rss()
+                after = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+                span.set(mem_peak=peak, rss_peak=rss)
+
+                entry = self._phases.setdefault(name, PhaseMemory(name))
+                entry.runs += 1
+                entry.seconds += seconds
+                entry.peak_traced = max(entry.peak_traced, peak)
+                entry.peak_rss = max(entry.peak_rss, rss)
+                for stat in after.compare_to(before, "lineno")[:self.top]:
+                    if stat.size_diff > 0:
+                        site = str(stat.traceback)
+                        entry.top[site] = max(entry.top.get(site, 0), stat.size_diff)
+
+    def stop(self) -> List[str]:
+        """
+        停止剖析並寫出結果
+
+        Returns:
+            回報文字行
+        """
+        lines: List[str] = []
+        if self._profile is not None:
+            self._profile.disable()
+            lines.append(self._write_profile())
+            self._profile = None
+
+        if self.trace_malloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(self._peak, peak)
+            tracemalloc.stop()
+            lines.append(
+                f"記憶體: 目前配置 {_format_size(current)}，配置峰值 {_format_size(peak)}，"
+                f"峰值 RSS {_format_size(peak_rss())}"
+            )
+            lines.append("  配置最多的位置:")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                lines.append(f"    {stat.traceback}  {_format_size(stat.size)} ({stat.count} 個區塊)")
+            if self._phases:
+                lines.append("  各階段:")
+                for entry in self._phases.values():
+                    lines.append(
+                        f"    {entry.name}: {entry.runs} 次 {entry.seconds:.2f}s，"
+                        f"配置峰值 {_format_size(entry.peak_traced)}，峰值 RSS {_format_size(entry.peak_rss)}"
+                    )
+                    top = sorted(entry.top.items(), key=lambda item: -item[1])[:self.top]
+                    for site, size in top:
+                        lines.append(f"      {site}  +{_format_size(size)}")
+        self.trace_malloc = False
+        return lines
+
+    def _write_profile(self) -> str:
+        path = self.profile_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(self._profile)
+        if self.profile_format == "pstats":
+            stats.dump_stats(str(path))
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                for line in collapsed_stacks(stats):
+                    f.write(line + "\n")
+        return f"效能剖析已寫入 {path} ({self.profile_format}，共 {stats.total_tt:.2f}s)"
+
+
+# 全域剖析器
+profiler = Profiler()
@@ -0,0 +1,252 @@
+"""
+輕量的階段追蹤（span）
+
+在 GitLab API 呼叫、git 命令與狀態讀寫等階段包上 span，記錄巢狀的耗時與屬性
+（專案、iid、位元組數等），找出掃描時間花在哪裡：
+
+    with tracer.span("gitlab.mergerequests.list", project=project) as span:
+        mrs = ...
+        span.set(count=len(mrs))
+
+停用時（預設）span() 直接回傳共用的空 span，不取時間、不配置物件。
+巢狀關係以執行緒區域的堆疊維護：同一執行緒內開啟的 span 為目前 span 的子 span。
+
+完成的 span 保留在有上限的緩衝區，可匯出為：
+
+- jsonl: 每行一個 span，附加寫入並清空緩衝區
+- chrome: Chrome trace event 格式（chrome://tracing、Perfetto），以緩衝區內所有 span 覆寫檔案
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+TRACE_FORMATS = ("jsonl", "chrome")
+
+
+class Span:
+    """一個已開始的階段"""
+
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "thread_id", "start_ns", "duration_ns")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], span_id: int, parent_id: Optional[int], thread_id: int):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.thread_id = thread_id
+        self.start_ns = 0
+        self.duration_ns = 0
+
+    def set(self, **attrs):
+        """加上或更新屬性"""
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        """耗時秒數"""
+        return self.duration_ns / 1e9
+
+
+class _NoopSpan:
+    """停用追蹤時回傳的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "span")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.tracer._stack().append(self.span)
+        self.span.start_ns = time.perf_counter_ns()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        span = self.span
+        span.duration_ns = time.perf_counter_ns() - span.start_ns
+        if exc_type is not None:
+            span.attrs["error"] = exc_type.__name__
+        stack = self.tracer._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        self.tracer._finish(span)
+        return False
+
+
+class Tracer:
+    """收集 span 的追蹤器"""
+
+    def __init__(self, max_spans: int = 100000):
+        """
+        Args:
+            max_spans: 緩衝區保留的 span 上限，超過時捨棄最舊的
+        """
+        self.enabled = False
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        # perf_counter 與牆上時間的對應，匯出時換算成絕對時間
+        self._origin_ns = time.perf_counter_ns()
+        self._origin_wall = time.time()
+
+    def enable(self, max_spans: Optional[int] = None):
+        """開始收集 span"""
+        if max_spans is not None:
+            with self._lock:
+                self._spans = deque(self._spans, maxlen=max_spans)
+        self.enabled = True
+
+    def disable(self):
+        """停止收集並清空緩衝區"""
+        self.enabled = False
+        self.drain()
+
+    def span(self, name: str, **attrs):
+        """
+        開啟一個 span（以 with 使用）
+
+        Args:
+            name: 階段名稱，以 "." 分隔類別，如 "git.clone"
+            **attrs: 屬性
+
+        Returns:
+            context manager；停用時為 NOOP_SPAN
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        stack = self._stack()
+        parent_id = stack[-1].span_id if stack else None
+        return _SpanContext(self, Span(name, attrs, next(self._ids), parent_id, threading.get_ident()))
+
+    def spans(self) -> List[Span]:
+        """緩衝區中已完成的 span"""
+        with self._lock:
+            return list(self._spans)
+
+    def drain(self) -> List[Span]:
+        """取出並清空緩衝區"""
+        with self._lock:
+            spans = list(self._spans)
+            self._spans.clear()
+        return spans
+
+    def export(self, path: Path, fmt: str = "jsonl") -> int:
+        """
+        匯出 span
+
+        Args:
+            path: 輸出檔案
+            fmt: jsonl（附加並清空緩衝區）或 chrome（覆寫）
+
+        Returns:
+            寫入的 span 數
+        """
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"未知的追蹤格式: {fmt}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "jsonl":
+            spans = self.drain()
+            with open(path, "a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(self._as_record(span), ensure_ascii=False, default=str) + "\n")
+            return len(spans)
+
+        spans = self.spans()
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": span.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (span.start_ns - self._origin_ns) / 1000,
+                "dur": span.duration_ns / 1000,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": span.attrs,
+            }
+            for span in spans
+        ]
+        tmp_path = path.with_name(f"{path.name}.{pid}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        return len(spans)
+
+    def _as_record(self, span: Span) -> Dict[str, Any]:
+        return {
+            "name": span.name,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "thread": span.thread_id,
+            "start": self._origin_wall + (span.start_ns - self._origin_ns) / 1e9,
+            "duration_ms": span.duration_ns / 1e6,
+            "attrs": span.attrs,
+        }
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+
+def summarize(spans: List[Span]) -> List[Tuple[str, int, float]]:
+    """
+    依名稱彙總 span
+
+    Returns:
+        (名稱, 次數, 總秒數) 列表，依總秒數由大到小
+    """
+    totals: Dict[str, List[float]] = {}
+    for span in spans:
+        entry = totals.setdefault(span.name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += span.duration
+    return sorted(((name, int(count), total) for name, (count, total) in totals.items()), key=lambda item: -item[2])
+
+
+def traced(name: str) -> Callable:
+    """以 span 包住整個函數呼叫的裝飾器"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# 全域追蹤器
+tracer = Tracer()
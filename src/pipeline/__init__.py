@@ -0,0 +1,3 @@
+"""
+scan → clone 管線模組
+"""
@@ -0,0 +1,261 @@
+"""
+scan → clone 管線
+
+掃描執行緒逐專案取得 MR，掃描完一個專案就把它的 MR 放入有界佇列；
+clone worker 同時從佇列取出處理，API 掃描與 git clone 因此重疊執行，
+第一個 MR 不必等所有專案掃描完才開始 clone。佇列容量有上限 (backpressure)，
+等待 clone 的 MR 不超過 queue_size 個。
+
+佇列依專案公平取出（見 src.pipeline.fair）。佇列已滿時，掃描端先保留該專案
+其餘的 MR 並繼續掃描下一個專案，待佇列有空位再輪流放入，
+大型專案因此不會佔滿佇列而延誤後面的專案。保留 MR 的專案達到 queue_size 個時，
+掃描端等待佇列消化、不再掃描新專案，已掃描但尚未 clone 的專案數因此有上限。
+
+專案的所有 MR 都處理完後才呼叫 on_project_done，讓呼叫端逐專案寫入統計。
+
+指定 deadline 時，各專案的 MR 依 updated_at 由新到舊處理；超過期限後不再掃描新專案
+（ScanResult.deferred），預估 clone 時間超出剩餘時間的 MR 也不再開始
+（ScanResult.deferred_mrs），由呼叫端記錄後留待下一次執行。
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.gitlab_.models import MRInfo
+from src.logger import logger
+from src.pipeline.fair import FairPolicy, FairQueue
+from src.scanner.mr_scanner import ScanResult
+
+
+DEFER_PROJECT_REASON = "時間預算已用盡，未掃描"
+DEFER_MR_REASON = "預估 clone 時間超出剩餘預算"
+
+# 估計單一 clone 耗時的指數移動平均權重
+ESTIMATE_ALPHA = 0.3
+
+
+@dataclass
+class _ProjectProgress:
+    """單一專案的處理進度"""
+    result: ScanResult
+    pending: int
+    scanned_at: float
+
+
+class ScanClonePipeline:
+    """以有界佇列連接掃描端與 clone worker 的生產者/消費者管線"""
+
+    def __init__(
+        self,
+        scan_project: Callable[[str], Optional[ScanResult]],
+        process_mr: Callable[[str, MRInfo], None],
+        on_project_done: Callable[[ScanResult, float], None],
+        workers: int = 2,
+        scanners: int = 1,
+        queue_size: int = 16,
+        policy: Optional[FairPolicy] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        """
+        初始化管線
+
+        Args:
+            scan_project: 掃描單一專案，回傳 None 表示略過該專案
+            process_mr: 處理一個 MR（專案路徑, MR 資訊）
+            on_project_done: 專案所有 MR 處理完成時呼叫（掃描結果, clone 階段秒數）
+            workers: clone worker 執行緒數
+            scanners: 掃描執行緒數
+            queue_size: 待 clone 佇列的容量
+            policy: 跨專案公平排程的權重與成本，預設所有專案相同
+            clock: 計時函數（測試用）
+        """
+        self.scan_project = scan_project
+        self.process_mr = process_mr
+        self.on_project_done = on_project_done
+        self.workers = max(1, workers)
+        self.scanners = max(1, scanners)
+        self.queue_size = max(1, queue_size)
+        self.policy = policy or FairPolicy()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._progress: Dict[str, _ProjectProgress] = {}
+        self._started = 0.0
+        self._deadline: Optional[float] = None
+        self._clone_estimate = 0.0
+        self.first_clone_latency: Optional[float] = None
+
+    def run(self, projects: List[str], budget: Optional[float] = None) -> List[ScanResult]:
+        """
+        執行管線直到所有專案掃描完成且佇列清空
+
+        Args:
+            projects: 專案列表
+            budget: 時間預算秒數，None 表示不限制
+
+        Returns:
+            掃描結果（依專案順序，包含延後的專案，不含略過的專案）
+        """
+        self._started = self._clock()
+        self._deadline = self._started + budget if budget else None
+        self._clone_estimate = 0.0
+        self._progress = {}
+        self.first_clone_latency = None
+
+        pending_projects: "queue.Queue[str]" = queue.Queue()
+        for project in projects:
+            pending_projects.put(project)
+        items: FairQueue[MRInfo] = FairQueue(self.queue_size, weight=self.policy.weight, cost=self.policy.cost)
+
+        workers = [
+            threading.Thread(target=self._clone_worker, args=(items,), name=f"clone-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        scanners = [
+            threading.Thread(target=self._scanner, args=(pending_projects, items), name=f"scan-{n}", daemon=True)
+            for n in range(min(self.scanners, max(1, len(projects))))
+        ]
+        for thread in workers + scanners:
+            thread.start()
+        for thread in scanners:
+            thread.join()
+        items.close()
+        for thread in workers:
+            thread.join()
+
+        return [self._progress[project].result for project in projects if project in self._progress]
+
+    def _scanner(self, pending_projects: "queue.Queue[str]", items: FairQueue):
+        """掃描執行緒：逐專案掃描並將 MR 放入佇列"""
+        # 佇列已滿時暫存的專案 -> 尚未放入的 MR
+        backlog: List[Tuple[str, Iterator[MRInfo]]] = []
+        while True:
+            try:
+                project = pending_projects.get_nowait()
+            except queue.Empty:
+                break
+
+            if self.over_budget():
+                result = ScanResult(project=project, merge_requests=[], deferred=True, deferred_reason=DEFER_PROJECT_REASON)
+                with self._lock:
+                    self._progress[project] = _ProjectProgress(result, 0, self._clock())
+                continue
+
+            try:
+                result = self.scan_project(project)
+            except Exception as e:
+                logger.error("管線掃描專案 %s 失敗: %s", project, e)
+                continue
+            if result is None:
+                continue
+
+            progress = _ProjectProgress(result, len(result.merge_requests), self._clock())
+            with self._lock:
+                self._progress[project] = progress
+            if not result.merge_requests:
+                self._finish(progress)
+                continue
+            mrs = result.merge_requests
+            if self._deadline is not None:
+                # 有時間預算時先處理最近更新的 MR
+                mrs = sorted(mrs, key=lambda mr: mr.updated_at or "", reverse=True)
+            backlog.append((project, iter(mrs)))
+            backlog = self._feed(items, backlog, block=False)
+            while len(backlog) >= self.queue_size:
+                backlog = self._feed(items, backlog, block=True)
+
+        # 所有專案都已掃描，輪流放入剩餘的 MR（佇列滿時等待）
+        while backlog:
+            backlog = self._feed(items, backlog, block=True)
+
+    @staticmethod
+    def _feed(items: FairQueue, backlog: List[Tuple[str, Iterator[MRInfo]]], block: bool) -> List[Tuple[str, Iterator[MRInfo]]]:
+        """
+        輪流為每個專案放入一個 MR
+
+        block=False 時持續輪流直到佇列已滿；block=True 時只放一輪，佇列滿時等待。
+
+        Returns:
+            仍有 MR 未放入的專案
+        """
+        while backlog:
+            remaining = []
+            for index, (project, mrs) in enumerate(backlog):
+                mr = next(mrs, None)
+                if mr is None:
+                    continue
+                try:
+                    items.put(project, mr, block=block)
+                except queue.Full:
+                    return remaining + [(project, _prepend(mr, mrs))] + backlog[index + 1:]
+                remaining.append((project, mrs))
+            backlog = remaining
+            if block:
+                break
+        return backlog
+
+    def _clone_worker(self, items: FairQueue):
+        """clone worker：處理佇列中的 MR，直到佇列關閉並清空"""
+        while True:
+            item = items.get()
+            if item is None:
+                return
+
+            project, mr = item
+            progress = self._progress[project]
+            if self.over_budget(self._clone_estimate):
+                with self._lock:
+                    progress.result.deferred_mrs.append(mr)
+                    progress.result.deferred_reason = DEFER_MR_REASON
+            else:
+                self._process(project, mr)
+
+            with self._lock:
+                progress.pending -= 1
+                done = progress.pending == 0
+            if done:
+                self._finish(progress)
+
+    def _process(self, project: str, mr: MRInfo):
+        """處理一個 MR 並更新 clone 耗時估計"""
+        started = self._clock()
+        with self._lock:
+            if self.first_clone_latency is None:
+                self.first_clone_latency = started - self._started
+        try:
+            self.process_mr(project, mr)
+        except Exception as e:
+            logger.error("管線處理 %s#%s 失敗: %s", project, mr.iid, e)
+        elapsed = self._clock() - started
+        with self._lock:
+            if self._clone_estimate:
+                self._clone_estimate += ESTIMATE_ALPHA * (elapsed - self._clone_estimate)
+            else:
+                self._clone_estimate = elapsed
+
+    def over_budget(self, needed: float = 0.0) -> bool:
+        """
+        剩餘時間是否不足
+
+        Args:
+            needed: 接下來的工作預估需要的秒數
+
+        Returns:
+            已設定期限且目前時間加上 needed 超過期限
+        """
+        return self._deadline is not None and self._clock() + needed > self._deadline
+
+    def _finish(self, progress: _ProjectProgress):
+        """專案的所有 MR 都已處理"""
+        try:
+            self.on_project_done(progress.result, self._clock() - progress.scanned_at)
+        except Exception as e:
+            logger.error("管線完成專案 %s 時出錯: %s", progress.result.project, e)
+
+
+def _prepend(item: MRInfo, rest: Iterator[MRInfo]) -> Iterator[MRInfo]:
+    """將取出但未放入的 MR 放回迭代器開頭"""
+    yield item
+    yield from rest
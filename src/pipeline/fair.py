@@ -0,0 +1,168 @@
+"""
+跨專案公平排程
+
+FairQueue 為每個專案維護一條子佇列，取出時以加權公平佇列 (WFQ) 選擇
+虛擬完成時間最小的專案：每取出一個 MR，該專案的虛擬時間前進 cost / weight。
+權重相同時等同輪流 (round-robin)，大型專案排入再多 MR 也只會佔用自己的份額，
+後面的小專案不必等它全部 clone 完。
+
+FairPolicy 決定權重與成本：專案權重來自 PROJECT_WEIGHTS，
+近期更新的 MR 成本除以 FAIR_RECENT_BOOST，讓剛有動靜的 MR 較早被處理。
+"""
+
+import queue
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, Generic, Optional, Tuple, TypeVar
+
+from src.gitlab_.models import MRInfo
+
+
+T = TypeVar("T")
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat((value or "").replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class FairPolicy:
+    """專案權重與 MR 成本"""
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        recent_window: float = 3600.0,
+        recent_boost: float = 1.0,
+        now: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ):
+        """
+        初始化排程策略
+
+        Args:
+            weights: 專案 -> 權重，未列出的專案為 1
+            recent_window: 視為近期更新的秒數
+            recent_boost: 近期更新的 MR 成本除以此倍數（1 表示不加權）
+            now: 取得目前時間的函數（測試用）
+        """
+        self.weights = weights or {}
+        self.recent_window = recent_window
+        self.recent_boost = recent_boost
+        self._now = now
+
+    def weight(self, project: str) -> float:
+        """專案權重"""
+        return self.weights.get(project, 1.0)
+
+    def cost(self, mr: MRInfo) -> float:
+        """處理一個 MR 的相對成本"""
+        if self.recent_boost == 1.0:
+            return 1.0
+        updated_at = _parse_time(mr.updated_at)
+        if updated_at is not None and (self._now() - updated_at).total_seconds() <= self.recent_window:
+            return 1.0 / self.recent_boost
+        return 1.0
+
+
+class _Flow(Generic[T]):
+    """單一專案的子佇列"""
+
+    def __init__(self):
+        self.items: Deque[T] = deque()
+        self.finish = 0.0
+
+
+class FairQueue(Generic[T]):
+    """依專案加權公平取出的有界佇列"""
+
+    def __init__(
+        self,
+        maxsize: int,
+        weight: Callable[[str], float] = lambda flow: 1.0,
+        cost: Callable[[T], float] = lambda item: 1.0,
+    ):
+        """
+        初始化佇列
+
+        Args:
+            maxsize: 所有專案合計的容量
+            weight: 專案 -> 權重
+            cost: 項目 -> 成本
+        """
+        self.maxsize = max(1, maxsize)
+        self._weight = weight
+        self._cost = cost
+        self._flows: "OrderedDict[str, _Flow[T]]" = OrderedDict()
+        self._size = 0
+        self._virtual_time = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def qsize(self) -> int:
+        """目前的項目數"""
+        with self._cond:
+            return self._size
+
+    def put(self, flow: str, item: T, block: bool = True):
+        """
+        放入一個項目
+
+        Args:
+            flow: 專案路徑
+            item: 項目
+            block: 佇列已滿時是否等待
+
+        Raises:
+            queue.Full: block 為 False 且佇列已滿
+        """
+        with self._cond:
+            while self._size >= self.maxsize:
+                if not block:
+                    raise queue.Full
+                self._cond.wait()
+            if flow not in self._flows:
+                self._flows[flow] = _Flow()
+            self._flows[flow].items.append(item)
+            self._size += 1
+            self._cond.notify_all()
+
+    def get(self) -> Optional[Tuple[str, T]]:
+        """
+        取出虛擬完成時間最小的專案的下一個項目
+
+        Returns:
+            (專案路徑, 項目)；佇列已關閉且清空時回傳 None
+        """
+        with self._cond:
+            while self._size == 0:
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+            best_flow, best_start, best_finish = None, 0.0, 0.0
+            for name, flow in self._flows.items():
+                if not flow.items:
+                    continue
+                start = max(self._virtual_time, flow.finish)
+                finish = start + self._cost(flow.items[0]) / self._weight(name)
+                # 同分時依專案加入順序
+                if best_flow is None or finish < best_finish:
+                    best_flow, best_start, best_finish = name, start, finish
+
+            flow = self._flows[best_flow]
+            item = flow.items.popleft()
+            flow.finish = best_finish
+            self._virtual_time = best_start
+            self._size -= 1
+            self._cond.notify_all()
+            return best_flow, item
+
+    def close(self):
+        """不再放入項目；取完剩餘項目後 get 回傳 None"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,198 @@
+"""
+專案掃描斷路器
+
+專案被刪除、改名或沒有權限時，每次掃描都會重試、記錄錯誤並消耗 API 請求。
+ProjectBreaker 追蹤每個專案連續失敗的次數，狀態保存在狀態儲存的 "breakers" 文件命名空間：
+
+- closed: 正常掃描；連續失敗達 threshold 次（403/404 視為永久錯誤，一次即達）後開啟
+- open: 在 skip_until 之前略過該專案；每次開啟的冷卻時間加倍，上限 max_delay
+- half_open: 冷卻結束後放行一次探測；成功即關閉，失敗則以更長的冷卻時間重新開啟
+
+探測期間 skip_until 會延後 base_delay 秒，避免多個行程或節點同時探測同一個專案。
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+
+from src.logger import logger
+from src.scanner.mr_scanner import ScanResult
+from src.utils.exceptions import StateError
+
+
+NAMESPACE = "breakers"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 重試也不會成功的 GitLab 回應
+PERMANENT_STATUSES = (403, 404)
+
+# token 無效或過期：影響所有專案，不屬於單一專案的錯誤，由呼叫端中止整次掃描
+UNAUTHORIZED = 401
+
+
+@dataclass
+class BreakerState:
+    """單一專案的斷路器狀態"""
+    project: str
+    state: str = CLOSED
+    failures: int = 0
+    trips: int = 0
+    skip_until: float = 0.0
+    error: Optional[str] = None
+    error_class: Optional[str] = None
+    error_status: Optional[int] = None
+    updated_at: float = 0.0
+
+
+class ProjectBreaker:
+    """以狀態儲存持久化的專案斷路器"""
+
+    def __init__(
+        self,
+        state_manager,
+        threshold: int = 3,
+        base_delay: float = 300.0,
+        max_delay: float = 86400.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        初始化斷路器
+
+        Args:
+            state_manager: 提供 get/put/delete_document 的狀態管理器
+            threshold: 開啟斷路器的連續失敗次數
+            base_delay: 第一次開啟的冷卻秒數
+            max_delay: 冷卻秒數上限
+            clock: 取得目前時間的函數（測試用）
+        """
+        self.state_manager = state_manager
+        self.threshold = max(1, threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def blocking(self, project: str) -> Optional[BreakerState]:
+        """
+        檢查專案是否應略過
+
+        冷卻已結束的開啟狀態會轉為 half_open，並放行這一次掃描作為探測。
+
+        Args:
+            project: 專案路徑
+
+        Returns:
+            阻擋中的斷路器狀態；None 表示可以掃描
+        """
+        with self._lock:
+            entry = self._load(project)
+            if entry is None or entry.state == CLOSED:
+                return None
+            now = self._clock()
+            if now < entry.skip_until:
+                return entry
+            entry.state = HALF_OPEN
+            entry.skip_until = now + self.base_delay
+            entry.updated_at = now
+            self._save(entry)
+        logger.info("專案 %s 的斷路器冷卻結束，進行探測", project)
+        return None
+
+    def record(self, result: ScanResult) -> Optional[BreakerState]:
+        """
+        記錄一次掃描結果
+
+        Args:
+            result: 掃描結果
+
+        401 (UNAUTHORIZED) 不是專案本身的問題，不計入失敗次數。
+
+        Returns:
+            更新後的狀態；掃描成功且斷路器關閉時回傳 None
+        """
+        with self._lock:
+            entry = self._load(result.project)
+            if not result.error:
+                if entry is not None:
+                    self._delete(result.project)
+                    if entry.state != CLOSED:
+                        logger.info("專案 %s 掃描恢復，關閉斷路器", result.project)
+                return None
+            if result.error_status == UNAUTHORIZED:
+                return entry
+
+            now = self._clock()
+            entry = entry or BreakerState(project=result.project)
+            entry.failures += 1
+            entry.error = result.error
+            entry.error_class = result.error_class
+            entry.error_status = result.error_status
+            entry.updated_at = now
+            if (
+                entry.state == HALF_OPEN
+                or entry.failures >= self.threshold
+                or result.error_status in PERMANENT_STATUSES
+            ):
+                entry.trips += 1
+                entry.state = OPEN
+                entry.skip_until = now + min(self.max_delay, self.base_delay * 2 ** (entry.trips - 1))
+                logger.warning(
+                    "專案 %s 連續失敗 %s 次，略過 %.0f 秒: %s",
+                    result.project, entry.failures, entry.skip_until - now, result.error,
+                )
+            self._save(entry)
+            return entry
+
+    def tripped(self) -> List[BreakerState]:
+        """
+        列出開啟中（含探測中）的斷路器
+
+        Returns:
+            依 skip_until 排序的斷路器狀態
+        """
+        entries = [BreakerState(**value) for value in self.state_manager.get_documents(NAMESPACE).values()]
+        return sorted(
+            (entry for entry in entries if entry.state != CLOSED),
+            key=lambda entry: entry.skip_until,
+        )
+
+    def reset(self, project: str) -> bool:
+        """
+        手動關閉斷路器
+
+        Args:
+            project: 專案路徑
+
+        Returns:
+            是否有被清除的狀態
+        """
+        with self._lock:
+            if self._load(project) is None:
+                return False
+            self._delete(project)
+            return True
+
+    def _load(self, project: str) -> Optional[BreakerState]:
+        try:
+            value = self.state_manager.get_document(NAMESPACE, project)
+        except StateError as e:
+            # 讀取失敗時照常掃描，不因斷路器本身的問題略過專案
+            logger.warning("讀取專案 %s 的斷路器狀態失敗: %s", project, e)
+            return None
+        return BreakerState(**value) if value is not None else None
+
+    def _save(self, entry: BreakerState):
+        try:
+            self.state_manager.put_document(NAMESPACE, entry.project, asdict(entry))
+        except StateError as e:
+            logger.warning("保存專案 %s 的斷路器狀態失敗: %s", entry.project, e)
+
+    def _delete(self, project: str):
+        try:
+            self.state_manager.delete_document(NAMESPACE, project)
+        except StateError as e:
+            logger.warning("清除專案 %s 的斷路器狀態失敗: %s", project, e)
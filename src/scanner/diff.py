@@ -0,0 +1,105 @@
+"""
+掃描結果與已保存狀態的差異比對
+
+以 (專案, iid) 為鍵的雜湊表比對本次掃描的 MR 與 MRState，
+產生 clone 階段要處理的事件：
+
+- opened: 沒有保存狀態的 MR → 建立 clone
+- head_moved: head commit 改變 → 重新 clone
+- metadata_changed: 只有標題、標籤等資料改變 → 只更新 clone 的元資料
+- closed: 有保存狀態但不在本次成功掃描的結果中，且 GitLab 確認已關閉或合併 → 移除 clone
+- filtered_out: 有保存狀態但不在本次成功掃描的結果中，且未確認已關閉或合併
+  （轉為草稿、不再符合篩選條件，或無法取得狀態）→ 保留 clone
+
+沒有事件的 MR 不需要任何處理。建立索引與比對皆為線性時間，
+追蹤十萬個 MR 時每次掃描仍只需走訪一次。
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.gitlab_.models import MRInfo
+from src.state.models import MRState
+
+
+OPENED = "opened"
+HEAD_MOVED = "head_moved"
+METADATA_CHANGED = "metadata_changed"
+CLOSED = "closed"
+FILTERED_OUT = "filtered_out"
+
+# GitLab 上視為已結束的 MR 狀態
+CLOSED_STATES = ("closed", "merged")
+
+
+@dataclass
+class MREvent:
+    """單一 MR 的變化"""
+    kind: str
+    project: str
+    iid: int
+    mr: Optional[MRInfo] = None  # closed / filtered_out 事件為 None
+    previous: Optional[MRState] = None  # opened 事件為 None
+
+
+def index_states(states: Iterable[MRState]) -> Dict[str, Dict[int, MRState]]:
+    """
+    將 MR 狀態依專案與 iid 建立索引
+
+    Args:
+        states: MR 狀態
+
+    Returns:
+        專案 -> iid -> MRState
+    """
+    index: Dict[str, Dict[int, MRState]] = {}
+    for state in states:
+        index.setdefault(state.project_slug, {})[state.iid] = state
+    return index
+
+
+def diff_project(
+    project: str,
+    mrs: List[MRInfo],
+    previous: Dict[int, MRState],
+    lookup_state: Optional[Callable[[int], Optional[str]]] = None,
+) -> List[MREvent]:
+    """
+    比對單一專案的掃描結果與保存的狀態
+
+    Args:
+        project: 專案路徑
+        mrs: 本次掃描（成功）取得的 MR
+        previous: 該專案 iid -> 保存的狀態
+        lookup_state: iid -> GitLab 上的 MR 狀態（無法取得時為 None），
+            只對不在掃描結果中的 MR 呼叫；未提供時這些 MR 一律為 filtered_out
+
+    Returns:
+        事件列表（未改變的 MR 不產生事件）
+    """
+    events = []
+    seen = set()
+    for mr in mrs:
+        seen.add(mr.iid)
+        state = previous.get(mr.iid)
+        kind = _classify(mr, state)
+        if kind is not None:
+            events.append(MREvent(kind=kind, project=project, iid=mr.iid, mr=mr, previous=state))
+
+    for iid, state in previous.items():
+        if iid not in seen:
+            current = lookup_state(iid) if lookup_state is not None else None
+            kind = CLOSED if current in CLOSED_STATES else FILTERED_OUT
+            events.append(MREvent(kind=kind, project=project, iid=iid, previous=state))
+    return events
+
+
+def _classify(mr: MRInfo, state: Optional[MRState]) -> Optional[str]:
+    if state is None:
+        return OPENED
+    if mr.sha and state.head_commit_sha:
+        if mr.sha != state.head_commit_sha:
+            return HEAD_MOVED
+        return METADATA_CHANGED if mr.updated_at != state.mr_updated_at else None
+    # 舊版狀態沒有記錄 head commit：只能依 updated_at 判斷，交由 clone 佇列去重
+    return HEAD_MOVED if mr.updated_at != state.mr_updated_at else None
@@ -0,0 +1,288 @@
+"""
+宣告式 MR 篩選規則
+
+每條規則為一行 ``欄位 運算子 值``，例如::
+
+    author != renovate-bot
+    label = backend,needs-review
+    target_branch = main,release/*
+    source_project = same
+    age < 14d
+    title !~ ^(Revert|WIP)
+    path = src/*.py,docs/*
+    wip = no
+
+規則在建立掃描器時編譯一次為 predicate。可以對應到 GitLab
+``mergerequests.list`` 查詢參數的規則會下推到伺服器端以縮小回應，
+下推的規則仍會在用戶端再檢查一次（成本極低），
+舊版 GitLab 忽略未知參數時結果依然正確。
+變更路徑規則需要額外的 API 請求，一律最後評估。
+"""
+
+import fnmatch
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.gitlab_.models import MRInfo
+from src.utils.exceptions import ConfigError
+
+
+RULE_PATTERN = re.compile(r"^\s*(?P<field>[a-z_]+)\s*(?P<op>!=|!~|=|~|<|>)\s*(?P<value>.+?)\s*$")
+
+DURATION_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# 各欄位允許的運算子
+FIELD_OPERATORS = {
+    "author": ("=", "!="),
+    "label": ("=", "!="),
+    "target_branch": ("=", "!="),
+    "source_project": ("=",),
+    "age": ("<", ">"),
+    "title": ("~", "!~"),
+    "path": ("=", "!="),
+    "wip": ("=",),
+    "draft": ("=",),
+}
+
+# 評估順序：便宜的欄位在前，需要額外 API 請求的 path 最後
+FIELD_COST = {
+    "wip": 0, "draft": 0, "author": 1, "target_branch": 1, "source_project": 1,
+    "label": 2, "age": 3, "title": 4, "path": 9,
+}
+
+ChangesLoader = Callable[[MRInfo], List[str]]
+
+
+@dataclass
+class FilterRule:
+    """已編譯的篩選規則"""
+    field: str
+    op: str
+    value: str
+    predicate: Callable[[MRInfo, Optional[ChangesLoader]], bool]
+    # 值為字串，或於查詢時才計算的函數（例如相對時間）
+    query_params: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def server_side(self) -> bool:
+        """是否可下推為 GitLab 查詢參數"""
+        return bool(self.query_params)
+
+    def __str__(self) -> str:
+        return f"{self.field} {self.op} {self.value}"
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_duration(value: str) -> timedelta:
+    match = re.fullmatch(r"(\d+)\s*([mhdw])", value)
+    if not match:
+        raise ConfigError(f"無效的時間長度: {value}（例如 30m、12h、14d、2w）")
+    return timedelta(seconds=int(match.group(1)) * DURATION_UNITS[match.group(2)])
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _has_glob(value: str) -> bool:
+    return any(char in value for char in "*?[")
+
+
+def compile_rule(text: str, now: Callable[[], datetime] = lambda: datetime.now(timezone.utc)) -> FilterRule:
+    """
+    將一行規則編譯為 FilterRule
+
+    Args:
+        text: 規則文字
+        now: 取得目前時間的函數（測試用）
+
+    Returns:
+        FilterRule
+
+    Raises:
+        ConfigError: 規則格式錯誤
+    """
+    match = RULE_PATTERN.match(text)
+    if not match:
+        raise ConfigError(f"無效的 MR 篩選規則: {text}")
+    name, op, value = match.group("field"), match.group("op"), match.group("value")
+    if name not in FIELD_OPERATORS:
+        raise ConfigError(f"未知的 MR 篩選欄位: {name}")
+    if op not in FIELD_OPERATORS[name]:
+        raise ConfigError(f"欄位 {name} 不支援運算子 {op}")
+
+    params: Dict[str, Any] = {}
+    negate = op.startswith("!")
+
+    if name in ("wip", "draft"):
+        if value.lower() != "no":
+            raise ConfigError(f"{name} 只支援 '= no'")
+        attribute = "work_in_progress" if name == "wip" else "draft"
+        params = {"wip": "no"}
+
+        def predicate(mr, changes):
+            return not getattr(mr, attribute)
+
+    elif name == "author":
+        authors = set(_split(value))
+        if not negate and len(authors) == 1:
+            params = {"author_username": next(iter(authors))}
+
+        def predicate(mr, changes):
+            return (mr.author in authors) != negate
+
+    elif name == "label":
+        labels = set(_split(value))
+        if not negate:
+            params = {"labels": ",".join(sorted(labels))}
+
+            def predicate(mr, changes):
+                return labels.issubset(mr.labels)
+        else:
+            def predicate(mr, changes):
+                return labels.isdisjoint(mr.labels)
+
+    elif name == "target_branch":
+        branches = _split(value)
+        if not negate and len(branches) == 1 and not _has_glob(branches[0]):
+            params = {"target_branch": branches[0]}
+
+        def predicate(mr, changes):
+            return any(fnmatch.fnmatchcase(mr.target_branch, branch) for branch in branches) != negate
+
+    elif name == "source_project":
+        if value not in ("same", "fork"):
+            raise ConfigError("source_project 只支援 same 或 fork")
+        want_fork = value == "fork"
+
+        def predicate(mr, changes):
+            is_fork = mr.source_project_id is not None and mr.source_project_id != mr.project_id
+            return is_fork == want_fork
+
+    elif name == "age":
+        limit = _parse_duration(value)
+        younger = op == "<"
+        # 下推參數在每次查詢時才計算，避免長時間執行的行程使用過時的時間點
+        params = {"created_after" if younger else "created_before": lambda: (now() - limit).isoformat()}
+
+        def predicate(mr, changes):
+            created = _parse_time(mr.created_at)
+            if created is None:
+                return False
+            return (now() - created < limit) == younger
+
+    elif name == "title":
+        try:
+            pattern = re.compile(value)
+        except re.error as e:
+            raise ConfigError(f"無效的 title 正規表示式 {value}: {e}")
+
+        def predicate(mr, changes):
+            return (pattern.search(mr.title or "") is not None) != negate
+
+    else:  # path
+        globs = _split(value)
+
+        def predicate(mr, changes):
+            paths = changes(mr) if changes is not None else []
+            matched = any(fnmatch.fnmatchcase(path, glob) for path in paths for glob in globs)
+            return matched != negate
+
+    return FilterRule(field=name, op=op, value=value, predicate=predicate, query_params=params)
+
+
+class MRFilter:
+    """已編譯的 MR 篩選規則集合"""
+
+    def __init__(self, rules: Iterable[FilterRule]):
+        """
+        Args:
+            rules: 已編譯的規則，評估時依成本排序
+        """
+        self.rules = sorted(rules, key=lambda rule: FIELD_COST[rule.field])
+
+    @classmethod
+    def parse(cls, texts: Iterable[str]) -> "MRFilter":
+        """
+        由規則文字建立篩選器（忽略空行與 # 開頭的註解行）
+
+        Args:
+            texts: 規則文字列表
+
+        Returns:
+            MRFilter
+        """
+        lines = (text.strip() for text in texts)
+        return cls(compile_rule(line) for line in lines if line and not line.startswith("#"))
+
+    def with_options(self, exclude_wip: bool, exclude_draft: bool) -> "MRFilter":
+        """加上 scan 命令列的 --exclude-wip / --exclude-draft 規則"""
+        extra = []
+        if exclude_wip:
+            extra.append(compile_rule("wip = no"))
+        if exclude_draft:
+            extra.append(compile_rule("draft = no"))
+        return MRFilter(self.rules + extra) if extra else self
+
+    def without(self, name: str) -> "MRFilter":
+        """去掉指定欄位的規則（例如離線時無法評估的 path）"""
+        return MRFilter(rule for rule in self.rules if rule.field != name)
+
+    def query_params(self) -> Dict[str, str]:
+        """
+        可下推到 mergerequests.list 的查詢參數
+
+        Returns:
+            查詢參數字典
+        """
+        params = {}
+        for rule in self.rules:
+            for key, value in rule.query_params.items():
+                params[key] = value() if callable(value) else value
+        return params
+
+    def describe(self) -> Tuple[List[str], List[str]]:
+        """
+        依執行位置列出規則
+
+        Returns:
+            (伺服器端規則, 僅用戶端規則)
+        """
+        server = [str(rule) for rule in self.rules if rule.server_side]
+        client = [str(rule) for rule in self.rules if not rule.server_side]
+        return server, client
+
+    def matches(self, mr: MRInfo, changes: Optional[ChangesLoader] = None) -> bool:
+        """
+        判斷 MR 是否符合所有規則
+
+        Args:
+            mr: MR 資訊
+            changes: 取得 MR 變更路徑的函數（path 規則使用）
+
+        Returns:
+            是否符合
+        """
+        return all(rule.predicate(mr, changes) for rule in self.rules)
+
+    def apply(self, mrs: List[MRInfo], changes: Optional[ChangesLoader] = None) -> List[MRInfo]:
+        """
+        篩選 MR 列表
+
+        Args:
+            mrs: MR 列表
+            changes: 取得 MR 變更路徑的函數（path 規則使用）
+
+        Returns:
+            符合所有規則的 MR
+        """
+        return [mr for mr in mrs if self.matches(mr, changes)]
@@ -2,12 +2,17 @@
 MR 掃描和篩選引擎
 """
 
-from dataclasses import dataclass
-from typing import List
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 from src.gitlab_.client import GitLabClient
 from src.gitlab_.models import MRInfo
+from src.gitlab_.usage import api_usage
 from src.logger import logger
+from src.observability.metrics import projects_scanned
+from src.observability.tracing import tracer
+from src.scanner.filters import MRFilter
 
 
 @dataclass
@@ -16,21 +21,35 @@ class ScanResult:
     project: str
     merge_requests: List[MRInfo]
     error: str = None
+    error_class: Optional[str] = None
+    # GitLab 回應的 HTTP 狀態碼（非 HTTP 錯誤時為 None）
+    error_status: Optional[int] = None
+    duration: float = 0.0
+    api_requests: int = 0
+    bytes_transferred: int = 0
+    # 時間預算不足時延後到下一次執行的工作
+    deferred: bool = False
+    deferred_mrs: List[MRInfo] = field(default_factory=list)
+    deferred_reason: Optional[str] = None
+    # GitLab 列出的 MR（用戶端篩選之前），供掃描快照保存
+    listed: List[MRInfo] = field(default_factory=list)
 
 
 class MRScanner:
     """MR 掃描器"""
     
-    def __init__(self, client: GitLabClient, state_manager):
+    def __init__(self, client: GitLabClient, state_manager, filter_rules: Optional[List[str]] = None):
         """
         初始化掃描器
         
         Args:
             client: GitLab 客戶端
             state_manager: 狀態管理器
+            filter_rules: MR 篩選規則（見 src.scanner.filters），於此編譯一次
         """
         self.client = client
         self.state_manager = state_manager
+        self.mr_filter = MRFilter.parse(filter_rules or [])
     
     def scan(self, projects: List[str], exclude_wip: bool = True, exclude_draft: bool = True) -> List[ScanResult]:
         """
@@ -45,33 +64,138 @@ class MRScanner:
             ScanResult 列表
         """
         results = []
+        mr_filter = self.mr_filter.with_options(exclude_wip, exclude_draft)
         
         for project in projects:
-            try:
-                # 取得當前的 MR 列表
-                logger.info(f"掃描專案: {project}")
-                mrs = self.client.get_merge_requests(project)
-                
-                # 篩選 MR
-                filtered_mrs = self._filter_mrs(mrs, exclude_wip=exclude_wip, exclude_draft=exclude_draft)
-                
-                logger.info(f"專案 {project} 有 {len(filtered_mrs)} 個符合條件的 MR")
-                
-                results.append(ScanResult(
-                    project=project,
-                    merge_requests=filtered_mrs,
-                    error=None
-                ))
-            except Exception as e:
-                logger.error(f"掃描專案 {project} 失敗: {e}")
-                results.append(ScanResult(
-                    project=project,
-                    merge_requests=[],
-                    error=str(e)
-                ))
+            with tracer.span("scan.project", project=project) as span:
+                result = self._scan_project(project, mr_filter)
+                span.set(
+                    listed=len(result.listed), matched=len(result.merge_requests),
+                    requests=result.api_requests, bytes=result.bytes_transferred,
+                )
+            projects_scanned.inc(result="error" if result.error else "ok")
+            results.append(result)
         
         return results
     
+    def _scan_project(self, project: str, mr_filter: MRFilter) -> ScanResult:
+        """掃描單一專案，記錄耗時與 API 成本"""
+        started = time.perf_counter()
+        usage_before = api_usage.snapshot()
+        try:
+            # 取得當前的 MR 列表
+            logger.info("掃描專案: %s", project)
+            mrs = self.client.get_merge_requests(project, params=mr_filter.query_params())
+            
+            # 篩選 MR（下推的規則也在用戶端再確認一次）
+            filtered_mrs = mr_filter.apply(mrs, changes=self._changes_loader(project))
+            
+            logger.info("專案 %s 有 %s 個符合條件的 MR", project, len(filtered_mrs))
+            
+            result = ScanResult(
+                project=project,
+                merge_requests=filtered_mrs,
+                error=None,
+                listed=mrs,
+            )
+        except Exception as e:
+            logger.error("掃描專案 %s 失敗: %s", project, e)
+            result = ScanResult(
+                project=project,
+                merge_requests=[],
+                error=str(e),
+                error_class=self._error_class(e),
+                error_status=self._error_status(e),
+            )
+        
+        # 記錄此專案的耗時與 API 成本
+        usage = api_usage.snapshot() - usage_before
+        result.duration = time.perf_counter() - started
+        result.api_requests = usage.requests
+        result.bytes_transferred = usage.bytes
+        return result
+    
+    def refresh_mr(self, project: str, iid: int, exclude_wip: bool = True, exclude_draft: bool = True) -> Optional[MRInfo]:
+        """
+        只重新取得單一 MR（webhook 觸發的定向更新）
+        
+        Args:
+            project: 專案路徑
+            iid: MR 編號
+            exclude_wip: 排除 WIP MR
+            exclude_draft: 排除草稿 MR
+            
+        Returns:
+            符合篩選規則的開啟中 MR，否則 None
+            
+        Raises:
+            GitLabError: 無法取得 MR
+        """
+        mr = self.client.get_mr_details(project, iid)
+        if mr.state != "opened":
+            logger.info("MR %s!%s 狀態為 %s，不建立 clone", project, iid, mr.state)
+            return None
+        
+        mr_filter = self.mr_filter.with_options(exclude_wip, exclude_draft)
+        if not mr_filter.matches(mr, changes=self._changes_loader(project)):
+            logger.info("MR %s!%s 不符合篩選規則", project, iid)
+            return None
+        return mr
+    
+    def filter_offline(
+        self, mrs: List[MRInfo], exclude_wip: bool = True, exclude_draft: bool = True,
+    ) -> Tuple[List[MRInfo], List[str]]:
+        """
+        不連線篩選 MR（例如掃描快照中的 MR）
+        
+        變更路徑規則需要 API 請求，離線時略過。
+        
+        Args:
+            mrs: MR 列表
+            exclude_wip: 排除 WIP MR
+            exclude_draft: 排除草稿 MR
+            
+        Returns:
+            (符合其餘規則的 MR, 略過的規則)
+        """
+        mr_filter = self.mr_filter.with_options(exclude_wip, exclude_draft)
+        skipped = [str(rule) for rule in mr_filter.rules if rule.field == "path"]
+        return mr_filter.without("path").apply(mrs), skipped
+    
+    def describe_filters(self, exclude_wip: bool = True, exclude_draft: bool = True) -> Tuple[List[str], List[str]]:
+        """
+        列出本次掃描的篩選規則與執行位置
+        
+        Returns:
+            (伺服器端規則, 僅用戶端規則)
+        """
+        return self.mr_filter.with_options(exclude_wip, exclude_draft).describe()
+    
+    def _changes_loader(self, project: str):
+        """建立取得 MR 變更路徑的函數，同一 MR 只請求一次"""
+        cache: Dict[int, List[str]] = {}
+        
+        def load(mr: MRInfo) -> List[str]:
+            if mr.iid not in cache:
+                changes = self.client.get_mr_changes(project, mr.iid)
+                cache[mr.iid] = [path for change in changes for path in {change.old_path, change.new_path} if path]
+            return cache[mr.iid]
+        
+        return load
+    
+    @staticmethod
+    def _error_class(error: Exception) -> str:
+        """取得錯誤的根本類別名稱（GitLabError 包裝前的原始例外）"""
+        root = error.__cause__ or error.__context__ or error
+        return type(root).__name__
+    
+    @staticmethod
+    def _error_status(error: Exception) -> Optional[int]:
+        """取得 GitLab 回應的 HTTP 狀態碼"""
+        root = error.__cause__ or error.__context__ or error
+        status = getattr(root, "response_code", None)
+        return status if isinstance(status, int) else None
+    
     def _filter_mrs(self, mrs: List[MRInfo], exclude_wip: bool = True, exclude_draft: bool = True) -> List[MRInfo]:
         """
         篩選 MR 列表
@@ -84,18 +208,4 @@ class MRScanner:
         Returns:
             篩選後的 MR 列表
         """
-        filtered = []
-        
-        for mr in mrs:
-            # 檢查是否應該排除
-            if exclude_wip and mr.work_in_progress:
-                logger.debug(f"排除 WIP MR: {mr.iid}")
-                continue
-            
-            if exclude_draft and mr.draft:
-                logger.debug(f"排除草稿 MR: {mr.iid}")
-                continue
-            
-            filtered.append(mr)
-        
-        return filtered
+        return self.mr_filter.with_options(exclude_wip, exclude_draft).apply(mrs)
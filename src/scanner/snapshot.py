@@ -0,0 +1,159 @@
+"""
+最近一次掃描的 MR 快照
+
+每次掃描結束後，將各專案由 GitLab 列出的 MR（用戶端篩選之前）寫入狀態目錄下的單一 JSON 檔，
+供 ``scan --dry-run --offline``、``list-clones --long`` 等不需連線的查詢使用。
+
+格式（SNAPSHOT_VERSION = 1）::
+
+    {
+      "version": 1,
+      "fields": ["id", "project_id", ...],        # MRInfo 欄位順序
+      "projects": {
+        "group/project": {"scanned_at": 1700000000.0, "mrs": [[...], [...]]}
+      }
+    }
+
+每個 MR 以欄位順序的陣列保存，省去重複的鍵名；讀取時依 "fields" 對應，
+MRInfo 增減欄位時舊快照仍可讀取。版本不符或檔案損毀時視為沒有快照。
+寫入先寫暫存檔再 os.replace，讀取端不會看到寫到一半的檔案。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from src.gitlab_.models import MRInfo
+from src.logger import logger
+from src.scanner.mr_scanner import ScanResult
+
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = "scan_snapshot.json"
+
+MR_FIELDS = [item.name for item in fields(MRInfo)]
+
+
+@dataclass
+class ProjectSnapshot:
+    """單一專案最近一次成功掃描列出的 MR"""
+    project: str
+    scanned_at: float
+    merge_requests: List[MRInfo]
+
+
+class ScanSnapshot:
+    """最近一次掃描的 MR 快照"""
+
+    def __init__(self, path: Path, projects: Optional[Dict[str, ProjectSnapshot]] = None):
+        """
+        Args:
+            path: 快照檔路徑
+            projects: 專案 -> 快照
+        """
+        self.path = Path(path)
+        self.projects: Dict[str, ProjectSnapshot] = projects or {}
+
+    @classmethod
+    def load(cls, path: Path) -> "ScanSnapshot":
+        """
+        讀取快照
+
+        Args:
+            path: 快照檔路徑
+
+        Returns:
+            快照；檔案不存在、損毀或版本不符時回傳空的快照
+        """
+        snapshot = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return snapshot
+        except (OSError, ValueError) as e:
+            logger.warning("讀取掃描快照失敗，視為沒有快照: %s: %s", path, e)
+            return snapshot
+
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            logger.warning("掃描快照版本不符（%s），視為沒有快照", data.get("version") if isinstance(data, dict) else "?")
+            return snapshot
+
+        names = data.get("fields", [])
+        # 欄位與目前的 MRInfo 相同時（一般情況）直接以位置建立，省去每筆建立 dict
+        same_fields = names == MR_FIELDS
+        known = [name in MR_FIELDS for name in names]
+        for project, entry in data.get("projects", {}).items():
+            mrs = []
+            for row in entry.get("mrs", []):
+                try:
+                    if same_fields:
+                        mrs.append(MRInfo(*row))
+                    else:
+                        mrs.append(MRInfo(**{name: value for name, value, ok in zip(names, row, known) if ok}))
+                except TypeError:
+                    # 快照缺少必要欄位（不應發生），略過這一筆
+                    continue
+            snapshot.projects[project] = ProjectSnapshot(project, entry.get("scanned_at", 0.0), mrs)
+        return snapshot
+
+    def update(self, results: Iterable[ScanResult], now: Optional[float] = None) -> int:
+        """
+        以成功掃描的專案結果取代快照中對應的專案
+
+        失敗或延後（未掃描）的專案保留上一次的快照。
+
+        Args:
+            results: 掃描結果
+            now: 掃描時間，None 表示現在
+
+        Returns:
+            更新的專案數
+        """
+        now = now if now is not None else time.time()
+        updated = 0
+        for result in results:
+            if result.error or result.deferred:
+                continue
+            self.projects[result.project] = ProjectSnapshot(result.project, now, list(result.listed))
+            updated += 1
+        return updated
+
+    def save(self):
+        """以原子方式寫入快照檔"""
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "fields": MR_FIELDS,
+            "projects": {
+                project: {
+                    "scanned_at": entry.scanned_at,
+                    "mrs": [[getattr(mr, name) for name in MR_FIELDS] for mr in entry.merge_requests],
+                }
+                for project, entry in self.projects.items()
+            },
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def merge_requests(self, projects: Optional[Iterable[str]] = None) -> List[MRInfo]:
+        """
+        取得快照中的 MR
+
+        Args:
+            projects: 只取指定專案，None 表示全部
+
+        Returns:
+            MR 列表
+        """
+        names = self.projects.keys() if projects is None else projects
+        return [mr for name in names if name in self.projects for mr in self.projects[name].merge_requests]
+
+    def oldest(self) -> Optional[float]:
+        """最舊的專案掃描時間；沒有快照時回傳 None"""
+        return min((entry.scanned_at for entry in self.projects.values()), default=None)
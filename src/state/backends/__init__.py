@@ -0,0 +1,15 @@
+"""
+狀態儲存後端模組
+
+匯入各後端模組以完成註冊。
+"""
+
+from .base import StateBackend, available_backends, create_backend, register_backend
+from . import json_backend, kv_backend, sqlite_backend
+
+__all__ = [
+    'StateBackend',
+    'available_backends',
+    'create_backend',
+    'register_backend',
+]
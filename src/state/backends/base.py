@@ -0,0 +1,151 @@
+"""
+狀態儲存後端介面與註冊表
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from src.state.models import MRState, ScanRecord
+from src.utils.exceptions import StateError
+
+
+StateKey = Tuple[int, str]
+
+
+class StateBackend(ABC):
+    """
+    狀態儲存後端
+
+    每個後端負責一種儲存格式；錯誤處理與日誌由 StateManager 統一包裝，
+    後端直接拋出原始例外即可。
+    """
+
+    def __init__(self, db_path: Optional[str], state_dir: Path):
+        """
+        初始化後端
+
+        Args:
+            db_path: 資料庫檔案路徑（僅部分後端使用）
+            state_dir: 狀態儲存目錄
+        """
+        self.db_path = db_path
+        self.state_dir = state_dir
+
+    @abstractmethod
+    def save_mr_states(self, mr_states: List[MRState]):
+        """批次保存 MR 狀態（同鍵覆蓋）"""
+
+    @abstractmethod
+    def get_mr_state(self, mr_id: int, project_slug: str) -> Optional[MRState]:
+        """取得單一 MR 狀態"""
+
+    @abstractmethod
+    def get_all_mr_states(self) -> List[MRState]:
+        """取得所有 MR 狀態"""
+
+    @abstractmethod
+    def delete_mr_states(self, keys: List[StateKey]):
+        """批次刪除 MR 狀態"""
+
+    @abstractmethod
+    def record_scan(self, record: ScanRecord):
+        """寫入一筆掃描統計"""
+
+    @abstractmethod
+    def get_scan_history(self, project: Optional[str], since: Optional[str]) -> List[ScanRecord]:
+        """取得掃描統計（依時間由舊到新）"""
+
+    @abstractmethod
+    def get_document(self, namespace: str, key: str) -> Optional[dict]:
+        """
+        取得命名空間下的一筆文件
+
+        文件為其他模組（如專案快取）持久化的小型 JSON 資料。
+        """
+
+    @abstractmethod
+    def get_documents(self, namespace: str) -> Dict[str, dict]:
+        """取得命名空間下的所有文件（鍵 -> 內容）"""
+
+    def get_document_keys(self, namespace: str) -> List[str]:
+        """取得命名空間下所有文件的鍵（不解析內容）"""
+        return list(self.get_documents(namespace))
+
+    @abstractmethod
+    def put_document(self, namespace: str, key: str, value: dict):
+        """寫入命名空間下的一筆文件（同鍵覆蓋）"""
+
+    @abstractmethod
+    def delete_document(self, namespace: str, key: str):
+        """刪除命名空間下的一筆文件"""
+
+    def close(self):
+        """釋放後端資源"""
+
+
+_BACKENDS: Dict[str, Type[StateBackend]] = {}
+
+
+def register_backend(name: str) -> Callable[[Type[StateBackend]], Type[StateBackend]]:
+    """
+    註冊狀態儲存後端的裝飾器
+
+    Args:
+        name: 後端名稱（對應 STORAGE_TYPE）
+    """
+    def decorator(cls: Type[StateBackend]) -> Type[StateBackend]:
+        _BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def available_backends() -> List[str]:
+    """取得已註冊的後端名稱"""
+    return sorted(_BACKENDS)
+
+
+def create_backend(name: str, db_path: Optional[str], state_dir: Path) -> StateBackend:
+    """
+    依名稱建立後端
+
+    Args:
+        name: 後端名稱
+        db_path: 資料庫檔案路徑
+        state_dir: 狀態儲存目錄
+
+    Raises:
+        StateError: 未知的後端名稱
+    """
+    if name not in _BACKENDS:
+        raise StateError(f"未知的存儲類型: {name}（可用: {', '.join(available_backends())}）")
+    return _BACKENDS[name](db_path=db_path, state_dir=state_dir)
+
+
+SCAN_RECORD_FIELDS = [
+    "scan_time", "project", "mr_count", "success",
+    "duration_ms", "api_requests", "bytes_transferred",
+    "clones_created", "clones_refreshed", "clones_skipped", "clones_failed",
+    "error_class", "lock_wait_ms", "clones_deferred",
+    "git_negotiation_ms", "git_pack_ms", "git_checkout_ms", "git_total_ms",
+]
+
+
+def scan_record_from_dict(row: dict) -> ScanRecord:
+    """由資料列建立 ScanRecord，舊資料缺少的欄位補上預設值"""
+    values = {name: row[name] for name in SCAN_RECORD_FIELDS if row.get(name) is not None}
+    values["success"] = bool(values.get("success", False))
+    values.setdefault("mr_count", 0)
+    return ScanRecord(**values)
+
+
+def filter_scan_records(records: List[ScanRecord], project: Optional[str], since: Optional[str]) -> List[ScanRecord]:
+    """依專案與時間篩選掃描統計，並依時間排序"""
+    return sorted(
+        (
+            record for record in records
+            if (project is None or record.project == project)
+            and (since is None or record.scan_time >= since)
+        ),
+        key=lambda record: record.scan_time,
+    )
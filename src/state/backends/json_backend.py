@@ -0,0 +1,125 @@
+"""
+JSON 狀態儲存後端（人類可讀，適合除錯）
+
+每次寫入都是「讀取整個檔案 → 修改 → 寫回」，以執行緒鎖串行化，
+並先寫入暫存檔再以 os.replace 取代，讀取端不會看到寫到一半的檔案。
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from src.state.backends.base import (
+    StateBackend,
+    StateKey,
+    filter_scan_records,
+    register_backend,
+    scan_record_from_dict,
+)
+from src.state.models import MRState, ScanRecord
+
+
+@register_backend("json")
+class JSONBackend(StateBackend):
+    """JSON 後端：每次操作完整讀寫檔案"""
+
+    def __init__(self, db_path, state_dir):
+        super().__init__(db_path, state_dir)
+        self.mr_state_file = self.state_dir / "mr_states.json"
+        self.scan_history_file = self.state_dir / "scan_history.json"
+        self.documents_file = self.state_dir / "documents.json"
+        self._lock = threading.Lock()
+
+        # 建立初始檔案
+        for path in (self.mr_state_file, self.scan_history_file):
+            if not path.exists():
+                self._dump(path, [])
+
+    def _load(self, path) -> list:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _dump(self, path, data):
+        # 暫存檔與目標在同一目錄，os.replace 為原子操作
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def save_mr_states(self, mr_states: List[MRState]):
+        with self._lock:
+            states = self._load(self.mr_state_file)
+
+            # 以 (mr_id, project_slug) 建立索引，更新或新增
+            index = {
+                (state["mr_id"], state["project_slug"]): i
+                for i, state in enumerate(states)
+            }
+            for mr_state in mr_states:
+                key = (mr_state.mr_id, mr_state.project_slug)
+                if key in index:
+                    states[index[key]] = mr_state.__dict__
+                else:
+                    index[key] = len(states)
+                    states.append(mr_state.__dict__)
+
+            self._dump(self.mr_state_file, states)
+
+    def get_mr_state(self, mr_id: int, project_slug: str) -> Optional[MRState]:
+        for state in self._load(self.mr_state_file):
+            if state["mr_id"] == mr_id and state["project_slug"] == project_slug:
+                return MRState(**state)
+        return None
+
+    def get_all_mr_states(self) -> List[MRState]:
+        return [MRState(**state) for state in self._load(self.mr_state_file)]
+
+    def delete_mr_states(self, keys: List[StateKey]):
+        removed = set(keys)
+        with self._lock:
+            states = [
+                state for state in self._load(self.mr_state_file)
+                if (state["mr_id"], state["project_slug"]) not in removed
+            ]
+            self._dump(self.mr_state_file, states)
+
+    def record_scan(self, record: ScanRecord):
+        with self._lock:
+            history = self._load(self.scan_history_file)
+            history.append(record.__dict__)
+            self._dump(self.scan_history_file, history)
+
+    def get_scan_history(self, project: Optional[str], since: Optional[str]) -> List[ScanRecord]:
+        records = [scan_record_from_dict(row) for row in self._load(self.scan_history_file)]
+        return filter_scan_records(records, project, since)
+
+    def _load_documents(self) -> dict:
+        # 文件檔在第一次寫入時才建立，既有的狀態目錄不需遷移
+        if not self.documents_file.exists():
+            return {}
+        with open(self.documents_file, "r") as f:
+            return json.load(f)
+
+    def get_document(self, namespace: str, key: str) -> Optional[dict]:
+        return self._load_documents().get(namespace, {}).get(key)
+
+    def get_documents(self, namespace: str) -> Dict[str, dict]:
+        return self._load_documents().get(namespace, {})
+
+    def put_document(self, namespace: str, key: str, value: dict):
+        with self._lock:
+            documents = self._load_documents()
+            documents.setdefault(namespace, {})[key] = value
+            self._dump(self.documents_file, documents)
+
+    def delete_document(self, namespace: str, key: str):
+        with self._lock:
+            documents = self._load_documents()
+            if documents.get(namespace, {}).pop(key, None) is not None:
+                self._dump(self.documents_file, documents)
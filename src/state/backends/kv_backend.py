@@ -0,0 +1,123 @@
+"""
+嵌入式 key-value 狀態儲存後端（標準函式庫 dbm）
+
+以 (project_slug, mr_id) 為鍵直接查詢，點查詢不需掃描整份資料，
+適合追蹤大量 MR 狀態。dbm 的實際實作（gnu/ndbm/dumb）依平台而定。
+"""
+
+import dbm
+import json
+import threading
+from typing import Dict, List, Optional
+
+from src.state.backends.base import (
+    StateBackend,
+    StateKey,
+    filter_scan_records,
+    register_backend,
+    scan_record_from_dict,
+)
+from src.state.models import MRState, ScanRecord
+
+
+MR_PREFIX = b"mr:"
+SCAN_PREFIX = b"scan:"
+SCAN_SEQ_KEY = b"meta:scan_seq"
+DOC_PREFIX = b"doc:"
+
+
+@register_backend("kv")
+class KVBackend(StateBackend):
+    """dbm 後端：每個 MR 狀態為一筆 JSON 值"""
+
+    def __init__(self, db_path, state_dir):
+        super().__init__(db_path, state_dir)
+        self.kv_path = self.state_dir / "mr_state.kv"
+        self._lock = threading.Lock()
+        self._db = dbm.open(str(self.kv_path), "c")
+
+    @staticmethod
+    def _mr_key(mr_id: int, project_slug: str) -> bytes:
+        return MR_PREFIX + f"{project_slug}\0{mr_id}".encode("utf-8")
+
+    @staticmethod
+    def _doc_key(namespace: str, key: str) -> bytes:
+        return DOC_PREFIX + f"{namespace}\0{key}".encode("utf-8")
+
+    def _sync(self):
+        """將寫入落地（僅部分 dbm 實作支援）"""
+        sync = getattr(self._db, "sync", None)
+        if sync:
+            sync()
+
+    def _values_with_prefix(self, prefix: bytes) -> List[dict]:
+        return [json.loads(self._db[key]) for key in self._db.keys() if key.startswith(prefix)]
+
+    def save_mr_states(self, mr_states: List[MRState]):
+        with self._lock:
+            for mr_state in mr_states:
+                self._db[self._mr_key(mr_state.mr_id, mr_state.project_slug)] = json.dumps(mr_state.__dict__)
+            self._sync()
+
+    def get_mr_state(self, mr_id: int, project_slug: str) -> Optional[MRState]:
+        with self._lock:
+            value = self._db.get(self._mr_key(mr_id, project_slug))
+        return MRState(**json.loads(value)) if value is not None else None
+
+    def get_all_mr_states(self) -> List[MRState]:
+        with self._lock:
+            return [MRState(**state) for state in self._values_with_prefix(MR_PREFIX)]
+
+    def delete_mr_states(self, keys: List[StateKey]):
+        with self._lock:
+            for mr_id, project_slug in keys:
+                key = self._mr_key(mr_id, project_slug)
+                if key in self._db:
+                    del self._db[key]
+            self._sync()
+
+    def record_scan(self, record: ScanRecord):
+        with self._lock:
+            seq = int(self._db.get(SCAN_SEQ_KEY, b"0")) + 1
+            self._db[SCAN_PREFIX + f"{seq:012d}".encode("ascii")] = json.dumps(record.__dict__)
+            self._db[SCAN_SEQ_KEY] = str(seq)
+            self._sync()
+
+    def get_scan_history(self, project: Optional[str], since: Optional[str]) -> List[ScanRecord]:
+        with self._lock:
+            rows = self._values_with_prefix(SCAN_PREFIX)
+        return filter_scan_records([scan_record_from_dict(row) for row in rows], project, since)
+
+    def get_document(self, namespace: str, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._db.get(self._doc_key(namespace, key))
+        return json.loads(value) if value is not None else None
+
+    def get_documents(self, namespace: str) -> Dict[str, dict]:
+        prefix = self._doc_key(namespace, "")
+        with self._lock:
+            return {
+                key[len(prefix):].decode("utf-8"): json.loads(self._db[key])
+                for key in self._db.keys() if key.startswith(prefix)
+            }
+
+    def get_document_keys(self, namespace: str) -> List[str]:
+        prefix = self._doc_key(namespace, "")
+        with self._lock:
+            return [key[len(prefix):].decode("utf-8") for key in self._db.keys() if key.startswith(prefix)]
+
+    def put_document(self, namespace: str, key: str, value: dict):
+        with self._lock:
+            self._db[self._doc_key(namespace, key)] = json.dumps(value)
+            self._sync()
+
+    def delete_document(self, namespace: str, key: str):
+        with self._lock:
+            doc_key = self._doc_key(namespace, key)
+            if doc_key in self._db:
+                del self._db[doc_key]
+                self._sync()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
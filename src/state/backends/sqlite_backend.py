@@ -0,0 +1,234 @@
+"""
+SQLite 狀態儲存後端
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from src.state.backends.base import (
+    SCAN_RECORD_FIELDS,
+    StateBackend,
+    StateKey,
+    register_backend,
+    scan_record_from_dict,
+)
+from src.state.models import MRState, ScanRecord
+
+
+# scan_history 在初始版本之後新增的統計欄位
+SCAN_HISTORY_COLUMNS = [
+    ("duration_ms", "REAL DEFAULT 0"),
+    ("api_requests", "INTEGER DEFAULT 0"),
+    ("bytes_transferred", "INTEGER DEFAULT 0"),
+    ("clones_created", "INTEGER DEFAULT 0"),
+    ("clones_refreshed", "INTEGER DEFAULT 0"),
+    ("clones_skipped", "INTEGER DEFAULT 0"),
+    ("clones_failed", "INTEGER DEFAULT 0"),
+    ("error_class", "TEXT"),
+    ("lock_wait_ms", "REAL DEFAULT 0"),
+    ("clones_deferred", "INTEGER DEFAULT 0"),
+    ("git_negotiation_ms", "REAL DEFAULT 0"),
+    ("git_pack_ms", "REAL DEFAULT 0"),
+    ("git_checkout_ms", "REAL DEFAULT 0"),
+    ("git_total_ms", "REAL DEFAULT 0"),
+]
+
+# merge_requests 在初始版本之後新增的欄位
+MERGE_REQUESTS_COLUMNS = [
+    ("mr_updated_at", "TEXT DEFAULT ''"),
+]
+
+MR_STATE_COLUMNS = "mr_id, project_slug, iid, state, head_commit_sha, saved_at, mr_updated_at"
+
+
+@register_backend("sqlite")
+class SQLiteBackend(StateBackend):
+    """SQLite 後端：以單一連線搭配鎖序列化存取，避免每次操作重新連線"""
+
+    def __init__(self, db_path, state_dir):
+        super().__init__(db_path, state_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            self._init_schema()
+        except Exception:
+            self._conn.close()
+            raise
+
+    def _init_schema(self):
+        """建立資料表並套用遷移"""
+        cursor = self._conn.cursor()
+
+        # 建立 merge_requests 表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS merge_requests (
+                id INTEGER PRIMARY KEY,
+                mr_id INTEGER,
+                project_slug TEXT,
+                iid INTEGER,
+                state TEXT,
+                head_commit_sha TEXT,
+                saved_at TEXT
+            )
+        """)
+
+        # 舊版缺少唯一鍵，INSERT OR REPLACE 會累積重複列；保留最新一筆後補上唯一索引
+        cursor.execute("""
+            DELETE FROM merge_requests
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM merge_requests GROUP BY mr_id, project_slug
+            )
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_merge_requests_key
+            ON merge_requests (mr_id, project_slug)
+        """)
+
+        cursor.execute("PRAGMA table_info(merge_requests)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, column_type in MERGE_REQUESTS_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE merge_requests ADD COLUMN {column} {column_type}")
+
+        # 建立 scan_history 表
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_history (
+                id INTEGER PRIMARY KEY,
+                scan_time TEXT,
+                project TEXT,
+                mr_count INTEGER,
+                success BOOLEAN
+            )
+        """)
+
+        cursor.execute("PRAGMA table_info(scan_history)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, column_type in SCAN_HISTORY_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE scan_history ADD COLUMN {column} {column_type}")
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_scan_history_project_time
+            ON scan_history (project, scan_time)
+        """)
+
+        # 建立 documents 表（其他模組的持久化資料，以命名空間區分）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                namespace TEXT,
+                key TEXT,
+                value TEXT,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+
+        self._conn.commit()
+
+    @staticmethod
+    def _row_to_state(row) -> MRState:
+        return MRState(
+            mr_id=row[0],
+            project_slug=row[1],
+            iid=row[2],
+            state=row[3],
+            head_commit_sha=row[4],
+            saved_at=row[5],
+            mr_updated_at=row[6] or "",
+        )
+
+    def save_mr_states(self, mr_states: List[MRState]):
+        with self._lock, self._conn:
+            self._conn.executemany(f"""
+                INSERT OR REPLACE INTO merge_requests ({MR_STATE_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    mr_state.mr_id,
+                    mr_state.project_slug,
+                    mr_state.iid,
+                    mr_state.state,
+                    mr_state.head_commit_sha,
+                    mr_state.saved_at,
+                    mr_state.mr_updated_at,
+                ) for mr_state in mr_states
+            ])
+
+    def get_mr_state(self, mr_id: int, project_slug: str) -> Optional[MRState]:
+        with self._lock:
+            row = self._conn.execute(f"""
+                SELECT {MR_STATE_COLUMNS} FROM merge_requests
+                WHERE mr_id = ? AND project_slug = ?
+            """, (mr_id, project_slug)).fetchone()
+        return self._row_to_state(row) if row else None
+
+    def get_all_mr_states(self) -> List[MRState]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {MR_STATE_COLUMNS} FROM merge_requests").fetchall()
+        return [self._row_to_state(row) for row in rows]
+
+    def delete_mr_states(self, keys: List[StateKey]):
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                DELETE FROM merge_requests
+                WHERE mr_id = ? AND project_slug = ?
+            """, list(keys))
+
+    def record_scan(self, record: ScanRecord):
+        placeholders = ", ".join("?" for _ in SCAN_RECORD_FIELDS)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO scan_history ({', '.join(SCAN_RECORD_FIELDS)}) VALUES ({placeholders})",
+                tuple(getattr(record, name) for name in SCAN_RECORD_FIELDS),
+            )
+
+    def get_scan_history(self, project: Optional[str], since: Optional[str]) -> List[ScanRecord]:
+        conditions = []
+        params = []
+        if project is not None:
+            conditions.append("project = ?")
+            params.append(project)
+        if since is not None:
+            conditions.append("scan_time >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SCAN_RECORD_FIELDS)} FROM scan_history {where} ORDER BY scan_time, id",
+                params,
+            ).fetchall()
+        return [scan_record_from_dict(dict(zip(SCAN_RECORD_FIELDS, row))) for row in rows]
+
+    def get_document(self, namespace: str, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM documents WHERE namespace = ? AND key = ?", (namespace, key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_documents(self, namespace: str) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM documents WHERE namespace = ?", (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_document_keys(self, namespace: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM documents WHERE namespace = ?", (namespace,)).fetchall()
+        return [row[0] for row in rows]
+
+    def put_document(self, namespace: str, key: str, value: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value)),
+            )
+
+    def delete_document(self, namespace: str, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
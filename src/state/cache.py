@@ -0,0 +1,285 @@
+"""
+狀態 write-behind 快取層
+
+在 StateManager 前加上一層記憶體快取：讀取優先由記憶體提供，
+寫入只標記為 dirty，再依下列時機批次寫回後端：
+
+- 定時：距上次寫回超過 flush_interval 秒（背景執行緒）
+- 容量：dirty 筆數達到 max_dirty
+- 專案邊界：flush_policy 為 "project" 時，每個專案處理完呼叫 checkpoint()
+- 結束：close() 或行程正常結束 (atexit)
+
+崩潰一致性：
+- "always": 每次寫入立即寫回，與未啟用快取時相同
+- "project": 行程崩潰最多遺失目前正在處理的專案的狀態
+- "batch": 行程崩潰最多遺失 flush_interval 秒或 max_dirty 筆的狀態
+遺失的狀態只會讓下次掃描重新處理對應的 MR，不會造成資料錯亂。
+"""
+
+import atexit
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.logger import logger
+from src.observability.metrics import cache_requests
+from src.observability.tracing import traced
+from src.state.manager import StateManager
+from src.state.models import MRState
+
+
+FLUSH_POLICIES = ("batch", "project", "always")
+
+StateKey = Tuple[int, str]
+
+# 直接轉交後端的屬性：設定值與不經過 MR 狀態快取的操作。
+# 其他 MR 狀態操作必須在快取層實作，否則會繞過快取而被下次寫回覆蓋。
+FORWARDED_ATTRIBUTES = frozenset({
+    "storage_type",
+    "db_path",
+    "state_dir",
+    "record_scan",
+    "get_scan_history",
+    "get_document",
+    "get_documents",
+    "get_document_keys",
+    "put_document",
+    "delete_document",
+})
+
+
+class CachedStateManager:
+    """StateManager 的記憶體 write-behind 快取"""
+
+    def __init__(
+        self,
+        backend: StateManager,
+        flush_interval: float = 5.0,
+        max_dirty: int = 100,
+        flush_policy: str = "batch",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化快取層
+
+        Args:
+            backend: 實際寫入的狀態管理器
+            flush_interval: 定時寫回間隔（秒），<= 0 表示停用定時寫回
+            max_dirty: dirty 筆數達到此值時立即寫回
+            flush_policy: 寫回策略 ("batch"、"project" 或 "always")
+            clock: 取得目前時間的函數（測試用）
+        """
+        if flush_policy not in FLUSH_POLICIES:
+            raise ValueError(f"未知的 flush 策略: {flush_policy}")
+
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.flush_policy = flush_policy
+        self._clock = clock
+
+        # None 代表已確認不存在或待刪除
+        self._entries: Dict[StateKey, Optional[MRState]] = {}
+        self._dirty: Dict[StateKey, Optional[MRState]] = {}
+        self._all_loaded = False
+        self._lock = threading.RLock()
+        self._last_flush = clock()
+
+        self._stop_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        """只轉交 FORWARDED_ATTRIBUTES 中的屬性，其餘一律拋出 AttributeError"""
+        if name not in FORWARDED_ATTRIBUTES:
+            raise AttributeError(f"{type(self).__name__} 不支援 {name}")
+        return getattr(self.backend, name)
+
+    @property
+    def dirty_count(self) -> int:
+        """尚未寫回的筆數"""
+        with self._lock:
+            return len(self._dirty)
+
+    def save_mr_state(self, mr_state: MRState):
+        """
+        保存 MR 狀態（寫入記憶體並標記 dirty）
+
+        Args:
+            mr_state: MR 狀態物件
+        """
+        key = (mr_state.mr_id, mr_state.project_slug)
+        with self._lock:
+            self._entries[key] = mr_state
+            self._dirty[key] = mr_state
+        self._after_write()
+
+    def save_mr_states(self, mr_states: List[MRState]):
+        """
+        批次保存 MR 狀態
+
+        Args:
+            mr_states: MR 狀態物件列表
+        """
+        with self._lock:
+            for mr_state in mr_states:
+                key = (mr_state.mr_id, mr_state.project_slug)
+                self._entries[key] = mr_state
+                self._dirty[key] = mr_state
+        self._after_write()
+
+    def get_mr_state(self, mr_id: int, project_slug: str) -> Optional[MRState]:
+        """
+        取得 MR 狀態，未命中時向後端讀取並快取（含不存在的結果）
+
+        Args:
+            mr_id: MR ID
+            project_slug: 專案路徑
+
+        Returns:
+            MRState 物件或 None
+        """
+        key = (mr_id, project_slug)
+        with self._lock:
+            if key in self._entries:
+                cache_requests.inc(cache="state", result="hit")
+                return self._entries[key]
+            if self._all_loaded:
+                cache_requests.inc(cache="state", result="hit")
+                return None
+
+        cache_requests.inc(cache="state", result="miss")
+        mr_state = self.backend.get_mr_state(mr_id, project_slug)
+        with self._lock:
+            # 讀取期間若已有新寫入，以記憶體中的版本為準
+            return self._entries.setdefault(key, mr_state)
+
+    def get_all_mr_states(self) -> List[MRState]:
+        """
+        取得所有 MR 狀態，首次呼叫時自後端載入
+
+        Returns:
+            MRState 列表
+        """
+        with self._lock:
+            loaded = self._all_loaded
+
+        if not loaded:
+            stored = self.backend.get_all_mr_states()
+            with self._lock:
+                for mr_state in stored:
+                    key = (mr_state.mr_id, mr_state.project_slug)
+                    if key not in self._dirty:
+                        self._entries[key] = mr_state
+                self._all_loaded = True
+
+        with self._lock:
+            return [mr_state for mr_state in self._entries.values() if mr_state is not None]
+
+    def delete_mr_state(self, mr_id: int, project_slug: str):
+        """
+        刪除 MR 狀態（記錄刪除標記，寫回時批次刪除）
+
+        Args:
+            mr_id: MR ID
+            project_slug: 專案路徑
+        """
+        key = (mr_id, project_slug)
+        with self._lock:
+            self._entries[key] = None
+            self._dirty[key] = None
+        self._after_write()
+
+    def delete_mr_states(self, keys: List[StateKey]):
+        """
+        批次刪除 MR 狀態（立即刪除後端資料，並移出快取與 dirty 集合）
+
+        Args:
+            keys: (mr_id, project_slug) 列表
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._dirty.pop(key, None)
+            # 持有鎖時刪除，避免同時進行的寫回把舊資料寫回後端
+            self.backend.delete_mr_states(keys)
+
+    def checkpoint(self):
+        """專案邊界檢查點，"project" 策略下寫回所有 dirty 資料"""
+        if self.flush_policy in ("project", "always"):
+            self.flush()
+
+    @traced("state.cache.flush")
+    def flush(self):
+        """
+        將 dirty 資料批次寫回後端
+
+        寫回失敗時資料保留為 dirty，並拋出後端的 StateError。
+        """
+        with self._lock:
+            if not self._dirty:
+                self._last_flush = self._clock()
+                return
+
+            saves = [mr_state for mr_state in self._dirty.values() if mr_state is not None]
+            deletes = [key for key, mr_state in self._dirty.items() if mr_state is None]
+
+            self.backend.save_mr_states(saves)
+            self.backend.delete_mr_states(deletes)
+
+            logger.debug("狀態快取寫回: %s 筆保存, %s 筆刪除", len(saves), len(deletes))
+            self._dirty.clear()
+            self._last_flush = self._clock()
+
+    def close(self):
+        """停止背景寫回並寫回剩餘資料"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        atexit.unregister(self.close)
+
+        try:
+            self.flush()
+        finally:
+            self.backend.close()
+
+    def _after_write(self):
+        """寫入後依策略決定是否立即寫回，並確保背景寫回執行緒已啟動"""
+        with self._lock:
+            should_flush = (
+                self.flush_policy == "always"
+                or len(self._dirty) >= self.max_dirty
+                or (self.flush_interval > 0 and self._clock() - self._last_flush >= self.flush_interval)
+            )
+
+        if should_flush:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        """啟動定時寫回的背景執行緒"""
+        if self.flush_interval <= 0 or self._closed:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name="state-cache-flusher",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def _flush_loop(self):
+        """背景執行緒：每 flush_interval 秒寫回一次"""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("狀態快取定時寫回失敗: %s", e)
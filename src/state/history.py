@@ -0,0 +1,115 @@
+"""
+掃描歷史統計彙整
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from src.state.models import ScanRecord
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """
+    以 nearest-rank 法計算百分位數
+
+    Args:
+        values: 數值序列
+        pct: 百分位 (0-100)
+
+    Returns:
+        百分位數，序列為空時回傳 0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class ProjectScanSummary:
+    """單一專案的掃描統計摘要"""
+    project: str
+    runs: int
+    failures: int
+    p50_ms: float
+    p95_ms: float
+    p50_requests: float
+    p95_requests: float
+    avg_bytes: float
+    clones_created: int
+    clones_refreshed: int
+    clones_skipped: int
+    p95_lock_wait_ms: float = 0.0
+    git_phases_ms: Dict[str, float] = field(default_factory=dict)  # git trace2 階段 -> 每次 clone 平均毫秒
+    trend: Optional[float] = None
+    last_error_class: Optional[str] = None
+
+
+def summarize_scan_history(records: List[ScanRecord], window: int = 50) -> List[ProjectScanSummary]:
+    """
+    依專案彙整掃描統計
+
+    每個專案取最近 window 筆紀錄計算 p50/p95；trend 為較新一半相對較舊一半
+    的 p50 耗時變化比例（例如 0.25 表示變慢 25%），紀錄不足 4 筆時為 None。
+
+    Args:
+        records: 依時間由舊到新排序的掃描紀錄
+        window: 每個專案納入計算的最近紀錄數
+
+    Returns:
+        依 p95 耗時由慢到快排序的摘要列表
+    """
+    by_project: Dict[str, List[ScanRecord]] = {}
+    for record in records:
+        by_project.setdefault(record.project, []).append(record)
+
+    summaries = []
+    for project, project_records in by_project.items():
+        recent = project_records[-window:]
+        durations = [record.duration_ms for record in recent]
+        requests = [record.api_requests for record in recent]
+
+        trend = None
+        if len(recent) >= 4:
+            half = len(recent) // 2
+            older = percentile(durations[:half], 50)
+            newer = percentile(durations[half:], 50)
+            if older > 0:
+                trend = (newer - older) / older
+
+        failed = [record for record in recent if not record.success]
+        summaries.append(ProjectScanSummary(
+            project=project,
+            runs=len(recent),
+            failures=len(failed),
+            p50_ms=percentile(durations, 50),
+            p95_ms=percentile(durations, 95),
+            p50_requests=percentile(requests, 50),
+            p95_requests=percentile(requests, 95),
+            avg_bytes=sum(record.bytes_transferred for record in recent) / len(recent),
+            clones_created=sum(record.clones_created for record in recent),
+            clones_refreshed=sum(record.clones_refreshed for record in recent),
+            clones_skipped=sum(record.clones_skipped for record in recent),
+            p95_lock_wait_ms=percentile([record.lock_wait_ms for record in recent], 95),
+            git_phases_ms=_git_phases(recent),
+            trend=trend,
+            last_error_class=failed[-1].error_class if failed else None,
+        ))
+
+    return sorted(summaries, key=lambda summary: summary.p95_ms, reverse=True)
+
+
+def _git_phases(records: List[ScanRecord]) -> Dict[str, float]:
+    """有 git trace2 紀錄的掃描中，每次 clone 的各階段平均毫秒"""
+    traced = [record for record in records if record.git_total_ms > 0]
+    clones = sum(record.clones_created + record.clones_refreshed for record in traced)
+    if not clones:
+        return {}
+    return {
+        "negotiation": sum(record.git_negotiation_ms for record in traced) / clones,
+        "pack": sum(record.git_pack_ms for record in traced) / clones,
+        "checkout": sum(record.git_checkout_ms for record in traced) / clones,
+        "total": sum(record.git_total_ms for record in traced) / clones,
+    }
@@ -4,6 +4,7 @@
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Optional
 
 from src.gitlab_.models import MRInfo
 
@@ -17,6 +18,7 @@ class MRState:
     state: str
     head_commit_sha: str
     saved_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    mr_updated_at: str = ""
     
     @classmethod
     def from_mr_info(cls, mr_info: MRInfo) -> "MRState":
@@ -34,5 +36,30 @@ class MRState:
             project_slug=mr_info.project_name,
             iid=mr_info.iid,
             state=mr_info.state,
-            head_commit_sha="",  # 會在後續更新
+            head_commit_sha=mr_info.sha or "",
+            mr_updated_at=mr_info.updated_at or "",
         )
+
+
+@dataclass
+class ScanRecord:
+    """單一專案單次掃描循環的統計紀錄"""
+    project: str
+    mr_count: int
+    success: bool
+    duration_ms: float = 0.0
+    api_requests: int = 0
+    bytes_transferred: int = 0
+    clones_created: int = 0
+    clones_refreshed: int = 0
+    clones_skipped: int = 0
+    clones_failed: int = 0
+    error_class: Optional[str] = None
+    lock_wait_ms: float = 0.0
+    clones_deferred: int = 0
+    # git trace2 各階段累計耗時（GIT_TRACE2 啟用時）
+    git_negotiation_ms: float = 0.0
+    git_pack_ms: float = 0.0
+    git_checkout_ms: float = 0.0
+    git_total_ms: float = 0.0
+    scan_time: str = field(default_factory=lambda: datetime.now().isoformat())
@@ -0,0 +1,28 @@
+"""
+SQLite 共用工具
+"""
+
+import sqlite3
+
+
+class ImmediateTransaction:
+    """
+    BEGIN IMMEDIATE 交易的 context manager，例外時回滾
+
+    連線需以 isolation_level=None 開啟；進入時即取得寫入鎖，
+    確保多個行程之間「讀取後寫入」的操作是原子的。
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+        return False
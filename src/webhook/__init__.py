@@ -0,0 +1,3 @@
+"""
+Webhook 接收模組
+"""
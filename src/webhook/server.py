@@ -0,0 +1,190 @@
+"""
+GitLab merge request webhook 接收端
+
+以標準函式庫 http.server 提供 POST 端點：驗證 X-Gitlab-Token、
+只接受 Merge Request Hook，解析出專案與 MR 編號後交給 on_event 回呼。
+回呼應只做排入佇列等輕量工作，實際的 clone 由背景 worker 處理，
+讓 GitLab 能立即收到 202 回應。
+"""
+
+import hmac
+import json
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+from src.logger import logger
+from src.utils.exceptions import ConfigError
+
+
+MERGE_REQUEST_EVENT = "Merge Request Hook"
+
+
+@dataclass
+class MergeRequestEvent:
+    """merge request webhook 事件"""
+    project: str
+    iid: int
+    action: Optional[str] = None
+    state: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+def parse_merge_request_event(payload: dict) -> Optional[MergeRequestEvent]:
+    """
+    由 webhook payload 解析 MR 事件
+
+    Args:
+        payload: GitLab merge request webhook JSON
+
+    Returns:
+        MergeRequestEvent，payload 不是 merge request 事件或缺少必要欄位時回傳 None
+    """
+    if payload.get("object_kind") != "merge_request":
+        return None
+    attributes = payload.get("object_attributes") or {}
+    project = (payload.get("project") or {}).get("path_with_namespace")
+    iid = attributes.get("iid")
+    if not project or not isinstance(iid, int):
+        return None
+    return MergeRequestEvent(
+        project=project,
+        iid=iid,
+        action=attributes.get("action"),
+        state=attributes.get("state"),
+        updated_at=attributes.get("updated_at"),
+    )
+
+
+class WebhookServer:
+    """在背景執行緒執行的 webhook HTTP 伺服器"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        secret: str,
+        on_event: Callable[[MergeRequestEvent], None],
+        path: str = "/webhook",
+        max_body: int = 1024 * 1024,
+    ):
+        """
+        初始化 webhook 伺服器
+
+        Args:
+            host: 監聽位址
+            port: 監聽埠（0 表示由系統指定）
+            secret: GitLab webhook 的 Secret token
+            on_event: 收到 MR 事件時的回呼
+            path: 接收 webhook 的 URL 路徑
+            max_body: 允許的最大 payload 位元組數
+        """
+        if not secret:
+            raise ConfigError("啟用 webhook 時必須設定 WEBHOOK_SECRET")
+
+        self.secret = secret
+        self.on_event = on_event
+        self.path = path
+        self.max_body = max_body
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """實際監聽的 (host, port)"""
+        return self._httpd.server_address[:2]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = self._content_length()
+                if length is None:
+                    status, message = 400, "invalid content-length"
+                else:
+                    status, message = server.handle(self.path, self.headers, self._read_body(length))
+                body = json.dumps({"message": message}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _content_length(self) -> Optional[int]:
+                value = self.headers.get("Content-Length")
+                if value is None:
+                    return 0
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # 無法得知請求的結尾，不再沿用此連線
+                    self.close_connection = True
+                    return None
+                return length
+
+            def _read_body(self, length: int) -> Optional[bytes]:
+                if length > server.max_body:
+                    # 不讀取過大的內容，回應後關閉連線
+                    self.close_connection = True
+                    return None
+                return self.rfile.read(length)
+
+            def log_message(self, format, *args):
+                logger.debug("webhook %s " + format, self.address_string(), *args)
+
+        return Handler
+
+    def handle(self, path: str, headers, body: Optional[bytes]) -> Tuple[int, str]:
+        """
+        處理一個 webhook 請求
+
+        Args:
+            path: 請求路徑
+            headers: 請求標頭
+            body: 請求內容，超過大小上限時為 None
+
+        Returns:
+            (HTTP 狀態碼, 訊息)
+        """
+        if path.split("?", 1)[0] != self.path:
+            return 404, "not found"
+        token = headers.get("X-Gitlab-Token") or ""
+        if not hmac.compare_digest(token.encode("utf-8"), self.secret.encode("utf-8")):
+            logger.warning("webhook token 驗證失敗")
+            return 401, "invalid token"
+        if body is None:
+            return 413, "payload too large"
+        if headers.get("X-Gitlab-Event") != MERGE_REQUEST_EVENT:
+            return 202, "ignored"
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, "invalid json"
+        event = parse_merge_request_event(payload) if isinstance(payload, dict) else None
+        if event is None:
+            return 400, "invalid merge request payload"
+
+        self.on_event(event)
+        logger.info("收到 webhook: %s!%s (%s)", event.project, event.iid, event.action)
+        return 202, "accepted"
+
+    def start(self):
+        """在背景執行緒開始接受請求"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="webhook", daemon=True)
+        self._thread.start()
+        host, port = self.address
+        logger.info("webhook 伺服器啟動: http://%s:%s%s", host, port, self.path)
+
+    def stop(self):
+        """停止伺服器並釋放連接埠"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
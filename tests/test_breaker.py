@@ -0,0 +1,230 @@
+"""
+測試專案掃描斷路器
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import gitlab
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.config import Config
+from src.main import cli
+from src.scanner.breaker import CLOSED, HALF_OPEN, OPEN, ProjectBreaker
+from src.scanner.mr_scanner import MRScanner, ScanResult
+from src.state.manager import StateManager
+from src.utils.exceptions import ConfigError, GitLabError, StateError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _manager(tmp_path):
+    return StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path / "state"))
+
+
+def _failed(project="g/a", status=None):
+    return ScanResult(project=project, merge_requests=[], error="boom", error_class="GitlabListError", error_status=status)
+
+
+def test_breaker_opens_after_threshold_and_backs_off(tmp_path):
+    clock = FakeClock()
+    breaker = ProjectBreaker(_manager(tmp_path), threshold=2, base_delay=100, max_delay=300, clock=clock)
+
+    assert breaker.record(_failed()).state == CLOSED
+    assert breaker.blocking("g/a") is None
+    entry = breaker.record(_failed())
+    assert (entry.state, entry.skip_until) == (OPEN, 1100)
+    assert breaker.blocking("g/a").failures == 2
+
+    # 冷卻結束後放行一次探測，探測期間其他呼叫仍被阻擋
+    clock.now = 1100
+    assert breaker.blocking("g/a") is None
+    assert breaker.blocking("g/a").state == HALF_OPEN
+
+    # 探測失敗：冷卻時間加倍；再失敗則受上限限制
+    assert breaker.record(_failed()).skip_until == 1100 + 200
+    clock.now = 1300
+    breaker.blocking("g/a")
+    assert breaker.record(_failed()).skip_until == 1300 + 300
+    assert [entry.project for entry in breaker.tripped()] == ["g/a"]
+
+    clock.now = 1600
+    assert breaker.blocking("g/a") is None
+    assert breaker.record(ScanResult(project="g/a", merge_requests=[])) is None
+    assert breaker.tripped() == []
+    assert breaker.blocking("g/a") is None
+
+
+def test_permanent_errors_open_immediately(tmp_path):
+    breaker = ProjectBreaker(_manager(tmp_path), threshold=5, clock=FakeClock())
+
+    assert breaker.record(_failed(status=404)).state == OPEN
+    assert breaker.record(_failed("g/b", status=500)).state == CLOSED
+    assert breaker.reset("g/a") is True
+    assert breaker.reset("g/a") is False
+
+    # 401 是 token 的問題，不計入專案
+    assert breaker.record(_failed("g/c", status=401)) is None
+    assert breaker.record(_failed("g/b", status=401)).failures == 1
+
+
+def test_state_errors_do_not_block_scanning():
+    manager = Mock()
+    manager.get_document.side_effect = StateError("locked")
+    manager.put_document.side_effect = StateError("locked")
+    manager.delete_document.side_effect = StateError("locked")
+    breaker = ProjectBreaker(manager, threshold=1, clock=FakeClock())
+
+    # 讀取失敗視為沒有斷路器；寫入與清除失敗只記錄警告
+    assert breaker.blocking("g/a") is None
+    assert breaker.record(_failed(status=500)).state == OPEN
+    assert breaker.reset("g/a") is False
+
+    manager.get_document.side_effect = None
+    manager.get_document.return_value = {"project": "g/a", "state": OPEN, "failures": 1}
+    assert breaker.record(ScanResult(project="g/a", merge_requests=[])) is None
+    manager.delete_document.assert_called_once_with("breakers", "g/a")
+
+
+def test_scanner_reports_error_status():
+    client = Mock()
+
+    def fail(project, params=None):
+        try:
+            raise gitlab.exceptions.GitlabGetError("403 Forbidden", response_code=403)
+        except Exception as e:
+            raise GitLabError(f"取得專案失敗: {e}")
+
+    client.get_merge_requests.side_effect = fail
+    (result,) = MRScanner(client, Mock()).scan(["g/a"])
+
+    assert (result.error_class, result.error_status) == ("GitlabGetError", 403)
+
+
+def test_scan_skips_open_breaker_and_lists_it(monkeypatch, tmp_path):
+    manager = _manager(tmp_path)
+    breaker = ProjectBreaker(manager, threshold=1)
+    scanned = []
+    modes = []
+
+    def scan(projects, exclude_wip, exclude_draft):
+        scanned.extend(projects)
+        return [_failed(projects[0], status=404)]
+
+    def fake_init(offline=False):
+        modes.append(offline)
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/a"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+        )
+        main.state_manager = manager
+        main.job_queue = Mock()
+        main.mr_scanner = SimpleNamespace(scan=scan)
+        main.project_breaker = breaker
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    # 測試結束後還原 fake_init 設定的全域變數
+    for name in ("logger", "config", "state_manager", "job_queue", "mr_scanner", "project_breaker"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    runner = CliRunner()
+    assert runner.invoke(cli, ["scan"]).exit_code == 0
+    result = runner.invoke(cli, ["scan"])
+
+    assert result.exit_code == 0, result.output
+    assert "連續失敗 1 次，暫停掃描至" in result.output
+    assert scanned == ["g/a"]
+
+    result = runner.invoke(cli, ["breakers"])
+    assert "g/a" in result.output and "404" in result.output
+    result = runner.invoke(cli, ["breakers", "--reset", "g/a"])
+    assert "已關閉 g/a" in result.output
+    assert breaker.tripped() == []
+    # scan 連線 GitLab，breakers 只讀寫本機狀態
+    assert modes == [False, False, True, True]
+
+
+def test_scan_stops_on_unauthorized(monkeypatch, tmp_path):
+    manager = _manager(tmp_path)
+    breaker = ProjectBreaker(manager, threshold=1)
+    scanned = []
+
+    def scan(projects, exclude_wip, exclude_draft):
+        scanned.extend(projects)
+        return [_failed(projects[0], status=401)]
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/a", "g/b"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+        )
+        main.state_manager = manager
+        main.job_queue = Mock()
+        main.mr_scanner = SimpleNamespace(scan=scan)
+        main.project_breaker = breaker
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "job_queue", "mr_scanner", "project_breaker"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["scan"])
+
+    assert result.exit_code == 1
+    assert "g/a: GitLab 驗證失敗 (401)，停止掃描其餘專案" in result.output
+    assert "請確認 GITLAB_TOKEN" in result.output
+    assert scanned == ["g/a"]
+    assert breaker.tripped() == []
+
+
+def test_breakers_command_edge_cases(monkeypatch, tmp_path):
+    failing = Mock()
+    failing.tripped.side_effect = StateError("locked")
+    breakers = [None, ProjectBreaker(_manager(tmp_path), threshold=1), ProjectBreaker(_manager(tmp_path), threshold=1), failing]
+
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.project_breaker = breakers.pop(0)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "project_breaker"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["breakers"])
+    assert result.exit_code == 0 and "斷路器未啟用" in result.output
+
+    result = runner.invoke(cli, ["breakers"])
+    assert result.exit_code == 0 and "沒有開啟中的斷路器" in result.output
+
+    result = runner.invoke(cli, ["breakers", "--reset", "g/unknown"])
+    assert result.exit_code == 0 and "g/unknown 沒有斷路器紀錄" in result.output
+
+    result = runner.invoke(cli, ["breakers"])
+    assert result.exit_code == 1 and "locked" in result.output
+    main.logger.error.assert_called_once()
+
+
+def test_breaker_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    config = Config.from_env()
+    assert (config.breaker_threshold, config.breaker_base_delay, config.breaker_max_delay) == (3, 300.0, 86400.0)
+
+    monkeypatch.setenv("BREAKER_BASE_DELAY", "100000")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.delenv("BREAKER_BASE_DELAY")
+    monkeypatch.setenv("BREAKER_THRESHOLD", "-1")
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -0,0 +1,108 @@
+"""
+測試狀態儲存中的 clone 清單
+"""
+
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CLONE_STRATEGY, CloneManager
+from src.clone.workspaces import Workspace, WorkspaceStore
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.main import cli
+from src.state.manager import StateManager
+
+
+def _mr(iid, title="Add feature", sha="0123456789abcdef"):
+    return MRInfo(
+        id=100 + iid, project_id=1, project_name="a/b/c", iid=iid, title=title, description="", state="opened",
+        author="a", created_at="2024-01-01T00:00:00Z", updated_at="2024-01-02T00:00:00Z",
+        source_branch="feature", target_branch="main", web_url=f"https://gitlab.example.com/a/b/c/-/merge_requests/{iid}",
+        draft=False, work_in_progress=False, sha=sha,
+    )
+
+
+def _fake_git(cmd, cwd=None):
+    if cmd[1] == "clone":
+        (Path(cmd[-1]) / ".git").mkdir(parents=True)
+
+
+def _manager(tmp_path, **config):
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    config = SimpleNamespace(reviews_path=str(tmp_path / "reviews"), gitlab_url="https://gitlab.example.com", **config)
+    return CloneManager(config, state_manager, workspaces=WorkspaceStore(state_manager))
+
+
+def test_clone_records_manifest(tmp_path):
+    manager = _manager(tmp_path, mr_info_export=False)
+
+    with patch.object(CloneManager, "_run_git_command", side_effect=_fake_git):
+        clone_path = manager.create_clone(_mr(1))
+
+    workspace = manager.workspaces.get("a/b/c", 1)
+    assert (workspace.mr_id, workspace.title, workspace.source_branch, workspace.target_branch) == (
+        101, "Add feature", "feature", "main",
+    )
+    assert (workspace.head_sha, workspace.strategy, workspace.mr_updated_at) == (
+        "0123456789abcdef", CLONE_STRATEGY, "2024-01-02T00:00:00Z",
+    )
+    assert set(workspace.timings) == {"clone", "fetch", "checkout"} and workspace.cloned_at > 0
+    # 關閉匯出時不寫入 .mr_info.json
+    assert not (clone_path / ".mr_info.json").exists()
+
+    assert manager.update_metadata(_mr(1, title="Renamed"))
+    workspace = manager.workspaces.get("a/b/c", 1)
+    assert workspace.title == "Renamed" and set(workspace.timings) == {"clone", "fetch", "checkout"}
+
+
+def test_workspace_from_document_tolerates_schema_changes():
+    # 舊版只有大小與存取時間；新版可能多出欄位
+    old = Workspace.from_document({"project": "a/b/c", "iid": 1, "size": 10, "last_access": 5.0})
+    assert (old.title, old.timings) == ("", {})
+    newer = Workspace.from_document({"project": "a/b/c", "iid": 1, "future_field": True})
+    assert newer.iid == 1
+
+
+def test_list_clones_long_uses_single_query(monkeypatch, tmp_path):
+    manager = _manager(tmp_path)
+    with patch.object(CloneManager, "_run_git_command", side_effect=_fake_git):
+        manager.create_clone(_mr(1))
+        manager.create_clone(_mr(2, title="Fix bug", sha="fedcba9876543210"))
+    assert (tmp_path / "reviews/a/b/c/1/.mr_info.json").exists()
+    state_manager = manager.state_manager
+    get_documents = Mock(wraps=state_manager.get_documents)
+    get_document = Mock(wraps=state_manager.get_document)
+    monkeypatch.setattr(state_manager, "get_documents", get_documents)
+    monkeypatch.setattr(state_manager, "get_document", get_document)
+
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.config = manager.config
+        main.state_manager = state_manager
+        main.clone_manager = manager
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["list-clones", "--long"])
+
+    assert result.exit_code == 0, result.output
+    assert "#1      01234567" in result.output and "feature → main  Add feature" in result.output
+    assert "#2      fedcba98" in result.output and "Fix bug" in result.output
+    assert "總計: 2 個 clone" in result.output
+    assert get_documents.call_count == 1 and get_document.call_count == 0
+
+
+def test_mr_info_export_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    assert Config.from_env().mr_info_export is True
+    monkeypatch.setenv("MR_INFO_EXPORT", "false")
+    assert Config.from_env().mr_info_export is False
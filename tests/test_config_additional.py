@@ -45,3 +45,73 @@ def test_load_projects_from_file_file_not_found(monkeypatch, tmp_path):
         Config._load_projects_from_file(str(file_path))
 
     assert "專案清單檔案不存在" in str(exc.value) or "讀取專案清單檔案失敗" in str(exc.value)
+
+
+def test_storage_type_from_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "proj/a")
+    monkeypatch.setenv("STORAGE_TYPE", "KV")
+
+    assert Config.from_env().storage_type == "kv"
+
+
+def test_job_queue_settings_from_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "proj/a")
+    monkeypatch.setenv("JOB_MAX_ATTEMPTS", "5")
+    monkeypatch.setenv("JOB_BACKOFF_SECONDS", "2.5")
+    monkeypatch.setenv("JOB_LEASE_TIMEOUT", "60")
+    monkeypatch.setenv("JOB_RETENTION", "0")
+
+    config = Config.from_env()
+    assert config.job_max_attempts == 5
+    assert config.job_backoff_seconds == 2.5
+    assert config.job_lease_timeout == 60.0
+    assert config.job_retention == 0.0
+
+    monkeypatch.setenv("JOB_RETENTION", "-1")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+
+def test_shard_settings_from_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "proj/a")
+    monkeypatch.setenv("SHARD_MODE", "Hash")
+    monkeypatch.setenv("SHARD_NODE_ID", "review-1")
+    monkeypatch.setenv("SHARD_NODES", "review-1, review-2")
+
+    config = Config.from_env()
+    assert config.shard_mode == "hash"
+    assert config.shard_node_id == "review-1"
+    assert config.shard_nodes == ["review-1", "review-2"]
+    assert config.shard_lease_ttl == 900.0
+
+    monkeypatch.setenv("SHARD_MODE", "random")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+
+def test_scan_lock_settings_from_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "proj/a")
+
+    config = Config.from_env()
+    assert config.scan_lock == "global"
+    assert config.scan_lock_wait == 0.0
+
+    monkeypatch.setenv("SCAN_LOCK", "Project")
+    monkeypatch.setenv("SCAN_LOCK_WAIT", "30")
+    monkeypatch.setenv("SCAN_LOCK_STALE", "600")
+    config = Config.from_env()
+    assert config.scan_lock == "project"
+    assert config.scan_lock_wait == 30.0
+    assert config.scan_lock_stale == 600.0
+
+    monkeypatch.setenv("SCAN_LOCK", "file")
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -0,0 +1,45 @@
+"""
+測試 Config.from_env 對狀態快取設定的解析
+"""
+
+import pytest
+
+from src.config import Config
+from src.utils.exceptions import ConfigError
+
+
+@pytest.fixture
+def base_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+
+def test_state_cache_defaults(base_env):
+    config = Config.from_env()
+
+    assert config.state_cache_enabled is False
+    assert config.state_cache_flush_interval == 5.0
+    assert config.state_cache_max_dirty == 100
+    assert config.state_cache_flush_policy == "batch"
+
+
+def test_state_cache_from_env(base_env, monkeypatch):
+    monkeypatch.setenv("STATE_CACHE_ENABLED", "true")
+    monkeypatch.setenv("STATE_CACHE_FLUSH_INTERVAL", "0.5")
+    monkeypatch.setenv("STATE_CACHE_MAX_DIRTY", "10")
+    monkeypatch.setenv("STATE_CACHE_FLUSH_POLICY", "Project")
+
+    config = Config.from_env()
+
+    assert config.state_cache_enabled is True
+    assert config.state_cache_flush_interval == 0.5
+    assert config.state_cache_max_dirty == 10
+    assert config.state_cache_flush_policy == "project"
+
+
+def test_invalid_flush_policy(base_env, monkeypatch):
+    monkeypatch.setenv("STATE_CACHE_FLUSH_POLICY", "never")
+
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -217,7 +217,7 @@ class TestMainExceptionPaths:
     
     def test_list_clones_exception(self, monkeypatch):
         """測試 list-clones 命令的異常處理"""
-        def fake_init():
+        def fake_init(offline=False):
             import src.main as main
             main.logger = Mock()
             main.clone_manager = Mock()
@@ -0,0 +1,348 @@
+"""
+測試常駐服務的自適應輪詢排程與 serve 命令
+"""
+
+import signal
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.prune import PruneReport
+from src.config import Config
+from src.coordination.lock import GLOBAL_LOCK, ScanLock
+from src.daemon.scheduler import AdaptiveScheduler
+from src.gitlab_.models import MRInfo
+from src.main import cli
+from src.scanner.mr_scanner import ScanResult
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _mr(iid, project="g/hot"):
+    return MRInfo(
+        id=iid, project_id=1, project_name=project, iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False,
+    )
+
+
+def test_scheduler_adapts_interval_to_activity():
+    clock = FakeClock()
+    scheduler = AdaptiveScheduler(["g/hot", "g/cold"], min_interval=30, max_interval=100, clock=clock)
+    assert scheduler.due() == ["g/hot", "g/cold"]
+
+    for _ in range(4):
+        scheduler.record("g/cold", active=False)
+    scheduler.record("g/hot", active=True)
+    assert scheduler.schedules["g/cold"].interval == 100
+    assert scheduler.schedules["g/hot"].interval == 30
+    assert scheduler.due() == []
+    assert scheduler.seconds_until_next() == 30
+
+    clock.now = 30
+    assert scheduler.due() == ["g/hot"]
+    assert scheduler.seconds_until_next() == 0
+
+    # 閒置專案一有活動就回到最短間隔
+    scheduler.record("g/cold", active=True)
+    assert scheduler.schedules["g/cold"].interval == 30
+
+    assert AdaptiveScheduler([], max_interval=60).seconds_until_next() == 60
+
+
+@pytest.fixture
+def serve_globals(monkeypatch):
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(
+        projects=["g/hot", "g/cold"], scan_lock="project", scan_lock_wait=0,
+        pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+    ))
+    monkeypatch.setattr(main, "shard_coordinator", None)
+    monkeypatch.setattr(main, "scan_lock", None)
+    monkeypatch.setattr(main, "state_manager", Mock())
+    monkeypatch.setattr(main, "clone_manager", Mock())
+    job_queue = Mock()
+    job_queue.enqueue.return_value = True
+    job_queue.claim.return_value = None
+    monkeypatch.setattr(main, "job_queue", job_queue)
+    scanner = Mock()
+    scanner.scan.side_effect = lambda projects, exclude_wip, exclude_draft: [
+        ScanResult(project=p, merge_requests=[_mr(1)] if p == "g/hot" else []) for p in projects
+    ]
+    monkeypatch.setattr(main, "mr_scanner", scanner)
+    return scanner
+
+
+def test_serve_cycle_records_activity(serve_globals):
+    clock = FakeClock()
+    scheduler = AdaptiveScheduler(["g/hot", "g/cold"], min_interval=30, max_interval=1800, clock=clock)
+
+    main._serve_cycle(scheduler, "w", exclude_wip=True, exclude_draft=False)
+
+    assert scheduler.schedules["g/hot"].interval == 30
+    assert scheduler.schedules["g/cold"].interval == 60
+    assert [c.kwargs["projects"] for c in serve_globals.scan.call_args_list] == [["g/hot"], ["g/cold"]]
+    assert serve_globals.scan.call_args.kwargs["exclude_wip"] is True
+
+    # 沒有到期專案時不呼叫 API
+    main._serve_cycle(scheduler, "w", exclude_wip=True, exclude_draft=False)
+    assert serve_globals.scan.call_count == 2
+
+
+def test_serve_cycle_respects_shard_and_locks(serve_globals, monkeypatch):
+    coordinator = Mock()
+    coordinator.assign.return_value = ["g/hot", "g/cold"]
+    coordinator.owns.return_value = True
+    lock = Mock()
+    lock.acquire.side_effect = lambda name, wait=0.0: 0.0 if name == "project:g/hot" else None
+    monkeypatch.setattr(main, "shard_coordinator", coordinator)
+    monkeypatch.setattr(main, "scan_lock", lock)
+    scheduler = AdaptiveScheduler(["g/hot", "g/cold", "g/other"], clock=FakeClock())
+
+    main._serve_cycle(scheduler, "w", exclude_wip=False, exclude_draft=False)
+
+    assert serve_globals.scan.call_args.kwargs["projects"] == ["g/hot"]
+    lock.release.assert_called_once_with("project:g/hot")
+    # webhook 可能正持有其他專案的鎖，不一次釋放全部
+    lock.release_all.assert_not_called()
+    assert scheduler.schedules["g/hot"].interval == 30
+    assert scheduler.schedules["g/other"].interval == 60
+
+
+def test_serve_cycle_skips_when_global_lock_held_elsewhere(serve_globals, monkeypatch, tmp_path):
+    other = ScanLock(str(tmp_path / "db.sqlite"), owner="other-host:1")
+    other.try_acquire(GLOBAL_LOCK)
+    lock = ScanLock(str(tmp_path / "db.sqlite"), owner="other-host:2")
+    monkeypatch.setattr(main, "scan_lock", lock)
+    main.config.scan_lock = "global"
+    scheduler = AdaptiveScheduler(["g/hot", "g/cold"], clock=FakeClock())
+
+    try:
+        main._serve_cycle(scheduler, "w", exclude_wip=False, exclude_draft=False)
+    finally:
+        lock.close()
+        other.close()
+
+    serve_globals.scan.assert_not_called()
+    main.logger.info.assert_any_call("掃描鎖由 %s 持有，略過本輪", "other-host:1")
+    assert scheduler.schedules["g/hot"].interval == 60
+
+
+def test_serve_cycle_releases_global_lock_after_scan(serve_globals, monkeypatch, tmp_path):
+    lock = ScanLock(str(tmp_path / "db.sqlite"), owner="this-host:1")
+    holders = []
+
+    def scan(projects, exclude_wip, exclude_draft):
+        holders.append(lock.holder(GLOBAL_LOCK))
+        return [ScanResult(project=p, merge_requests=[]) for p in projects]
+
+    serve_globals.scan.side_effect = scan
+    monkeypatch.setattr(main, "scan_lock", lock)
+    main.config.scan_lock = "global"
+    scheduler = AdaptiveScheduler(["g/hot", "g/cold"], clock=FakeClock())
+
+    try:
+        main._serve_cycle(scheduler, "w", exclude_wip=False, exclude_draft=False)
+        # 整體鎖在本輪掃描期間持有，結束即釋放讓其他節點接手
+        assert holders == ["this-host:1", "this-host:1"]
+        assert lock.holder(GLOBAL_LOCK) is None
+    finally:
+        lock.close()
+
+
+def test_serve_loop_survives_errors_and_stops(serve_globals):
+    stop = threading.Event()
+    scheduler = Mock()
+    scheduler.due.side_effect = [RuntimeError("boom"), []]
+    scheduler.seconds_until_next.side_effect = [0, 0]
+
+    def wait_then_stop():
+        if scheduler.due.call_count == 2:
+            stop.set()
+        return 0
+
+    scheduler.seconds_until_next.side_effect = wait_then_stop
+    main._serve_loop(scheduler, stop, "w", False, False)
+
+    assert scheduler.due.call_count == 2
+    main.logger.error.assert_called_once()
+
+
+def test_serve_command_handles_signal(monkeypatch):
+    seen = {}
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/p"], poll_min_interval=30, poll_max_interval=1800, webhook_enabled=False, prune_interval=0, metrics_port=0,
+        )
+        main.shard_coordinator = Mock()
+        main.scan_lock = Mock()
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+
+    def fake_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft):
+        signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        seen["stopped"] = stop.is_set()
+        seen["projects"] = list(scheduler.schedules)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._serve_loop", fake_loop)
+    before = signal.getsignal(signal.SIGTERM)
+
+    result = CliRunner().invoke(cli, ["serve"])
+    shard, lock = main.shard_coordinator, main.scan_lock
+    main.shard_coordinator = None
+    main.scan_lock = None
+
+    assert result.exit_code == 0
+    assert seen == {"stopped": True, "projects": ["g/p"]}
+    assert "服務已停止" in result.output
+    assert signal.getsignal(signal.SIGTERM) is before
+    main.state_manager.flush.assert_called_once()
+    shard.start_heartbeat.assert_called_once()
+    shard.close.assert_called_once()
+    lock.close.assert_called_once()
+
+
+def test_serve_command_starts_optional_services(monkeypatch):
+    workers = {}
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/p"], poll_min_interval=30, poll_max_interval=1800, prune_interval=60,
+            webhook_enabled=True, webhook_host="127.0.0.1", webhook_port=0, webhook_secret="s", webhook_path="/hook",
+            metrics_host="127.0.0.1", metrics_port=9100,
+        )
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+
+    def fake_worker(name):
+        def worker(*args):
+            stop = args[1] if name == "webhook" else args[0]
+            workers[name] = stop.wait(5)
+        return worker
+
+    def fake_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft):
+        stop.set()
+
+    webhook_server = Mock(address=("127.0.0.1", 8080))
+    metrics_server = Mock(address=("127.0.0.1", 9100))
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._serve_loop", fake_loop)
+    monkeypatch.setattr("src.main.WebhookServer", Mock(return_value=webhook_server))
+    monkeypatch.setattr("src.main.MetricsServer", Mock(return_value=metrics_server))
+    monkeypatch.setattr("src.main._webhook_worker", fake_worker("webhook"))
+    monkeypatch.setattr("src.main._prune_worker", fake_worker("prune"))
+    for name in ("logger", "config", "shard_coordinator", "scan_lock", "state_manager", "job_queue"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["serve"])
+
+    assert result.exit_code == 0, result.output
+    assert "webhook 接收端: http://127.0.0.1:8080/hook" in result.output
+    assert "指標端點: http://127.0.0.1:9100/metrics" in result.output
+    # 背景執行緒在 stop 設定後結束，並在寫回狀態前等待完成
+    assert workers == {"webhook": True, "prune": True}
+    webhook_server.start.assert_called_once()
+    webhook_server.stop.assert_called_once()
+    metrics_server.stop.assert_called_once()
+    main.state_manager.flush.assert_called_once()
+
+
+def test_serve_command_stops_prune_worker_on_error(monkeypatch):
+    finished = []
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/p"], poll_min_interval=30, poll_max_interval=1800, webhook_enabled=False, prune_interval=60,
+            metrics_port=0,
+        )
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+
+    def fake_worker(stop, interval):
+        finished.append(stop.wait(5))
+
+    def fake_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft):
+        raise RuntimeError("poll crashed")
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._serve_loop", fake_loop)
+    monkeypatch.setattr("src.main._prune_worker", fake_worker)
+    for name in ("logger", "config", "shard_coordinator", "scan_lock", "state_manager", "job_queue"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["serve"])
+
+    assert result.exit_code == 1 and "poll crashed" in result.output
+    # 失敗時仍通知清理執行緒停止並等待其結束
+    assert finished == [True]
+    main.state_manager.flush.assert_not_called()
+
+
+def test_prune_worker_reports_and_survives_errors(monkeypatch, capsys):
+    stop = threading.Event()
+    reports = [PruneReport(removed=2, bytes_reclaimed=3 * 1024 * 1024), RuntimeError("disk")]
+    calls = []
+
+    def fake_reconcile(projects):
+        calls.append(projects)
+        result = reports.pop(0)
+        if not reports:
+            stop.set()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    shard = Mock()
+    shard.assign.return_value = ["g/a"]
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["g/a", "g/b"]))
+    monkeypatch.setattr(main, "shard_coordinator", shard)
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "_reconcile", fake_reconcile)
+    main._prune_worker(stop, 0.01)
+
+    assert calls == [["g/a"], ["g/a"]]
+    captured = capsys.readouterr()
+    assert captured.out == "✓ 清理 2 個 clone，釋放 3.0 MB\n"
+    assert captured.err == "✗ 清理失敗: disk\n"
+    main.logger.error.assert_called_once()
+
+
+def test_serve_command_init_failure(monkeypatch):
+    def fake_init():
+        raise RuntimeError("no config")
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr(main, "logger", Mock())
+
+    result = CliRunner().invoke(cli, ["serve"])
+    assert result.exit_code == 1
+
+
+def test_poll_interval_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+    monkeypatch.setenv("POLL_MIN_INTERVAL", "10")
+    monkeypatch.setenv("POLL_MAX_INTERVAL", "600")
+
+    config = Config.from_env()
+    assert (config.poll_min_interval, config.poll_max_interval) == (10.0, 600.0)
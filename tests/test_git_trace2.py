@@ -0,0 +1,134 @@
+"""
+測試 git trace2 階段耗時擷取
+"""
+
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CloneManager
+from src.clone.trace2 import git_trace2, parse_events
+from src.config import Config
+from src.state.history import summarize_scan_history
+from src.state.manager import StateManager
+from src.state.models import ScanRecord
+from src.utils.exceptions import GitError
+
+
+def _event(**fields):
+    return json.dumps(fields)
+
+
+@pytest.fixture
+def enabled_trace2():
+    git_trace2.enable()
+    yield git_trace2
+    git_trace2.disable()
+
+
+def test_parse_events_phases():
+    lines = [
+        _event(event="start", sid="A", argv=["git", "clone"]),
+        _event(event="region_leave", sid="A", category="fetch-pack", label="mark_complete_local_refs", t_rel=0.5),
+        _event(event="region_leave", sid="A", category="negotiation_v2", label="round", t_rel=0.2),
+        _event(event="region_leave", sid="A", category="fetch-pack", label="negotiation_v2", t_rel=0.25),
+        _event(event="child_start", sid="A", child_id=0, argv=["git", "index-pack", "--stdin"]),
+        _event(event="child_start", sid="A", child_id=1, argv=["git", "rev-list", "--objects"]),
+        "not json",
+        "[1, 2]",
+        _event(event="exit", sid="A/B", t_abs=1.5),
+        _event(event="child_exit", sid="A", child_id=1, t_rel=0.1),
+        _event(event="child_exit", sid="A", child_id=0, t_rel=1.75),
+        _event(event="region_leave", sid="A", category="unpack_trees", label="traverse_trees", t_rel=0.1),
+        _event(event="region_leave", sid="A", category="unpack_trees", label="unpack_trees", t_rel=0.5),
+        _event(event="exit", sid="A", t_abs=3.0),
+    ]
+
+    assert parse_events(lines) == {"negotiation": 0.25, "pack": 1.75, "checkout": 0.5, "total": 3.0}
+
+
+def test_git_commands_report_phases(enabled_trace2, tmp_path):
+    source = tmp_path / "source"
+    CloneManager._run_git_command(["git", "init", "-q", str(source)])
+    (source / "README").write_text("hello")
+    CloneManager._run_git_command(["git", "add", "README"], cwd=source)
+    CloneManager._run_git_command(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-qm", "init"], cwd=source,
+    )
+    leftovers = set(Path(tempfile.gettempdir()).glob("git-trace2-*"))
+
+    with git_trace2.collect() as phases:
+        CloneManager._run_git_command(["git", "clone", "-q", "--no-local", f"file://{source}", str(tmp_path / "clone")])
+        with pytest.raises(GitError):
+            CloneManager._run_git_command(["git", "checkout", "no-such-branch"], cwd=tmp_path / "clone")
+
+    assert {"negotiation", "pack", "checkout", "total"} <= set(phases)
+    assert phases["total"] >= phases["pack"] > 0
+    # 每個命令的事件檔在解析後刪除
+    assert set(Path(tempfile.gettempdir()).glob("git-trace2-*")) == leftovers
+
+
+def test_missing_event_file_is_ignored(enabled_trace2, caplog):
+    with git_trace2.collect() as phases:
+        with git_trace2.command() as env:
+            # git 沒有寫出事件檔（或已被移除）時，讀取與刪除都會失敗
+            Path(env["GIT_TRACE2_EVENT"]).unlink()
+
+    assert phases == {}
+    assert "讀取 git trace2 事件失敗" in caplog.text
+
+
+def test_disabled_trace2_leaves_environment():
+    with git_trace2.command() as env, git_trace2.collect() as phases:
+        assert env is None
+    assert phases == {}
+    result = CloneManager._run_git_command(["git", "--version"])
+    assert result.returncode == 0
+
+
+def test_scan_history_keeps_git_phases(tmp_path):
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    state_manager.record_scan(ScanRecord(project="g/p", mr_count=2, success=True, clones_created=2,
+                                         git_negotiation_ms=100, git_pack_ms=900, git_checkout_ms=300, git_total_ms=1400))
+    state_manager.record_scan(ScanRecord(project="g/p", mr_count=2, success=True, clones_skipped=2))
+
+    records = state_manager.get_scan_history()
+    assert records[0].git_pack_ms == 900
+
+    summary = summarize_scan_history(records)[0]
+    assert summary.git_phases_ms == {"negotiation": 50, "pack": 450, "checkout": 150, "total": 700}
+    assert summarize_scan_history(records[1:])[0].git_phases_ms == {}
+
+
+def test_stats_command_reports_git_phases(monkeypatch):
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.return_value = [
+            ScanRecord(project="g/p", mr_count=1, success=True, clones_created=1,
+                       git_negotiation_ms=40, git_pack_ms=800, git_checkout_ms=160, git_total_ms=1000),
+        ]
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "state_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(main.cli, ["stats"])
+
+    assert result.exit_code == 0, result.output
+    assert "git 每次 clone 平均: negotiation 40ms、pack 800ms、checkout 160ms、total 1000ms" in result.output
+
+
+def test_git_trace2_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    assert Config.from_env().git_trace2 is False
+    monkeypatch.setenv("GIT_TRACE2", "true")
+    assert Config.from_env().git_trace2 is True
@@ -0,0 +1,279 @@
+"""
+測試 SQLite 持久化 clone 工作佇列
+"""
+
+import os
+import socket
+from dataclasses import replace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+from src.gitlab_.models import MRInfo
+from src.jobs import queue as queue_module
+from src.jobs.queue import DONE, FAILED, PENDING, RUNNING, JobQueue, default_worker_id, worker_is_dead
+from src.main import cli
+from src.utils.exceptions import StateError
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _mr(iid, updated_at="2026-01-01T00:00:00", project="g/p"):
+    return MRInfo(
+        id=iid, project_id=1, project_name=project, iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at=updated_at, source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False,
+    )
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=3, backoff_seconds=10, lease_timeout=60, clock=clock)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_claim_complete(queue):
+    assert queue.enqueue(_mr(1)) is True
+
+    job = queue.claim("w1")
+    assert job.state == RUNNING
+    assert job.attempts == 1
+    assert job.mr_info == _mr(1)
+    assert queue.claim("w1") is None
+
+    # 正在執行的工作不會被重複排入
+    assert queue.enqueue(_mr(1)) is False
+
+    queue.complete(job)
+    assert job.state == DONE
+    assert queue.counts() == {DONE: 1}
+
+    # 同一版本已完成，不再執行；MR 有更新則重新排入
+    assert queue.enqueue(_mr(1)) is False
+    assert queue.enqueue(_mr(1, updated_at="2026-01-02T00:00:00")) is True
+    assert queue.claim("w1").attempts == 1
+
+
+def test_remove_allows_reenqueue_of_same_version(queue):
+    queue.enqueue(_mr(1))
+    queue.complete(queue.claim("w1"))
+    assert queue.enqueue(_mr(1)) is False
+
+    assert queue.remove("g/p", 1) is True
+    assert queue.remove("g/p", 1) is False
+    assert queue.counts() == {}
+    # MR 重新開啟：同一版本也會再次 clone
+    assert queue.enqueue(_mr(1)) is True
+
+
+def test_purge_finished_after_retention(tmp_path, clock):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=1, retention=100, clock=clock)
+    for iid in (1, 2, 3):
+        queue.enqueue(_mr(iid))
+    queue.complete(queue.claim("w1", "g/p", 1))
+    queue.fail(queue.claim("w1", "g/p", 2), "boom")
+
+    clock.now += 100
+    assert queue.purge_finished() == 0
+    clock.now += 1
+    assert queue.purge_finished() == 2
+    # 未結束的工作不受影響
+    assert queue.counts() == {PENDING: 1}
+
+    forever = JobQueue(str(tmp_path / "other.sqlite"), retention=0, clock=clock)
+    forever.enqueue(_mr(1))
+    forever.complete(forever.claim("w1"))
+    clock.now += 10 ** 9
+    assert forever.purge_finished() == 0
+    queue.close()
+    forever.close()
+
+
+def test_pending_reenqueue_keeps_backoff(queue, clock):
+    queue.enqueue(_mr(1))
+    job = queue.claim("w1")
+    assert queue.fail(job, "boom") == PENDING
+    assert job.next_run_at == clock.now + 10
+
+    assert queue.enqueue(replace(_mr(1), title="renamed")) is True
+    assert queue.claim("w1") is None
+
+    clock.now += 10
+    retried = queue.claim("w1")
+    assert retried.attempts == 2
+    assert retried.mr_info.title == "renamed"
+
+
+def test_exponential_backoff_then_failed(queue, clock):
+    queue.enqueue(_mr(1))
+
+    delays = []
+    for _ in range(2):
+        job = queue.claim("w1")
+        assert queue.fail(job, "boom") == PENDING
+        delays.append(job.next_run_at - clock.now)
+        clock.now = job.next_run_at
+
+    job = queue.claim("w1")
+    assert queue.fail(job, "boom") == FAILED
+    assert delays == [10, 20]
+    assert queue.claim("w1") is None
+    assert queue.counts() == {FAILED: 1}
+
+    # 放棄的工作在下次掃描時重新開始計算嘗試次數
+    assert queue.enqueue(_mr(1)) is True
+    assert queue.claim("w1").attempts == 1
+
+
+def test_claim_filters_by_project(queue):
+    queue.enqueue(_mr(1, project="g/a"))
+    queue.enqueue(_mr(2, project="g/b"))
+
+    assert queue.claim("w1", project="g/b").project == "g/b"
+    assert queue.claim("w1", project="g/b") is None
+    assert queue.claim("w1").project == "g/a"
+
+
+def test_claim_filters_by_mr(queue):
+    queue.enqueue(_mr(1))
+    queue.enqueue(_mr(2))
+
+    assert queue.claim("w1", project="g/p", iid=2).iid == 2
+    assert queue.claim("w1", project="g/p", iid=2) is None
+    assert queue.claim("w1", project="g/p").iid == 1
+
+
+def test_recover_stale_after_lease_timeout(queue, clock):
+    queue.enqueue(_mr(1))
+    queue.claim("other-host:1")
+
+    assert queue.recover_stale() == 0
+    clock.now += 60
+    assert queue.recover_stale() == 1
+    assert queue.counts() == {PENDING: 1}
+    assert queue.claim("w1").attempts == 2
+
+
+def test_recover_stale_dead_local_worker(queue, monkeypatch):
+    queue.enqueue(_mr(1))
+    queue.claim("dead")
+    monkeypatch.setattr(queue_module, "worker_is_dead", lambda worker_id: worker_id == "dead")
+
+    assert queue.recover_stale() == 1
+
+
+def test_queue_survives_reopen(tmp_path, clock):
+    db_path = str(tmp_path / "jobs.sqlite")
+    first = JobQueue(db_path, clock=clock)
+    first.enqueue(_mr(1))
+    first.enqueue(_mr(2))
+    first.complete(first.claim("w1"))
+    first.close()
+
+    second = JobQueue(db_path, clock=clock)
+    assert second.claim("w2").iid == 2
+    second.close()
+
+
+def test_transaction_rolls_back_on_error(queue):
+    queue.enqueue(_mr(1))
+    with pytest.raises(RuntimeError):
+        with queue._transaction():
+            queue._conn.execute("DELETE FROM clone_jobs")
+            raise RuntimeError("abort")
+
+    assert queue.counts() == {PENDING: 1}
+
+
+def test_init_failure_raises_state_error(tmp_path):
+    with pytest.raises(StateError):
+        JobQueue(str(tmp_path / "missing" / "jobs.sqlite"))
+
+
+def test_worker_is_dead():
+    host = socket.gethostname()
+
+    assert default_worker_id() == f"{host}:{os.getpid()}"
+    assert worker_is_dead(default_worker_id()) is False
+    assert worker_is_dead(None) is False
+    assert worker_is_dead("other-host:1") is False
+    assert worker_is_dead(f"{host}:abc") is False
+    assert worker_is_dead(f"{host}:999999999") is True
+
+
+def test_worker_is_dead_permission_error(monkeypatch):
+    def deny(pid, sig):
+        raise PermissionError
+
+    monkeypatch.setattr(queue_module.os, "kill", deny)
+    assert worker_is_dead(f"{socket.gethostname()}:1") is False
+
+
+def test_mr_still_open_skips_listed_and_tolerates_errors(monkeypatch):
+    import src.main as main
+    client = Mock()
+    client.get_mr_details.return_value = Mock(state="closed")
+    monkeypatch.setattr(main, "gitlab_client", client)
+    monkeypatch.setattr(main, "logger", Mock())
+
+    assert main._mr_still_open(_mr(1), listed={1}) is True
+    client.get_mr_details.assert_not_called()
+    assert main._mr_still_open(_mr(2), listed={1}) is False
+
+    client.get_mr_details.side_effect = RuntimeError("timeout")
+    assert main._mr_still_open(_mr(2)) is True
+
+
+def test_scan_resume_drains_queue(monkeypatch, tmp_path):
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_queue.enqueue(_mr(1))
+    job_queue.enqueue(_mr(2))
+    job_queue.enqueue(_mr(3))
+    import src.main as main
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = Mock(projects=["g/p"])
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.job_queue = job_queue
+        main.state_manager = Mock()
+        main.mr_scanner = Mock()
+        # 3 在中斷期間已合併
+        main.gitlab_client = Mock()
+        main.gitlab_client.get_mr_details.side_effect = lambda project, iid: Mock(
+            state="merged" if iid == 3 else "opened",
+        )
+        cm = Mock()
+        cm.get_clone_path.return_value = None
+        cm.create_clone.side_effect = lambda mr: f"/c/{mr.iid}"
+        main.clone_manager = cm
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+    for name in ("logger", "config", "shard_coordinator", "scan_lock", "job_queue", "state_manager",
+                 "mr_scanner", "gitlab_client", "clone_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["scan", "--resume"])
+
+    assert result.exit_code == 0, result.output
+    assert "建立 2" in result.output
+    assert "g/p#3: MR 已不是開啟狀態" in result.output
+    assert job_queue.counts() == {DONE: 2}
+    assert [call.args[0].iid for call in main.clone_manager.create_clone.call_args_list] == [1, 2]
+
+    main.mr_scanner.scan.assert_not_called()
+    main.state_manager.flush.assert_called_once()
@@ -0,0 +1,86 @@
+"""
+測試日誌系統
+"""
+
+import logging
+import subprocess
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
+from pathlib import Path
+
+import pytest
+
+from src.logger import LOGGER_NAME, setup_logging, stop_logging
+
+
+@pytest.fixture
+def app_logger():
+    yield
+    stop_logging()
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers.clear()
+    logger.propagate = True
+
+
+def test_import_does_not_touch_filesystem(tmp_path):
+    root = Path(__file__).resolve().parent.parent
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {str(root)!r}); import src.logger"],
+        cwd=tmp_path, check=True,
+    )
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_records_are_written_by_listener(app_logger, tmp_path):
+    logger = setup_logging(log_level="INFO", log_dir=str(tmp_path / "logs"))
+    assert [type(handler) for handler in logger.handlers] == [QueueHandler]
+
+    logger.info("建立 clone: %s#%s", "g/p", 7)
+    logger.debug("不會輸出: %s", "x")
+    stop_logging()
+
+    text = (tmp_path / "logs" / "app.log").read_text(encoding="utf-8")
+    assert "INFO - 建立 clone: g/p#7" in text
+    assert "不會輸出" not in text
+
+
+def test_disabled_level_is_not_formatted(app_logger, tmp_path):
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return "expensive"
+
+    logger = setup_logging(log_level="INFO", log_dir=str(tmp_path))
+    logger.debug("Git 輸出: %s", Expensive())
+    logger.info("Git 輸出: %s", Expensive())
+    stop_logging()
+
+    assert Expensive.formatted == 1
+
+
+def test_worker_threads_do_not_wait_for_disk(app_logger, tmp_path, monkeypatch):
+    def slow_emit(self, record):
+        time.sleep(0.05)
+
+    monkeypatch.setattr(RotatingFileHandler, "emit", slow_emit)
+    monkeypatch.setattr(logging.StreamHandler, "emit", slow_emit)
+    logger = setup_logging(log_level="INFO", log_dir=str(tmp_path))
+
+    def worker():
+        for i in range(20):
+            logger.info("clone %s", i)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 80 筆各 0.05 秒的寫入全部由背景執行緒處理
+    assert time.perf_counter() - started < 1.0
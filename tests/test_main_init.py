@@ -6,30 +6,80 @@ from types import SimpleNamespace
 from unittest.mock import Mock
 
 import src.main as main
+from src.clone.quota import QuotaManager
+from src.clone.trace2 import git_trace2
+from src.observability.tracing import tracer
+from src.scanner.breaker import ProjectBreaker
+from src.state.cache import CachedStateManager
 
 
-def test_init_app_sets_globals(monkeypatch):
+def _restore_globals(monkeypatch):
+    # init_app 會改寫模組層級的全域變數，測試結束後還原
+    for name in ("config", "gitlab_client", "mr_scanner", "state_manager", "clone_manager", "job_queue",
+                 "shard_coordinator", "scan_lock", "fair_policy", "project_breaker", "quota_manager",
+                 "snapshot_path", "metrics_path", "logger"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+
+def _run_init_app(monkeypatch, tmp_path, offline=True, **settings):
+    """以最小設定（可覆寫）執行 init_app，預設離線"""
+    fake_config = SimpleNamespace(
+        log_level="INFO", state_dir=str(tmp_path), db_path=str(tmp_path / "db.sqlite"), reviews_path=str(tmp_path / "reviews"),
+        storage_type="sqlite", job_max_attempts=3, job_backoff_seconds=30.0, job_lease_timeout=1800.0, job_retention=604800.0,
+        shard_mode="none", scan_lock="none", mr_filters=[], project_weights={}, fair_recent_window=3600.0,
+        fair_recent_boost=1.0, project_cache_ttl=0.0, breaker_threshold=0, reviews_quota=0, trace_file="", metrics_textfile="",
+        git_trace2=False, state_cache_enabled=False,
+    )
+    for name, value in settings.items():
+        setattr(fake_config, name, value)
+    monkeypatch.setattr("src.main.Config.from_env", lambda: fake_config)
+    monkeypatch.setattr("src.main.setup_logging", lambda log_level, log_dir: Mock())
+    _restore_globals(monkeypatch)
+    main.init_app(offline=offline)
+
+
+def test_init_app_sets_globals(monkeypatch, tmp_path):
     # 準備 fake config
     fake_config = SimpleNamespace(
         gitlab_url="https://gitlab.example.com",
         gitlab_token="token",
         gitlab_ssl_verify=True,
         log_level="INFO",
-        state_dir="./state",
-        db_path="./state/db.sqlite",
+        state_dir=str(tmp_path),
+        db_path=str(tmp_path / "db.sqlite"),
         projects=["group/proj"],
         reviews_path="~/reviews",
+        storage_type="sqlite",
+        job_max_attempts=3,
+        job_backoff_seconds=30.0,
+        job_lease_timeout=1800.0,
+        job_retention=604800.0,
+        shard_mode="none",
+        scan_lock="none",
+        mr_filters=[],
+        project_weights={},
+        fair_recent_window=3600.0,
+        fair_recent_boost=1.0,
+        project_cache_ttl=0.0,
+        breaker_threshold=0,
+        reviews_quota=0,
+        metrics_textfile="",
+        trace_file="",
+        git_trace2=False,
+        state_cache_enabled=False,
     )
 
     monkeypatch.setattr('src.main.Config.from_env', lambda: fake_config)
     monkeypatch.setattr('src.main.setup_logging', lambda log_level, log_dir: Mock())
 
     # Patch GitLabClient, StateManager, MRScanner, CloneManager to simple mocks
-    monkeypatch.setattr('src.main.GitLabClient', lambda url, token, ssl_verify: Mock())
-    monkeypatch.setattr('src.main.StateManager', lambda db_path: Mock())
+    monkeypatch.setattr('src.main.GitLabClient', lambda url, token, ssl_verify, project_cache: Mock())
+    monkeypatch.setattr('src.main.StateManager', lambda **kwargs: Mock())
+    monkeypatch.setattr('src.main.JobQueue', lambda **kwargs: Mock())
     # MRScanner and CloneManager will be instantiated in init_app; allow defaults
 
     # Call init_app
+    _restore_globals(monkeypatch)
     main.init_app()
 
     assert main.config is not None
@@ -37,3 +87,155 @@ def test_init_app_sets_globals(monkeypatch):
     assert main.state_manager is not None
     assert main.mr_scanner is not None
     assert main.clone_manager is not None
+    assert main.job_queue is not None
+    assert main.shard_coordinator is None
+    assert main.scan_lock is None
+
+
+def test_init_app_wraps_state_manager_with_cache(monkeypatch, tmp_path):
+    fake_config = SimpleNamespace(
+        gitlab_url="https://gitlab.example.com",
+        gitlab_token="token",
+        gitlab_ssl_verify=True,
+        log_level="INFO",
+        state_dir=str(tmp_path),
+        db_path=str(tmp_path / "db.sqlite"),
+        projects=["group/proj"],
+        reviews_path="~/reviews",
+        storage_type="sqlite",
+        job_max_attempts=3,
+        job_backoff_seconds=30.0,
+        job_lease_timeout=1800.0,
+        job_retention=604800.0,
+        shard_mode="none",
+        scan_lock="none",
+        mr_filters=[],
+        project_weights={},
+        fair_recent_window=3600.0,
+        fair_recent_boost=1.0,
+        project_cache_ttl=0.0,
+        breaker_threshold=0,
+        reviews_quota=0,
+        metrics_textfile="",
+        trace_file="",
+        git_trace2=False,
+        state_cache_enabled=True,
+        state_cache_flush_interval=0,
+        state_cache_max_dirty=10,
+        state_cache_flush_policy="project",
+    )
+
+    monkeypatch.setattr('src.main.Config.from_env', lambda: fake_config)
+    monkeypatch.setattr('src.main.setup_logging', lambda log_level, log_dir: Mock())
+    monkeypatch.setattr('src.main.GitLabClient', lambda url, token, ssl_verify, project_cache: Mock())
+    monkeypatch.setattr('src.main.StateManager', lambda **kwargs: Mock())
+    monkeypatch.setattr('src.main.JobQueue', lambda **kwargs: Mock())
+
+    _restore_globals(monkeypatch)
+    main.init_app()
+
+    assert isinstance(main.state_manager, CachedStateManager)
+    assert main.state_manager.flush_policy == "project"
+    main.state_manager.close()
+
+
+def test_init_app_creates_shard_coordinator(monkeypatch, tmp_path):
+    fake_config = SimpleNamespace(
+        gitlab_url="https://gitlab.example.com",
+        gitlab_token="token",
+        gitlab_ssl_verify=True,
+        log_level="INFO",
+        state_dir=str(tmp_path),
+        db_path=str(tmp_path / "db.sqlite"),
+        projects=["group/proj"],
+        reviews_path="~/reviews",
+        storage_type="sqlite",
+        job_max_attempts=3,
+        job_backoff_seconds=30.0,
+        job_lease_timeout=1800.0,
+        job_retention=604800.0,
+        mr_filters=[],
+        project_weights={},
+        fair_recent_window=3600.0,
+        fair_recent_boost=1.0,
+        project_cache_ttl=0.0,
+        breaker_threshold=0,
+        reviews_quota=0,
+        metrics_textfile="",
+        trace_file="",
+        git_trace2=False,
+        state_cache_enabled=False,
+        shard_mode="hash",
+        shard_node_id="node-a",
+        shard_nodes=["node-a", "node-b"],
+        shard_lease_ttl=60.0,
+        scan_lock="project",
+        scan_lock_stale=60.0,
+    )
+    created = {}
+
+    monkeypatch.setattr('src.main.Config.from_env', lambda: fake_config)
+    monkeypatch.setattr('src.main.setup_logging', lambda log_level, log_dir: Mock())
+    monkeypatch.setattr('src.main.GitLabClient', lambda url, token, ssl_verify, project_cache: Mock())
+    monkeypatch.setattr('src.main.StateManager', lambda **kwargs: Mock())
+    monkeypatch.setattr('src.main.JobQueue', lambda **kwargs: Mock())
+    monkeypatch.setattr('src.main.ShardCoordinator', lambda **kwargs: created.update(kwargs) or Mock())
+    monkeypatch.setattr('src.main.ScanLock', lambda **kwargs: Mock())
+
+    _restore_globals(monkeypatch)
+    main.init_app()
+
+    assert main.shard_coordinator is not None
+    assert created["mode"] == "hash"
+    assert created["nodes"] == ["node-a", "node-b"]
+    assert main.scan_lock is not None
+    main.shard_coordinator = None
+    main.scan_lock = None
+
+
+def test_init_app_creates_quota_manager(monkeypatch, tmp_path):
+    _run_init_app(monkeypatch, tmp_path)
+    assert main.quota_manager is None
+
+    _run_init_app(monkeypatch, tmp_path, reviews_quota=4096, quota_min_idle=60.0, prune_workers=1)
+
+    assert isinstance(main.quota_manager, QuotaManager)
+    assert (main.quota_manager.quota, main.quota_manager.min_idle) == (4096, 60.0)
+    assert main.quota_manager.workspaces is main.clone_manager.workspaces
+
+
+def test_init_app_creates_project_breaker(monkeypatch, tmp_path):
+    _run_init_app(monkeypatch, tmp_path, breaker_threshold=2, breaker_base_delay=60.0, breaker_max_delay=600.0)
+
+    assert isinstance(main.project_breaker, ProjectBreaker)
+    assert main.project_breaker.threshold == 2
+
+
+def test_init_app_wires_project_cache(monkeypatch, tmp_path):
+    clients = []
+    monkeypatch.setattr("src.main.GitLabClient", lambda **kwargs: clients.append(kwargs) or Mock())
+
+    _run_init_app(
+        monkeypatch, tmp_path, offline=False, project_cache_ttl=60.0,
+        gitlab_url="https://gitlab.example.com", gitlab_token="token", gitlab_ssl_verify=True,
+    )
+
+    (kwargs,) = clients
+    assert kwargs["project_cache"].ttl == 60.0
+    assert kwargs["project_cache"].state_manager is main.state_manager
+
+
+def test_init_app_enables_tracing(monkeypatch, tmp_path):
+    try:
+        _run_init_app(monkeypatch, tmp_path, trace_file=str(tmp_path / "trace.json"), trace_format="chrome")
+        assert tracer.enabled
+    finally:
+        tracer.disable()
+
+
+def test_init_app_enables_git_trace2(monkeypatch, tmp_path):
+    try:
+        _run_init_app(monkeypatch, tmp_path, git_trace2=True)
+        assert git_trace2.enabled
+    finally:
+        git_trace2.disable()
@@ -5,7 +5,10 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 from click.testing import CliRunner
 
+from src.gitlab_.models import MRInfo
+from src.jobs.queue import JobQueue
 from src.main import cli, init_app
+from src.scanner.mr_scanner import ScanResult
 
 
 @pytest.fixture
@@ -60,6 +63,7 @@ class TestScanCommand:
         mock_result.project = 'group/project'
         
         mock_scanner.scan.return_value = [mock_result]
+        mock_scanner.describe_filters.return_value = (['wip = no'], [])
         
         result = runner.invoke(cli, ['scan', '--dry-run'])
         
@@ -67,32 +71,38 @@ class TestScanCommand:
         assert '試執行模式' in result.output
         assert 'group/project#42' in result.output
     
+    @patch('src.main.state_manager')
     @patch('src.main.init_app')
     @patch('src.main.mr_scanner')
     @patch('src.main.config')
     @patch('src.main.clone_manager')
     @patch('src.main.logger')
-    def test_scan_creates_clones(self, mock_logger, mock_clone_manager, mock_config, mock_scanner, mock_init, runner):
+    def test_scan_creates_clones(self, mock_logger, mock_clone_manager, mock_config, mock_scanner, mock_init, mock_state, runner, tmp_path):
         """測試 scan 建立 clone"""
         mock_config.projects = ['group/project']
+        mock_config.pipeline_workers = 1
+        mock_config.pipeline_scanners = 1
+        mock_config.pipeline_queue_size = 4
+        mock_config.scan_budget = 0
         
-        mock_mr = Mock()
-        mock_mr.project_name = 'group/project'
-        mock_mr.iid = 42
-        mock_mr.title = 'Test MR'
+        mock_mr = MRInfo(
+            id=1, project_id=1, project_name='group/project', iid=42, title='Test MR', description='',
+            state='opened', author='a', created_at='', updated_at='', source_branch='f', target_branch='m',
+            web_url='', draft=False, work_in_progress=False,
+        )
         
-        mock_result = Mock()
-        mock_result.merge_requests = [mock_mr]
-        mock_result.error = None
-        mock_result.project = 'group/project'
+        mock_result = ScanResult(project='group/project', merge_requests=[mock_mr])
         
         mock_scanner.scan.return_value = [mock_result]
         mock_clone_manager.create_clone.return_value = '/path/to/clone'
         
-        result = runner.invoke(cli, ['scan'])
+        with patch('src.main.job_queue', JobQueue(str(tmp_path / 'jobs.sqlite'))):
+            result = runner.invoke(cli, ['scan'])
         
         assert result.exit_code == 0
         mock_clone_manager.create_clone.assert_called_once_with(mock_mr)
+        mock_state.checkpoint.assert_called_once()
+        mock_state.flush.assert_called_once()
 
 
 class TestListClonesCommand:
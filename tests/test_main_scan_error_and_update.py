@@ -8,7 +8,10 @@ from unittest.mock import Mock
 import pytest
 from click.testing import CliRunner
 
+from src.gitlab_.models import MRInfo
+from src.jobs.queue import JobQueue
 from src.main import cli
+from src.scanner.mr_scanner import ScanResult
 
 
 @pytest.fixture
@@ -20,9 +23,11 @@ def test_scan_handles_scanresult_error(monkeypatch, cli_runner):
     def fake_init():
         import src.main as main
         main.logger = Mock()
-        main.config = SimpleNamespace(projects=["group/proj"])
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+        main.config = SimpleNamespace(projects=["group/proj"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
         main.mr_scanner = SimpleNamespace()
-        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [SimpleNamespace(project="group/proj", merge_requests=[], error="api failed")]
+        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [ScanResult(project="group/proj", merge_requests=[], error="api failed")]
         main.clone_manager = SimpleNamespace()
 
     monkeypatch.setattr('src.main.init_app', fake_init)
@@ -32,14 +37,20 @@ def test_scan_handles_scanresult_error(monkeypatch, cli_runner):
     assert "✗ group/proj: api failed" in result.output
 
 
-def test_scan_create_clone_exception(monkeypatch, cli_runner):
+def test_scan_create_clone_exception(monkeypatch, cli_runner, tmp_path):
     def fake_init():
         import src.main as main
         main.logger = Mock()
-        main.config = SimpleNamespace(projects=["group/proj"])
+        main.state_manager = Mock()
+        main.job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+        main.config = SimpleNamespace(projects=["group/proj"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
         main.mr_scanner = SimpleNamespace()
-        mr = SimpleNamespace(project_name="group/proj", iid=99, title="t", source_branch="f", target_branch="m")
-        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [SimpleNamespace(project="group/proj", merge_requests=[mr], error=None)]
+        mr = MRInfo(
+            id=1, project_id=1, project_name="group/proj", iid=99, title="t", description="", state="opened",
+            author="a", created_at="", updated_at="", source_branch="f", target_branch="m", web_url="",
+            draft=False, work_in_progress=False,
+        )
+        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [ScanResult(project="group/proj", merge_requests=[mr], error=None)]
         cm = Mock()
         cm.create_clone.side_effect = Exception('create failed')
         main.clone_manager = cm
@@ -0,0 +1,233 @@
+"""
+測試 Prometheus 指標
+"""
+
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CLONE_STRATEGY, CloneManager
+from src.clone.workspaces import WorkspaceStore
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.gitlab_.project_cache import ProjectCache
+from src.main import cli
+from src.observability import metrics
+from src.observability.metrics import MetricsServer, Registry, api_endpoint, observe_api_response
+from src.scanner.mr_scanner import MRScanner
+from src.state.manager import StateManager
+from src.utils.exceptions import ConfigError
+
+
+def _mr(iid):
+    return MRInfo(
+        id=100 + iid, project_id=1, project_name="g/p", iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+        draft=False, work_in_progress=False, sha="a1",
+    )
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("app_requests_total", "請求數", ("endpoint", "status"))
+    depth = registry.gauge("app_queue", "佇列深度", ("state",))
+    seconds = registry.histogram("app_seconds", "耗時", buckets=(0.1, 1.0))
+    requests.inc(endpoint="projects/:id", status="200")
+    requests.inc(2, endpoint="projects/:id", status="200")
+    requests.inc(endpoint='a"b', status="404")
+    registry.set_collector("queue", lambda: depth.set(3, state="pending"))
+    for value in (0.05, 0.1, 0.5, 7):
+        seconds.observe(value)
+
+    text = registry.render()
+
+    assert "# TYPE app_requests_total counter" in text
+    assert 'app_requests_total{endpoint="projects/:id",status="200"} 3' in text
+    assert 'app_requests_total{endpoint="a\\"b",status="404"} 1' in text
+    assert 'app_queue{state="pending"} 3' in text
+    assert 'app_seconds_bucket{le="0.1"} 2' in text
+    assert 'app_seconds_bucket{le="1"} 3' in text
+    assert 'app_seconds_bucket{le="+Inf"} 4' in text
+    assert "app_seconds_sum 7.65" in text and "app_seconds_count 4" in text
+    assert text.endswith("\n")
+
+    with pytest.raises(ValueError):
+        requests.inc(endpoint="x")
+    with pytest.raises(ValueError):
+        registry.counter("app_requests_total", "重複")
+
+
+def test_collector_failure_does_not_break_render():
+    registry = Registry()
+    registry.gauge("app_up", "上線").set(1)
+    registry.set_collector("broken", Mock(side_effect=RuntimeError("db locked")))
+
+    assert "app_up 1" in registry.render()
+
+
+def test_collector_can_be_removed():
+    registry = Registry()
+    gauge = registry.gauge("app_jobs", "工作數")
+    registry.set_collector("jobs", lambda: gauge.set(3))
+    assert "app_jobs 3" in registry.render()
+
+    registry.set_collector("jobs", None)
+    registry.set_collector("missing", None)
+    gauge.set(1)
+    assert "app_jobs 1" in registry.render()
+
+
+def test_collectors_skip_missing_components(monkeypatch, tmp_path):
+    for name in ("job_queue", "clone_manager", "metrics_path", "logger"):
+        monkeypatch.setattr(main, name, None)
+    metrics.queue_jobs.set(5, state="pending")
+
+    main._collect_queue_metrics()
+    main._collect_reviews_metrics()
+    monkeypatch.setattr(main, "clone_manager", SimpleNamespace(workspaces=None))
+    main._collect_reviews_metrics()
+    # 沒有佇列或 clone 索引時保留原值
+    assert metrics.queue_jobs.value(state="pending") == 5
+    metrics.queue_jobs.clear()
+
+    # 無法寫入指標檔只記錄警告
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "metrics_path", tmp_path / "missing-dir" / "file" / "metrics.prom")
+    (tmp_path / "missing-dir").write_text("not a directory")
+    main._write_metrics()
+    main.logger.warning.assert_called_once()
+
+
+@pytest.mark.parametrize("path,endpoint", [
+    ("/api/v4/projects/group%2Fproj", "projects/:id"),
+    ("/api/v4/projects/42/merge_requests", "projects/:id/merge_requests"),
+    ("/api/v4/projects/42/merge_requests/7/changes?access_raw_diffs=true", "projects/:id/merge_requests/:id/changes"),
+    ("/api/v4/user", "user"),
+])
+def test_api_endpoint_is_low_cardinality(path, endpoint):
+    assert api_endpoint(path) == endpoint
+
+
+def test_observe_api_response():
+    labels = {"endpoint": "projects/:id/merge_requests", "method": "GET", "status": "200"}
+    before = metrics.api_requests.value(**labels)
+    count_before = metrics.api_request_seconds.count(endpoint="projects/:id/merge_requests")
+    response = SimpleNamespace(
+        request=SimpleNamespace(url="https://gitlab.example.com/api/v4/projects/1/merge_requests?state=opened", method="GET"),
+        status_code=200,
+        headers={"Content-Length": "120"},
+        elapsed=timedelta(milliseconds=30),
+    )
+
+    assert observe_api_response(response) is response
+    assert metrics.api_requests.value(**labels) == before + 1
+    assert metrics.api_request_seconds.count(endpoint="projects/:id/merge_requests") == count_before + 1
+
+
+def test_textfile_and_http_endpoint(tmp_path):
+    registry = Registry()
+    registry.counter("app_total", "總數").inc(5)
+
+    path = tmp_path / "textfile" / "reviewer.prom"
+    registry.write_textfile(path)
+    assert "app_total 5" in path.read_text()
+    assert [item.name for item in path.parent.iterdir()] == ["reviewer.prom"]
+
+    server = MetricsServer("127.0.0.1", 0, registry)
+    server.start()
+    try:
+        host, port = server.address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "app_total 5" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{port}/other", timeout=5)
+    finally:
+        server.stop()
+
+
+def test_clone_and_cache_metrics(tmp_path):
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    config = SimpleNamespace(reviews_path=str(tmp_path / "reviews"), gitlab_url="https://gitlab.example.com")
+    manager = CloneManager(config, state_manager, workspaces=WorkspaceStore(state_manager))
+    clones_before = metrics.clone_seconds.count(strategy=CLONE_STRATEGY)
+    bytes_before = metrics.clone_bytes.value(strategy=CLONE_STRATEGY)
+
+    def fake_git(cmd, cwd=None):
+        if cmd[1] == "clone":
+            Path(cmd[-1]).mkdir(parents=True)
+            (Path(cmd[-1]) / "README").write_bytes(b"x" * 500)
+
+    with patch.object(CloneManager, "_run_git_command", side_effect=fake_git):
+        manager.create_clone(_mr(1))
+
+    assert metrics.clone_seconds.count(strategy=CLONE_STRATEGY) == clones_before + 1
+    assert metrics.clone_bytes.value(strategy=CLONE_STRATEGY) >= bytes_before + 500
+
+    cache = ProjectCache(state_manager)
+    hits, misses = (metrics.cache_requests.value(cache="project", result=result) for result in ("hit", "miss"))
+    cache.get("g/p")
+    cache.put("g/p", 1, "g/p")
+    cache.get("g/p")
+    assert metrics.cache_requests.value(cache="project", result="miss") == misses + 1
+    assert metrics.cache_requests.value(cache="project", result="hit") == hits + 1
+
+
+def test_scan_writes_textfile(monkeypatch, tmp_path):
+    path = tmp_path / "reviewer.prom"
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager)
+    store.record("g/p", 1, 101, 2048)
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/p"], reviews_quota=4096)
+        main.metrics_path = path
+        main.mr_scanner = MRScanner(Mock(), Mock())
+        main.mr_scanner.client.get_merge_requests.return_value = [_mr(1)]
+        main.clone_manager = CloneManager(main.config, state_manager, workspaces=store)
+        main.job_queue = Mock()
+        main.job_queue.counts.return_value = {"pending": 2, "done": 5}
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.snapshot_path = None
+        metrics.registry.set_collector("queue", main._collect_queue_metrics)
+        metrics.registry.set_collector("reviews", main._collect_reviews_metrics)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "mr_scanner", "clone_manager", "job_queue", "shard_coordinator", "scan_lock", "snapshot_path", "metrics_path"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["scan", "--dry-run"])
+
+    assert result.exit_code == 0, result.output
+    text = path.read_text()
+    assert 'gitlab_mr_reviewer_queue_jobs{state="pending"} 2' in text
+    assert "gitlab_mr_reviewer_reviews_bytes 2048" in text
+    assert "gitlab_mr_reviewer_reviews_clones 1" in text
+    assert "gitlab_mr_reviewer_reviews_quota_bytes 4096" in text
+    assert 'gitlab_mr_reviewer_projects_scanned_total{result="ok"}' in text
+
+
+def test_metrics_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    config = Config.from_env()
+    assert (config.metrics_textfile, config.metrics_host, config.metrics_port) == ("", "127.0.0.1", 0)
+
+    monkeypatch.setenv("METRICS_PORT", "9464")
+    assert Config.from_env().metrics_port == 9464
+    monkeypatch.setenv("METRICS_TEXTFILE", "~/node_exporter/gitlab_mr.prom")
+    assert Config.from_env().metrics_textfile == str(Path.home() / "node_exporter" / "gitlab_mr.prom")
+    monkeypatch.setenv("METRICS_PORT", "70000")
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -0,0 +1,201 @@
+"""
+測試宣告式 MR 篩選規則、伺服器端下推與掃描器整合
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from click.testing import CliRunner
+
+from src.config import Config
+from src.gitlab_.models import Change, MRInfo
+from src.main import cli
+from src.scanner.filters import MRFilter, compile_rule
+from src.scanner.mr_scanner import MRScanner
+from src.utils.exceptions import ConfigError
+
+
+NOW = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _mr(iid=1, **kwargs):
+    values = dict(
+        id=iid, project_id=10, project_name="g/p", iid=iid, title="Add feature", description="",
+        state="opened", author="alice", created_at="2026-02-25T00:00:00Z", updated_at="",
+        source_branch="f", target_branch="main", web_url="", draft=False, work_in_progress=False,
+        labels=["backend", "needs-review"], source_project_id=10,
+    )
+    values.update(kwargs)
+    return MRInfo(**values)
+
+
+@pytest.mark.parametrize("rule, mr, expected", [
+    ("author = alice,bob", _mr(), True),
+    ("author != alice", _mr(), False),
+    ("label = backend", _mr(), True),
+    ("label = backend,frontend", _mr(), False),
+    ("label != do-not-review", _mr(), True),
+    ("label != backend", _mr(), False),
+    ("target_branch = release/*", _mr(target_branch="release/1.0"), True),
+    ("target_branch != main", _mr(), False),
+    ("source_project = same", _mr(), True),
+    ("source_project = fork", _mr(source_project_id=99), True),
+    ("source_project = fork", _mr(source_project_id=None), False),
+    ("title ~ ^Add", _mr(), True),
+    ("title !~ (?i)^revert", _mr(title="Revert x"), False),
+    ("wip = no", _mr(work_in_progress=True), False),
+    ("draft = No", _mr(draft=True), False),
+])
+def test_rule_predicates(rule, mr, expected):
+    assert MRFilter.parse([rule]).matches(mr) is expected
+
+
+def test_age_rule_and_pushdown():
+    younger = compile_rule("age < 7d", now=lambda: NOW)
+    older = compile_rule("age > 2w", now=lambda: NOW)
+
+    assert younger.predicate(_mr(), None) is True
+    assert older.predicate(_mr(), None) is False
+    assert younger.predicate(_mr(created_at=""), None) is False
+    assert younger.predicate(_mr(created_at="2026-02-28T00:00:00"), None) is True
+
+    params = MRFilter([younger, older]).query_params()
+    assert params == {
+        "created_after": "2026-02-22T00:00:00+00:00",
+        "created_before": "2026-02-15T00:00:00+00:00",
+    }
+
+
+def test_path_rule_uses_changes_loader():
+    loader = Mock(return_value=["src/app.py", "README.md"])
+
+    assert MRFilter.parse(["path = src/*.py"]).matches(_mr(), loader) is True
+    assert MRFilter.parse(["path != *.md"]).matches(_mr(), loader) is False
+    assert MRFilter.parse(["path = docs/*"]).matches(_mr()) is False
+
+
+def test_pushdown_and_describe():
+    mr_filter = MRFilter.parse([
+        "# 只看主線",
+        "",
+        "path = src/*",
+        "title ~ feat",
+        "target_branch = main",
+        "target_branch != release/*",
+        "author = alice",
+        "author = alice,bob",
+        "label = b,a",
+    ]).with_options(exclude_wip=True, exclude_draft=False)
+
+    assert mr_filter.query_params() == {
+        "target_branch": "main", "author_username": "alice", "labels": "a,b", "wip": "no",
+    }
+    server, client = mr_filter.describe()
+    assert server == ["wip = no", "target_branch = main", "author = alice", "label = b,a"]
+    # 需要額外 API 的 path 規則最後評估
+    assert client[-1] == "path = src/*"
+    assert MRFilter.parse([]).with_options(False, False).rules == []
+
+
+@pytest.mark.parametrize("rule", [
+    "nonsense",
+    "color = red",
+    "author ~ alice",
+    "wip = yes",
+    "source_project = mine",
+    "age < soon",
+    "title ~ (",
+])
+def test_invalid_rules(rule):
+    with pytest.raises(ConfigError):
+        MRFilter.parse([rule])
+
+
+def test_scanner_pushes_params_and_filters_client_side():
+    client = Mock()
+    client.get_merge_requests.return_value = [
+        _mr(1), _mr(2, author="bot"), _mr(3, work_in_progress=True), _mr(4),
+    ]
+    client.get_mr_changes.side_effect = lambda project, iid: [
+        Change(old_path="old.py", new_path="src/a.py" if iid == 1 else "docs/a.md",
+               new_file=False, deleted_file=False, renamed_file=False),
+    ]
+
+    scanner = MRScanner(client, Mock(), filter_rules=["author = alice", "path = src/*", "path != *.txt"])
+    results = scanner.scan(["g/p"], exclude_wip=True, exclude_draft=False)
+
+    assert [mr.iid for mr in results[0].merge_requests] == [1]
+    assert client.get_merge_requests.call_args.kwargs["params"] == {"author_username": "alice", "wip": "no"}
+    # 每個 MR 的變更只取得一次，且只針對通過便宜規則的 MR
+    assert sorted(c.args[1] for c in client.get_mr_changes.call_args_list) == [1, 4]
+    assert scanner.describe_filters(exclude_wip=False, exclude_draft=False)[0] == ["author = alice"]
+
+
+def test_client_passes_params_and_reads_labels():
+    with patch("src.gitlab_.client.gitlab.Gitlab") as mock_gitlab:
+        from src.gitlab_.client import GitLabClient
+
+        mock_mr = SimpleNamespace(
+            id=1, iid=2, title="t", description="", state="opened", author={"username": "alice"},
+            created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+            draft=False, work_in_progress=False, labels=["backend"], source_project_id=99,
+        )
+        project = Mock(id=10, path_with_namespace="g/p")
+        project.mergerequests.list.return_value = [mock_mr]
+        mock_gitlab.return_value.projects.get.return_value = project
+
+        mrs = GitLabClient("https://gitlab.example.com", "token").get_merge_requests("g/p", params={"wip": "no"})
+
+    project.mergerequests.list.assert_called_once_with(all=True, state="opened", wip="no")
+    assert mrs[0].labels == ["backend"]
+    assert mrs[0].source_project_id == 99
+
+
+@pytest.fixture
+def base_env(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+
+def test_config_reads_filters(base_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("MR_FILTERS", "author != bot; label = backend;")
+    assert Config.from_env().mr_filters == ["author != bot", "label = backend"]
+
+    rules_file = tmp_path / "filters.txt"
+    rules_file.write_text("# 規則\ntitle ~ #123\n\nage < 14d\n", encoding="utf-8")
+    monkeypatch.setenv("MR_FILTERS_FILE", str(rules_file))
+    assert Config.from_env().mr_filters == ["title ~ #123", "age < 14d"]
+
+
+def test_config_rejects_bad_filters(base_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("MR_FILTERS", "color = red")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.setenv("MR_FILTERS_FILE", str(tmp_path / "missing.txt"))
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.setenv("MR_FILTERS_FILE", str(tmp_path))
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+
+def test_dry_run_shows_rule_placement(monkeypatch):
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/p"])
+        main.mr_scanner = MRScanner(Mock(), Mock(), filter_rules=["label = backend", "title ~ feat"])
+        main.mr_scanner.client.get_merge_requests.return_value = []
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = CliRunner().invoke(cli, ["scan", "--dry-run"])
+
+    assert result.exit_code == 0
+    assert "篩選規則（伺服器端）: label = backend" in result.output
+    assert "篩選規則（用戶端）: title ~ feat" in result.output
@@ -0,0 +1,311 @@
+"""
+測試 scan → clone 管線與跨專案公平排程
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.pipeline.engine import DEFER_MR_REASON, DEFER_PROJECT_REASON, ScanClonePipeline
+from src.pipeline.fair import FairPolicy, FairQueue
+from src.scanner.mr_scanner import ScanResult
+from src.utils.exceptions import ConfigError
+
+
+def _mr(iid, project="g/a"):
+    return MRInfo(
+        id=iid, project_id=1, project_name=project, iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False,
+    )
+
+
+def test_clone_starts_before_scan_finishes():
+    first_clone = threading.Event()
+    scanned = []
+
+    def scan(project):
+        if project == "g/b":
+            # 第二個專案要等第一個專案的 MR 開始 clone 才能完成掃描
+            assert first_clone.wait(5)
+        scanned.append(project)
+        return ScanResult(project=project, merge_requests=[_mr(1, project)])
+
+    def process(project, mr):
+        first_clone.set()
+
+    pipeline = ScanClonePipeline(scan, process, lambda result, seconds: None, workers=1)
+    results = pipeline.run(["g/a", "g/b"])
+
+    assert [result.project for result in results] == ["g/a", "g/b"]
+    assert scanned == ["g/a", "g/b"]
+    assert pipeline.first_clone_latency is not None
+
+
+def test_bounded_queue_applies_backpressure():
+    lock = threading.Lock()
+    state = {"queued": 0, "peak": 0}
+
+    class CountingList(list):
+        def __iter__(self):
+            for item in list.__iter__(self):
+                with lock:
+                    state["queued"] += 1
+                    state["peak"] = max(state["peak"], state["queued"])
+                yield item
+
+    def scan(project):
+        return ScanResult(project=project, merge_requests=CountingList(_mr(i, project) for i in range(20)))
+
+    def process(project, mr):
+        with lock:
+            state["queued"] -= 1
+
+    ScanClonePipeline(scan, process, lambda result, seconds: None, workers=2, queue_size=3).run(["g/a", "g/b"])
+
+    # 已產生但尚未處理的 MR 不超過佇列容量 + worker 數（+1 為正在放入的項目）
+    assert state["peak"] <= 3 + 2 + 1
+    assert state["queued"] == 0
+
+
+def test_scanner_waits_when_backlog_is_full():
+    scanned = []
+    seen = []
+
+    def scan(project):
+        scanned.append(project)
+        return ScanResult(project=project, merge_requests=[_mr(i, project) for i in range(5)])
+
+    def process(project, mr):
+        if not seen:
+            # clone 停住時，掃描端最多保留 queue_size 個專案的 MR
+            time.sleep(0.5)
+            seen.append(len(scanned))
+
+    projects = [f"g/{n}" for n in range(10)]
+    results = ScanClonePipeline(scan, process, lambda result, seconds: None, workers=1, queue_size=2).run(projects)
+
+    assert seen == [2]
+    assert len(results) == 10
+
+
+def test_project_done_after_all_mrs_processed():
+    processed = []
+    done = []
+    lock = threading.Lock()
+
+    def scan(project):
+        if project == "g/skip":
+            return None
+        if project == "g/bad":
+            raise RuntimeError("boom")
+        mrs = [_mr(i, project) for i in range(5)] if project == "g/a" else []
+        return ScanResult(project=project, merge_requests=mrs)
+
+    def process(project, mr):
+        if mr.iid == 2:
+            raise RuntimeError("clone failed")
+        with lock:
+            processed.append((project, mr.iid))
+
+    def project_done(result, seconds):
+        with lock:
+            done.append((result.project, len(processed)))
+
+    pipeline = ScanClonePipeline(scan, process, project_done, workers=3, scanners=2, queue_size=2)
+    results = pipeline.run(["g/a", "g/skip", "g/bad", "g/empty"])
+
+    assert [result.project for result in results] == ["g/a", "g/empty"]
+    assert sorted(processed) == [("g/a", 0), ("g/a", 1), ("g/a", 3), ("g/a", 4)]
+    # g/a 要等 4 個成功與 1 個失敗的 MR 都處理完才算完成
+    assert ("g/a", 4) in done
+    assert sorted(project for project, _ in done) == ["g/a", "g/empty"]
+
+
+def test_project_done_failure_does_not_stop_pipeline():
+    processed = []
+    lock = threading.Lock()
+
+    def scan(project):
+        mrs = [_mr(i, project) for i in range(3)] if project != "g/empty" else []
+        return ScanResult(project=project, merge_requests=mrs)
+
+    def process(project, mr):
+        with lock:
+            processed.append((project, mr.iid))
+
+    def project_done(result, seconds):
+        raise RuntimeError("state write failed")
+
+    results = ScanClonePipeline(scan, process, project_done, workers=2, queue_size=2).run(["g/a", "g/empty", "g/b"])
+
+    # 完成回呼失敗只記錄錯誤，其餘專案的 MR 仍全部處理
+    assert [result.project for result in results] == ["g/a", "g/empty", "g/b"]
+    assert sorted(processed) == [(p, i) for p in ("g/a", "g/b") for i in range(3)]
+
+
+def test_empty_project_list():
+    pipeline = ScanClonePipeline(lambda p: None, lambda p, mr: None, lambda r, s: None)
+    assert pipeline.run([]) == []
+    assert pipeline.first_clone_latency is None
+
+
+def test_pipeline_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+    monkeypatch.setenv("PIPELINE_WORKERS", "4")
+    monkeypatch.setenv("PIPELINE_QUEUE_SIZE", "8")
+
+    config = Config.from_env()
+    assert (config.pipeline_workers, config.pipeline_scanners, config.pipeline_queue_size) == (4, 1, 8)
+
+    monkeypatch.setenv("PIPELINE_WORKERS", "0")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+
+def test_fair_queue_round_robin_and_weights():
+    q = FairQueue(maxsize=100)
+    for i in range(4):
+        q.put("g/big", f"big{i}")
+    q.put("g/small", "small0")
+    q.put("g/small", "small1")
+
+    order = [q.get()[1] for _ in range(6)]
+    assert order == ["big0", "small0", "big1", "small1", "big2", "big3"]
+
+    weighted = FairQueue(maxsize=100, weight=lambda flow: 2.0 if flow == "g/hot" else 1.0)
+    for i in range(4):
+        weighted.put("g/hot", f"hot{i}")
+        weighted.put("g/cold", f"cold{i}")
+    order = [weighted.get()[1] for _ in range(6)]
+    # 權重 2 的專案取得約兩倍的份額
+    assert sum(item.startswith("hot") for item in order) == 4
+
+
+def test_fair_queue_bounds_and_close():
+    q = FairQueue(maxsize=1)
+    q.put("g/a", 1)
+    with pytest.raises(queue.Full):
+        q.put("g/b", 2, block=False)
+    assert q.qsize() == 1
+
+    q.close()
+    assert q.get() == ("g/a", 1)
+    assert q.get() is None
+
+
+def test_fair_policy_boosts_recent_mrs():
+    now = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    policy = FairPolicy(weights={"g/hot": 3}, recent_window=3600, recent_boost=4, now=lambda: now)
+
+    recent, stale, unknown = _mr(1), _mr(2), _mr(3)
+    recent.updated_at = "2024-05-01T11:30:00.000Z"
+    stale.updated_at = "2024-04-01T00:00:00Z"
+    unknown.updated_at = None
+
+    assert (policy.cost(recent), policy.cost(stale), policy.cost(unknown)) == (0.25, 1.0, 1.0)
+    assert (policy.weight("g/hot"), policy.weight("g/other")) == (3, 1.0)
+    assert FairPolicy().cost(recent) == 1.0
+
+
+def test_large_project_does_not_starve_later_projects():
+    order = []
+
+    def scan(project):
+        count = 30 if project == "g/mono" else 2
+        return ScanResult(project=project, merge_requests=[_mr(i, project) for i in range(count)])
+
+    def process(project, mr):
+        order.append(project)
+
+    pipeline = ScanClonePipeline(scan, process, lambda result, seconds: None, workers=1, queue_size=4)
+    pipeline.run(["g/mono", "g/a", "g/b"])
+
+    assert len(order) == 34
+    # 後面的小專案在大型專案清空前就已完成
+    last_small = max(i for i, project in enumerate(order) if project != "g/mono")
+    assert last_small < 15
+
+
+def test_project_weights_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+    monkeypatch.setenv("PROJECT_WEIGHTS", "group/big=0.5, group/hot=2")
+    monkeypatch.setenv("FAIR_RECENT_BOOST", "3")
+
+    config = Config.from_env()
+    assert config.project_weights == {"group/big": 0.5, "group/hot": 2.0}
+    assert (config.fair_recent_window, config.fair_recent_boost) == (3600.0, 3.0)
+
+    for value in ("group/big", "group/big=0", "group/big=abc", "=2"):
+        monkeypatch.setenv("PROJECT_WEIGHTS", value)
+        with pytest.raises(ConfigError):
+            Config.from_env()
+
+    monkeypatch.setenv("PROJECT_WEIGHTS", "")
+    for value in ("0", "-1"):
+        monkeypatch.setenv("FAIR_RECENT_BOOST", value)
+        with pytest.raises(ConfigError, match="FAIR_RECENT_BOOST"):
+            Config.from_env()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_budget_defers_mrs_that_do_not_fit():
+    clock = FakeClock()
+    processed = []
+    done = []
+
+    def scan(project):
+        mrs = [_mr(i, project) for i in range(4)]
+        for i, mr in enumerate(mrs):
+            mr.updated_at = f"2024-05-0{i + 1}T00:00:00Z"
+        return ScanResult(project=project, merge_requests=mrs)
+
+    def process(project, mr):
+        processed.append(mr.iid)
+        clock.now += 10
+
+    pipeline = ScanClonePipeline(
+        scan, process, lambda result, seconds: done.append(result), workers=1, clock=clock,
+    )
+    (result,) = pipeline.run(["g/a"], budget=25)
+
+    # 最近更新的 MR 先處理；第三個 MR 預估會超出預算而延後
+    assert processed == [3, 2]
+    assert [mr.iid for mr in result.deferred_mrs] == [1, 0]
+    assert result.deferred_reason == DEFER_MR_REASON
+    assert done == [result]
+    assert not pipeline.over_budget() and pipeline.over_budget(10)
+
+
+def test_budget_defers_unscanned_projects():
+    clock = FakeClock()
+    scanned = []
+
+    def scan(project):
+        scanned.append(project)
+        clock.now += 30
+        return ScanResult(project=project, merge_requests=[])
+
+    pipeline = ScanClonePipeline(scan, lambda p, mr: None, lambda r, s: None, clock=clock)
+    results = pipeline.run(["g/a", "g/b"], budget=20)
+
+    assert scanned == ["g/a"]
+    assert [(r.project, r.deferred, r.deferred_reason) for r in results] == [
+        ("g/a", False, None), ("g/b", True, DEFER_PROJECT_REASON),
+    ]
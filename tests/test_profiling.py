@@ -0,0 +1,126 @@
+"""
+測試 CLI 效能剖析選項
+"""
+
+import cProfile
+import pstats
+import tracemalloc
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+from src.main import cli
+from src.observability import profiling
+from src.observability.profiling import Profiler, collapsed_stacks
+from src.observability.tracing import tracer
+
+
+def _inner():
+    return sum(i * i for i in range(20000))
+
+
+def _outer():
+    total = 0
+    for _ in range(5):
+        total += _inner()
+    return total
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+def test_collapsed_stacks_follow_call_edges():
+    profile = cProfile.Profile()
+    profile.enable()
+    _outer()
+    profile.disable()
+
+    lines = collapsed_stacks(pstats.Stats(profile))
+
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+    inner = [stack for stack in stacks if stack.split(";")[-1].startswith("_inner (")]
+    assert inner and all("_outer (test_profiling.py:" in stack.split(";")[-2] for stack in inner)
+    assert all(value > 0 for value in stacks.values())
+
+
+def test_collapsed_stacks_skip_functions_without_time():
+    root = ("app.py", 1, "main")
+    idle = ("app.py", 10, "idle")
+    stats = Mock(stats={
+        root: (1, 1, 0.002, 0.002, {}),
+        idle: (1, 1, 0.0, 0.0, {root: (1, 1, 0.0, 0.0)}),
+        ("~", 0, "<built-in method time.sleep>"): (1, 1, 0.0, 0.0, {}),
+    })
+
+    assert collapsed_stacks(stats, min_fraction=0) == ["main (app.py:1) 2000"]
+
+
+def test_peak_rss_and_size_formatting(monkeypatch):
+    assert profiling.peak_rss() > 0
+    assert profiling._format_size(512) == "512.0 B"
+    assert profiling._format_size(3 * 1024 ** 3) == "3.0 GB"
+
+    # 沒有 resource 模組的平台（Windows）回報 0
+    monkeypatch.setattr(profiling, "resource", None)
+    assert profiling.peak_rss() == 0
+
+
+def test_start_rejects_unknown_format():
+    with pytest.raises(ValueError, match="svg"):
+        Profiler().start(profile_format="svg")
+
+
+def test_cli_profile_and_trace_malloc(monkeypatch, tmp_path):
+    def fake_init(offline=False):
+        import src.main as main
+        main.logger = Mock()
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.return_value = []
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    path = tmp_path / "profile" / "stats.prof"
+
+    result = CliRunner().invoke(cli, ["--profile", str(path), "--trace-malloc", "stats"])
+
+    assert result.exit_code == 0, result.output
+    assert "沒有掃描紀錄" in result.output
+    assert f"效能剖析已寫入 {path} (pstats" in result.output
+    assert "峰值 RSS" in result.output and "配置最多的位置" in result.output
+    assert any("stats" in func[2] for func in pstats.Stats(str(path)).stats)
+    assert not tracemalloc.is_tracing()
+
+    collapsed = tmp_path / "stats.folded"
+    result = CliRunner().invoke(cli, ["--profile", str(collapsed), "--profile-format", "collapsed", "stats"])
+    assert result.exit_code == 0, result.output
+    assert "記憶體" not in result.output
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.read_text().splitlines())
+
+
+def test_phases_reported_only_with_tracing(enabled_tracer):
+    profiler = Profiler()
+    profiler.start(trace_malloc=True, top=5)
+    with profiler.phase("scan"):
+        data = [bytes(1024) for _ in range(2000)]
+    with profiler.phase("scan"):
+        pass
+    del data
+
+    lines = profiler.stop()
+
+    assert "  各階段:" in lines
+    phase = next(line for line in lines if line.startswith("    scan:"))
+    assert phase.startswith("    scan: 2 次")
+    assert any("test_profiling.py:" in line for line in lines[lines.index("  各階段:"):])
+    spans = [span for span in tracer.drain() if span.name == "phase.scan"]
+    assert len(spans) == 2 and spans[0].attrs["mem_peak"] >= 2000 * 1024
+
+    tracer.disable()
+    profiler.start(trace_malloc=True)
+    with profiler.phase("scan"):
+        pass
+    assert "  各階段:" not in profiler.stop()
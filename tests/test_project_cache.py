@@ -0,0 +1,187 @@
+"""
+測試專案路徑 → ID 解析快取
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import gitlab
+import pytest
+
+from src.config import Config
+from src.gitlab_.client import GitLabClient
+from src.gitlab_.project_cache import ProjectCache
+from src.state.manager import StateManager
+from src.utils.exceptions import ConfigError, GitLabError, StateError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _manager(tmp_path, storage_type="sqlite"):
+    return StateManager(storage_type=storage_type, db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path / "state"))
+
+
+def _mr(iid, path):
+    return SimpleNamespace(
+        id=iid, iid=iid, title="t", description="", state="opened", author={"username": "a"},
+        created_at="", updated_at="", source_branch="f", target_branch="m",
+        web_url=f"https://gitlab.example.com/{path}/-/merge_requests/{iid}",
+    )
+
+
+def _client(mock_gl, cache):
+    with patch("src.gitlab_.client.gitlab.Gitlab", return_value=mock_gl):
+        return GitLabClient("https://gitlab.example.com", "token", project_cache=cache)
+
+
+@pytest.mark.parametrize("storage_type", ["sqlite", "json", "kv"])
+def test_documents_round_trip(tmp_path, storage_type):
+    manager = _manager(tmp_path, storage_type)
+
+    assert manager.get_document("projects", "g/a") is None
+    manager.put_document("projects", "g/a", {"id": 1})
+    manager.put_document("projects", "g/a", {"id": 2})
+    manager.put_document("other", "g/a", {"id": 3})
+    assert manager.get_document("projects", "g/a") == {"id": 2}
+
+    manager.delete_document("projects", "g/a")
+    manager.delete_document("projects", "g/missing")
+    assert manager.get_document("projects", "g/a") is None
+    assert manager.get_document("other", "g/a") == {"id": 3}
+    manager.close()
+
+
+def test_cache_persists_and_expires(tmp_path):
+    clock = FakeClock()
+    cache = ProjectCache(_manager(tmp_path), ttl=60, clock=clock)
+    cache.put("g/a", 42, "g/a")
+
+    # 新的快取實例由狀態儲存讀回
+    reloaded = ProjectCache(_manager(tmp_path), ttl=60, clock=clock)
+    assert reloaded.get("g/a").id == 42
+
+    clock.now += 61
+    assert reloaded.get("g/a") is None
+
+    cache.invalidate("g/a")
+    assert ProjectCache(_manager(tmp_path), ttl=60, clock=clock).get("g/a") is None
+
+
+def test_cache_tolerates_state_errors(caplog):
+    manager = Mock()
+    manager.get_document.side_effect = StateError("locked")
+    manager.put_document.side_effect = StateError("read-only")
+    manager.delete_document.side_effect = StateError("read-only")
+    cache = ProjectCache(manager, ttl=60, clock=FakeClock())
+
+    # 讀取失敗視為未命中
+    assert cache.get("g/a") is None
+    # 寫入失敗時仍保留在記憶體中
+    assert cache.put("g/a", 42, "g/a").id == 42
+    assert cache.get("g/a").id == 42
+    assert "無法保存專案 g/a 的解析結果" in caplog.text
+
+    cache.invalidate("g/a")
+    assert "無法刪除專案 g/a 的解析結果" in caplog.text
+    assert cache.get("g/a") is None
+
+
+def test_client_uses_lazy_handle_on_cache_hit(tmp_path):
+    mock_gl = Mock()
+    project = Mock(id=42, path_with_namespace="g/a")
+    project.mergerequests.list.return_value = [_mr(1, "g/a")]
+    mock_gl.projects.get.return_value = project
+    cache = ProjectCache(_manager(tmp_path))
+    client = _client(mock_gl, cache)
+
+    client.get_merge_requests("g/a")
+    (mr,) = client.get_merge_requests("g/a")
+
+    assert (mr.project_id, mr.project_name) == (42, "g/a")
+    # 第一次完整解析路徑，之後以數字 ID 建立 lazy 物件
+    assert [c.args for c in mock_gl.projects.get.call_args_list] == [("g/a",), (42,)]
+    assert mock_gl.projects.get.call_args.kwargs == {"lazy": True}
+
+
+def test_client_reresolves_after_404(tmp_path):
+    mock_gl = Mock()
+    stale = Mock()
+    stale.mergerequests.list.side_effect = gitlab.exceptions.GitlabListError("404 Not Found", response_code=404)
+    moved = Mock(id=7, path_with_namespace="g/a")
+    moved.mergerequests.list.return_value = [_mr(1, "g/a")]
+    mock_gl.projects.get.side_effect = lambda project_id, lazy=False: stale if lazy else moved
+    cache = ProjectCache(_manager(tmp_path))
+    cache.put("g/a", 42, "g/a")
+    client = _client(mock_gl, cache)
+
+    (mr,) = client.get_merge_requests("g/a")
+
+    assert mr.project_id == 7
+    assert cache.get("g/a").id == 7
+
+
+def test_client_keeps_cache_on_other_errors(tmp_path):
+    mock_gl = Mock()
+    handle = Mock()
+    handle.mergerequests.list.side_effect = gitlab.exceptions.GitlabListError("500 Internal Server Error", response_code=500)
+    mock_gl.projects.get.return_value = handle
+    cache = ProjectCache(_manager(tmp_path))
+    cache.put("g/a", 42, "g/a")
+    client = _client(mock_gl, cache)
+
+    with pytest.raises(GitLabError, match="500"):
+        client.get_merge_requests("g/a")
+
+    # 只有 404 才重新解析
+    assert [c.kwargs for c in mock_gl.projects.get.call_args_list] == [{"lazy": True}]
+    assert cache.get("g/a").id == 42
+
+
+def test_client_detects_moved_project(tmp_path):
+    mock_gl = Mock()
+    handle = Mock()
+    handle.mergerequests.list.return_value = [_mr(1, "new-group/a")]
+    renamed = Mock(id=42, path_with_namespace="new-group/a")
+    mock_gl.projects.get.side_effect = lambda project_id, lazy=False: handle if lazy else renamed
+    cache = ProjectCache(_manager(tmp_path))
+    cache.put("g/a", 42, "g/a")
+    client = _client(mock_gl, cache)
+
+    (mr,) = client.get_merge_requests("g/a")
+
+    assert mr.project_name == "new-group/a"
+    assert cache.get("g/a").path_with_namespace == "new-group/a"
+
+
+def test_client_trusts_mrs_without_web_url(tmp_path):
+    mock_gl = Mock()
+    handle = Mock()
+    handle.mergerequests.list.return_value = [SimpleNamespace(**{**vars(_mr(1, "g/a")), "web_url": None})]
+    mock_gl.projects.get.return_value = handle
+    cache = ProjectCache(_manager(tmp_path))
+    cache.put("g/a", 42, "g/a")
+    client = _client(mock_gl, cache)
+
+    (mr,) = client.get_merge_requests("g/a")
+
+    # 無法由網址判斷專案時沿用快取，不重新解析
+    assert mr.project_name == "g/a"
+    assert mock_gl.projects.get.call_count == 1
+
+
+def test_project_cache_ttl_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    assert Config.from_env().project_cache_ttl == 86400.0
+
+    monkeypatch.setenv("PROJECT_CACHE_TTL", "-1")
+    with pytest.raises(ConfigError):
+        Config.from_env()
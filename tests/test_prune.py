@@ -0,0 +1,258 @@
+"""
+測試已關閉 MR 的 clone 清理
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CloneManager
+from src.clone import prune as prune_module
+from src.clone.prune import TRASH_DIR, ClonePruner, PruneReport, find_stale_clones, tree_size
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.jobs.queue import PENDING, JobQueue
+from src.state.cache import CachedStateManager
+from src.main import cli
+from src.state.manager import StateManager
+from src.state.models import MRState
+from src.utils.exceptions import ConfigError
+
+
+def _clone(reviews, project, iid, size=100):
+    path = reviews / project / str(iid)
+    (path / "src").mkdir(parents=True)
+    (path / "src" / "file.txt").write_bytes(b"x" * size)
+    return path
+
+
+def test_find_stale_clones_skips_unknown_projects():
+    clones = {"g/a": [3, 1, 2], "g/b": [1], "g/unreachable": [7]}
+    open_iids = {"g/a": {2}, "g/b": {1}}
+
+    assert find_stale_clones(clones, open_iids) == [("g/a", 1), ("g/a", 3)]
+
+
+def test_pruner_removes_in_background_and_reports_size(tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "g/a", 1, size=1000)
+    _clone(reviews, "g/a", 2, size=500)
+    kept = _clone(reviews, "g/a", 3)
+    # 前次中斷留下的目錄
+    leftover = reviews / TRASH_DIR / "g_a-9-dead"
+    (leftover / "x").mkdir(parents=True)
+    (leftover / "x" / "blob").write_bytes(b"y" * 24)
+
+    report = ClonePruner(str(reviews), workers=2).prune([("g/a", 1), ("g/a", 2), ("g/a", 404)])
+
+    assert (report.removed, report.failed, report.bytes_reclaimed) == (2, 1, 1524)
+    assert kept.exists()
+    assert list((reviews / TRASH_DIR).iterdir()) == []
+    assert tree_size(kept) == 100
+    # .trash 不會被當成專案列出
+    assert CloneManager(SimpleNamespace(reviews_path=str(reviews)), Mock()).list_clones() == {"g/a": [3]}
+
+
+def test_tree_size_skips_unreadable_entries(tmp_path, monkeypatch):
+    assert tree_size(tmp_path / "missing") == 0
+
+    _clone(tmp_path, "g/a", 1, size=10)
+    (tmp_path / "g/a" / "1" / "src" / "gone.txt").write_bytes(b"x" * 5)
+    real_scandir = prune_module.os.scandir
+
+    class Vanished:
+        # 走訪期間被刪除的檔案
+        def __init__(self, entry):
+            self.entry = entry
+            self.path = entry.path
+
+        def is_dir(self, follow_symlinks=True):
+            return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+        def stat(self, follow_symlinks=True):
+            raise FileNotFoundError(self.path)
+
+    def scandir(path):
+        return [Vanished(entry) if entry.name == "gone.txt" else entry for entry in real_scandir(path)]
+
+    monkeypatch.setattr(prune_module.os, "scandir", scandir)
+    assert tree_size(tmp_path / "g/a" / "1") == 10
+
+
+def test_pruner_removes_leftover_files_and_retries_failures(tmp_path, monkeypatch):
+    reviews = tmp_path / "reviews"
+    trash = reviews / TRASH_DIR
+    trash.mkdir(parents=True)
+    (trash / "stray").write_bytes(b"z" * 7)
+    (trash / "busy" / "x").mkdir(parents=True)
+
+    def rmtree(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(prune_module.shutil, "rmtree", rmtree)
+    report = ClonePruner(str(reviews)).prune([])
+
+    # 檔案直接刪除；刪除失敗的目錄留待下次清理
+    assert report.bytes_reclaimed == 7
+    assert [path.name for path in trash.iterdir()] == ["busy"]
+
+
+def test_prune_command(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "g/a", 1, size=2048)
+    _clone(reviews, "g/a", 2)
+    _clone(reviews, "g/orphan", 5)
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    state_manager.save_mr_states([
+        MRState(mr_id=11, project_slug="g/a", iid=1, state="opened", head_commit_sha=""),
+        MRState(mr_id=12, project_slug="g/a", iid=2, state="opened", head_commit_sha=""),
+        MRState(mr_id=13, project_slug="g/a", iid=3, state="opened", head_commit_sha=""),
+    ])
+    job_queue = JobQueue(str(tmp_path / "db.sqlite"))
+    for iid in (1, 2, 3):
+        job_queue.enqueue(MRInfo(
+            id=10 + iid, project_id=1, project_name="g/a", iid=iid, title="t", description="", state="opened",
+            author="a", created_at="", updated_at="", source_branch="f", target_branch="m", web_url="", draft=False,
+            work_in_progress=False,
+        ))
+    job_queue.complete(job_queue.claim("w1", "g/a", 1))
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/a"], reviews_path=str(reviews), prune_workers=2)
+        main.state_manager = state_manager
+        main.clone_manager = CloneManager(main.config, state_manager)
+        main.gitlab_client = Mock()
+        main.gitlab_client.get_merge_requests.return_value = [SimpleNamespace(iid=2)]
+        main.shard_coordinator = None
+        main.job_queue = job_queue
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager", "gitlab_client", "shard_coordinator", "job_queue"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["prune", "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert "g/a#1" in result.output and "將移除 1 個 clone" in result.output
+    assert (reviews / "g/a" / "1").exists()
+
+    result = runner.invoke(cli, ["prune"])
+    assert result.exit_code == 0, result.output
+    assert "移除 1 個 clone" in result.output
+    assert not (reviews / "g/a" / "1").exists()
+    assert (reviews / "g/a" / "2").exists() and (reviews / "g/orphan" / "5").exists()
+    # 已關閉 MR 的狀態（包含沒有 clone 的）一併清除
+    assert sorted(state.iid for state in state_manager.get_all_mr_states()) == [2]
+    # 已關閉 MR 的工作（完成紀錄與待執行）也移除
+    assert job_queue.counts() == {PENDING: 1}
+    assert job_queue.claim("w1").iid == 2
+
+    result = runner.invoke(cli, ["prune", "--include-orphans"])
+    assert "移除 1 個 clone" in result.output
+    assert not (reviews / "g/orphan" / "5").exists()
+
+
+def test_prune_command_with_shard_and_failures(monkeypatch):
+    reports = [PruneReport(removed=1, bytes_reclaimed=1024 * 1024, failed=2), RuntimeError("gitlab down")]
+    calls = []
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/a", "g/b"])
+        main.state_manager = Mock()
+        main.shard_coordinator = Mock()
+        main.shard_coordinator.assign.return_value = ["g/b"]
+
+    def fake_reconcile(projects, dry_run=False, include_orphans=False):
+        calls.append(projects)
+        result = reports.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._reconcile", fake_reconcile)
+    for name in ("logger", "config", "state_manager", "shard_coordinator"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["prune"])
+    assert result.exit_code == 0, result.output
+    assert "移除 1 個 clone，釋放 1.0 MB" in result.output
+    assert "2 個 clone 無法移除" in result.output
+    # 只清理分配給本實例的專案，結束時釋放分片
+    assert calls == [["g/b"]]
+    main.shard_coordinator.close.assert_called_once()
+
+    result = runner.invoke(cli, ["prune"])
+    assert result.exit_code == 1
+    assert "gitlab down" in result.output
+    main.logger.error.assert_called_once()
+    main.state_manager.flush.assert_not_called()
+    main.shard_coordinator.close.assert_called_once()
+
+
+def test_prune_through_state_cache(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "g/a", 1)
+    backend = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    backend.save_mr_states([MRState(mr_id=11, project_slug="g/a", iid=1, state="opened", head_commit_sha="")])
+    cache = CachedStateManager(backend, flush_interval=0)
+    cache.get_all_mr_states()
+    # 尚未寫回的狀態
+    cache.save_mr_state(MRState(mr_id=13, project_slug="g/a", iid=3, state="opened", head_commit_sha=""))
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["g/a"], reviews_path=str(reviews), prune_workers=1))
+    monkeypatch.setattr(main, "state_manager", cache)
+    monkeypatch.setattr(main, "clone_manager", CloneManager(main.config, cache))
+    monkeypatch.setattr(main, "job_queue", Mock())
+    client = Mock()
+    client.get_merge_requests.return_value = []
+    monkeypatch.setattr(main, "gitlab_client", client)
+
+    report = main._reconcile(["g/a"])
+    cache.flush()
+
+    assert report.removed == 1
+    assert cache.get_all_mr_states() == []
+    assert backend.get_all_mr_states() == []
+    cache.close()
+
+
+def test_prune_keeps_clones_when_listing_fails(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    clone = _clone(reviews, "g/a", 1)
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["g/a"], reviews_path=str(reviews), prune_workers=1))
+    monkeypatch.setattr(main, "clone_manager", CloneManager(main.config, Mock()))
+    monkeypatch.setattr(main, "state_manager", Mock())
+    client = Mock()
+    client.get_merge_requests.side_effect = RuntimeError("timeout")
+    monkeypatch.setattr(main, "gitlab_client", client)
+
+    report = main._reconcile(["g/a"])
+
+    assert report.removed == 0
+    assert clone.exists()
+
+
+def test_prune_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    config = Config.from_env()
+    assert (config.prune_interval, config.prune_workers, config.auto_clean_merged) == (86400.0, 4, False)
+
+    monkeypatch.setenv("PRUNE_WORKERS", "0")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.setenv("PRUNE_WORKERS", "2")
+    monkeypatch.setenv("PRUNE_INTERVAL", "-1")
+    with pytest.raises(ConfigError, match="PRUNE_INTERVAL"):
+        Config.from_env()
@@ -0,0 +1,326 @@
+"""
+測試 clone 磁碟配額與 LRU 淘汰
+"""
+
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CloneManager
+from src.clone.prune import ClonePruner
+from src.clone.quota import QuotaManager, QuotaReport, plan_eviction
+from src.clone.workspaces import Workspace, WorkspaceStore
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.jobs.queue import JobQueue
+from src.main import cli
+from src.scanner.mr_scanner import ScanResult
+from src.state.manager import StateManager
+from src.state.models import MRState
+from src.utils.exceptions import ConfigError
+
+
+NOW = 1_000_000.0
+
+
+def _clone(reviews, project, iid, size=100, accessed=NOW - 86400):
+    path = reviews / project / str(iid)
+    (path / ".git").mkdir(parents=True)
+    (path / "blob").write_bytes(b"x" * size)
+    os.utime(path, (accessed, accessed))
+    return path
+
+
+def test_plan_eviction_is_lru_and_skips_pinned_and_recent():
+    workspaces = [
+        Workspace("g/p", 1, size=400, last_access=NOW - 500),
+        Workspace("g/p", 2, size=400, last_access=NOW - 900, pinned=True),
+        Workspace("g/p", 3, size=400, last_access=NOW - 700),
+        Workspace("g/p", 4, size=400, last_access=NOW - 10),
+    ]
+
+    evict = plan_eviction(workspaces, quota=900, now=NOW, min_idle=60)
+
+    assert [workspace.iid for workspace in evict] == [3, 1]
+    # 可淘汰的都淘汰後仍超過配額
+    assert [workspace.iid for workspace in plan_eviction(workspaces, quota=100, now=NOW, min_idle=60)] == [3, 1]
+    assert plan_eviction(workspaces, quota=1600, now=NOW) == []
+
+
+def test_quota_manager_evicts_least_recently_used(tmp_path):
+    reviews = tmp_path / "reviews"
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager, clock=lambda: NOW - 86400)
+    for iid, accessed in ((1, NOW - 7200), (2, NOW - 3 * 86400), (3, NOW - 2 * 86400)):
+        _clone(reviews, "g/p", iid, size=1000, accessed=accessed)
+        store.record("g/p", iid, 100 + iid, 1000)
+    store.pin("g/p", 2)
+    store.record("g/p", 9, 109, 5000)  # 目錄已被手動刪除
+    manager = QuotaManager(store, ClonePruner(str(reviews), workers=1), quota=2500, min_idle=3600, clock=lambda: NOW)
+
+    preview = manager.enforce(dry_run=True)
+    assert [workspace.iid for workspace in preview.evicted] == [3]
+    assert (reviews / "g/p" / "3").exists() and store.get("g/p", 9) is not None
+
+    report = manager.enforce()
+
+    assert [workspace.iid for workspace in report.evicted] == [3]
+    assert (report.usage, report.bytes_reclaimed) == (2000, 1000)
+    assert not (reviews / "g/p" / "3").exists()
+    assert sorted(workspace.iid for workspace in store.all()) == [1, 2]
+    # 以目錄 atime 更新最後存取時間
+    assert store.get("g/p", 1).last_access == NOW - 7200
+    assert manager.usage() == 2000
+    assert manager.enforce().evicted == []
+
+
+def _mr(iid):
+    return MRInfo(
+        id=100 + iid, project_id=1, project_name="g/p", iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+        draft=False, work_in_progress=False, sha="a1",
+    )
+
+
+def test_clone_manager_tracks_workspace_size(tmp_path):
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager)
+    config = SimpleNamespace(reviews_path=str(tmp_path / "reviews"), gitlab_url="https://gitlab.example.com")
+    manager = CloneManager(config, state_manager, workspaces=store)
+
+    def fake_git(cmd, cwd=None):
+        if cmd[1] == "clone":
+            Path(cmd[-1]).mkdir(parents=True)
+            (Path(cmd[-1]) / "README").write_bytes(b"x" * 321)
+
+    with patch.object(CloneManager, "_run_git_command", side_effect=fake_git):
+        manager.create_clone(_mr(1))
+    store.pin("g/p", 1)
+    with patch.object(CloneManager, "_run_git_command", side_effect=fake_git):
+        manager.create_clone(_mr(1))
+
+    workspace = store.get("g/p", 1)
+    # 大小包含 .mr_info.json；重新 clone 保留釘選
+    assert workspace.size > 321 and workspace.pinned and workspace.mr_id == 101
+
+    assert manager.delete_clone(_mr(1))
+    assert store.get("g/p", 1) is None
+
+
+def test_pin_and_quota_commands(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "g/p", 1, size=2048)
+    _clone(reviews, "g/p", 2, size=1024)
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    modes = []
+
+    def fake_init(offline=False):
+        modes.append(offline)
+        main.logger = Mock()
+        main.config = SimpleNamespace(reviews_path=str(reviews), reviews_quota=2048)
+        main.state_manager = state_manager
+        store = WorkspaceStore(state_manager, clock=lambda: NOW)
+        main.clone_manager = CloneManager(main.config, state_manager, workspaces=store)
+        main.quota_manager = QuotaManager(store, ClonePruner(str(reviews)), quota=2048, min_idle=0, clock=lambda: NOW)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager", "quota_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["pin", "--project", "g/p", "--iid", "1"])
+    assert result.exit_code == 0, result.output
+    assert "已釘選: g/p#1" in result.output
+    result = runner.invoke(cli, ["pin", "--project", "g/p", "--iid", "7"])
+    assert result.exit_code == 1
+
+    # 重新量測所有 clone
+    result = runner.invoke(cli, ["quota", "--rescan"])
+    assert result.exit_code == 0, result.output
+    assert "重新量測 2 個 clone" in result.output and "用量 0.0 MB" in result.output
+    assert "g/p#1" in result.output and "是" in result.output
+
+    result = runner.invoke(cli, ["quota", "--evict"])
+    assert result.exit_code == 0, result.output
+    assert "→ g/p#2" in result.output and "淘汰 1 個 clone" in result.output
+    assert (reviews / "g/p" / "1").exists() and not (reviews / "g/p" / "2").exists()
+    # 只使用本機狀態，不連線 GitLab
+    assert modes == [True] * 4
+
+
+def test_quota_and_pin_command_edge_cases(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "g/p", 1)
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager, clock=lambda: NOW)
+    quota_managers = [None, Mock(), Mock()]
+    workspace = Workspace(project="g/p", iid=1, size=1024 * 1024, last_access=NOW)
+    quota_managers[1].enforce.return_value = QuotaReport(quota=1, usage=2, evicted=[workspace])
+    quota_managers[2].enforce.return_value = QuotaReport(quota=1, usage=2, evicted=[workspace], failed=1)
+
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.config = SimpleNamespace(reviews_path=str(reviews), reviews_quota=0)
+        main.state_manager = state_manager
+        main.clone_manager = CloneManager(main.config, state_manager, workspaces=store)
+        main.quota_manager = quota_managers.pop(0) if quota_managers else None
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager", "quota_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["quota", "--evict"])
+    assert result.exit_code == 0 and "未設定配額" in result.output
+
+    result = runner.invoke(cli, ["quota", "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert "→ g/p#1: 1.0 MB" in result.output and "試執行模式：將淘汰 1 個 clone" in result.output
+    main.quota_manager.enforce.assert_called_once_with(dry_run=True)
+
+    result = runner.invoke(cli, ["quota", "--evict"])
+    assert result.exit_code == 0, result.output
+    assert "1 個 clone 無法移除" in result.output
+
+    # 尚未量測的 clone 不在索引中，列表為空
+    result = runner.invoke(cli, ["quota"])
+    assert result.exit_code == 0, result.output
+    assert "配額 不限制，0 個 clone" in result.output and "最後存取" not in result.output
+
+    with patch.object(WorkspaceStore, "pin", side_effect=OSError("read-only")):
+        result = runner.invoke(cli, ["pin", "--project", "g/p", "--iid", "1"])
+    assert result.exit_code == 1 and "read-only" in result.output
+    main.logger.error.assert_called_once()
+
+    with patch.object(CloneManager, "rebuild_index", side_effect=OSError("denied")):
+        result = runner.invoke(cli, ["quota", "--rescan"])
+    assert result.exit_code == 1 and "denied" in result.output
+    main.logger.error.assert_called_once()
+
+
+def _scan_with_quota(monkeypatch, tmp_path, pinned):
+    reviews = tmp_path / "reviews"
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager, clock=lambda: NOW - 86400)
+    for iid in (1, 2):
+        _clone(reviews, "g/p", iid, size=1000)
+        store.record("g/p", iid, 100 + iid, 1000)
+    for iid in pinned:
+        store.pin("g/p", iid)
+
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+        main.config = SimpleNamespace(
+            projects=["g/p"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+        )
+        main.state_manager = state_manager
+        main.mr_scanner = SimpleNamespace(scan=lambda projects, exclude_wip, exclude_draft: [
+            ScanResult(project="g/p", merge_requests=[]),
+        ])
+        main.clone_manager = Mock()
+        main.quota_manager = QuotaManager(store, ClonePruner(str(reviews), workers=1), quota=1500, min_idle=0, clock=lambda: NOW)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "job_queue", "config", "state_manager", "mr_scanner", "clone_manager", "quota_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    return CliRunner().invoke(cli, ["scan"]), reviews, store
+
+
+def test_scan_evicts_clones_over_quota(monkeypatch, tmp_path):
+    result, reviews, store = _scan_with_quota(monkeypatch, tmp_path, pinned=())
+
+    assert result.exit_code == 0, result.output
+    assert "超過配額 0.0 MB：淘汰 1 個最久未使用的 clone" in result.output
+    assert "仍超過配額" not in result.output
+    assert len(store.all()) == 1 and len(list((reviews / "g/p").iterdir())) == 1
+
+
+def test_scan_reports_usage_still_over_quota(monkeypatch, tmp_path, caplog):
+    result, reviews, store = _scan_with_quota(monkeypatch, tmp_path, pinned=(1, 2))
+
+    assert result.exit_code == 0, result.output
+    assert "淘汰" not in result.output
+    assert "clone 用量 0.0 MB 仍超過配額 0.0 MB" in result.output
+    assert "仍超過配額" in caplog.text
+    assert len(store.all()) == 2
+
+
+def test_enforce_quota_failure_does_not_abort_scan(monkeypatch):
+    quota_manager = Mock()
+    quota_manager.enforce.side_effect = OSError("disk")
+    monkeypatch.setattr(main, "quota_manager", quota_manager)
+    monkeypatch.setattr(main, "logger", Mock())
+
+    assert main._enforce_quota() is None
+    main.logger.warning.assert_called_once()
+
+
+def test_format_size_switches_to_gb():
+    assert main._format_size(512 * 1024 ** 2) == "512.0 MB"
+    assert main._format_size(3 * 1024 ** 3) == "3.0 GB"
+
+
+def test_prune_and_closed_clones_forget_workspaces(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager, clock=lambda: NOW)
+    for iid in (1, 2):
+        _clone(reviews, "g/p", iid)
+        store.record("g/p", iid, 100 + iid, 100)
+    clone_manager = CloneManager(SimpleNamespace(reviews_path=str(reviews)), state_manager, workspaces=store)
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/p"], reviews_path=str(reviews), prune_workers=1)
+        main.state_manager = state_manager
+        main.clone_manager = clone_manager
+        main.gitlab_client = Mock()
+        main.gitlab_client.get_merge_requests.return_value = [SimpleNamespace(iid=2)]
+        main.shard_coordinator = None
+        main.job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager", "gitlab_client", "shard_coordinator", "job_queue"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["prune"])
+
+    assert result.exit_code == 0, result.output
+    assert store.get("g/p", 1) is None and store.get("g/p", 2) is not None
+
+    # clone 目錄已不存在時只清除狀態與索引
+    store.record("g/p", 5, 105, 100)
+    assert clone_manager.delete_closed_clone(MRState(mr_id=105, project_slug="g/p", iid=5, state="closed", head_commit_sha="")) is False
+    assert store.get("g/p", 5) is None
+
+
+def test_quota_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    config = Config.from_env()
+    assert (config.reviews_quota, config.quota_min_idle) == (0, 3600.0)
+
+    monkeypatch.setenv("REVIEWS_QUOTA", "1.5G")
+    assert Config.from_env().reviews_quota == 1536 * 1024 * 1024
+    monkeypatch.setenv("REVIEWS_QUOTA", "500MB")
+    assert Config.from_env().reviews_quota == 500 * 1024 * 1024
+    monkeypatch.setenv("REVIEWS_QUOTA", "-1G")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+    monkeypatch.setenv("REVIEWS_QUOTA", "0")
+    monkeypatch.setenv("QUOTA_MIN_IDLE", "-1")
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.setenv("REVIEWS_QUOTA", "lots")
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -0,0 +1,128 @@
+"""
+測試 scan 的時間預算與延後工作
+"""
+
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.config import Config
+from src.gitlab_.models import MRInfo
+from src.jobs.queue import PENDING, JobQueue
+from src.main import cli
+from src.scanner.mr_scanner import ScanResult
+from src.state.manager import StateManager
+from src.state.models import ScanRecord
+from src.utils.exceptions import ConfigError
+
+
+def _mr(iid, updated_at, project="g/p"):
+    return MRInfo(
+        id=iid, project_id=1, project_name=project, iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at=updated_at, source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False,
+    )
+
+
+def test_scan_budget_defers_remaining_mrs(monkeypatch, tmp_path):
+    recorded = []
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+
+    def fake_init():
+        main.logger = Mock()
+        main.job_queue = job_queue
+        main.config = SimpleNamespace(
+            projects=["g/p"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+        )
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.return_value = []
+        main.state_manager.record_scan.side_effect = recorded.append
+        main.mr_scanner = SimpleNamespace(scan=lambda projects, exclude_wip, exclude_draft: [
+            ScanResult(project="g/p", merge_requests=[_mr(1, "2024-01-01T00:00:00Z"), _mr(2, "2024-06-01T00:00:00Z")]),
+        ])
+        cm = Mock()
+        cm.get_clone_path.return_value = None
+        cm.create_clone.side_effect = lambda mr: time.sleep(0.2) or f"/c/{mr.iid}"
+        main.clone_manager = cm
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+
+    result = CliRunner().invoke(cli, ["scan", "--budget", "0.1"])
+
+    assert result.exit_code == 0, result.output
+    assert "延後 0 個專案、1 個 MR" in result.output
+    # 最近更新的 MR 先 clone，較舊的 MR 留在佇列等待下一次執行
+    main.clone_manager.create_clone.assert_called_once()
+    assert main.clone_manager.create_clone.call_args.args[0].iid == 2
+    (record,) = recorded
+    assert (record.clones_created, record.clones_deferred) == (1, 1)
+    assert job_queue.claim("w").iid == 1
+    assert PENDING not in job_queue.counts()
+
+
+def test_deferred_projects_count_as_active(monkeypatch, tmp_path, capsys):
+    scanned = []
+
+    def scan(projects, exclude_wip, exclude_draft):
+        scanned.extend(projects)
+        time.sleep(0.2)
+        return [ScanResult(project=p, merge_requests=[]) for p in projects]
+
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(
+        projects=["g/a", "g/b"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_lock="none",
+    ))
+    monkeypatch.setattr(main, "job_queue", JobQueue(str(tmp_path / "jobs.sqlite")))
+    monkeypatch.setattr(main, "state_manager", Mock())
+    monkeypatch.setattr(main, "mr_scanner", SimpleNamespace(scan=scan))
+    monkeypatch.setattr(main, "clone_manager", Mock())
+    for name in ("shard_coordinator", "scan_lock", "project_breaker", "quota_manager", "snapshot_path"):
+        monkeypatch.setattr(main, name, None)
+
+    activity = main._scan_and_clone(["g/a", "g/b"], "w", {}, False, False, budget=0.1)
+
+    # 第一個專案用完預算，第二個專案延後且視為有活動，讓常駐服務盡快再輪詢
+    assert scanned == ["g/a"]
+    assert activity == {"g/a": False, "g/b": True}
+    assert "延後 1 個專案、0 個 MR" in capsys.readouterr().out
+
+
+def test_prioritize_projects_puts_least_recent_first(monkeypatch):
+    monkeypatch.setattr(main, "logger", Mock())
+    state = Mock()
+    state.get_scan_history.return_value = [
+        ScanRecord(project="g/a", mr_count=0, success=True, scan_time="2026-01-02T00:00:00"),
+        ScanRecord(project="g/b", mr_count=0, success=True, scan_time="2026-01-01T00:00:00"),
+    ]
+    monkeypatch.setattr(main, "state_manager", state)
+
+    assert main._prioritize_projects(["g/a", "g/b", "g/new"]) == ["g/new", "g/b", "g/a"]
+
+    state.get_scan_history.side_effect = RuntimeError("locked")
+    assert main._prioritize_projects(["g/a", "g/b"]) == ["g/a", "g/b"]
+
+
+def test_clones_deferred_is_persisted(tmp_path):
+    manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    manager.record_scan(ScanRecord(project="g/a", mr_count=3, success=True, clones_deferred=2))
+
+    assert manager.get_scan_history()[0].clones_deferred == 2
+
+
+def test_scan_budget_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    assert Config.from_env().scan_budget == 0.0
+
+    monkeypatch.setenv("SCAN_BUDGET", "600")
+    assert Config.from_env().scan_budget == 600.0
+
+    monkeypatch.setenv("SCAN_BUDGET", "-1")
+    with pytest.raises(ConfigError):
+        Config.from_env()
@@ -0,0 +1,175 @@
+"""
+測試掃描結果的差異比對與 clone 事件
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.manager import CloneManager
+from src.gitlab_.models import MRInfo
+from src.main import cli
+from src.scanner.diff import (
+    CLOSED, FILTERED_OUT, HEAD_MOVED, METADATA_CHANGED, OPENED, diff_project, index_states,
+)
+from src.scanner.mr_scanner import ScanResult
+from src.state.manager import StateManager
+from src.state.models import MRState
+
+
+def _mr(iid, sha="a1", updated_at="2024-01-01T00:00:00Z", project="g/p"):
+    return MRInfo(
+        id=100 + iid, project_id=1, project_name=project, iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at=updated_at, source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False, sha=sha,
+    )
+
+
+def _state(iid, sha="a1", updated_at="2024-01-01T00:00:00Z", project="g/p"):
+    return MRState(
+        mr_id=100 + iid, project_slug=project, iid=iid, state="opened",
+        head_commit_sha=sha, mr_updated_at=updated_at,
+    )
+
+
+def test_diff_project_emits_typed_events():
+    previous = index_states([
+        _state(1), _state(2), _state(3), _state(4), _state(5, sha=""), _state(7), _state(8),
+        _state(9, project="g/other"),
+    ])["g/p"]
+    mrs = [
+        _mr(1),                                                    # 未改變
+        _mr(2, sha="b2", updated_at="2024-02-01T00:00:00Z"),       # 新的 commit
+        _mr(3, updated_at="2024-02-01T00:00:00Z"),                 # 只改了標題等資料
+        _mr(5, updated_at="2024-02-01T00:00:00Z"),                 # 舊版狀態沒有 head commit
+        _mr(6),                                                    # 新的 MR
+    ]
+
+    # 4 已合併、7 仍開啟（被篩選排除）、8 無法取得狀態
+    states = {4: "merged", 7: "opened", 8: None}
+    looked_up = []
+
+    def lookup(iid):
+        looked_up.append(iid)
+        return states[iid]
+
+    events = {event.iid: event for event in diff_project("g/p", mrs, previous, lookup)}
+
+    assert {iid: event.kind for iid, event in events.items()} == {
+        2: HEAD_MOVED, 3: METADATA_CHANGED, 5: HEAD_MOVED, 6: OPENED, 4: CLOSED, 7: FILTERED_OUT, 8: FILTERED_OUT,
+    }
+    assert sorted(looked_up) == [4, 7, 8]
+    assert events[4].mr is None and events[4].previous.mr_id == 104
+    assert events[6].previous is None
+
+    # 沒有查詢函數時不確認狀態，一律不視為關閉
+    kinds = {event.iid: event.kind for event in diff_project("g/p", mrs, previous)}
+    assert (kinds[4], kinds[7], kinds[8]) == (FILTERED_OUT, FILTERED_OUT, FILTERED_OUT)
+
+
+def test_clone_manager_updates_metadata_and_removes_closed(tmp_path):
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    manager = CloneManager(SimpleNamespace(reviews_path=str(tmp_path / "reviews")), state_manager)
+    clone_path = tmp_path / "reviews" / "g/p" / "1"
+
+    assert manager.update_metadata(_mr(1)) is False
+    clone_path.mkdir(parents=True)
+    assert manager.update_metadata(_mr(1, sha="c3"))
+    assert (clone_path / ".mr_info.json").exists()
+    assert state_manager.get_mr_state(101, "g/p").head_commit_sha == "c3"
+
+    assert manager.delete_closed_clone(_state(1))
+    assert not clone_path.exists()
+    assert state_manager.get_mr_state(101, "g/p") is None
+
+    # clone 目錄已不存在時仍清除狀態
+    state_manager.save_mr_state(_state(2))
+    assert manager.delete_closed_clone(_state(2)) is False
+    assert state_manager.get_mr_state(102, "g/p") is None
+
+
+def test_scan_clones_only_changed_mrs(monkeypatch, tmp_path):
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    state_manager.save_mr_states([_state(1), _state(2), _state(3), _state(4), _state(5), _state(6)])
+    scanned = [_mr(1), _mr(2, sha="b2", updated_at="2024-02-01T00:00:00Z"), _mr(3, updated_at="2024-02-01T00:00:00Z")]
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/p"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+            auto_clean_merged=True,
+        )
+        main.state_manager = state_manager
+        main.mr_scanner = SimpleNamespace(scan=lambda projects, exclude_wip, exclude_draft: [
+            ScanResult(project="g/p", merge_requests=scanned),
+        ])
+        # 4 已關閉；5 仍開啟但被篩選排除；6 查詢失敗
+        main.gitlab_client = Mock()
+        main.gitlab_client.get_mr_details.side_effect = lambda project, iid: {
+            4: SimpleNamespace(state="closed"), 5: SimpleNamespace(state="opened"),
+        }[iid]
+        main.job_queue = Mock()
+        main.job_queue.enqueue.return_value = False
+        main.job_queue.claim.return_value = None
+        cm = Mock()
+        cm.update_metadata.return_value = True
+        cm.delete_closed_clone.return_value = True
+        main.clone_manager = cm
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "job_queue", "mr_scanner", "clone_manager", "gitlab_client"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["scan"])
+
+    assert result.exit_code == 0, result.output
+    # 只有 head commit 改變的 MR 進入 clone 佇列
+    assert [call.args[0].iid for call in main.job_queue.enqueue.call_args_list] == [2]
+    assert main.clone_manager.update_metadata.call_args.args[0].iid == 3
+    # 只有 GitLab 確認已關閉的 MR 被移除，並一併移除其 clone 工作
+    assert [call.args[0].iid for call in main.clone_manager.delete_closed_clone.call_args_list] == [4]
+    main.job_queue.remove.assert_called_once_with("g/p", 4)
+    assert "g/p#4: 已關閉或合併，移除 clone" in result.output
+
+
+def test_scan_keeps_missing_mrs_when_auto_clean_disabled(monkeypatch, tmp_path):
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path))
+    state_manager.save_mr_states([_state(1), _state(2)])
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["g/p"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0,
+            auto_clean_merged=False,
+        )
+        main.state_manager = state_manager
+        # 例如 --exclude-draft 排除了 2
+        main.mr_scanner = SimpleNamespace(scan=lambda projects, exclude_wip, exclude_draft: [
+            ScanResult(project="g/p", merge_requests=[_mr(1)]),
+        ])
+        main.gitlab_client = Mock()
+        main.job_queue = Mock()
+        main.job_queue.claim.return_value = None
+        main.clone_manager = Mock()
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "job_queue", "mr_scanner", "clone_manager", "gitlab_client"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["scan", "--exclude-draft"])
+
+    assert result.exit_code == 0, result.output
+    main.gitlab_client.get_mr_details.assert_not_called()
+    main.clone_manager.delete_closed_clone.assert_not_called()
+    main.job_queue.remove.assert_not_called()
+    assert state_manager.get_mr_state(102, "g/p") is not None
+
+
+def test_sqlite_state_keeps_head_and_updated_at(tmp_path):
+    manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    manager.save_mr_state(MRState.from_mr_info(_mr(1, sha="d4", updated_at="2024-03-01T00:00:00Z")))
+
+    state = manager.get_mr_state(101, "g/p")
+    assert (state.head_commit_sha, state.mr_updated_at) == ("d4", "2024-03-01T00:00:00Z")
@@ -0,0 +1,278 @@
+"""
+測試掃描統計紀錄 (scan_history) 的寫入、彙整與 stats 命令
+"""
+
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+from click.testing import CliRunner
+
+from src.gitlab_.models import MRInfo
+from src.gitlab_.usage import ApiUsage, ApiUsageTracker, api_usage
+from src.jobs.queue import JobQueue
+from src.main import cli
+from src.scanner.mr_scanner import MRScanner, ScanResult
+from src.state.history import percentile, summarize_scan_history
+from src.state.manager import StateManager
+from src.state.models import ScanRecord
+from src.utils.exceptions import GitLabError, StateError
+
+
+def _record(project, duration_ms, success=True, scan_time="2026-01-01T00:00:00", **kwargs):
+    return ScanRecord(project=project, mr_count=1, success=success, duration_ms=duration_ms, scan_time=scan_time, **kwargs)
+
+
+@pytest.mark.parametrize("storage_type", ["sqlite", "json"])
+def test_record_and_query_scan_history(tmp_path, storage_type):
+    manager = StateManager(storage_type=storage_type, db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path / "state"))
+
+    manager.record_scan(_record("g/a", 120.0, scan_time="2026-01-01T00:00:00", api_requests=3, bytes_transferred=2048))
+    manager.record_scan(_record("g/b", 50.0, success=False, scan_time="2026-01-02T00:00:00", error_class="GitlabGetError"))
+    manager.record_scan(_record("g/a", 80.0, scan_time="2026-01-03T00:00:00", clones_created=2))
+
+    all_records = manager.get_scan_history()
+    assert [r.duration_ms for r in all_records] == [120.0, 50.0, 80.0]
+
+    project_a = manager.get_scan_history(project="g/a")
+    assert len(project_a) == 2
+    assert project_a[0].api_requests == 3
+    assert project_a[0].bytes_transferred == 2048
+    assert project_a[1].clones_created == 2
+
+    recent = manager.get_scan_history(since="2026-01-02T00:00:00")
+    assert [r.project for r in recent] == ["g/b", "g/a"]
+    assert recent[0].success is False
+    assert recent[0].error_class == "GitlabGetError"
+
+
+def test_migrates_legacy_scan_history_table(tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE scan_history (
+            id INTEGER PRIMARY KEY, scan_time TEXT, project TEXT, mr_count INTEGER, success BOOLEAN
+        )
+    """)
+    conn.execute("INSERT INTO scan_history (scan_time, project, mr_count, success) VALUES ('2025-01-01', 'g/old', 4, 1)")
+    conn.commit()
+    conn.close()
+
+    manager = StateManager(storage_type="sqlite", db_path=str(db_path), state_dir=str(tmp_path / "state"))
+    manager.record_scan(_record("g/new", 10.0))
+
+    records = manager.get_scan_history()
+    assert records[0].project == "g/old"
+    assert records[0].mr_count == 4
+    assert records[0].duration_ms == 0.0
+    assert records[1].duration_ms == 10.0
+
+
+def test_scan_history_errors_wrapped(tmp_path):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    with patch.object(manager.backend, "record_scan", side_effect=Exception("io")):
+        with pytest.raises(StateError):
+            manager.record_scan(_record("g/a", 1.0))
+
+    with patch.object(manager.backend, "get_scan_history", side_effect=Exception("io")):
+        with pytest.raises(StateError):
+            manager.get_scan_history()
+
+
+def test_api_usage_tracker_counts_per_thread():
+    tracker = ApiUsageTracker()
+    with_length = SimpleNamespace(headers={"Content-Length": "100"}, content=b"")
+    without_length = SimpleNamespace(headers={}, content=b"abc")
+
+    before = tracker.snapshot()
+    assert tracker.record(with_length) is with_length
+    tracker.record(without_length)
+
+    assert tracker.snapshot() - before == ApiUsage(requests=2, bytes=103)
+
+
+def test_client_session_records_usage():
+    with patch("src.gitlab_.client.gitlab.Gitlab") as mock_gitlab:
+        from src.gitlab_.client import GitLabClient
+        GitLabClient("https://gitlab.example.com", "token")
+
+    session = mock_gitlab.call_args.kwargs["session"]
+    assert api_usage.record in session.hooks["response"]
+
+
+def _mr(iid):
+    return MRInfo(
+        id=iid, project_id=1, project_name="g/p", iid=iid, title="t", description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="m", web_url="",
+        draft=False, work_in_progress=False,
+    )
+
+
+def test_scanner_records_duration_and_api_cost():
+    client = Mock()
+
+    def fake_get(project, params=None):
+        api_usage.record(SimpleNamespace(headers={"Content-Length": "10"}, content=b""))
+        api_usage.record(SimpleNamespace(headers={"Content-Length": "5"}, content=b""))
+        return [_mr(1)]
+
+    client.get_merge_requests.side_effect = fake_get
+    results = MRScanner(client, Mock()).scan(["g/p"], exclude_wip=False, exclude_draft=False)
+
+    assert results[0].api_requests == 2
+    assert results[0].bytes_transferred == 15
+    assert results[0].duration >= 0
+    assert results[0].error_class is None
+
+
+def test_scanner_records_root_error_class():
+    client = Mock()
+
+    def fake_get(project, params=None):
+        try:
+            raise KeyError("missing")
+        except KeyError:
+            raise GitLabError("取得專案失敗")
+
+    client.get_merge_requests.side_effect = fake_get
+    results = MRScanner(client, Mock()).scan(["g/p"])
+
+    assert results[0].error_class == "KeyError"
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) == 0.0
+    assert percentile([5], 95) == 5
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 50) == 5
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 95) == 10
+
+
+def test_summarize_sorts_by_p95_and_computes_trend():
+    records = [_record("g/fast", 10.0) for _ in range(4)]
+    records += [_record("g/slow", d) for d in (100.0, 100.0, 200.0, 200.0)]
+    records.append(_record("g/slow", 0.0, success=False, error_class="Timeout"))
+
+    summaries = summarize_scan_history(records, window=4)
+
+    assert [s.project for s in summaries] == ["g/slow", "g/fast"]
+    slow = summaries[0]
+    assert slow.runs == 4
+    assert slow.failures == 1
+    assert slow.last_error_class == "Timeout"
+    assert summaries[1].trend == 0.0
+    assert summarize_scan_history([_record("g/x", 0.0)] * 4)[0].trend is None
+    assert summarize_scan_history([_record("g/x", 1.0)])[0].trend is None
+
+
+@pytest.fixture
+def cli_runner():
+    return CliRunner()
+
+
+def test_stats_command_reports_projects(monkeypatch, cli_runner):
+    def fake_init(offline=False):
+        import src.main as main
+        main.logger = Mock()
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.return_value = [
+            _record("g/slow", d, api_requests=4) for d in (100.0, 120.0, 300.0, 400.0)
+        ] + [_record("g/slow", 10.0, success=False, error_class="GitlabGetError")]
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = cli_runner.invoke(cli, ["stats", "--days", "7"])
+
+    assert result.exit_code == 0
+    assert "g/slow" in result.output
+    assert "p95(ms)" in result.output
+    assert "GitlabGetError" in result.output
+
+
+def test_stats_command_empty(monkeypatch, cli_runner):
+    def fake_init(offline=False):
+        assert offline is True
+        import src.main as main
+        main.logger = Mock()
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.return_value = []
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = cli_runner.invoke(cli, ["stats"])
+    assert result.exit_code == 0
+    assert "沒有掃描紀錄" in result.output
+
+
+def test_stats_command_error(monkeypatch, cli_runner):
+    def fake_init(offline=False):
+        import src.main as main
+        main.logger = Mock()
+        main.state_manager = Mock()
+        main.state_manager.get_scan_history.side_effect = StateError("db locked")
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = cli_runner.invoke(cli, ["stats"])
+    assert result.exit_code == 1
+
+
+def test_scan_records_history_per_project(monkeypatch, cli_runner, tmp_path):
+    recorded = []
+
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+        main.config = SimpleNamespace(projects=["g/p", "g/broken"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
+        main.state_manager = Mock()
+        main.state_manager.record_scan.side_effect = recorded.append
+        main.mr_scanner = SimpleNamespace()
+        results = [
+            ScanResult(project="g/p", merge_requests=[_mr(1), _mr(2), _mr(3)], duration=0.5, api_requests=2, bytes_transferred=64),
+            ScanResult(project="g/broken", merge_requests=[], error="404", error_class="GitlabGetError", api_requests=1),
+        ]
+        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [r for r in results if r.project in projects]
+        cm = Mock()
+        cm.get_clone_path.side_effect = lambda project, iid: "/existing" if iid == 1 else None
+        cm.create_clone.side_effect = lambda mr: (_ for _ in ()).throw(Exception("boom")) if mr.iid == 3 else f"/c/{mr.iid}"
+        main.clone_manager = cm
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = cli_runner.invoke(cli, ["scan"])
+
+    assert result.exit_code == 0
+    records = {record.project: record for record in recorded}
+    ok, broken = records["g/p"], records["g/broken"]
+    assert ok.project == "g/p"
+    assert ok.mr_count == 3
+    assert ok.clones_refreshed == 1
+    assert ok.clones_created == 1
+    assert ok.clones_failed == 1
+    assert ok.error_class == "Exception"
+    assert ok.success is False
+    assert ok.api_requests == 2
+    assert ok.duration_ms >= 500
+    assert broken.error_class == "GitlabGetError"
+    assert broken.api_requests == 1
+
+
+def test_scan_history_write_failure_does_not_abort(monkeypatch, cli_runner, tmp_path):
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.job_queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+        main.config = SimpleNamespace(projects=["g/p"], pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
+        main.state_manager = Mock()
+        main.state_manager.record_scan.side_effect = StateError("locked")
+        main.mr_scanner = SimpleNamespace()
+        main.mr_scanner.scan = lambda projects, exclude_wip, exclude_draft: [ScanResult(project="g/p", merge_requests=[])]
+        main.clone_manager = Mock()
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = cli_runner.invoke(cli, ["scan"])
+    assert result.exit_code == 0
+    assert "掃描和 clone 建立完成" in result.output
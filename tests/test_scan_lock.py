@@ -0,0 +1,258 @@
+"""
+測試跨行程掃描鎖與 scan 的重疊執行處理
+"""
+
+import socket
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+from src.coordination.lock import GLOBAL_LOCK, ScanLock, project_lock_name
+from src.main import cli
+from src.scanner.breaker import UNAUTHORIZED
+from src.scanner.mr_scanner import ScanResult
+from src.utils.exceptions import StateError
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_lock(tmp_path, clock):
+    locks = []
+
+    def make(owner, **kwargs):
+        lock = ScanLock(str(tmp_path / "db.sqlite"), owner=owner, stale_after=60, clock=clock, sleep=clock.sleep, **kwargs)
+        locks.append(lock)
+        return lock
+
+    yield make
+    for lock in locks:
+        lock.close()
+
+
+def test_lock_is_exclusive_and_reentrant(make_lock):
+    a = make_lock("other-host:1")
+    b = make_lock("other-host:2")
+
+    assert a.try_acquire(GLOBAL_LOCK) is True
+    assert a.try_acquire(GLOBAL_LOCK) is True
+    assert b.try_acquire(GLOBAL_LOCK) is False
+    assert a.holder(GLOBAL_LOCK) == "other-host:1"
+
+    # 只能釋放自己持有的鎖
+    b.release(GLOBAL_LOCK)
+    assert a.holder(GLOBAL_LOCK) == "other-host:1"
+    a.release(GLOBAL_LOCK)
+    assert a.holder(GLOBAL_LOCK) is None
+    assert b.try_acquire(GLOBAL_LOCK) is True
+
+
+def test_acquire_waits_and_reports_wait_time(make_lock, clock):
+    a = make_lock("other-host:1")
+    b = make_lock("other-host:2", poll_interval=5)
+    a.try_acquire(GLOBAL_LOCK)
+
+    assert b.acquire(GLOBAL_LOCK) is None
+    assert b.acquire(GLOBAL_LOCK, wait=20) is None
+    assert clock.now == 1020
+
+    # 持有者停止更新後鎖過期，等待者接手並回報等待秒數
+    assert b.acquire(GLOBAL_LOCK, wait=100) == 40
+    assert b.holder(GLOBAL_LOCK) == "other-host:2"
+
+
+def test_refresh_keeps_lock_fresh(make_lock, clock):
+    a = make_lock("other-host:1")
+    b = make_lock("other-host:2")
+    a.try_acquire(GLOBAL_LOCK)
+
+    clock.now += 50
+    a.refresh()
+    clock.now += 50
+    assert b.try_acquire(GLOBAL_LOCK) is False
+
+
+def test_dead_local_owner_is_taken_over(make_lock):
+    dead = make_lock(f"{socket.gethostname()}:999999999")
+    dead.try_acquire(project_lock_name("g/p"))
+
+    assert make_lock("other-host:2").try_acquire("project:g/p") is True
+
+
+def test_close_releases_locks(make_lock, tmp_path):
+    a = make_lock("other-host:1")
+    a.try_acquire(GLOBAL_LOCK)
+    a.close()
+
+    assert make_lock("other-host:2").holder(GLOBAL_LOCK) is None
+
+
+def test_close_failure_is_logged(tmp_path):
+    lock = ScanLock(str(tmp_path / "db.sqlite"))
+    lock._conn.close()
+    lock.close()
+
+
+def test_init_failure_raises_state_error(tmp_path):
+    with pytest.raises(StateError):
+        ScanLock(str(tmp_path / "missing" / "db.sqlite"))
+
+
+def _fake_init(lock, mode, recorded, scanned, wait=0.0):
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/a", "g/b"], scan_lock=mode, scan_lock_wait=wait, pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
+        main.shard_coordinator = None
+        main.scan_lock = lock
+        main.state_manager = Mock()
+        main.state_manager.record_scan.side_effect = recorded.append
+        main.job_queue = Mock()
+        main.job_queue.claim.return_value = None
+        main.clone_manager = Mock()
+        main.mr_scanner = SimpleNamespace()
+
+        def scan(projects, exclude_wip, exclude_draft):
+            scanned.extend(projects)
+            return [ScanResult(project=p, merge_requests=[]) for p in projects]
+
+        main.mr_scanner.scan = scan
+        main.mr_scanner.describe_filters = lambda exclude_wip, exclude_draft: ([], [])
+
+    return fake_init
+
+
+def _invoke(monkeypatch, fake_init, args=("scan",)):
+    monkeypatch.setattr('src.main.init_app', fake_init)
+    result = CliRunner().invoke(cli, list(args))
+    import src.main as main
+    main.scan_lock = None
+    return result
+
+
+def test_scan_skips_when_global_lock_held(monkeypatch, make_lock):
+    make_lock("other-host:1").try_acquire(GLOBAL_LOCK)
+    scanned = []
+
+    result = _invoke(monkeypatch, _fake_init(make_lock("other-host:2"), "global", [], scanned))
+
+    assert result.exit_code == 0
+    assert "另一個掃描正在執行（other-host:1）" in result.output
+    assert scanned == []
+
+
+def test_scan_records_global_lock_wait(monkeypatch, make_lock):
+    lock = make_lock("other-host:2")
+    lock.acquire = Mock(return_value=1.5)
+    recorded = []
+
+    result = _invoke(monkeypatch, _fake_init(lock, "global", recorded, [], wait=10))
+
+    assert result.exit_code == 0
+    lock.acquire.assert_called_once_with(GLOBAL_LOCK, wait=10)
+    assert [r.lock_wait_ms for r in recorded] == [1500.0, 1500.0]
+
+
+def test_scan_project_lock_takes_free_projects(monkeypatch, make_lock):
+    make_lock("other-host:1").try_acquire(project_lock_name("g/a"))
+    scanned = []
+    recorded = []
+
+    result = _invoke(monkeypatch, _fake_init(make_lock("other-host:2"), "project", recorded, scanned))
+
+    assert result.exit_code == 0
+    assert "g/a: 正由其他行程（other-host:1）處理，略過" in result.output
+    assert scanned == ["g/b"]
+    assert [r.project for r in recorded] == ["g/b"]
+
+
+def test_scan_project_lock_held_only_while_scanning_project(monkeypatch, make_lock):
+    lock = make_lock("other-host:2")
+    lock.acquire = Mock(wraps=lock.acquire)
+    holders = []
+    recorded = []
+    fake_init = _fake_init(lock, "project", recorded, [], wait=5)
+
+    def init():
+        fake_init()
+        import src.main as main
+
+        def scan(projects, exclude_wip, exclude_draft):
+            holders.append({p: lock.holder(project_lock_name(p)) for p in ("g/a", "g/b")})
+            return [ScanResult(project=p, merge_requests=[]) for p in projects]
+
+        main.mr_scanner.scan = scan
+
+    result = _invoke(monkeypatch, init)
+
+    assert result.exit_code == 0, result.output
+    # 掃描 g/a 時尚未鎖住 g/b，g/a 處理完即釋放
+    assert holders == [
+        {"g/a": "other-host:2", "g/b": None},
+        {"g/a": None, "g/b": "other-host:2"},
+    ]
+    assert [c.kwargs["wait"] for c in lock.acquire.call_args_list] == [5, 5]
+    assert [r.project for r in recorded] == ["g/a", "g/b"]
+
+
+@pytest.mark.parametrize("failure,exit_code", [("raise", 0), ("unauthorized", 1)])
+def test_scan_project_lock_released_when_scan_fails(monkeypatch, make_lock, failure, exit_code):
+    lock = make_lock("other-host:2")
+    lock.release = Mock(wraps=lock.release)
+    recorded = []
+    fake_init = _fake_init(lock, "project", recorded, [])
+
+    def init():
+        fake_init()
+        import src.main as main
+
+        def scan(projects, exclude_wip, exclude_draft):
+            if failure == "raise":
+                raise RuntimeError("scanner crashed")
+            return [ScanResult(project=p, merge_requests=[], error="401", error_status=UNAUTHORIZED) for p in projects]
+
+        main.mr_scanner.scan = scan
+
+    result = _invoke(monkeypatch, init)
+
+    assert result.exit_code == exit_code, result.output
+    assert recorded == []
+    # 掃描拋出例外或沒有產生結果的專案也立即釋放專案鎖
+    assert [c.args for c in lock.release.call_args_list] == [(project_lock_name("g/a"),), (project_lock_name("g/b"),)]
+
+
+def test_resume_with_project_lock_only_drains_locked_projects(monkeypatch, make_lock):
+    make_lock("other-host:1").try_acquire(project_lock_name("g/a"))
+    fake_init = _fake_init(make_lock("other-host:2"), "project", [], [])
+
+    result = _invoke(monkeypatch, fake_init, ("scan", "--resume"))
+
+    import src.main as main
+    assert result.exit_code == 0
+    assert [c.kwargs["project"] for c in main.job_queue.claim.call_args_list] == ["g/b"]
+
+
+def test_dry_run_does_not_take_lock(monkeypatch, make_lock):
+    make_lock("other-host:1").try_acquire(GLOBAL_LOCK)
+    scanned = []
+
+    result = _invoke(monkeypatch, _fake_init(make_lock("other-host:2"), "global", [], scanned), ("scan", "--dry-run"))
+
+    assert result.exit_code == 0
+    assert scanned == ["g/a", "g/b"]
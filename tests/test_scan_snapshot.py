@@ -0,0 +1,217 @@
+"""
+測試掃描快照與離線試執行
+"""
+
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone.workspaces import WorkspaceStore
+from src.clone.manager import CloneManager
+from src.gitlab_.models import MRInfo
+from src.main import cli
+from src.scanner.mr_scanner import MRScanner, ScanResult
+from src.scanner.snapshot import SNAPSHOT_FILE, SNAPSHOT_VERSION, ScanSnapshot
+from src.state.manager import StateManager
+
+
+def _mr(iid, project="g/p", title="Add feature", sha="a1", draft=False, labels=None):
+    return MRInfo(
+        id=100 + iid, project_id=1, project_name=project, iid=iid, title=title, description="", state="opened",
+        author="a", created_at="", updated_at="", source_branch="f", target_branch="main", web_url="",
+        draft=draft, work_in_progress=False, sha=sha, labels=labels or [],
+    )
+
+
+def test_snapshot_round_trip_keeps_failed_projects(tmp_path):
+    path = tmp_path / SNAPSHOT_FILE
+    snapshot = ScanSnapshot.load(path)
+    assert snapshot.projects == {} and snapshot.oldest() is None
+
+    snapshot.update([
+        ScanResult(project="g/p", merge_requests=[], listed=[_mr(1, labels=["backend"]), _mr(2, draft=True)]),
+        ScanResult(project="g/q", merge_requests=[], listed=[_mr(3, project="g/q")]),
+    ], now=100.0)
+    snapshot.save()
+
+    loaded = ScanSnapshot.load(path)
+    assert loaded.merge_requests(["g/p"]) == [_mr(1, labels=["backend"]), _mr(2, draft=True)]
+    assert loaded.oldest() == 100.0
+
+    # 失敗與延後的專案保留上一次的快照
+    updated = loaded.update([
+        ScanResult(project="g/p", merge_requests=[], error="timeout"),
+        ScanResult(project="g/q", merge_requests=[], deferred=True),
+    ], now=200.0)
+    assert updated == 0 and len(loaded.merge_requests()) == 3
+
+
+def test_snapshot_tolerates_unknown_fields_and_versions(tmp_path):
+    path = tmp_path / SNAPSHOT_FILE
+    ScanSnapshot(path).save()
+    data = json.loads(path.read_text())
+    data["fields"] = data["fields"] + ["future_field"]
+    row = [getattr(_mr(1), name) for name in data["fields"][:-1]] + ["x"]
+    data["projects"] = {"g/p": {"scanned_at": 1.0, "mrs": [row]}}
+    path.write_text(json.dumps(data))
+
+    assert ScanSnapshot.load(path).merge_requests() == [_mr(1)]
+
+    # 缺少必要欄位的資料列略過，不影響其他 MR
+    data["fields"] = data["fields"][:-1]
+    data["projects"]["g/p"]["mrs"] = [row[:-1], row[:3]]
+    path.write_text(json.dumps(data))
+    assert ScanSnapshot.load(path).merge_requests() == [_mr(1)]
+
+    data["version"] = SNAPSHOT_VERSION + 1
+    path.write_text(json.dumps(data))
+    assert ScanSnapshot.load(path).projects == {}
+    path.write_text("{broken")
+    assert ScanSnapshot.load(path).projects == {}
+
+
+def test_scan_records_listed_mrs_before_filtering():
+    client = Mock()
+    client.get_merge_requests.return_value = [_mr(1), _mr(2, draft=True)]
+    scanner = MRScanner(client, Mock())
+
+    result = scanner.scan(["g/p"])[0]
+
+    assert [mr.iid for mr in result.merge_requests] == [1]
+    assert [mr.iid for mr in result.listed] == [1, 2]
+
+
+def test_filter_offline_skips_path_rules():
+    scanner = MRScanner(None, Mock(), filter_rules=["label = backend", "path = src/*"])
+
+    mrs, skipped = scanner.filter_offline([_mr(1, labels=["backend"]), _mr(2)], exclude_wip=False, exclude_draft=False)
+
+    assert [mr.iid for mr in mrs] == [1]
+    assert skipped == ["path = src/*"]
+
+
+def test_offline_dry_run_uses_snapshot(monkeypatch, tmp_path):
+    path = tmp_path / SNAPSHOT_FILE
+    snapshot = ScanSnapshot(path)
+    snapshot.update([ScanResult(project="g/p", merge_requests=[], listed=[_mr(1), _mr(2, draft=True)])], now=time.time())
+    snapshot.save()
+    calls = []
+
+    def fake_init(offline=False):
+        calls.append(offline)
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/p", "g/new"])
+        main.mr_scanner = MRScanner(None, Mock(), filter_rules=["path = docs/*"])
+        main.shard_coordinator = None
+        main.scan_lock = None
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "mr_scanner", "shard_coordinator", "scan_lock"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, "snapshot_path", path)
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["scan", "--offline"])
+    assert result.exit_code == 2 and calls == []
+
+    result = runner.invoke(cli, ["scan", "--dry-run", "--offline", "--exclude-draft"])
+
+    assert result.exit_code == 0, result.output
+    assert calls == [True]
+    assert "離線" in result.output and "將處理 1 個 MR" in result.output
+    assert "→ g/p#1" in result.output and "g/p#2" not in result.output
+    assert "已略過: path = docs/*" in result.output
+    assert "? g/new: 快照中沒有此專案" in result.output
+
+    path.unlink()
+    result = runner.invoke(cli, ["scan", "--dry-run", "--offline"])
+    assert result.exit_code == 1 and "沒有掃描快照" in result.output
+
+
+def test_save_snapshot_merges_results_and_only_warns_on_failure(monkeypatch, tmp_path):
+    def broken_load(path):
+        raise OSError("disk full")
+
+    path = tmp_path / SNAPSHOT_FILE
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "snapshot_path", path)
+
+    main._save_snapshot([ScanResult(project="g/p", merge_requests=[], listed=[_mr(1)])])
+    assert ScanSnapshot.load(path).merge_requests() == [_mr(1)]
+
+    monkeypatch.setattr(ScanSnapshot, "load", broken_load)
+
+    main._save_snapshot([ScanResult(project="g/p", merge_requests=[], listed=[_mr(1)])])
+
+    main.logger.warning.assert_called_once()
+    assert "disk full" in str(main.logger.warning.call_args)
+
+
+def test_format_age_units():
+    now = time.time()
+    assert main._format_age(now - 120) == "2 分鐘前"
+    assert main._format_age(now - 2 * 3600) == "2.0 小時前"
+    assert main._format_age(now - 3 * 86400) == "3.0 天前"
+    # 時鐘偏差造成的未來時間視為剛剛
+    assert main._format_age(now + 60) == "0 分鐘前"
+
+
+def test_list_clones_long_marks_stale_clones(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager)
+    for iid in (1, 2, 3):
+        (reviews / "g/p" / str(iid) / ".git").mkdir(parents=True)
+        store.record("g/p", iid, 100 + iid, 1024, mr_info=_mr(iid, sha="a1"))
+    path = tmp_path / SNAPSHOT_FILE
+    snapshot = ScanSnapshot(path)
+    snapshot.update([ScanResult(project="g/p", merge_requests=[], listed=[_mr(1), _mr(2, sha="b2c3d4e5f6")])])
+    snapshot.save()
+
+    def fake_init(offline=False):
+        assert offline
+        main.logger = Mock()
+        main.config = SimpleNamespace(reviews_path=str(reviews))
+        main.state_manager = state_manager
+        main.clone_manager = CloneManager(main.config, state_manager, workspaces=store)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, "snapshot_path", path)
+
+    result = CliRunner().invoke(cli, ["list-clones", "--long"])
+
+    assert result.exit_code == 0, result.output
+    lines = {line.split()[0]: line for line in result.output.splitlines() if line.strip().startswith("#")}
+    assert "[" not in lines["#1"]
+    assert "[有新 commit b2c3d4e5]" in lines["#2"]
+    assert "[快照中已無此 MR]" in lines["#3"]
+    assert "掃描快照:" in result.output
+
+
+def test_init_app_offline_skips_gitlab(monkeypatch, tmp_path):
+    fake_config = SimpleNamespace(
+        log_level="INFO", state_dir=str(tmp_path), db_path=str(tmp_path / "db.sqlite"), reviews_path=str(tmp_path),
+        storage_type="sqlite", job_max_attempts=3, job_backoff_seconds=30.0, job_lease_timeout=1800.0, job_retention=604800.0,
+        shard_mode="none", scan_lock="none", mr_filters=[], project_weights={}, fair_recent_window=3600.0,
+        fair_recent_boost=1.0, project_cache_ttl=0.0, breaker_threshold=0, reviews_quota=0, trace_file="", metrics_textfile="", git_trace2=False,
+        state_cache_enabled=False,
+    )
+    monkeypatch.setattr("src.main.Config.from_env", lambda: fake_config)
+    monkeypatch.setattr("src.main.setup_logging", lambda log_level, log_dir: Mock())
+    client = Mock(side_effect=AssertionError("不應連線"))
+    monkeypatch.setattr("src.main.GitLabClient", client)
+    for name in ("config", "gitlab_client", "mr_scanner", "state_manager", "clone_manager", "job_queue",
+                 "shard_coordinator", "scan_lock", "fair_policy", "project_breaker", "quota_manager",
+                 "snapshot_path", "metrics_path", "logger"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    main.init_app(offline=True)
+
+    assert main.gitlab_client is None and main.mr_scanner.client is None
+    assert main.snapshot_path == tmp_path / SNAPSHOT_FILE
@@ -0,0 +1,223 @@
+"""
+測試多節點專案分片（一致性雜湊與 SQLite 租約）
+"""
+
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+from src.coordination.hashring import HashRing
+from src.coordination.shard import ShardCoordinator
+from src.main import cli
+from src.scanner.mr_scanner import ScanResult
+from src.utils.exceptions import StateError
+
+
+PROJECTS = [f"group/project-{i}" for i in range(12)]
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_node(tmp_path, clock):
+    nodes = []
+
+    def make(node_id, mode="lease", **kwargs):
+        node = ShardCoordinator(str(tmp_path / "db.sqlite"), node_id, mode=mode, lease_ttl=60, clock=clock, **kwargs)
+        nodes.append(node)
+        return node
+
+    yield make
+    for node in nodes:
+        node.close()
+
+
+def test_hash_ring_is_stable_and_balanced():
+    ring = HashRing(["a", "b", "c"])
+    keys = [f"group/project-{i}" for i in range(300)]
+    owners = {key: ring.owner(key) for key in keys}
+
+    counts = {node: list(owners.values()).count(node) for node in ring.nodes}
+    assert min(counts.values()) > 50
+
+    # 移除節點時只有該節點的鍵改變歸屬
+    smaller = HashRing(["a", "b"])
+    moved = [key for key in keys if smaller.owner(key) != owners[key]]
+    assert moved and all(owners[key] == "c" for key in moved)
+
+    assert HashRing([]).owner("x") is None
+
+
+def test_lease_mode_splits_projects(make_node):
+    a = make_node("a")
+    b = make_node("b")
+    a.heartbeat()
+    b.heartbeat()
+
+    owned_a = a.assign(PROJECTS)
+    owned_b = b.assign(PROJECTS)
+
+    assert len(owned_a) == len(owned_b) == 6
+    assert set(owned_a) | set(owned_b) == set(PROJECTS)
+    assert all(a.owns(p) and not b.owns(p) for p in owned_a)
+
+    # 再次分配保留原本的租約
+    assert a.assign(PROJECTS) == owned_a
+
+
+def test_lease_rebalances_when_node_joins(make_node):
+    a = make_node("a")
+    assert len(a.assign(PROJECTS)) == 12
+
+    b = make_node("b")
+    assert b.assign(PROJECTS) == []
+
+    # a 下次執行時釋出超額租約，b 隨後接手
+    assert len(a.assign(PROJECTS)) == 6
+    assert len(b.assign(PROJECTS)) == 6
+
+
+def test_lease_moves_when_node_disappears(make_node, clock):
+    a = make_node("a")
+    b = make_node("b")
+    a.heartbeat()
+    b.heartbeat()
+    a.assign(PROJECTS)
+    b.assign(PROJECTS)
+
+    clock.now += 61
+    assert b.assign(PROJECTS) == PROJECTS
+    assert not a.owns(PROJECTS[0])
+
+
+def test_lease_drops_removed_projects(make_node):
+    a = make_node("a")
+    a.assign(PROJECTS)
+    a.assign(PROJECTS[:2])
+
+    b = make_node("b")
+    assert b.assign(PROJECTS[2:3]) == PROJECTS[2:3]
+
+
+def test_heartbeat_renews_leases(make_node, clock):
+    a = make_node("a")
+    a.assign(PROJECTS[:1])
+
+    clock.now += 50
+    a.heartbeat()
+    clock.now += 50
+    assert a.owns(PROJECTS[0])
+
+
+def test_hash_mode_follows_live_nodes(make_node, clock):
+    a = make_node("a", mode="hash", nodes=["a", "b"])
+    b = make_node("b", mode="hash", nodes=["a", "b"])
+    make_node("c", mode="hash").heartbeat()
+    b.heartbeat()
+
+    owned_a = a.assign(PROJECTS)
+    owned_b = b.assign(PROJECTS)
+    assert a.live_nodes() == ["a", "b"]
+    assert sorted(owned_a + owned_b) == sorted(PROJECTS)
+    assert all(b.owns(p) for p in owned_b)
+
+    clock.now += 61
+    assert a.assign(PROJECTS) == PROJECTS
+
+
+def test_background_heartbeat(make_node, clock):
+    a = make_node("a")
+    a.heartbeat = Mock(side_effect=[OSError("locked"), None, None, None, None])
+
+    a.start_heartbeat(interval=0.01)
+    a.start_heartbeat(interval=0.01)
+    deadline = time.time() + 2
+    while a.heartbeat.call_count < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    a.stop_heartbeat()
+    a.stop_heartbeat()
+
+    assert a.heartbeat.call_count >= 2
+
+
+def test_invalid_mode_and_init_failure(tmp_path):
+    with pytest.raises(StateError):
+        ShardCoordinator(str(tmp_path / "db.sqlite"), "a", mode="random")
+    with pytest.raises(StateError):
+        ShardCoordinator(str(tmp_path / "missing" / "db.sqlite"), "a")
+
+
+def test_scan_only_processes_assigned_projects(monkeypatch):
+    coordinator = Mock()
+    coordinator.assign.return_value = ["g/mine", "g/lost"]
+    coordinator.owns.side_effect = lambda project: project == "g/mine"
+    scanned = []
+
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/mine", "g/lost", "g/other"], shard_node_id="node-a", pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
+        main.shard_coordinator = coordinator
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+        main.job_queue.claim.return_value = None
+        main.clone_manager = Mock()
+        main.mr_scanner = SimpleNamespace()
+
+        def scan(projects, exclude_wip, exclude_draft):
+            scanned.extend(projects)
+            return [ScanResult(project=p, merge_requests=[]) for p in projects]
+
+        main.mr_scanner.scan = scan
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = CliRunner().invoke(cli, ["scan"])
+
+    import src.main as main
+    main.shard_coordinator = None
+
+    assert result.exit_code == 0
+    assert scanned == ["g/mine", "g/lost"]
+    assert "負責 2/3 個專案" in result.output
+    assert "g/lost: 已由其他節點負責" in result.output
+    coordinator.start_heartbeat.assert_called_once()
+    coordinator.close.assert_called_once()
+
+
+def test_scan_resume_limits_to_assigned_projects(monkeypatch):
+    coordinator = Mock()
+    coordinator.assign.return_value = ["g/mine"]
+
+    def fake_init():
+        import src.main as main
+        main.logger = Mock()
+        main.config = SimpleNamespace(projects=["g/mine", "g/other"], shard_node_id="node-a", pipeline_workers=1, pipeline_scanners=1, pipeline_queue_size=4, scan_budget=0)
+        main.shard_coordinator = coordinator
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+        main.job_queue.claim.return_value = None
+
+    monkeypatch.setattr('src.main.init_app', fake_init)
+
+    result = CliRunner().invoke(cli, ["scan", "--resume"])
+
+    import src.main as main
+    main.shard_coordinator = None
+
+    assert result.exit_code == 0
+    assert main.job_queue.claim.call_args.kwargs["project"] == "g/mine"
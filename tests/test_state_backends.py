@@ -0,0 +1,228 @@
+"""
+測試狀態儲存後端介面、註冊表與各後端的一致行為
+"""
+
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from src.state.backends import StateBackend, available_backends, create_backend, register_backend
+from src.state.backends import base as backends_base
+from src.state.manager import StateManager
+from src.state.models import MRState, ScanRecord
+from src.utils.exceptions import StateError
+
+
+def _state(mr_id, project="g/p", state="opened"):
+    return MRState(mr_id=mr_id, project_slug=project, iid=mr_id, state=state, head_commit_sha="sha", saved_at="now")
+
+
+@pytest.fixture(params=["sqlite", "json", "kv"])
+def manager(request, tmp_path):
+    manager = StateManager(
+        storage_type=request.param,
+        db_path=str(tmp_path / "db.sqlite"),
+        state_dir=str(tmp_path / "state"),
+    )
+    yield manager
+    manager.close()
+
+
+def test_registry_lists_builtin_backends():
+    assert {"sqlite", "json", "kv"} <= set(available_backends())
+
+
+def test_unknown_backend_raises(tmp_path):
+    with pytest.raises(StateError) as exc:
+        StateManager(storage_type="redis", state_dir=str(tmp_path / "state"))
+    assert "redis" in str(exc.value)
+
+
+def test_register_custom_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends_base, "_BACKENDS", dict(backends_base._BACKENDS))
+
+    @register_backend("memory")
+    class MemoryBackend(StateBackend):
+        def __init__(self, db_path, state_dir):
+            super().__init__(db_path, state_dir)
+            self.states = {}
+            self.documents = {}
+
+        def save_mr_states(self, mr_states):
+            for s in mr_states:
+                self.states[(s.mr_id, s.project_slug)] = s
+
+        def get_mr_state(self, mr_id, project_slug):
+            return self.states.get((mr_id, project_slug))
+
+        def get_all_mr_states(self):
+            return list(self.states.values())
+
+        def delete_mr_states(self, keys):
+            for key in keys:
+                self.states.pop(key, None)
+
+        def record_scan(self, record):
+            pass
+
+        def get_scan_history(self, project, since):
+            return []
+
+        def get_document(self, namespace, key):
+            return self.documents.get((namespace, key))
+
+        def get_documents(self, namespace):
+            return {key: value for (ns, key), value in self.documents.items() if ns == namespace}
+
+        def put_document(self, namespace, key, value):
+            self.documents[(namespace, key)] = value
+
+        def delete_document(self, namespace, key):
+            self.documents.pop((namespace, key), None)
+
+    backend = create_backend("memory", db_path=None, state_dir=tmp_path)
+    assert isinstance(backend, MemoryBackend)
+
+    manager = StateManager(storage_type="memory", state_dir=str(tmp_path / "state"))
+    manager.save_mr_state(_state(1))
+    assert manager.get_mr_state(1, "g/p").mr_id == 1
+    manager.put_document("cache", "a", {"v": 1})
+    assert manager.get_document_keys("cache") == ["a"]
+    # 預設 close() 不需要釋放任何資源
+    manager.close()
+
+
+def test_save_get_update_delete(manager):
+    manager.save_mr_state(_state(1))
+    manager.save_mr_states([_state(2), _state(1, state="merged"), _state(1, project="g/other")])
+
+    assert manager.get_mr_state(1, "g/p").state == "merged"
+    assert manager.get_mr_state(1, "g/other") is not None
+    assert manager.get_mr_state(3, "g/p") is None
+    assert len(manager.get_all_mr_states()) == 3
+
+    manager.delete_mr_state(1, "g/p")
+    manager.delete_mr_states([(2, "g/p"), (99, "g/p")])
+    assert [s.project_slug for s in manager.get_all_mr_states()] == ["g/other"]
+
+
+def test_scan_history_roundtrip(manager):
+    manager.record_scan(ScanRecord(project="g/a", mr_count=2, success=True, duration_ms=5.0, scan_time="2026-01-02"))
+    manager.record_scan(ScanRecord(project="g/b", mr_count=0, success=False, error_class="E", scan_time="2026-01-01"))
+
+    history = manager.get_scan_history()
+    assert [r.project for r in history] == ["g/b", "g/a"]
+    assert manager.get_scan_history(project="g/a")[0].duration_ms == 5.0
+    assert manager.get_scan_history(since="2026-01-02")[0].project == "g/a"
+
+
+def test_documents_roundtrip(manager):
+    manager.put_document("breakers", "g/a", {"failures": 1})
+    manager.put_document("breakers", "g/b", {"failures": 3})
+    manager.put_document("breakers2", "g/a", {"other": True})
+    manager.put_document("breakers", "g/a", {"failures": 2})
+
+    assert manager.get_document("breakers", "g/a") == {"failures": 2}
+    assert manager.get_document("breakers", "g/missing") is None
+    # 命名空間以完整名稱區分，前綴相同的命名空間不會混在一起
+    assert manager.get_documents("breakers") == {"g/a": {"failures": 2}, "g/b": {"failures": 3}}
+    assert sorted(manager.get_document_keys("breakers")) == ["g/a", "g/b"]
+
+    manager.delete_document("breakers", "g/a")
+    assert manager.get_documents("breakers") == {"g/b": {"failures": 3}}
+    assert manager.get_documents("empty") == {}
+
+
+def test_json_concurrent_writes_are_not_lost(tmp_path):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    def worker(n):
+        for i in range(20):
+            manager.save_mr_state(_state(n * 100 + i))
+            manager.put_document("ns", f"{n}-{i}", {"n": n})
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(manager.get_all_mr_states()) == 80
+    assert len(manager.get_documents("ns")) == 80
+
+
+def test_json_write_failure_keeps_previous_file(tmp_path, monkeypatch):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    manager.save_mr_state(_state(1))
+    manager.put_document("ns", "k", {"v": 1})
+
+    def broken_dump(data, f, **kwargs):
+        f.write('[{"mr_id": ')
+        raise OSError("disk full")
+
+    monkeypatch.setattr("src.state.backends.json_backend.json.dump", broken_dump)
+    with pytest.raises(StateError):
+        manager.save_mr_state(_state(2))
+    with pytest.raises(StateError):
+        manager.put_document("ns", "k", {"v": 2})
+    monkeypatch.undo()
+
+    # 寫到一半的內容只在暫存檔中，原檔案不受影響
+    assert [s.mr_id for s in manager.get_all_mr_states()] == [1]
+    assert manager.get_document("ns", "k") == {"v": 1}
+    assert json.loads((tmp_path / "state" / "mr_states.json").read_text())[0]["mr_id"] == 1
+    assert not list((tmp_path / "state").glob("*.tmp"))
+
+
+def test_kv_persists_across_reopen(tmp_path):
+    first = StateManager(storage_type="kv", state_dir=str(tmp_path / "state"))
+    first.save_mr_state(_state(7))
+    first.close()
+
+    second = StateManager(storage_type="kv", state_dir=str(tmp_path / "state"))
+    assert second.get_mr_state(7, "g/p").head_commit_sha == "sha"
+    second.close()
+
+
+def test_sqlite_deduplicates_legacy_rows(tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE merge_requests (
+            id INTEGER PRIMARY KEY, mr_id INTEGER, project_slug TEXT, iid INTEGER,
+            state TEXT, head_commit_sha TEXT, saved_at TEXT
+        )
+    """)
+    conn.execute("INSERT INTO merge_requests (mr_id, project_slug, iid, state, head_commit_sha, saved_at) VALUES (1, 'g/p', 1, 'opened', '', 'old')")
+    conn.execute("INSERT INTO merge_requests (mr_id, project_slug, iid, state, head_commit_sha, saved_at) VALUES (1, 'g/p', 1, 'merged', '', 'new')")
+    conn.commit()
+    conn.close()
+
+    manager = StateManager(storage_type="sqlite", db_path=str(db_path), state_dir=str(tmp_path / "state"))
+    assert manager.get_mr_state(1, "g/p").state == "merged"
+
+    manager.save_mr_state(_state(1, state="closed"))
+    assert [s.state for s in manager.get_all_mr_states()] == ["closed"]
+
+
+def test_sqlite_schema_failure_closes_connection(tmp_path, monkeypatch):
+    from src.state.backends.sqlite_backend import SQLiteBackend
+
+    def broken(self):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(SQLiteBackend, "_init_schema", broken)
+    with pytest.raises(StateError):
+        StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path / "state"))
+
+
+def test_close_failure_is_logged(tmp_path, monkeypatch):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    def broken():
+        raise OSError("busy")
+
+    monkeypatch.setattr(manager.backend, "close", broken)
+    manager.close()
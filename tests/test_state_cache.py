@@ -0,0 +1,276 @@
+"""
+測試 CachedStateManager 的讀取快取、寫入合併與批次寫回
+"""
+
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.state.cache import CachedStateManager
+from src.state.manager import StateManager
+from src.state.models import MRState
+from src.utils.exceptions import StateError
+
+
+def _state(mr_id, project="g/p", state="opened"):
+    return MRState(mr_id=mr_id, project_slug=project, iid=mr_id, state=state, head_commit_sha="", saved_at="now")
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path / "state"))
+
+
+def _reopen(manager):
+    """close() 會一併關閉後端，重新開啟以驗證落地的資料"""
+    return StateManager(storage_type="sqlite", db_path=manager.db_path, state_dir=str(manager.state_dir))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reads_served_from_memory_after_first_miss(backend):
+    backend.save_mr_state(_state(1))
+    cache = CachedStateManager(backend, flush_interval=0)
+
+    with patch.object(backend, "get_mr_state", wraps=backend.get_mr_state) as spy:
+        assert cache.get_mr_state(1, "g/p").mr_id == 1
+        assert cache.get_mr_state(1, "g/p").mr_id == 1
+        # 不存在的結果也會被快取
+        assert cache.get_mr_state(2, "g/p") is None
+        assert cache.get_mr_state(2, "g/p") is None
+
+    assert spy.call_count == 2
+    cache.close()
+
+
+def test_writes_coalesce_until_flush(backend):
+    cache = CachedStateManager(backend, flush_interval=0, max_dirty=100)
+
+    cache.save_mr_state(_state(1, state="opened"))
+    cache.save_mr_state(_state(1, state="merged"))
+    cache.save_mr_state(_state(2))
+
+    assert cache.dirty_count == 2
+    assert backend.get_mr_state(1, "g/p") is None
+    assert cache.get_mr_state(1, "g/p").state == "merged"
+
+    with patch.object(backend, "save_mr_states", wraps=backend.save_mr_states) as spy:
+        cache.flush()
+
+    spy.assert_called_once()
+    assert len(spy.call_args[0][0]) == 2
+    assert backend.get_mr_state(1, "g/p").state == "merged"
+    assert cache.dirty_count == 0
+    cache.close()
+
+
+def test_delete_is_batched(backend):
+    backend.save_mr_state(_state(1))
+    cache = CachedStateManager(backend, flush_interval=0)
+
+    cache.delete_mr_state(1, "g/p")
+    assert cache.get_mr_state(1, "g/p") is None
+    assert backend.get_mr_state(1, "g/p") is not None
+
+    cache.flush()
+    assert backend.get_mr_state(1, "g/p") is None
+    cache.close()
+
+
+def test_batch_delete_evicts_entries(backend):
+    backend.save_mr_states([_state(1), _state(2)])
+    cache = CachedStateManager(backend, flush_interval=0)
+    cache.get_all_mr_states()
+    cache.save_mr_state(_state(3))
+
+    cache.delete_mr_states([(1, "g/p"), (3, "g/p")])
+
+    assert backend.get_mr_state(1, "g/p") is None
+    assert [s.mr_id for s in cache.get_all_mr_states()] == [2]
+    assert cache.dirty_count == 0
+    cache.flush()
+    assert [s.mr_id for s in backend.get_all_mr_states()] == [2]
+    cache.close()
+
+
+def test_size_threshold_triggers_flush(backend):
+    cache = CachedStateManager(backend, flush_interval=0, max_dirty=2)
+
+    cache.save_mr_state(_state(1))
+    assert cache.dirty_count == 1
+    cache.save_mr_state(_state(2))
+
+    assert cache.dirty_count == 0
+    assert len(backend.get_all_mr_states()) == 2
+    cache.close()
+
+
+def test_interval_elapsed_triggers_flush_on_write(backend):
+    clock = FakeClock()
+    cache = CachedStateManager(backend, flush_interval=1000, max_dirty=100, clock=clock)
+
+    cache.save_mr_state(_state(1))
+    assert cache.dirty_count == 1
+
+    clock.now = 1000
+    cache.save_mr_state(_state(2))
+    assert cache.dirty_count == 0
+    cache.close()
+
+
+def test_background_flusher_writes_back(backend):
+    cache = CachedStateManager(backend, flush_interval=0.01, max_dirty=100)
+    cache.save_mr_state(_state(1))
+
+    deadline = time.monotonic() + 2
+    while cache.dirty_count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert backend.get_mr_state(1, "g/p") is not None
+    cache.close()
+
+
+def test_background_flusher_logs_errors():
+    backend = Mock()
+    backend.save_mr_states.side_effect = StateError("disk full")
+    cache = CachedStateManager(backend, flush_interval=0.01, max_dirty=100)
+
+    with patch("src.state.cache.logger") as mock_logger:
+        cache.save_mr_state(_state(1))
+        deadline = time.monotonic() + 2
+        while not mock_logger.error.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert mock_logger.error.called
+    # 寫回失敗的資料仍保留為 dirty
+    assert cache.dirty_count == 1
+    cache._closed = True
+    cache._stop_event.set()
+
+
+def test_project_policy_flushes_on_checkpoint(backend):
+    cache = CachedStateManager(backend, flush_interval=0, flush_policy="project")
+    cache.save_mr_state(_state(1))
+    assert cache.dirty_count == 1
+
+    cache.checkpoint()
+    assert cache.dirty_count == 0
+    cache.close()
+
+
+def test_batch_policy_ignores_checkpoint(backend):
+    cache = CachedStateManager(backend, flush_interval=0, flush_policy="batch")
+    cache.save_mr_state(_state(1))
+    cache.checkpoint()
+    assert cache.dirty_count == 1
+    cache.close()
+
+
+def test_always_policy_writes_through(backend):
+    cache = CachedStateManager(backend, flush_interval=0, flush_policy="always")
+    cache.save_mr_state(_state(1))
+    assert cache.dirty_count == 0
+    assert backend.get_mr_state(1, "g/p") is not None
+    cache.close()
+
+
+def test_invalid_policy_raises(backend):
+    with pytest.raises(ValueError):
+        CachedStateManager(backend, flush_policy="never")
+
+
+def test_get_all_overlays_dirty_entries(backend):
+    backend.save_mr_states([_state(1), _state(2)])
+    cache = CachedStateManager(backend, flush_interval=0)
+
+    cache.save_mr_state(_state(1, state="merged"))
+    cache.delete_mr_state(2, "g/p")
+    cache.save_mr_state(_state(3))
+
+    states = {s.mr_id: s for s in cache.get_all_mr_states()}
+    assert set(states) == {1, 3}
+    assert states[1].state == "merged"
+    # 全部載入後，未命中的查詢不再讀取後端
+    with patch.object(backend, "get_mr_state") as spy:
+        assert cache.get_mr_state(99, "g/p") is None
+    spy.assert_not_called()
+    cache.close()
+
+
+def test_close_flushes_and_is_idempotent(backend):
+    cache = CachedStateManager(backend, flush_interval=0.5)
+    cache.save_mr_state(_state(1))
+
+    cache.close()
+    cache.close()
+
+    assert _reopen(backend).get_mr_state(1, "g/p") is not None
+
+
+def test_only_allowed_attributes_delegate_to_backend(backend):
+    cache = CachedStateManager(backend, flush_interval=0)
+    assert cache.db_path == backend.db_path
+    cache.put_document("ns", "k", {"v": 1})
+    assert cache.get_documents("ns") == {"k": {"v": 1}}
+
+    # 未在快取層實作的 MR 狀態操作不可繞過快取
+    backend.delete_all = Mock()
+    with pytest.raises(AttributeError):
+        cache.delete_all
+    assert not hasattr(cache, "backend_only_method")
+    cache.close()
+
+
+def test_json_backend_batch_operations(tmp_path):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    manager.save_mr_states([_state(1), _state(2)])
+    manager.save_mr_states([_state(1, state="closed")])
+    manager.save_mr_states([])
+
+    assert manager.get_mr_state(1, "g/p").state == "closed"
+    assert len(manager.get_all_mr_states()) == 2
+
+    manager.delete_mr_states([(1, "g/p"), (2, "g/p")])
+    manager.delete_mr_states([])
+    assert manager.get_all_mr_states() == []
+
+
+def test_batch_operations_wrap_errors(tmp_path):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    with patch.object(manager.backend, "save_mr_states", side_effect=Exception("io")):
+        with pytest.raises(StateError):
+            manager.save_mr_states([_state(1)])
+
+    with patch.object(manager.backend, "delete_mr_states", side_effect=Exception("io")):
+        with pytest.raises(StateError):
+            manager.delete_mr_states([(1, "g/p")])
+
+
+def test_cache_batch_save_and_dirty_precedence(backend):
+    backend.save_mr_states([_state(1, state="opened"), _state(4)])
+    cache = CachedStateManager(backend, flush_interval=60, max_dirty=100)
+
+    cache.save_mr_states([_state(1, state="merged"), _state(2)])
+    cache.save_mr_state(_state(3))
+
+    # 後端舊版本不可覆蓋尚未寫回的新版本
+    states = {s.mr_id: s for s in cache.get_all_mr_states()}
+    assert states[1].state == "merged"
+    assert 4 in states
+    assert cache.dirty_count == 3
+    cache.close()
+    assert _reopen(backend).get_mr_state(2, "g/p") is not None
+
+
+def test_backend_attribute_missing_raises_attribute_error():
+    cache = CachedStateManager.__new__(CachedStateManager)
+    with pytest.raises(AttributeError):
+        cache.backend
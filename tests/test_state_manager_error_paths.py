@@ -23,8 +23,23 @@ def test_save_mr_state_propagates_stateerror(monkeypatch, tmp_path):
     manager = StateManager(storage_type="json", state_dir=str(tmp_path / 'state'))
 
     # 模擬內部方法拋出例外
-    with patch.object(manager, '_save_mr_state_json', side_effect=Exception('io fail')):
+    with patch.object(manager.backend, 'save_mr_states', side_effect=Exception('io fail')):
         from src.state.models import MRState
         mr_state = MRState(mr_id=1, project_slug='g/p', iid=1, state='opened', head_commit_sha='x', saved_at='now')
         with pytest.raises(StateError):
             manager.save_mr_state(mr_state)
+
+
+@pytest.mark.parametrize("method, args", [
+    ("get_document", ("projects", "g/p")),
+    ("get_documents", ("projects",)),
+    ("get_document_keys", ("projects",)),
+    ("put_document", ("projects", "g/p", {"id": 1})),
+    ("delete_document", ("projects", "g/p")),
+])
+def test_document_errors_wrapped_as_stateerror(tmp_path, method, args):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path / 'state'))
+
+    with patch.object(manager.backend, method, side_effect=Exception('io fail')):
+        with pytest.raises(StateError, match="io fail"):
+            getattr(manager, method)(*args)
@@ -12,7 +12,7 @@ from src.utils.exceptions import StateError
 def test_get_mr_state_handles_internal_exception(tmp_path):
     manager = StateManager(storage_type="json", state_dir=str(tmp_path / 'state'))
 
-    with patch.object(manager, '_get_mr_state_json', side_effect=Exception('boom')):
+    with patch.object(manager.backend, 'get_mr_state', side_effect=Exception('boom')):
         with pytest.raises(StateError):
             manager.get_mr_state(1, 'g/p')
 
@@ -20,7 +20,7 @@ def test_get_mr_state_handles_internal_exception(tmp_path):
 def test_get_all_mr_states_handles_internal_exception(tmp_path):
     manager = StateManager(storage_type="json", state_dir=str(tmp_path / 'state'))
 
-    with patch.object(manager, '_get_all_mr_states_json', side_effect=Exception('boom')):
+    with patch.object(manager.backend, 'get_all_mr_states', side_effect=Exception('boom')):
         with pytest.raises(StateError):
             manager.get_all_mr_states()
 
@@ -28,6 +28,6 @@ def test_get_all_mr_states_handles_internal_exception(tmp_path):
 def test_delete_mr_state_handles_internal_exception(tmp_path):
     manager = StateManager(storage_type="json", state_dir=str(tmp_path / 'state'))
 
-    with patch.object(manager, '_delete_mr_state_json', side_effect=Exception('boom')):
+    with patch.object(manager.backend, 'delete_mr_states', side_effect=Exception('boom')):
         with pytest.raises(StateError):
             manager.delete_mr_state(1, 'g/p')
@@ -0,0 +1,185 @@
+"""
+測試階段追蹤
+"""
+
+import json
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+import src.main as main
+from src.clone.manager import CloneManager
+from src.config import Config
+from src.gitlab_.client import GitLabClient
+from src.observability.tracing import NOOP_SPAN, Tracer, summarize, tracer
+from src.scanner.mr_scanner import MRScanner
+from src.state.manager import StateManager
+from src.utils.exceptions import ConfigError, GitError
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+def test_disabled_tracer_returns_noop_span():
+    local = Tracer()
+
+    with local.span("git.clone", project="g/p") as span:
+        span.set(bytes=1)
+
+    assert span is NOOP_SPAN
+    assert local.spans() == []
+
+
+def test_spans_nest_per_thread_and_record_errors():
+    local = Tracer()
+    local.enable()
+
+    with local.span("scan.project", project="g/p") as outer:
+        with local.span("gitlab.mergerequests.list") as inner:
+            inner.set(count=3)
+        with pytest.raises(RuntimeError):
+            with local.span("git.fetch"):
+                raise RuntimeError("boom")
+
+    def other_thread():
+        with local.span("state.put_document"):
+            pass
+
+    with local.span("scan.project"):
+        worker = threading.Thread(target=other_thread)
+        worker.start()
+        worker.join()
+
+    spans = {span.name: span for span in local.spans()}
+    assert spans["gitlab.mergerequests.list"].parent_id == outer.span_id
+    assert spans["gitlab.mergerequests.list"].attrs == {"count": 3}
+    assert spans["git.fetch"].attrs["error"] == "RuntimeError"
+    assert outer.parent_id is None and outer.duration >= spans["git.fetch"].duration
+    # 其他執行緒的 span 不會掛在此執行緒的 span 之下
+    assert spans["state.put_document"].parent_id is None
+
+    assert [(name, count) for name, count, _ in summarize(local.spans())][0] == ("scan.project", 2)
+
+
+def test_export_jsonl_and_chrome(tmp_path):
+    local = Tracer(max_spans=2)
+    local.enable()
+    for name in ("a.first", "a.second", "b.third"):
+        with local.span(name, iid=1):
+            pass
+
+    chrome = tmp_path / "trace.json"
+    assert local.export(chrome, "chrome") == 2
+    events = json.loads(chrome.read_text())["traceEvents"]
+    assert [(event["name"], event["cat"], event["ph"]) for event in events] == [("a.second", "a", "X"), ("b.third", "b", "X")]
+    assert events[0]["args"] == {"iid": 1} and events[0]["dur"] >= 0
+
+    jsonl = tmp_path / "trace.jsonl"
+    assert local.export(jsonl, "jsonl") == 2
+    # jsonl 匯出後清空緩衝區，下次附加新的 span
+    assert local.export(jsonl, "jsonl") == 0
+    records = [json.loads(line) for line in jsonl.read_text().splitlines()]
+    assert [record["name"] for record in records] == ["a.second", "b.third"]
+    assert set(records[0]) == {"name", "span_id", "parent_id", "thread", "start", "duration_ms", "attrs"}
+
+    with pytest.raises(ValueError):
+        local.export(jsonl, "xml")
+
+
+def test_enable_resizes_buffer_and_keeps_newest_spans():
+    local = Tracer(max_spans=5)
+    local.enable()
+    for name in ("a.first", "a.second", "a.third"):
+        with local.span(name):
+            pass
+
+    local.enable(max_spans=2)
+    with local.span("a.fourth"):
+        pass
+
+    assert [span.name for span in local.spans()] == ["a.third", "a.fourth"]
+
+
+def test_export_trace_logs_summary_and_failures(monkeypatch, tmp_path, enabled_tracer):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(trace_file=str(path), trace_format="jsonl"))
+    with tracer.span("scan.project"):
+        pass
+
+    main._export_trace()
+
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["scan.project"]
+    messages = [call.args[0] % call.args[1:] for call in main.logger.info.call_args_list]
+    assert messages[0] == f"寫入 1 個 span 到 {path}"
+    assert messages[1].startswith("  scan.project: 1 次")
+
+    # 寫入失敗只記錄警告
+    main.config.trace_file = str(tmp_path)
+    main._export_trace()
+    main.logger.warning.assert_called_once()
+
+    # 未啟用追蹤時不寫檔
+    main.logger.reset_mock()
+    tracer.disable()
+    main._export_trace()
+    main.logger.info.assert_not_called()
+
+
+def test_git_commands_and_state_writes_are_traced(enabled_tracer, tmp_path):
+    state_manager = StateManager(storage_type="sqlite", db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+
+    with tracer.span("clone.mr", project="g/p", iid=7) as parent:
+        CloneManager._run_git_command(["git", "--version"])
+        with pytest.raises(GitError):
+            CloneManager._run_git_command(["git", "rev-parse", "HEAD"], cwd=tmp_path)
+        state_manager.put_document("workspaces", "g/p#7", {"size": 1})
+
+    spans = {span.name: span for span in tracer.drain()}
+    assert spans["git.--version"].attrs == {"cwd": None, "returncode": 0}
+    assert spans["git.rev-parse"].attrs["returncode"] != 0
+    assert spans["git.rev-parse"].attrs["cwd"] == str(tmp_path)
+    assert spans["state.put_document"].parent_id == parent.span_id
+
+
+def test_api_calls_record_requests_and_bytes(enabled_tracer):
+    client = GitLabClient.__new__(GitLabClient)
+    client.gl = Mock()
+    client.gl.projects.get.return_value.mergerequests.list.return_value = []
+    client.gl.projects.get.return_value.path_with_namespace = "g/p"
+    scanner = MRScanner(client, Mock())
+
+    result = scanner.scan(["g/p"])[0]
+
+    assert result.error is None
+    spans = {span.name: span for span in tracer.drain()}
+    scan_span = spans["scan.project"]
+    assert scan_span.attrs == {"project": "g/p", "listed": 0, "matched": 0, "requests": 0, "bytes": 0}
+    assert spans["gitlab.mergerequests.list"].parent_id == scan_span.span_id
+    assert spans["gitlab.mergerequests.list"].attrs["count"] == 0
+    assert spans["gitlab.projects.get"].parent_id == spans["gitlab.mergerequests.list"].span_id
+    assert set(spans["gitlab.projects.get"].attrs) == {"project", "requests", "bytes"}
+
+
+def test_trace_config(monkeypatch, tmp_path):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+
+    config = Config.from_env()
+    assert (config.trace_file, config.trace_format) == ("", "jsonl")
+
+    monkeypatch.setenv("TRACE_FILE", str(tmp_path / "trace.json"))
+    monkeypatch.setenv("TRACE_FORMAT", "Chrome")
+    config = Config.from_env()
+    assert (config.trace_file, config.trace_format) == (str(tmp_path / "trace.json"), "chrome")
+
+    monkeypatch.setenv("TRACE_FORMAT", "otlp")
+    with pytest.raises(ConfigError):
+        Config.from_env()
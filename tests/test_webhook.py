@@ -0,0 +1,389 @@
+"""
+測試 webhook 接收端與定向 MR 更新
+"""
+
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+import src.main as main
+from src.config import Config
+from src.coordination.lock import GLOBAL_LOCK, ScanLock, project_lock_name
+from src.gitlab_.models import MRInfo
+from src.scanner.mr_scanner import MRScanner
+from src.utils.exceptions import ConfigError, StateError
+from src.webhook.server import MergeRequestEvent, WebhookServer, parse_merge_request_event
+
+
+# 節錄自 GitLab 實際送出的 merge request webhook
+MR_PAYLOAD = {
+    "object_kind": "merge_request",
+    "event_type": "merge_request",
+    "user": {"username": "alice"},
+    "project": {"id": 15, "path_with_namespace": "group/proj", "default_branch": "main"},
+    "object_attributes": {
+        "id": 99,
+        "iid": 7,
+        "title": "Add feature",
+        "state": "opened",
+        "action": "update",
+        "source_branch": "feature",
+        "target_branch": "main",
+        "updated_at": "2024-05-01 10:00:00 UTC",
+        "work_in_progress": False,
+    },
+    "labels": [],
+}
+
+
+def _mr(iid=7, state="opened", project="group/proj", **kwargs):
+    return MRInfo(
+        id=iid, project_id=15, project_name=project, iid=iid, title="t", description="", state=state,
+        author="alice", created_at="", updated_at="u1", source_branch="f", target_branch="main", web_url="",
+        draft=False, work_in_progress=False, **kwargs,
+    )
+
+
+def _post(server, body, token="s3cret", event="Merge Request Hook", path="/webhook"):
+    host, port = server.address
+    request = urllib.request.Request(
+        f"http://{host}:{port}{path}",
+        data=body,
+        headers={"X-Gitlab-Token": token, "X-Gitlab-Event": event, "Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _post_raw(server, content_length, body=b""):
+    host, port = server.address
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.putrequest("POST", "/webhook")
+        connection.putheader("X-Gitlab-Token", "s3cret")
+        connection.putheader("X-Gitlab-Event", "Merge Request Hook")
+        if content_length is not None:
+            connection.putheader("Content-Length", content_length)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def server():
+    events = []
+    server = WebhookServer("127.0.0.1", 0, "s3cret", events.append, max_body=4096)
+    server.start()
+    server.events = events
+    yield server
+    server.stop()
+
+
+def test_parse_merge_request_event():
+    event = parse_merge_request_event(MR_PAYLOAD)
+    assert event == MergeRequestEvent(
+        project="group/proj", iid=7, action="update", state="opened", updated_at="2024-05-01 10:00:00 UTC"
+    )
+
+    assert parse_merge_request_event({"object_kind": "push"}) is None
+    assert parse_merge_request_event({"object_kind": "merge_request", "object_attributes": {"iid": 1}}) is None
+    assert parse_merge_request_event(
+        {"object_kind": "merge_request", "project": {"path_with_namespace": "g/p"}, "object_attributes": {"iid": "1"}}
+    ) is None
+
+
+def test_server_accepts_recorded_payload(server):
+    status, body = _post(server, json.dumps(MR_PAYLOAD).encode("utf-8"))
+
+    assert (status, body) == (202, {"message": "accepted"})
+    assert [(e.project, e.iid) for e in server.events] == [("group/proj", 7)]
+
+
+def test_server_rejects_invalid_requests(server):
+    payload = json.dumps(MR_PAYLOAD).encode("utf-8")
+
+    assert _post(server, payload, token="wrong")[0] == 401
+    assert _post(server, payload, path="/other")[0] == 404
+    assert _post(server, b"x" * 5000)[0] == 413
+    assert _post(server, b"not json")[0] == 400
+    assert _post(server, b"[]")[0] == 400
+    assert _post(server, b"{}", event="Push Hook") == (202, {"message": "ignored"})
+    assert server.events == []
+
+
+def test_server_validates_content_length(server):
+    assert _post_raw(server, "abc") == (400, {"message": "invalid content-length"})
+    assert _post_raw(server, "-1") == (400, {"message": "invalid content-length"})
+    # 過大的內容不會被讀取
+    assert _post_raw(server, str(10 ** 12)) == (413, {"message": "payload too large"})
+    assert _post_raw(server, "2", b"{}")[0] == 400
+    # 沒有 Content-Length 時視為空內容
+    assert _post_raw(server, None) == (400, {"message": "invalid json"})
+    assert server.events == []
+
+
+def test_server_requires_secret():
+    with pytest.raises(ConfigError):
+        WebhookServer("127.0.0.1", 0, "", Mock())
+
+
+def test_refresh_mr():
+    client = Mock()
+    scanner = MRScanner(client, Mock(), filter_rules=["label = review"])
+
+    client.get_mr_details.return_value = _mr(labels=["review"])
+    assert scanner.refresh_mr("group/proj", 7).iid == 7
+    client.get_mr_details.assert_called_with("group/proj", 7)
+
+    client.get_mr_details.return_value = _mr(labels=[])
+    assert scanner.refresh_mr("group/proj", 7) is None
+
+    client.get_mr_details.return_value = _mr(state="merged", labels=["review"])
+    assert scanner.refresh_mr("group/proj", 7) is None
+
+
+@pytest.fixture
+def webhook_globals(monkeypatch):
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["group/proj"]))
+    monkeypatch.setattr(main, "shard_coordinator", None)
+    monkeypatch.setattr(main, "scan_lock", None)
+    monkeypatch.setattr(main, "state_manager", Mock())
+    monkeypatch.setattr(main, "clone_manager", Mock())
+    job_queue = Mock()
+    job_queue.enqueue.return_value = True
+    job_queue.claim.return_value = None
+    monkeypatch.setattr(main, "job_queue", job_queue)
+    scanner = Mock()
+    scanner.refresh_mr.return_value = _mr()
+    monkeypatch.setattr(main, "mr_scanner", scanner)
+    return SimpleNamespace(scanner=scanner, job_queue=job_queue)
+
+
+def test_handle_webhook_event_clones_single_mr(webhook_globals):
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, False)
+
+    webhook_globals.scanner.refresh_mr.assert_called_once_with("group/proj", 7, exclude_wip=True, exclude_draft=False)
+    webhook_globals.job_queue.enqueue.assert_called_once()
+    webhook_globals.job_queue.claim.assert_called_once_with("w", project="group/proj", iid=7)
+    main.state_manager.checkpoint.assert_called_once()
+
+
+def test_handle_webhook_event_skips(webhook_globals, monkeypatch):
+    # 未設定的專案
+    main._handle_webhook_event(MergeRequestEvent("other/proj", 1), "w", True, True)
+    webhook_globals.scanner.refresh_mr.assert_not_called()
+
+    # 由其他節點負責
+    coordinator = Mock()
+    coordinator.owns.return_value = False
+    monkeypatch.setattr(main, "shard_coordinator", coordinator)
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, True)
+    webhook_globals.scanner.refresh_mr.assert_not_called()
+    monkeypatch.setattr(main, "shard_coordinator", None)
+
+    # 已關閉或不符合篩選規則
+    webhook_globals.scanner.refresh_mr.return_value = None
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, True)
+    webhook_globals.job_queue.enqueue.assert_not_called()
+
+
+@pytest.mark.parametrize("mode, name", [("project", project_lock_name("group/proj")), ("global", GLOBAL_LOCK)])
+def test_handle_webhook_event_takes_scan_lock(webhook_globals, monkeypatch, tmp_path, mode, name):
+    lock = ScanLock(str(tmp_path / "locks.db"), owner="this-host:1")
+    other = ScanLock(str(tmp_path / "locks.db"), owner="other-host:1")
+    monkeypatch.setattr(main, "scan_lock", lock)
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["group/proj"], scan_lock=mode, scan_lock_wait=0))
+    held = []
+    webhook_globals.job_queue.claim.side_effect = lambda *args, **kwargs: held.append(lock.holder(name))
+
+    # 其他行程正在掃描：工作留在佇列，由下一輪掃描處理
+    other.try_acquire(name)
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, False)
+    webhook_globals.job_queue.enqueue.assert_called_once()
+    assert held == []
+    main.logger.info.assert_called_once()
+
+    # 本行程的掃描正持有同一個鎖
+    other.release(name)
+    assert main._acquire_lock(name) is not None
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, False)
+    assert held == []
+    main._release_lock(name)
+
+    main._handle_webhook_event(MergeRequestEvent("group/proj", 7), "w", True, False)
+    assert held == ["this-host:1"]
+    assert lock.holder(name) is None
+    lock.close()
+    other.close()
+
+
+def test_acquire_lock_waits_for_local_holder_and_releases_on_error(monkeypatch, tmp_path, capsys):
+    lock = ScanLock(str(tmp_path / "locks.db"), owner="this-host:1")
+    monkeypatch.setattr(main, "scan_lock", lock)
+    monkeypatch.setattr(main, "config", SimpleNamespace(scan_lock_wait=5))
+    name = project_lock_name("group/proj")
+    assert main._acquire_lock(name) is not None
+
+    # 本行程的其他執行緒持有時等待，等待時間計入回傳值
+    timer = threading.Timer(0.1, main._release_lock, args=(name,))
+    timer.start()
+    waited = main._acquire_lock(name)
+    timer.join()
+    assert 0.05 < waited < 5
+    main._release_lock(name)
+
+    # 取得跨行程鎖失敗時釋放執行緒鎖，之後仍可立即取得
+    with patch.object(lock, "acquire", side_effect=StateError("locked")):
+        with pytest.raises(StateError):
+            main._acquire_lock(name)
+    monkeypatch.setattr(main, "config", SimpleNamespace(scan_lock_wait=0))
+    assert main._acquire_lock(name) is not None
+
+    monkeypatch.setattr(main, "logger", Mock())
+    assert main._acquire_project_lock("group/proj") is None
+    assert "group/proj: 正由本行程的其他工作處理" in capsys.readouterr().out
+    main._release_lock(name)
+    lock.close()
+
+
+def test_webhook_worker_survives_errors(webhook_globals):
+    import queue
+
+    stop = threading.Event()
+    events = queue.Queue()
+    events.put(MergeRequestEvent("group/proj", 7))
+    events.put(MergeRequestEvent("group/proj", 8))
+
+    def refresh(project, iid, exclude_wip, exclude_draft):
+        if iid == 7:
+            raise RuntimeError("boom")
+        stop.set()
+        return None
+
+    webhook_globals.scanner.refresh_mr.side_effect = refresh
+    main._webhook_worker(events, stop, "w", True, True)
+
+    assert webhook_globals.scanner.refresh_mr.call_count == 2
+    main.logger.error.assert_called_once()
+
+
+def test_webhook_config(monkeypatch):
+    monkeypatch.setenv("GITLAB_URL", "https://gitlab.example.com")
+    monkeypatch.setenv("GITLAB_TOKEN", "token")
+    monkeypatch.setenv("GITLAB_PROJECTS", "group/proj")
+    monkeypatch.setenv("WEBHOOK_ENABLED", "true")
+
+    with pytest.raises(ConfigError):
+        Config.from_env()
+
+    monkeypatch.setenv("WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setenv("WEBHOOK_PORT", "9000")
+    config = Config.from_env()
+    assert (config.webhook_enabled, config.webhook_host, config.webhook_port, config.webhook_path) == (
+        True, "127.0.0.1", 9000, "/webhook"
+    )
+
+
+def test_serve_command_runs_webhook(monkeypatch):
+    from click.testing import CliRunner
+
+    from src.main import cli
+
+    handled = threading.Event()
+    seen = {}
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["group/proj"], poll_min_interval=30, poll_max_interval=1800, webhook_enabled=True,
+            webhook_host="127.0.0.1", webhook_port=0, webhook_path="/webhook", webhook_secret="s3cret",
+            prune_interval=0, metrics_port=0,
+        )
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+
+    def fake_handle(event, worker_id, exclude_wip, exclude_draft):
+        seen["event"] = (event.project, event.iid)
+        handled.set()
+
+    def fake_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft):
+        server = RecordingServer.instances[-1]
+        seen["status"] = _post(server, json.dumps(MR_PAYLOAD).encode("utf-8"))[0]
+        handled.wait(5)
+        stop.set()
+
+    class RecordingServer(WebhookServer):
+        instances = []
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            RecordingServer.instances.append(self)
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._serve_loop", fake_loop)
+    monkeypatch.setattr("src.main._handle_webhook_event", fake_handle)
+    monkeypatch.setattr("src.main.WebhookServer", RecordingServer)
+
+    result = CliRunner().invoke(cli, ["serve"])
+
+    assert result.exit_code == 0, result.output
+    assert "webhook 接收端" in result.output
+    assert seen == {"status": 202, "event": ("group/proj", 7)}
+    main.state_manager.flush.assert_called_once()
+
+
+def test_serve_command_stops_webhook_on_error(monkeypatch):
+    from click.testing import CliRunner
+
+    from src.main import cli
+
+    finished = []
+
+    def fake_init():
+        main.logger = Mock()
+        main.config = SimpleNamespace(
+            projects=["group/proj"], poll_min_interval=30, poll_max_interval=1800, webhook_enabled=True,
+            webhook_host="127.0.0.1", webhook_port=0, webhook_path="/webhook", webhook_secret="s3cret",
+            prune_interval=0, metrics_port=0,
+        )
+        main.shard_coordinator = None
+        main.scan_lock = None
+        main.state_manager = Mock()
+        main.job_queue = Mock()
+
+    def fake_worker(events, stop, *args):
+        finished.append(stop.wait(5))
+
+    def fake_loop(scheduler, stop, worker_id, exclude_wip, exclude_draft):
+        raise RuntimeError("poll crashed")
+
+    server = Mock(address=("127.0.0.1", 8080))
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    monkeypatch.setattr("src.main._serve_loop", fake_loop)
+    monkeypatch.setattr("src.main._webhook_worker", fake_worker)
+    monkeypatch.setattr("src.main.WebhookServer", Mock(return_value=server))
+    for name in ("logger", "config", "shard_coordinator", "scan_lock", "state_manager", "job_queue"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+
+    result = CliRunner().invoke(cli, ["serve"])
+
+    assert result.exit_code == 1 and "poll crashed" in result.output
+    # 失敗時仍關閉 webhook 伺服器並等待 worker 結束
+    server.stop.assert_called_once()
+    assert finished == [True]
+    main.state_manager.flush.assert_not_called()
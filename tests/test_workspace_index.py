@@ -0,0 +1,213 @@
+"""
+測試 clone 索引與目錄掃描重建
+"""
+
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+import src.main as main
+from src.clone import workspaces as workspaces_module
+from src.clone.manager import CloneManager
+from src.clone.workspaces import WorkspaceStore, measure, scan_workspaces
+from src.main import cli
+from src.state.manager import StateManager
+from src.utils.exceptions import StateError
+
+
+def _clone(reviews, relative):
+    path = reviews / relative
+    (path / ".git").mkdir(parents=True)
+    (path / "README").write_bytes(b"x" * 10)
+    return path
+
+
+def test_scan_workspaces_handles_any_depth(tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "group/sub/project/5")
+    _clone(reviews, "group/2024/project/3")
+    _clone(reviews, "group/project/12")
+    (reviews / "group/project/12/nested/1").mkdir(parents=True)  # clone 內的數字目錄不是 clone
+    (reviews / "legacy/7/src").mkdir(parents=True)  # 沒有 .git 的舊 clone
+    (reviews / ".trash/group-1-dead").mkdir(parents=True)
+
+    assert sorted(scan_workspaces(reviews)) == [
+        ("group/2024/project", 3), ("group/project", 12), ("group/sub/project", 5), ("legacy", 7),
+    ]
+    assert scan_workspaces(tmp_path / "missing") == []
+
+
+def test_scan_workspaces_nested_numeric_segments(tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "2024/11/project/3")  # 第一層的數字目錄是專案路徑的一部分
+    _clone(reviews, "group/7/8/9")
+    (reviews / "group/5/6").mkdir(parents=True)  # 沒有 .git：最內層的數字目錄才是 clone
+
+    assert sorted(scan_workspaces(reviews)) == [("2024/11/project", 3), ("group/5", 6), ("group/7/8", 9)]
+
+
+def test_scan_workspaces_skips_unreadable_directories(tmp_path, monkeypatch):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "group/locked/1")
+    _clone(reviews, "group/open/2")
+    _clone(reviews, "group/flaky/3")
+    real_scandir = workspaces_module.os.scandir
+
+    class Flaky:
+        def __init__(self, entry):
+            self.entry = entry
+            self.name = entry.name
+            self.path = entry.path
+
+        def is_dir(self, follow_symlinks=True):
+            raise PermissionError(self.path)
+
+    class Listing:
+        def __init__(self, entries):
+            self.entries = entries
+
+        def __enter__(self):
+            return iter(self.entries)
+
+        def __exit__(self, *exc):
+            return False
+
+    def scandir(path):
+        if path.endswith("locked"):
+            raise PermissionError(path)
+        with real_scandir(path) as it:
+            entries = [Flaky(entry) if entry.name == "flaky" else entry for entry in it]
+        return Listing(entries)
+
+    monkeypatch.setattr(workspaces_module.os, "scandir", scandir)
+
+    assert scan_workspaces(reviews) == [("group/open", 2)]
+
+
+def test_measure_ignores_utime_failure(tmp_path, monkeypatch):
+    path = _clone(tmp_path, "group/project/1")
+
+    def deny(*args, **kwargs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(workspaces_module.os, "utime", deny)
+    assert measure(path)[0] == 10
+
+
+def test_store_tolerates_state_errors():
+    manager = Mock()
+    for name in ("get_document", "get_documents", "get_document_keys", "put_document", "delete_document"):
+        getattr(manager, name).side_effect = StateError("locked")
+    store = WorkspaceStore(manager, clock=lambda: 100.0)
+
+    # 讀取失敗視為沒有紀錄；寫入失敗只記錄警告
+    assert store.record("g/p", 1, 11, 10).size == 10
+    assert store.all() == [] and store.index() == []
+    assert store.get("g/p", 1) is None
+    assert store.pin("g/p", 1) is False
+    assert store.update_manifest(SimpleNamespace(project_name="g/p", iid=1)) is False
+    store.touch("g/p", 1)
+    store.forget("g/p", 1)
+
+
+def test_touch_only_moves_forward(tmp_path):
+    manager = StateManager(storage_type="json", state_dir=str(tmp_path))
+    store = WorkspaceStore(manager, clock=lambda: 100.0)
+    store.record("g/p", 1, 11, 10, accessed_at=50.0)
+
+    store.touch("g/p", 1, accessed_at=40.0)
+    assert store.get("g/p", 1).last_access == 50.0
+    store.touch("g/p", 1)
+    assert store.get("g/p", 1).last_access == 100.0
+
+
+@pytest.mark.parametrize("storage_type", ["sqlite", "json", "kv"])
+def test_index_reads_keys_only(tmp_path, storage_type):
+    manager = StateManager(storage_type=storage_type, db_path=str(tmp_path / "db.sqlite"), state_dir=str(tmp_path))
+    store = WorkspaceStore(manager)
+    store.record("a/b/c", 1, 11, 100)
+    store.record("a/b/c", 2, 12, 100)
+    manager.put_document("projects", "a/b/c", {"id": 1})
+
+    assert sorted(store.index()) == [("a/b/c", 1), ("a/b/c", 2)]
+    store.forget("a/b/c", 1)
+    assert store.index() == [("a/b/c", 2)]
+    manager.close()
+
+
+def test_list_clones_reads_index_and_rebuild_fixes_drift(tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "group/sub/project/5")
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    manager = CloneManager(SimpleNamespace(reviews_path=str(reviews)), state_manager, workspaces=WorkspaceStore(state_manager))
+
+    # 索引為空時先重建一次
+    assert manager.list_clones() == {"group/sub/project": [5]}
+    assert manager.workspaces.get("group/sub/project", 5).size == 10
+
+    # 之後只讀索引，不走訪目錄
+    _clone(reviews, "group/sub/project/6")
+    assert manager.list_clones() == {"group/sub/project": [5]}
+
+    (reviews / "group/sub/project/5/.git").rmdir()
+    (reviews / "group/sub/project/5/README").unlink()
+    (reviews / "group/sub/project/5").rmdir()
+    assert manager.rebuild_index() == (1, 1)
+    assert manager.list_clones() == {"group/sub/project": [6]}
+
+
+def test_list_clones_command(monkeypatch, tmp_path):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "a/b/c/1")
+    _clone(reviews, "a/b/c/2")
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+
+    def fake_init(offline=False):
+        main.logger = Mock()
+        main.config = SimpleNamespace(reviews_path=str(reviews))
+        main.state_manager = state_manager
+        main.clone_manager = CloneManager(main.config, state_manager, workspaces=WorkspaceStore(state_manager))
+
+    monkeypatch.setattr("src.main.init_app", fake_init)
+    for name in ("logger", "config", "state_manager", "clone_manager"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["list-clones"])
+    assert result.exit_code == 0, result.output
+    assert "a/b/c:" in result.output and f"#2: {reviews / 'a/b/c/2'}" in result.output
+    assert "總計: 2 個 clone" in result.output
+
+    _clone(reviews, "a/b/c/3")
+    result = runner.invoke(cli, ["list-clones", "--rebuild"])
+    assert "新增 1 筆、清除 0 筆" in result.output and "總計: 3 個 clone" in result.output
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_reconcile_lists_clones_with_and_without_index(monkeypatch, tmp_path, indexed):
+    reviews = tmp_path / "reviews"
+    _clone(reviews, "a/b/c/1")
+    state_manager = StateManager(storage_type="json", state_dir=str(tmp_path / "state"))
+    store = WorkspaceStore(state_manager) if indexed else None
+    manager = CloneManager(SimpleNamespace(reviews_path=str(reviews)), state_manager, workspaces=store)
+    manager.list_clones()
+    # 索引建立後手動複製進來的已關閉 MR clone
+    _clone(reviews, "a/b/c/2")
+    client = Mock()
+    client.get_merge_requests.return_value = [SimpleNamespace(iid=1)]
+    monkeypatch.setattr(main, "logger", Mock())
+    monkeypatch.setattr(main, "config", SimpleNamespace(projects=["a/b/c"], reviews_path=str(reviews), prune_workers=1))
+    monkeypatch.setattr(main, "state_manager", state_manager)
+    monkeypatch.setattr(main, "clone_manager", manager)
+    monkeypatch.setattr(main, "gitlab_client", client)
+    monkeypatch.setattr(main, "job_queue", Mock())
+
+    report = main._reconcile(["a/b/c"])
+
+    # 有索引時先以目錄校正，沒有索引時直接掃描目錄，兩者都找得到手動複製的 clone
+    assert report.removed == 1
+    assert not (reviews / "a/b/c/2").exists()
+    assert manager.list_clones() == {"a/b/c": [1]}
+